@@ -0,0 +1,559 @@
+#!/usr/bin/env python3
+"""
+End-to-end scaling benchmark.
+
+Synthesizes projects of 1 to 1000 instances of generated templates, runs
+project_creation on each (in memory, with deterministic UUIDs), and
+measures the wall time and peak memory of every stage. The growth
+exponent of each is the slope of a log-log fit over the sizes (at least
+three of them): 1 is linear, 2 quadratic. A stage growing faster than
+--max-exponent fails the run, which is how accidentally quadratic code
+paths are caught. tests/test_scaling.py runs a smaller version
+(pytest -m benchmark).
+
+Usage:
+  python benchmarks/scaling.py [--sizes 1 10 100 300 1000] [--runs 2]
+                               [--max-exponent 1.2] [--templates 10]
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import math
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager, redirect_stdout
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+from schematic_api.hierarchical_object import HierarchicalObject  # noqa: E402
+from schematic_api.kicad_api import KiCadAPI, KiCadSchematic  # noqa: E402
+from schematic_api.sinks import MemorySink  # noqa: E402
+
+# Stage -> (class, method): project_creation's steps.
+STAGES = {
+    "instantiate": (KiCadAPI, "_instantiate_subsystems"),
+    "place sheets": (KiCadSchematic, "add_hierarchical_sheets"),
+    "write sheets": (KiCadAPI, "_write_instantiated_schematics"),
+    "symbol library": (KiCadAPI, "_write_symbol_library"),
+    "board": (KiCadAPI, "add_multiple_designs"),
+    "provenance": (KiCadAPI, "_record_provenance"),
+    "total": (KiCadAPI, "project_creation"),
+}
+
+# Parts (resistors) of each generated template.
+PARTS = 4
+
+
+# ---- generated templates ----
+
+
+def _uuid(*parts) -> str:
+    import uuid
+
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, "/".join(map(str, parts))))
+
+
+def _sheet(name: str) -> str:
+    symbols = []
+    for part in range(1, PARTS + 1):
+        x = 100 + 10 * part
+        pins = "".join(
+            f'\n\t\t(pin "{pin}"\n\t\t\t(uuid "{_uuid(name, "pin", part, pin)}")\n\t\t)'
+            for pin in (1, 2)
+        )
+        symbols.append(f"""
+	(symbol
+		(lib_id "Device:R")
+		(at {x} 100 0)
+		(unit 1)
+		(exclude_from_sim no)
+		(in_bom yes)
+		(on_board yes)
+		(dnp no)
+		(uuid "{_uuid(name, "symbol", part)}")
+		(property "Reference" "R{part}"
+			(at {x + 2} 100 0)
+			(effects
+				(font
+					(size 1.27 1.27)
+				)
+			)
+		)
+		(property "Value" "10k"
+			(at {x + 2} 102 0)
+			(effects
+				(font
+					(size 1.27 1.27)
+				)
+			)
+		)
+		(property "Footprint" "Resistor_SMD:R_0603_1608Metric"
+			(at {x} 100 0)
+			(effects
+				(font
+					(size 1.27 1.27)
+				)
+				(hide yes)
+			)
+		){pins}
+		(instances
+			(project "{name}"
+				(path "/{_uuid(name, "sheet")}"
+					(reference "R{part}")
+					(unit 1)
+				)
+			)
+		)
+	)""")
+    labels = "".join(
+        f"""
+	(hierarchical_label "{label}"
+		(shape {shape})
+		(at {x} 95 180)
+		(effects
+			(font
+				(size 1.27 1.27)
+			)
+			(justify right)
+		)
+		(uuid "{_uuid(name, "label", label)}")
+	)"""
+        for label, shape, x in (("IN", "input", 105), ("OUT", "output", 155))
+    )
+    return f"""(kicad_sch
+	(version 20250114)
+	(generator "eeschema")
+	(generator_version "9.0")
+	(uuid "{_uuid(name, "sheet")}")
+	(paper "A4")
+	(lib_symbols
+		(symbol "Device:R"
+			(exclude_from_sim no)
+			(in_bom yes)
+			(on_board yes)
+			(property "Reference" "R"
+				(at 2.032 0 90)
+				(effects
+					(font
+						(size 1.27 1.27)
+					)
+				)
+			)
+			(property "Value" "R"
+				(at 0 0 90)
+				(effects
+					(font
+						(size 1.27 1.27)
+					)
+				)
+			)
+			(symbol "R_0_1"
+				(rectangle
+					(start -1.016 -2.54)
+					(end 1.016 2.54)
+					(stroke
+						(width 0.254)
+						(type default)
+					)
+					(fill
+						(type none)
+					)
+				)
+			)
+			(symbol "R_1_1"
+				(pin passive line
+					(at 0 3.81 270)
+					(length 1.27)
+					(name "~"
+						(effects
+							(font
+								(size 1.27 1.27)
+							)
+						)
+					)
+					(number "1"
+						(effects
+							(font
+								(size 1.27 1.27)
+							)
+						)
+					)
+				)
+				(pin passive line
+					(at 0 -3.81 90)
+					(length 1.27)
+					(name "~"
+						(effects
+							(font
+								(size 1.27 1.27)
+							)
+						)
+					)
+					(number "2"
+						(effects
+							(font
+								(size 1.27 1.27)
+							)
+						)
+					)
+				)
+			)
+			(embedded_fonts no)
+		)
+	){"".join(symbols)}{labels}
+)
+"""
+
+
+def _board(name: str, sheet_name: str) -> str:
+    # The resistors in a chain, IN -> R1 -> ... -> OUT, joined by tracks.
+    nets = ['(net 0 "")', f'(net 1 "/{sheet_name}/IN")']
+    nets += [f'(net {part + 1} "Net-(R{part}-Pad2)")' for part in range(1, PARTS)]
+    nets.append(f'(net {PARTS + 1} "/{sheet_name}/OUT")')
+    items = []
+    for part in range(1, PARTS + 1):
+        x = 100 + 3 * part
+        pads = "".join(
+            f"""
+		(pad "{pin}" smd roundrect
+			(at {-0.8 if pin == 1 else 0.8} 0)
+			(size 0.8 0.95)
+			(layers "F.Cu" "F.Mask" "F.Paste")
+			(roundrect_rratio 0.25)
+			(net {net} "{nets[net].split('"')[1]}")
+			(pintype "passive")
+			(uuid "{_uuid(name, "pad", part, pin)}")
+		)"""
+            for pin, net in ((1, part), (2, part + 1))
+        )
+        items.append(f"""
+	(footprint "Resistor_SMD:R_0603_1608Metric"
+		(layer "F.Cu")
+		(uuid "{_uuid(name, "footprint", part)}")
+		(at {x} 100 90)
+		(property "Reference" "R{part}"
+			(at 0 -1.43 90)
+			(layer "F.SilkS")
+			(uuid "{_uuid(name, "reference", part)}")
+			(effects
+				(font
+					(size 1 1)
+					(thickness 0.15)
+				)
+			)
+		)
+		(path "/{_uuid(name, "symbol", part)}")
+		(sheetname "/{sheet_name}/")
+		(sheetfile "{name}.kicad_sch")
+		(attr smd)
+		(fp_rect
+			(start -1.48 -0.73)
+			(end 1.48 0.73)
+			(stroke
+				(width 0.05)
+				(type solid)
+			)
+			(fill no)
+			(layer "F.CrtYd")
+			(uuid "{_uuid(name, "courtyard", part)}")
+		){pads}
+	)""")
+        if part < PARTS:
+            items.append(f"""
+	(segment
+		(start {x} 100.8)
+		(end {x + 3} 99.2)
+		(width 0.2)
+		(layer "F.Cu")
+		(net {part + 1})
+		(uuid "{_uuid(name, "segment", part)}")
+	)""")
+    return f"""(kicad_pcb
+	(version 20241229)
+	(generator "pcbnew")
+	(generator_version "9.0")
+	(general
+		(thickness 1.6)
+		(legacy_teardrops no)
+	)
+	(paper "A4")
+	(layers
+		(0 "F.Cu" signal)
+		(2 "B.Cu" signal)
+		(31 "F.CrtYd" user "F.Courtyard")
+		(25 "Edge.Cuts" user)
+	)
+	{chr(10).join("	" + net for net in nets).lstrip()}{"".join(items)}
+)
+"""
+
+
+def generate_templates(folder: Path, count: int) -> list[HierarchicalObject]:
+    """`count` distinct templates written to `folder`."""
+    templates = []
+    for index in range(count):
+        name = f"gen_{index:02d}"
+        sheet_name = f"GEN_{index:02d}"
+        template_folder = folder / name
+        template_folder.mkdir(parents=True)
+        (template_folder / f"{name}.kicad_sch").write_text(
+            _sheet(name), encoding="utf-8"
+        )
+        (template_folder / f"{name}.kicad_pcb").write_text(
+            _board(name, sheet_name), encoding="utf-8"
+        )
+        (template_folder / "meta.yaml").write_text(
+            f"""sheet_name: {sheet_name}
+sheet_file: {name}.kicad_sch
+pcb_file: {name}.kicad_pcb
+at_xy: [0, 0]
+size_wh: [30, 20]
+properties:
+  Comment: Generated for the scaling benchmark
+pins:
+  - name: IN
+    type: input
+    net: IN
+  - name: OUT
+    type: output
+    net: OUT
+""",
+            encoding="utf-8",
+        )
+        templates.append(
+            HierarchicalObject.load_from_yaml(template_folder / "meta.yaml")
+        )
+    return templates
+
+
+# ---- measures ----
+
+
+class _Recorder:
+    # Wraps the stage methods, timing them and taking their peak memory
+    # (above what was allocated when they started) while tracemalloc runs.
+
+    def __init__(self):
+        self.times: dict[str, float] = {}
+        self.peaks: dict[str, int] = {}
+        # [memory at start, highest peak seen] of the stages running
+        self._frames: list[list[int]] = []
+
+    @contextmanager
+    def installed(self):
+        originals = {}
+        for stage, (cls, method) in STAGES.items():
+            originals[stage] = getattr(cls, method)
+            setattr(cls, method, self._wrap(stage, originals[stage]))
+        try:
+            yield self
+        finally:
+            for stage, (cls, method) in STAGES.items():
+                setattr(cls, method, originals[stage])
+
+    def _wrap(self, stage: str, function):
+        recorder = self
+
+        def wrapper(*args, **kwargs):
+            tracing = tracemalloc.is_tracing()
+            if tracing:
+                current, peak = tracemalloc.get_traced_memory()
+                # Stages nest (total holds them all): the enclosing one
+                # keeps its peak so far before it is reset.
+                if recorder._frames:
+                    recorder._frames[-1][1] = max(recorder._frames[-1][1], peak)
+                recorder._frames.append([current, current])
+                tracemalloc.reset_peak()
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                recorder.times[stage] = (
+                    recorder.times.get(stage, 0.0) + time.perf_counter() - start
+                )
+                if tracing:
+                    start_memory, highest = recorder._frames.pop()
+                    highest = max(highest, tracemalloc.get_traced_memory()[1])
+                    recorder.peaks[stage] = max(
+                        recorder.peaks.get(stage, 0), highest - start_memory
+                    )
+                    if recorder._frames:
+                        recorder._frames[-1][1] = max(recorder._frames[-1][1], highest)
+
+        return wrapper
+
+
+class _ScalingAPI(KiCadAPI):
+    # The board grows with the project: placement must not run out of room.
+    board_size = (285, 198)
+
+    def add_multiple_designs(self, project_path, design_instances, **options):
+        options.setdefault("max_x", self.board_size[0])
+        options.setdefault("max_y", self.board_size[1])
+        return super().add_multiple_designs(project_path, design_instances, **options)
+
+
+def _create(templates: list[HierarchicalObject], size: int) -> None:
+    api = _ScalingAPI()
+    # Fragments take about 20 x 10 mm with their spacing.
+    side = 25 + 20 * math.ceil(math.sqrt(size)) + 20
+    api.board_size = (max(285, side), max(198, side))
+    instances = [templates[i % len(templates)] for i in range(size)]
+    with redirect_stdout(io.StringIO()):
+        api.project_creation(
+            "scaling", instances, deterministic=True, sink=MemorySink("scaling")
+        )
+
+
+def measure(templates: list[HierarchicalObject], size: int, runs: int) -> dict:
+    # Times: the best of `runs`, without tracemalloc (which slows code
+    # down unevenly). Memory: one more run, traced.
+    times: dict[str, float] = {}
+    for _ in range(runs):
+        with _Recorder().installed() as recorder:
+            _create(templates, size)
+        for stage, seconds in recorder.times.items():
+            times[stage] = min(times.get(stage, seconds), seconds)
+    tracemalloc.start()
+    try:
+        with _Recorder().installed() as recorder:
+            _create(templates, size)
+    finally:
+        tracemalloc.stop()
+    return {"time": times, "peak": recorder.peaks}
+
+
+def growth_exponent(sizes: list[int], values: list[float]) -> float | None:
+    """Slope of the least squares fit of log(value) over log(size)."""
+    points = [
+        (math.log(size), math.log(value))
+        for size, value in zip(sizes, values)
+        if value > 0
+    ]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    if variance == 0:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / variance
+
+
+def run(sizes: list[int], runs: int, template_count: int) -> dict[int, dict]:
+    """measure() of every size, on `template_count` generated templates."""
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="kicad-scaling-") as folder:
+        templates = generate_templates(Path(folder), template_count)
+        for size in sizes:
+            start = time.perf_counter()
+            results[size] = measure(templates, size, runs)
+            print(
+                f"{size:>5} instances: {time.perf_counter() - start:.1f} s",
+                file=sys.stderr,
+            )
+    return results
+
+
+# measure -> (unit, scale)
+UNITS = {"time": ("ms", 1000), "peak": ("MiB", 1 / 2**20)}
+
+
+def exponents(
+    results: dict[int, dict],
+    fit_from: int,
+    min_time: float = 0.05,
+    min_peak: float = 1.0,
+) -> dict[str, dict[str, float | None]]:
+    """
+    Growth exponent of every stage (measure -> stage -> exponent), fitted
+    over the sizes from `fit_from`. Stages under `min_time` seconds or
+    `min_peak` MiB at the largest size are not fitted (None).
+    """
+    sizes = sorted(results)
+    fitted = [size for size in sizes if size >= fit_from]
+    if len(fitted) < 3:
+        raise ValueError(
+            f"fitting needs at least 3 sizes from {fit_from}, got {fitted}"
+        )
+    minimums = {"time": min_time, "peak": min_peak * 2**20}
+    fits: dict[str, dict[str, float | None]] = {}
+    for measure_name, minimum in minimums.items():
+        fits[measure_name] = {}
+        for stage in STAGES:
+            values = [results[size][measure_name].get(stage, 0) for size in fitted]
+            fits[measure_name][stage] = (
+                None if values[-1] < minimum else growth_exponent(fitted, values)
+            )
+    return fits
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100, 300, 1000])
+    ap.add_argument("--runs", type=int, default=2)
+    ap.add_argument(
+        "--templates", type=int, default=10, help="distinct generated templates"
+    )
+    ap.add_argument(
+        "--max-exponent",
+        type=float,
+        default=1.2,
+        help="fail when a stage grows faster than size ** this",
+    )
+    ap.add_argument(
+        "--fit-from",
+        type=int,
+        default=100,
+        help="smallest size fitted (fixed costs, and steps such as a "
+        "second schematic page, dominate below); at least 3 sizes must remain",
+    )
+    ap.add_argument(
+        "--min-time",
+        type=float,
+        default=0.05,
+        help="stages taking less seconds at the largest size are not fitted",
+    )
+    ap.add_argument(
+        "--min-peak",
+        type=float,
+        default=1.0,
+        help="stages peaking under these MiB at the largest size are not fitted",
+    )
+    args = ap.parse_args()
+    sizes = sorted(set(args.sizes))
+    if len([size for size in sizes if size >= args.fit_from]) < 3:
+        ap.error("at least 3 sizes must be >= --fit-from")
+
+    results = run(sizes, args.runs, args.templates)
+    fits = exponents(results, args.fit_from, args.min_time, args.min_peak)
+
+    header = "".join(f"{size:>10}" for size in sizes)
+    failed = False
+    for measure_name, (unit, scale) in UNITS.items():
+        print(f"\n{measure_name + ' (' + unit + ')':<16}{header}   exponent")
+        for stage in STAGES:
+            values = [
+                results[size][measure_name].get(stage, 0) * scale for size in sizes
+            ]
+            line = f"{stage:<16}" + "".join(f"{value:>10.1f}" for value in values)
+            exponent = fits[measure_name][stage]
+            if exponent is None:
+                line += "          -"
+            else:
+                line += f"{exponent:>11.2f}"
+                if exponent > args.max_exponent:
+                    line += "   super-linear"
+                    failed = True
+            print(line)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
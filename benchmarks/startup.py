@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+CLI startup benchmark.
+
+Runs each command several times under `python -X importtime` and reports
+the median wall time and the import time of every top-level module.
+The checked-in baseline (startup_baseline.json) is compared against, or
+rewritten with --save. It also holds, under "reference", the timings of
+the tree before the startup work (commit 5862120), measured on the same
+machine with --tree on a checkout of it and --save-reference: the
+improvement can be checked against them.
+
+Usage:
+  python benchmarks/startup.py [--runs 10] [--save] [--max-ratio 1.5]
+  git worktree add /tmp/before 5862120
+  python benchmarks/startup.py --tree /tmp/before --save-reference 5862120
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+MAIN = ROOT / "src" / "main.py"
+BASELINE = Path(__file__).resolve().parent / "startup_baseline.json"
+
+COMMANDS = {
+    "list": ["list"],
+    "help": ["--help"],
+}
+
+
+def _top_level_imports(importtime_output: str) -> dict[str, int]:
+    # Lines look like "import time:  self [us] | cumulative | package",
+    # top-level modules being those without indentation.
+    result = {}
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, package = line[len("import time:") :].split("|")
+        if package.startswith(" ") and not package.startswith("  "):
+            result[package.strip()] = int(cumulative)
+    return result
+
+
+def measure(args: list[str], runs: int, main: Path = MAIN) -> dict:
+    walls = []
+    imports: dict[str, list[int]] = {}
+    for _ in range(runs):
+        start = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", str(main), *args],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        walls.append(time.perf_counter() - start)
+        for package, us in _top_level_imports(proc.stderr).items():
+            imports.setdefault(package, []).append(us)
+
+    # Modules imported only in some runs (e.g. on a cold cache) count as 0 in the others.
+    top = sorted(
+        (
+            (package, statistics.median(values + [0] * (runs - len(values))))
+            for package, values in imports.items()
+        ),
+        key=lambda item: item[1],
+        reverse=True,
+    )
+    return {
+        "wall_ms": round(statistics.median(walls) * 1000, 1),
+        "import_ms": round(sum(us for _, us in top) / 1000, 1),
+        "top_imports_ms": {package: round(us / 1000, 1) for package, us in top[:10]},
+    }
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=10)
+    ap.add_argument("--save", action="store_true", help="rewrite the baseline")
+    ap.add_argument(
+        "--max-ratio",
+        type=float,
+        default=1.5,
+        help="fail when wall time exceeds baseline by this factor",
+    )
+    ap.add_argument(
+        "--tree",
+        type=Path,
+        default=ROOT,
+        help="checkout whose src/main.py is measured (default: this one)",
+    )
+    ap.add_argument(
+        "--save-reference",
+        metavar="COMMIT",
+        help="store the timings as the reference, measured on COMMIT",
+    )
+    args = ap.parse_args()
+
+    main = args.tree / "src" / "main.py"
+    results = {name: measure(cmd, args.runs, main) for name, cmd in COMMANDS.items()}
+    baseline = json.loads(BASELINE.read_text()) if BASELINE.exists() else {}
+    reference = baseline.get("reference", {})
+
+    failed = False
+    for name, result in results.items():
+        line = f"{name:<6} wall {result['wall_ms']:>7.1f} ms   imports {result['import_ms']:>7.1f} ms"
+        previous = baseline.get(name)
+        if previous:
+            ratio = result["wall_ms"] / previous["wall_ms"]
+            line += f"   ({ratio:.2f}x baseline)"
+            failed |= ratio > args.max_ratio
+        if name in reference:
+            line += f"   ({result['wall_ms'] / reference[name]['wall_ms']:.2f}x {reference['commit']})"
+        print(line)
+        for package, ms in result["top_imports_ms"].items():
+            print(f"         {ms:>7.1f} ms  {package}")
+
+    if args.save_reference:
+        baseline["reference"] = {"commit": args.save_reference, **results}
+        BASELINE.write_text(json.dumps(baseline, indent=2) + "\n")
+        print(f"Reference written to {BASELINE.relative_to(ROOT)}")
+        return 0
+    if args.save:
+        if reference:
+            results["reference"] = reference
+        BASELINE.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"Baseline written to {BASELINE.relative_to(ROOT)}")
+        return 0
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,9 +1,10 @@
-import os
 from pathlib import Path
 
 import click
 
-from schematic_api.kicad_api import KiCadAPI, KiCadLibrary
+# Heavier modules (kicad_api, sexpdata, yaml) are imported inside the
+# commands needing them: the CLI runs from editor hooks, so `list` must
+# start as fast as possible.
 import schematic_api.templates as templates
 
 PROJECT_FOLDER = Path(__file__).parent.parent
@@ -21,18 +22,46 @@ def cli():
 # List available templates
 @cli.command()
 def list():
-    for path in SUBSYSTEM_FOLDER.iterdir():
-        template_name = os.path.basename(path)
-        click.echo(template_name)
+    catalog = templates.TemplateCatalog(SUBSYSTEM_FOLDER)
+    summaries = catalog.summaries()
+    width = max((len(name) for name in summaries), default=0)
+    for template_name, summary in summaries.items():
+        if summary is None:
+            click.echo(f"{template_name:<{width}}  " + click.style("(no meta.yaml)", fg="yellow"))
+            continue
+        if "invalid" in summary:
+            click.echo(f"{template_name:<{width}}  " + click.style("(invalid meta.yaml)", fg="yellow"))
+            continue
+        w, h = summary["size_wh"]
+        pcb = "pcb" if summary["has_pcb"] else "   "
+        click.echo(
+            f"{template_name:<{width}}  {summary['pin_count']:>3} pins  {pcb}  "
+            f"{w:g}x{h:g} mm  {summary['comment']}"
+        )
 
 
 # Create new project with specified templates
+# (with --regenerate on a generated project, only the outputs whose inputs
+# changed are rebuilt when --deterministic is used both times)
 @cli.command()
 @click.argument("project_name")
 @click.argument("template_names", nargs=-1)
-def new(project_name: str, template_names: tuple[str, ...]):
+@click.option("--shared-sheets", is_flag=True,
+              help="Place repeated templates as instances of one shared sheet file.")
+@click.option("--deterministic", is_flag=True,
+              help="Derive UUIDs from the project name, so regenerating gives identical files.")
+@click.option("--regenerate", is_flag=True,
+              help="Generate an existing project again, in place (files edited since are kept).")
+@click.option("--archive", "archive_path", type=click.Path(dir_okay=False, allow_dash=True),
+              help="Write the project into this zip/tar archive instead of a folder ('-': stdout).")
+@click.option("--archive-format", type=click.Choice(["zip", "tar", "tar.gz", "tar.xz"]),
+              help="Archive format (default: from the archive name, zip for stdout).")
+def new(project_name: str, template_names: tuple[str, ...], shared_sheets: bool, deterministic: bool,
+        regenerate: bool, archive_path: str | None, archive_format: str | None):
+    from schematic_api.kicad_api import KiCadAPI
+
     api = KiCadAPI()
-    subsystems = templates.load_templates(SUBSYSTEM_FOLDER)
+    catalog = templates.TemplateCatalog(SUBSYSTEM_FOLDER)
 
     # TODO: limit project name to valid characters and length for KiCad
     for character in project_name:
@@ -42,13 +71,199 @@ def new(project_name: str, template_names: tuple[str, ...]):
 
     blocks = []
     for name in template_names:
-        t = templates.find_template(name, subsystems)
+        t = catalog.get(name)
         if t is None:
             click.echo(click.style("Error: ", fg="red") + f"Could not find template '{name}'")
             return
         blocks.append(t)
 
-    api.project_creation(project_name, blocks)
+    # Templates generation would fail on are reported before anything is
+    # created (results are cached: unchanged templates are not checked again).
+    from schematic_api.template_check import validate_templates
+
+    reports = validate_templates(SUBSYSTEM_FOLDER / name for name in dict.fromkeys(template_names))
+    # (on stderr: with --archive -, stdout carries the archive)
+    for report in reports:
+        for error in report.fatal:
+            click.echo(click.style("Error: ", fg="red") + f"{report.name}: {error}", err=True)
+        for error in report.errors:
+            click.echo(click.style("Warning: ", fg="yellow") + f"{report.name}: {error}", err=True)
+    if any(report.fatal for report in reports):
+        click.echo("Nothing was created: fix the templates first (see `validate`).", err=True)
+        raise SystemExit(1)
+
+    if archive_path is None:
+        from schematic_api.build_state import ModifiedOutputsError
+
+        try:
+            api.project_creation(project_name, blocks, shared_sheets=shared_sheets,
+                                 deterministic=deterministic, regenerate=regenerate)
+        except FileExistsError as error:
+            hint = ("it was not generated by this tool (no build state)" if regenerate
+                    else "use --regenerate to generate it again")
+            click.echo(click.style("Error: ", fg="red") + f"{error}: {hint}", err=True)
+            raise SystemExit(1)
+        except ModifiedOutputsError as error:
+            click.echo(click.style("Error: ", fg="red") + "files modified since they were generated:", err=True)
+            for name in error.names:
+                click.echo(f"  {name}", err=True)
+            click.echo("Nothing was changed: move or revert them first.", err=True)
+            raise SystemExit(1)
+        return
+
+    # Files are streamed into the archive as they are generated, nothing
+    # is written to the project folder.
+    import contextlib
+    import sys
+    from schematic_api.sinks import ArchiveSink
+
+    to_stdout = archive_path == "-"
+    archive_format = archive_format or ("zip" if to_stdout else ArchiveSink.format_of(archive_path))
+    fileobj = sys.stdout.buffer if to_stdout else open(archive_path, "wb")
+    try:
+        # stdout carries the archive: messages go to stderr.
+        with contextlib.redirect_stdout(sys.stderr), \
+                ArchiveSink(fileobj, project_name, archive_format) as sink:
+            api.project_creation(project_name, blocks, shared_sheets=shared_sheets,
+                                 deterministic=deterministic, sink=sink)
+    except BaseException:
+        if not to_stdout:
+            fileobj.close()
+            Path(archive_path).unlink(missing_ok=True)
+        raise
+    if not to_stdout:
+        fileobj.close()
+
+
+# Check templates for what generation relies on
+@cli.command()
+@click.argument("template_names", nargs=-1)
+@click.option("--jobs", "-j", type=int, help="Worker processes (default: one per CPU).")
+@click.option("--no-cache", is_flag=True, help="Check again templates checked before.")
+@click.option("--quiet", "-q", is_flag=True, help="Only list errors.")
+def validate(template_names: tuple[str, ...], jobs: int | None, no_cache: bool, quiet: bool):
+    from schematic_api.template_check import validate_templates
+
+    catalog = templates.TemplateCatalog(SUBSYSTEM_FOLDER)
+    for name in template_names:
+        if name not in catalog:
+            click.echo(click.style("Error: ", fg="red") + f"Could not find template '{name}'")
+            raise SystemExit(2)
+
+    reports = validate_templates(
+        (SUBSYSTEM_FOLDER / name for name in template_names or catalog.names()),
+        processes=jobs, use_cache=not no_cache)
+    for report in reports:
+        status = click.style("ok", fg="green") if report.ok else click.style("broken", fg="red")
+        click.echo(f"{report.name}: {status}")
+        for error in report.fatal:
+            click.echo("  " + click.style("fatal: ", fg="red") + error)
+        for error in report.errors:
+            click.echo("  " + click.style("error: ", fg="red") + error)
+        if not quiet:
+            for warning in report.warnings:
+                click.echo("  " + click.style("warning: ", fg="yellow") + warning)
+    raise SystemExit(0 if all(report.ok for report in reports) else 1)
+
+
+# Compare two generated projects, only walking the parts that differ
+@cli.command()
+@click.argument("project_a")
+@click.argument("project_b")
+@click.option("--max-changes", type=int, default=50, show_default=True,
+              help="Changes listed per file (0: all of them).")
+def diff(project_a: str, project_b: str, max_changes: int):
+    from schematic_api.project_diff import diff_projects, format_file_diff
+
+    # Project names, or paths to project folders
+    folders = []
+    for project in (project_a, project_b):
+        folder = Path(project) if Path(project).is_dir() else PROJECT_FOLDER / project
+        if not folder.is_dir():
+            click.echo(click.style("Error: ", fg="red") + f"Could not find project '{project}'")
+            raise SystemExit(2)
+        folders.append(folder)
+
+    different = False
+    for file_diff in diff_projects(*folders):
+        different = True
+        for line in format_file_diff(file_diff, max_changes or None):
+            click.echo(line)
+    if not different:
+        click.echo("Projects are identical.")
+    raise SystemExit(1 if different else 0)
+
+
+# Carry template changes into generated projects, keeping their own edits
+@cli.command()
+@click.argument("projects", nargs=-1)
+@click.option("--template", "template_names", multiple=True,
+              help="Only sync instances of this template (may be repeated).")
+@click.option("--jobs", "-j", type=int, help="Worker processes (default: one per CPU).")
+@click.option("--dry-run", is_flag=True, help="Report what would change, without writing.")
+def sync(projects: tuple[str, ...], template_names: tuple[str, ...], jobs: int | None, dry_run: bool):
+    from schematic_api.template_sync import find_projects, sync_projects
+
+    # Project names, project folders, or folders holding projects (all the
+    # generated projects by default)
+    folders = []
+    for project in projects or (str(PROJECT_FOLDER),):
+        folder = Path(project) if Path(project).is_dir() else PROJECT_FOLDER / project
+        if not folder.is_dir():
+            click.echo(click.style("Error: ", fg="red") + f"Could not find project '{project}'")
+            return
+        folders.append(folder)
+
+    counts = {"synced": 0, "up to date": 0, "skipped": 0, "failed": 0}
+    for result in sync_projects(find_projects(folders), SUBSYSTEM_FOLDER, template_names,
+                                dry_run=dry_run, processes=jobs):
+        if result.error is not None:
+            counts["failed"] += 1
+            click.echo(f"{result.project}: " + click.style(result.error, fg="red"))
+        elif result.skipped is not None:
+            counts["skipped"] += 1
+            click.echo(f"{result.project}: " + click.style(f"skipped, {result.skipped}", fg="yellow"))
+        elif not result.synced:
+            counts["up to date"] += 1
+            click.echo(f"{result.project}: up to date")
+        else:
+            counts["synced"] += 1
+            verb = "would write" if dry_run else "wrote"
+            click.echo(f"{result.project}: synced {', '.join(result.synced)}; "
+                       f"{verb} {', '.join(result.written) or 'nothing'}")
+        for conflict in result.conflicts:
+            click.echo("  " + click.style("conflict (kept the project's): ", fg="yellow") + conflict)
+        for note in result.notes:
+            click.echo(f"  {note}")
+    click.echo(", ".join(f"{count} {what}" for what, count in counts.items() if count) or "No projects found.")
+
+
+# Keep templates, parsed files and library indexes warm for repeated requests
+@cli.command()
+@click.option("--socket", "socket_path", type=click.Path(dir_okay=False),
+              help="Unix socket to listen on (default: serve.sock in the cache folder).")
+@click.option("--port", type=int, help="Also answer HTTP requests on 127.0.0.1:PORT (0: any free port).")
+@click.option("--no-socket", is_flag=True, help="Only listen over HTTP.")
+def serve(socket_path: str | None, port: int | None, no_socket: bool):
+    from schematic_api.cache import cache_dir
+    from schematic_api.server import GenerationService, ServeError, serve as run_server
+
+    if no_socket and port is None:
+        click.echo(click.style("Error: ", fg="red") + "--no-socket needs --port")
+        return
+    if socket_path is None and not no_socket:
+        socket_path = str(cache_dir() / "serve.sock")
+
+    service = GenerationService(SUBSYSTEM_FOLDER)
+    service.warm()
+    try:
+        run_server(service, None if no_socket else socket_path, port, ready=click.echo)
+    except ServeError as error:
+        click.echo(click.style("Error: ", fg="red") + str(error), err=True)
+        raise SystemExit(1)
+    except KeyboardInterrupt:
+        pass
+
 
 if __name__ == "__main__":
     cli()
@@ -0,0 +1,192 @@
+"""
+Template-local assets of a project: libraries and 3D models.
+
+A template folder may hold its own symbol libraries (*.kicad_sym),
+footprint libraries (*.pretty) and 3D models, referenced by its sheet and
+board. Generation brings along those of the templates used, once each
+whatever the number of instances, at the same path relative to the
+project as to the template: model paths such as
+"${KIPRJMOD}/3d_models/part.step" then resolve in the project as they did
+in the template, without rewriting the board. Only the libraries the
+sheet or board uses an item of are brought along, and added to the
+project's library tables under the nickname the template uses them with
+("Mikrobus:MIKROE-4247" -> Mikrobus); spare ones stay in the template.
+
+Files are put in place with reflinks or hard links where the filesystem
+allows (see ProjectSink.link_file): large STEP models are not copied.
+"""
+
+import hashlib
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Optional
+
+from schematic_api.lib_tables import LibTableEntry
+from schematic_api.sinks import ProjectSink
+
+
+_MODEL = re.compile(r'\(model\s+"((?:[^"\\]|\\.)*)"')
+_LIB_ID = re.compile(r'\(lib_id\s+"((?:[^"\\]|\\.)*)"')
+_FOOTPRINT = re.compile(r'\(footprint\s+"((?:[^"\\]|\\.)*)"')
+_FOOTPRINT_PROPERTY = re.compile(r'\(property\s+"Footprint"\s+"((?:[^"\\]|\\.)*)"')
+_SYMBOL_NAME = re.compile(r'\(symbol\s+"((?:[^"\\]|\\.)*)"')
+_PROJECT_DIR = "${KIPRJMOD}/"
+
+
+@dataclass
+class AssetPlan:
+    # project relative path -> template file
+    files: dict[str, Path] = field(default_factory=dict)
+    # files that may be hard linked (3D models: never edited in the project)
+    models: set[str] = field(default_factory=set)
+    symbol_libraries: list[LibTableEntry] = field(default_factory=list)
+    footprint_libraries: list[LibTableEntry] = field(default_factory=list)
+    # problems with the templates, for the user
+    warnings: list[str] = field(default_factory=list)
+
+
+def _local_path(folder: Path, reference: str) -> Optional[Path]:
+    # Where a model reference points in the template folder, None when it
+    # is not a template-local path (${KICAD9_3DMODEL_DIR}/..., absolute).
+    if reference.startswith(_PROJECT_DIR):
+        reference = reference[len(_PROJECT_DIR) :]
+    elif reference.startswith("$") or Path(reference).is_absolute():
+        return None
+    path = (folder / reference).resolve()
+    return path if path.is_relative_to(folder.resolve()) else None
+
+
+def _nickname(names: set[str], used_ids: Iterable[str]) -> Optional[str]:
+    # The nickname of the first lib_id naming an item of the library, None
+    # when the library is not used.
+    for lib_id in used_ids:
+        nickname, _, item = lib_id.rpartition(":")
+        if nickname and item in names:
+            return nickname
+    return None
+
+
+def _digest(path: Path) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+class _Collector:
+    def __init__(self):
+        self.plan = AssetPlan()
+        self._templates: dict[Path, None] = {}
+
+    def add_file(
+        self, name: str, source: Path, template: str, model: bool = False
+    ) -> None:
+        current = self.plan.files.get(name)
+        if current is None:
+            self.plan.files[name] = source
+            if model:
+                self.plan.models.add(name)
+        elif current != source and (
+            current.stat().st_size != source.stat().st_size
+            or _digest(current) != _digest(source)
+        ):
+            self.plan.warnings.append(
+                f"{template}: {name} differs from the one of another template, which is used"
+            )
+
+    def add_template(self, folder: Path, design_files: Iterable[Path]) -> None:
+        folder = Path(folder)
+        if folder.resolve() in self._templates:
+            return
+        self._templates[folder.resolve()] = None
+        texts = [
+            path.read_text(encoding="utf-8")
+            for path in design_files
+            if path is not None
+        ]
+        symbol_ids = [lib_id for text in texts for lib_id in _LIB_ID.findall(text)]
+        # Boards first: what their footprints use wins over sheet properties.
+        footprint_ids = [
+            name
+            for pattern in (_FOOTPRINT, _FOOTPRINT_PROPERTY)
+            for text in texts
+            for name in pattern.findall(text)
+        ]
+
+        for library in sorted(folder.rglob("*.kicad_sym")):
+            names = set(_SYMBOL_NAME.findall(library.read_text(encoding="utf-8")))
+            nickname = _nickname(names, symbol_ids)
+            if nickname is None:
+                continue
+            name = library.relative_to(folder).as_posix()
+            self.add_file(name, library, folder.name)
+            self.plan.symbol_libraries.append(
+                LibTableEntry(nickname, _PROJECT_DIR + name, f"{folder.name} symbols")
+            )
+
+        model_references = [
+            reference for text in texts for reference in _MODEL.findall(text)
+        ]
+        for library in sorted(folder.rglob("*.pretty")):
+            if not library.is_dir():
+                continue
+            footprints = sorted(library.glob("*.kicad_mod"))
+            nickname = _nickname(
+                {footprint.stem for footprint in footprints}, footprint_ids
+            )
+            if nickname is None:
+                continue
+            name = library.relative_to(folder).as_posix()
+            for footprint in footprints:
+                self.add_file(f"{name}/{footprint.name}", footprint, folder.name)
+                model_references += _MODEL.findall(
+                    footprint.read_text(encoding="utf-8")
+                )
+            self.plan.footprint_libraries.append(
+                LibTableEntry(
+                    nickname, _PROJECT_DIR + name, f"{folder.name} footprints"
+                )
+            )
+
+        for reference in dict.fromkeys(model_references):
+            path = _local_path(folder, reference)
+            if path is None:
+                continue
+            if not path.is_file():
+                self.plan.warnings.append(
+                    f"{folder.name}: 3D model {reference} not found"
+                )
+                continue
+            self.add_file(
+                path.relative_to(folder.resolve()).as_posix(),
+                path,
+                folder.name,
+                model=True,
+            )
+
+
+def collect_assets(templates: Iterable[tuple[Path, Iterable[Path]]]) -> AssetPlan:
+    """
+    The assets of templates given as (folder, design files: sheet and
+    board, which tell the nicknames and models used). Templates are
+    collected once each, in order.
+    """
+    collector = _Collector()
+    for folder, design_files in templates:
+        collector.add_template(folder, design_files)
+    plan = collector.plan
+    # Libraries of the same nickname: the first one is used.
+    for attribute in ("symbol_libraries", "footprint_libraries"):
+        entries = {}
+        for entry in getattr(plan, attribute):
+            entries.setdefault(entry.name, entry)
+        setattr(plan, attribute, list(entries.values()))
+    return plan
+
+
+def materialize_assets(plan: AssetPlan, sink: ProjectSink) -> dict[str, int]:
+    """Puts the files of `plan` in the project. Returns how many were put which way."""
+    counts: dict[str, int] = {}
+    for name, source in plan.files.items():
+        how = sink.link_file(name, source, hardlink=name in plan.models)
+        counts[how] = counts.get(how, 0) + 1
+    return counts
@@ -0,0 +1,198 @@
+"""
+Build state of a generated project, for incremental regeneration.
+
+The project's .build_state.json records, for every generated file, a digest of
+everything it was generated from (template files, options, annotation,
+placement...) and what was written. Regenerating the project rebuilds an
+output only when its input digest changed, or when the file no longer is
+what was written, the way make does with timestamps.
+"""
+
+import hashlib
+import json
+import threading
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+from schematic_api.sinks import ProjectSink
+
+STATE_FILE = ".build_state.json"
+# Bumped whenever generation changes in a way the input digests can't see.
+STATE_VERSION = 2
+
+
+def digest(*parts: Any) -> str:
+    """Digest of JSON-serializable parts (paths and other objects as str)."""
+    text = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def file_digest(path: str | Path) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+class ModifiedOutputsError(Exception):
+    """Generated files edited since: regenerating would overwrite or delete them."""
+
+    def __init__(self, names: list[str]):
+        super().__init__("modified since generated: " + ", ".join(names))
+        self.names = names
+
+
+class BuildState:
+    """Input/output digests of the previous build, and those of the current one.
+
+    With `enabled=False` (random UUIDs: outputs can't be reproduced) nothing
+    is ever fresh, but the state is still recorded and template digests are
+    still memoized.
+    """
+
+    def __init__(self, sink: ProjectSink, enabled: bool = True):
+        self.sink = sink
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._file_digests: dict[Path, str] = {}
+
+        previous: dict[str, Any] = {}
+        try:
+            previous = json.loads(sink.read_text(STATE_FILE))
+        except (OSError, ValueError):
+            pass
+        if previous.get("version") != STATE_VERSION:
+            previous = {}
+
+        self.previous_outputs: dict[str, dict] = previous.get("outputs", {})
+        self.previous_fragments: dict[str, dict] = previous.get("fragments", {})
+        # Symbols of each template sheet, by file digest: annotation needs
+        # them, reading them from here saves parsing unchanged templates.
+        self.previous_templates: dict[str, list] = previous.get("templates", {})
+
+        self.outputs: dict[str, dict] = {}
+        self.fragments: dict[str, dict] = {}
+        self.templates: dict[str, list] = {}
+
+    @staticmethod
+    def exists(sink: ProjectSink) -> bool:
+        return sink.exists(STATE_FILE)
+
+    def input_digest(self, path: str | Path) -> str:
+        # Template files are read once per build, whatever their use count.
+        path = Path(path)
+        with self._lock:
+            cached = self._file_digests.get(path)
+        if cached is None:
+            cached = file_digest(path)
+            with self._lock:
+                self._file_digests[path] = cached
+        return cached
+
+    def template_symbols(self, key: str) -> Optional[list[tuple]]:
+        symbols = self.templates.get(key)
+        if symbols is None:
+            symbols = self.previous_templates.get(key)
+            if symbols is None:
+                return None
+            self.templates[key] = symbols
+        return [tuple(symbol) for symbol in symbols]
+
+    def record_template(self, key: str, symbols: list[tuple]) -> None:
+        self.templates[key] = [list(symbol) for symbol in symbols]
+
+    # ---- outputs ----
+
+    def _unchanged_in_sink(self, name: str, record: dict) -> bool:
+        stat = self.sink.stat(name)
+        if stat is None or stat[0] != record["size"]:
+            return False
+        if stat[1] is not None and stat[1] == record["mtime_ns"]:
+            return True
+        return self.sink.digest(name) == record["digest"]
+
+    def unchanged(self, path: str | Path) -> bool:
+        """Whether `path` is still the file the previous build wrote."""
+        name = self.sink.key(path)
+        record = self.previous_outputs.get(name)
+        return (
+            self.enabled
+            and record is not None
+            and self._unchanged_in_sink(name, record)
+        )
+
+    def fresh(self, path: str | Path, key: str) -> bool:
+        """Whether `path` was built from `key` and left as is since.
+
+        A fresh output is recorded again as it is, so callers only have to
+        skip generating it.
+        """
+        name = self.sink.key(path)
+        record = self.previous_outputs.get(name)
+        if record is None or record["key"] != key or not self.unchanged(name):
+            return False
+        with self._lock:
+            self.outputs[name] = record
+        return True
+
+    def _entry(self, name: str, key: Optional[str]) -> dict:
+        size, mtime_ns = self.sink.stat(name)
+        return {
+            "key": key,
+            "digest": self.sink.digest(name),
+            "size": size,
+            "mtime_ns": mtime_ns,
+        }
+
+    def record(self, path: str | Path, key: Optional[str]) -> None:
+        """Records `path`, just written, as built from `key`."""
+        name = self.sink.key(path)
+        entry = self._entry(name, key)
+        with self._lock:
+            self.outputs[name] = entry
+
+    def modified_outputs(self) -> list[str]:
+        """Outputs of the previous build that are no longer what it wrote.
+
+        Missing ones are not listed: they are only generated again.
+        """
+        return [
+            name
+            for name, record in self.previous_outputs.items()
+            if self.sink.exists(name) and not self._unchanged_in_sink(name, record)
+        ]
+
+    def stale_outputs(self) -> list[str]:
+        """Outputs of the previous build this one did not produce."""
+        return [name for name in self.previous_outputs if name not in self.outputs]
+
+    def save_rewritten(self, paths: Iterable[str | Path]) -> None:
+        """Saves the previous build's state again, with the outputs `paths`
+        (rewritten outside a build, by sync) recorded as they are now.
+
+        Their keys are kept: the next build still rebuilds them if their
+        inputs changed, but no longer takes them for edited files.
+        """
+        self.outputs = dict(self.previous_outputs)
+        self.fragments = self.previous_fragments
+        self.templates = self.previous_templates
+        for path in paths:
+            name = self.sink.key(path)
+            if name in self.outputs:
+                self.outputs[name] = self._entry(name, self.outputs[name]["key"])
+        self.save()
+
+    # ---- board fragments ----
+
+    def previous_fragment(self, prepare_key: str) -> Optional[dict]:
+        return self.previous_fragments.get(prepare_key)
+
+    def record_fragment(self, prepare_key: str, **info: Any) -> None:
+        self.fragments[prepare_key] = info
+
+    def save(self) -> None:
+        state = {
+            "version": STATE_VERSION,
+            "outputs": self.outputs,
+            "fragments": self.fragments,
+            "templates": self.templates,
+        }
+        self.sink.write_text(STATE_FILE, json.dumps(state, indent=1, sort_keys=True))
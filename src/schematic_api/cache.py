@@ -0,0 +1,16 @@
+import os
+from pathlib import Path
+
+
+def cache_dir() -> Path:
+    # Per-user cache shared by the library index and the template catalog.
+    # KICAD_TEMPLATES_CACHE wins over the XDG location (useful for CI).
+    override = os.environ.get("KICAD_TEMPLATES_CACHE")
+    if override:
+        path = Path(override)
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+        path = Path(base) / "kicad-templates"
+
+    path.mkdir(parents=True, exist_ok=True)
+    return path
@@ -0,0 +1,87 @@
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Iterator, Mapping
+from pathlib import Path
+from typing import Any
+
+from sexpdata import loads
+
+FOOTPRINT_SUFFIX = ".kicad_mod"
+
+
+class FootprintLibrary(Mapping):
+    """Lazy, size-bounded view of a .pretty footprint library.
+
+    Loading only lists the folder; each footprint is parsed on first access
+    and kept in an LRU cache bounded by `max_entries` and/or `max_bytes`
+    (measured on the .kicad_mod source size). Returned trees are shared with
+    the cache: copy them before mutating.
+    """
+
+    def __init__(
+        self,
+        lib_dir: str | Path,
+        max_entries: int | None = 256,
+        max_bytes: int | None = None,
+    ):
+        self.lib_dir = Path(lib_dir)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._files = {
+            name[: -len(FOOTPRINT_SUFFIX)]: name
+            for name in os.listdir(self.lib_dir)
+            if name.endswith(FOOTPRINT_SUFFIX)
+        }
+        self._cache: OrderedDict[str, tuple[Any, int]] = OrderedDict()
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name: str) -> Any:
+        with self._lock:
+            cached = self._cache.get(name)
+            if cached is not None:
+                self._cache.move_to_end(name)
+                return cached[0]
+
+        filename = self._files.get(name)
+        if filename is None:
+            raise KeyError(name)
+
+        with open(self.lib_dir / filename, "r", encoding="utf-8") as f:
+            source = f.read()
+        data = loads(source)
+
+        with self._lock:
+            if name not in self._cache:
+                self._cache[name] = (data, len(source))
+                self._cached_bytes += len(source)
+                self._evict()
+        return data
+
+    def _evict(self) -> None:
+        # Always keep the entry that was just inserted.
+        while len(self._cache) > 1 and (
+            (self.max_entries is not None and len(self._cache) > self.max_entries)
+            or (self.max_bytes is not None and self._cached_bytes > self.max_bytes)
+        ):
+            _, (_, size) = self._cache.popitem(last=False)
+            self._cached_bytes -= size
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._files
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._files)
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    @property
+    def cached_names(self) -> list[str]:
+        return list(self._cache)
+
+    def clear_cache(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self._cached_bytes = 0
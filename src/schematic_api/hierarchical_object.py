@@ -3,8 +3,6 @@ from pathlib import Path
 from textwrap import dedent
 from typing import Self
 
-import yaml
-
 
 class HierarchicalObject:
     def __init__(
@@ -39,6 +37,8 @@ class HierarchicalObject:
 
     @classmethod
     def load_from_yaml(cls, path_to_yaml_metadata: Path) -> Self | None:
+        import yaml  # deferred: `list` with a warm catalog index never needs PyYAML
+
         with open(path_to_yaml_metadata, "r") as yaml_metadata:
             meta = yaml.safe_load(yaml_metadata)
 
@@ -0,0 +1,149 @@
+"""
+Undo journal for in-place edits of S-expression trees.
+
+Documents (KiCadSchematic, KiCadPCB) route their edits through a Journal.
+Outside a transaction an edit is just applied. Inside one (begin() ...
+commit() or rollback()) its inverse is recorded as well, so a trial edit
+is undone in O(changes) instead of working on a copy of the whole tree.
+
+Every list edit is a splice, node[start:stop] = items, undone by the
+splice putting the old items back. SpanList nodes get their clean flag
+back too, so a rolled back tree is still written verbatim (see span_sexp).
+"""
+
+from contextlib import contextmanager
+from typing import Any, Callable, Iterable, Iterator
+
+from schematic_api.span_sexp import SpanList
+
+
+class Journal:
+    """Records inverse edits between begin() and commit()/rollback().
+
+    Transactions nest: rolling back an inner one only undoes its own edits,
+    committing it hands them over to the enclosing one.
+    """
+
+    def __init__(self):
+        self._undo: list[Any] = []
+        self._marks: list[int] = []
+
+    @property
+    def active(self) -> bool:
+        return bool(self._marks)
+
+    def __len__(self) -> int:
+        return len(self._undo)
+
+    # ---- transactions ----
+
+    def begin(self) -> None:
+        self._marks.append(len(self._undo))
+
+    def commit(self) -> None:
+        if not self._marks:
+            raise RuntimeError("commit() without begin()")
+        self._marks.pop()
+        if not self._marks:
+            self._undo.clear()
+
+    def rollback(self) -> None:
+        if not self._marks:
+            raise RuntimeError("rollback() without begin()")
+        mark = self._marks.pop()
+        while len(self._undo) > mark:
+            entry = self._undo.pop()
+            if callable(entry):
+                entry()
+            elif entry[0] == "splice":
+                _, node, start, stop, items = entry
+                node[start:stop] = items
+            else:
+                for clean in entry[1]:
+                    clean.dirty = False
+
+    @contextmanager
+    def transaction(self) -> Iterator["Journal"]:
+        """Commits on success, rolls back if the block raises."""
+        self.begin()
+        try:
+            yield self
+        except BaseException:
+            self.rollback()
+            raise
+        self.commit()
+
+    def record(self, undo: Callable[[], Any]) -> None:
+        """Records an arbitrary undo action (for state outside the trees)."""
+        if self._marks:
+            self._undo.append(undo)
+
+    # ---- edits ----
+
+    def splice(self, node: list, start: int, stop: int, items: Iterable = ()) -> None:
+        """node[start:stop] = items (indices already within bounds)."""
+        items = list(items)
+        if self._marks:
+            if type(node) is SpanList and not node.dirty:
+                # Nodes touch() is about to dirty, to clean again on rollback.
+                cleans = []
+                parent = node
+                while parent is not None and not parent.dirty:
+                    cleans.append(parent)
+                    parent = parent.parent
+                self._undo.append(("clean", cleans))
+            self._undo.append(
+                ("splice", node, start, start + len(items), node[start:stop])
+            )
+        node[start:stop] = items
+
+    def set(self, node: list, index: int, value: Any) -> None:
+        index = _position(node, index, len(node) - 1)
+        self.splice(node, index, index + 1, (value,))
+
+    def insert(self, node: list, index: int, value: Any) -> None:
+        index = _position(node, index, len(node))
+        self.splice(node, index, index, (value,))
+
+    def append(self, node: list, value: Any) -> None:
+        self.splice(node, len(node), len(node), (value,))
+
+    def extend(self, node: list, values: Iterable) -> None:
+        self.splice(node, len(node), len(node), values)
+
+    def delete(self, node: list, index: int) -> Any:
+        index = _position(node, index, len(node) - 1)
+        value = node[index]
+        self.splice(node, index, index + 1)
+        return value
+
+    def replace_all(self, node: list, values: Iterable) -> None:
+        self.splice(node, 0, len(node), values)
+
+
+def _position(node: list, index: int, highest: int) -> int:
+    # Negative indices count from the end, as with lists.
+    if index < 0:
+        index += len(node)
+    return max(0, min(index, highest))
+
+
+class JournaledDocument:
+    """begin/commit/rollback for a document whose edits go through self.journal."""
+
+    journal: Journal
+
+    def begin(self) -> None:
+        """Starts a transaction: edits from here on can be rolled back."""
+        self.journal.begin()
+
+    def commit(self) -> None:
+        self.journal.commit()
+
+    def rollback(self) -> None:
+        """Undoes the edits made since the matching begin()."""
+        self.journal.rollback()
+
+    def transaction(self):
+        """`with doc.transaction():` commits, or rolls back on an exception."""
+        return self.journal.transaction()
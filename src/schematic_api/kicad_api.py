@@ -1,18 +1,33 @@
 import sexpdata
 from sexpdata import loads, dumps, Symbol
-from typing import Dict, List, Optional, Union, Any
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Union, Any
 from dataclasses import dataclass, field
-from shutil import copy
 from pathlib import Path
 import re
 import os
 import glob
-import uuid
 import pprint
 from copy import deepcopy
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 
-from schematic_api.project_builder import project_builder
+from schematic_api.project_builder import base_pcb_text, base_sch_text, project_builder
+from schematic_api.assets import collect_assets, materialize_assets
+from schematic_api.build_state import BuildState, ModifiedOutputsError, digest
 from schematic_api.hierarchical_object import HierarchicalObject  # Ajoute cette ligne
+from schematic_api.footprint_library import FootprintLibrary
+from schematic_api.journal import Journal, JournaledDocument
+from schematic_api.lazy_document import LazySexpDocument
+from schematic_api.parsed_files import ParsedFileCache
+from schematic_api.provenance import Provenance
+from schematic_api.sinks import DiskSink, MemorySink, ProjectSink, atomic_write
+from schematic_api.span_sexp import SpanList, copy_sexp, parse_sexp
+from schematic_api.uuid_factory import (
+    DeterministicUuidFactory, RecordedUuidFactory, UuidFactory, default_factory)
+from schematic_api.library_index import LibraryIndex, default_index
+from schematic_api.lib_tables import LibTableEntry, with_entries
+from schematic_api.pcb_sync import SyncReport, schematic_netlist, sync_footprints
+from schematic_api.sheet_skeleton import SheetSkeletonKey, sheet_skeleton
+from schematic_api.symbol_library import ProjectSymbolLibrary, prune_lib_symbols
 
 
 PROJECT_FOLDER = Path(__file__).parent.parent.parent
@@ -34,64 +49,229 @@ class InstantiatedSubsystem:
     reference_map: dict[str, str] = field(default_factory=dict)
     schematic_uuid_map: dict[str, str] = field(default_factory=dict)
     symbol_reference_map: dict[str, str] = field(default_factory=dict)
+    # (source symbol UUID, original reference, unit) for each symbol of the template sheet
+    symbol_sources: list[tuple[str | None, str | None, int]] = field(default_factory=list)
+    # The sheet is cloned on demand (see KiCadAPI._ensure_cloned): from
+    # source_sheet, with symbol_refs (new reference of each symbol, None to
+    # keep it), or by clone_owner when the sheet file is shared.
+    source_sheet: Path | None = None
+    symbol_refs: list[str | None] = field(default_factory=list)
+    clone_owner: Optional["InstantiatedSubsystem"] = None
 
 
-def _format_sexp_kicad(data, indent=0) -> str:
-    """
-    Formate une S-expression selon le style exact de KiCad :
-    - Tabs pour indentation
-    - Les atomes simples sur la même ligne
-    - Les sous-listes indentées
-    - Pas de parenthèses isolées sur des lignes vides
-    """
-    TAB = "\t"
-
-    def fmt_atom(x):
-        if isinstance(x, Symbol):
-            return str(x)
-        if isinstance(x, str):
-            # Supprimer d’éventuels guillemets d’enrobage
-            raw = x.strip()
-            if raw.startswith('"') and raw.endswith('"') and len(raw) >= 2:
-                raw = raw[1:-1]
-            # Échapper les backslashes et guillemets
-            raw = raw.replace("\\", "\\\\").replace('"', '\\"')
-            # Retourner la chaîne entre guillemets
-            return f'"{raw}"'
+@dataclass
+class ComponentRecord:
+    # One component to place with KiCadSchematic.add_components.
+    symbol_data: str
+    ref: str
+    value: str
+    footprint: str
+    at: list[float]
+
+
+def _copy_sexp(node: Sexp) -> Sexp:
+    # Structural copy: atoms (Symbol, str, numbers) are immutable, so only
+    # lists need copying. Much cheaper than deepcopy on large trees, and
+    # parsed lists keep their source span (see span_sexp).
+    return copy_sexp(node)
+
+
+def _fmt_atom(x) -> str:
+    if isinstance(x, Symbol):
         return str(x)
+    if isinstance(x, str):
+        # Supprimer d’éventuels guillemets d’enrobage
+        raw = x.strip()
+        if raw.startswith('"') and raw.endswith('"') and len(raw) >= 2:
+            raw = raw[1:-1]
+        # Échapper les backslashes et guillemets
+        raw = raw.replace("\\", "\\\\").replace('"', '\\"')
+        # Retourner la chaîne entre guillemets
+        return f'"{raw}"'
+    return str(x)
+
+
+def _format_sexp_into(data, indent: int, out: list) -> None:
+    # Unchanged parsed lists are copied from their source when they sit at
+    # the same depth there, so their indentation is still right.
+    if type(data) is SpanList and not data.dirty and data.depth == indent:
+        out.append(data.source[data.start:data.end])
+        return
 
     if isinstance(data, (list, tuple)):
         if not data:
-            return "()"
+            out.append("()")
+            return
 
         # Si la liste contient uniquement des atomes => inline
         if all(not isinstance(x, (list, tuple)) for x in data):
-            return f"({' '.join(fmt_atom(x) for x in data)})"
+            out.append(f"({' '.join(_fmt_atom(x) for x in data)})")
+            return
 
         # Sinon, on gère indentation
-        out = "("
+        out.append("(")
         first_line_atoms = []
+        child_indent = "\n" + "\t" * (indent + 1)
 
         for x in data:
             if isinstance(x, (list, tuple)):
                 # sous-liste → saute une ligne
                 if first_line_atoms:
-                    out += " ".join(fmt_atom(a) for a in first_line_atoms)
+                    out.append(" ".join(_fmt_atom(a) for a in first_line_atoms))
                     first_line_atoms = []
-                out += "\n" + (TAB * (indent + 1)) + \
-                    _format_sexp_kicad(x, indent + 1)
+                out.append(child_indent)
+                _format_sexp_into(x, indent + 1, out)
             else:
                 first_line_atoms.append(x)
 
         # Si on a accumulé des atomes à la fin
         if first_line_atoms:
-            out += " " + " ".join(fmt_atom(a) for a in first_line_atoms)
+            out.append(" " + " ".join(_fmt_atom(a) for a in first_line_atoms))
 
-        out += "\n" + (TAB * indent) + ")"
-        return out
+        out.append("\n" + "\t" * indent + ")")
+        return
 
     # Cas atome seul
-    return fmt_atom(data)
+    out.append(_fmt_atom(data))
+
+
+def _format_sexp_kicad(data, indent=0) -> str:
+    """
+    Formate une S-expression selon le style exact de KiCad :
+    - Tabs pour indentation
+    - Les atomes simples sur la même ligne
+    - Les sous-listes indentées
+    - Pas de parenthèses isolées sur des lignes vides
+    - Les sous-arbres lus depuis un fichier et non modifiés sont recopiés tels quels
+    """
+    # Pieces are collected and joined once, instead of concatenating strings
+    # at every level of the tree.
+    out: list[str] = []
+    _format_sexp_into(data, indent, out)
+    return "".join(out)
+
+
+def _atomic_write_text(path: Path, text: str) -> bool:
+    # Unchanged files are left alone (see sinks.atomic_write). Returns whether it wrote.
+    return atomic_write(path, text.encode("utf-8"))
+
+
+@dataclass
+class SheetLayout:
+    """Flows sheet blocks into rows (or columns) and pages.
+
+    Gaps are proportional to the blocks: max(h_gap_factor * width, min_hgap)
+    horizontally and max(v_gap_factor * row height, min_vgap) vertically.
+    A new page starts when the next row (column) would cross the page
+    margin. Single pass, linear in the number of sheets.
+    """
+
+    origin_xy: tuple[float, float] = (50.0, 50.0)
+    flow: str = "row"
+    max_row_width_mm: float = 180.0
+    max_column_height_mm: float | None = None
+    page_size_mm: tuple[float, float] = (297.0, 210.0)
+    page_margin_mm: float = 10.0
+    h_gap_factor: float = 0.5
+    v_gap_factor: float = 0.8
+    min_hgap: float = 4.0
+    min_vgap: float = 6.0
+
+    def _hgap(self, w: float) -> float:
+        return max(self.h_gap_factor * w, self.min_hgap)
+
+    def _vgap(self, h: float) -> float:
+        return max(self.v_gap_factor * h, self.min_vgap)
+
+    def place(self, sizes) -> list[tuple[int, float, float]]:
+        """Returns (page index, x, y) for each (w, h) in sizes."""
+        if self.flow not in ("row", "column"):
+            raise ValueError(f"Unknown sheet flow '{self.flow}'")
+
+        left, top = float(self.origin_xy[0]), float(self.origin_xy[1])
+        page_right = float(self.page_size_mm[0]) - self.page_margin_mm
+        page_bottom = float(self.page_size_mm[1]) - self.page_margin_mm
+        if self.flow == "row":
+            line_limit = min(left + float(self.max_row_width_mm), page_right)
+        else:
+            max_height = self.max_column_height_mm
+            line_limit = page_bottom if max_height is None else min(top + float(max_height), page_bottom)
+
+        slots = []
+        page = 0
+        x, y = left, top
+        line_size = 0.0  # row height, or column width
+        for size in sizes:
+            w, h = float(size[0]), float(size[1])
+
+            if self.flow == "row":
+                # line break when exceeding max row width
+                if x > left and x + w > line_limit:
+                    x = left
+                    y += line_size + self._vgap(line_size)
+                    line_size = 0.0
+                # page break when the row would cross the bottom margin
+                if y > top and y + h > page_bottom:
+                    page += 1
+                    x, y = left, top
+                slots.append((page, x, y))
+                x += w + self._hgap(w)
+                line_size = max(line_size, h)
+            else:
+                if y > top and y + h > line_limit:
+                    y = top
+                    x += line_size + self._hgap(line_size)
+                    line_size = 0.0
+                if x > left and x + w > page_right:
+                    page += 1
+                    x, y = left, top
+                slots.append((page, x, y))
+                y += h + self._vgap(h)
+                line_size = max(line_size, w)
+
+        return slots
+
+    def spread(self, slots: list[tuple[int, float, float]], sizes) -> list[tuple[int, float, float]]:
+        """The slots of several pages laid out on one sheet.
+
+        Each page is moved past the blocks of the previous one, along the
+        flow (right for rows, down for columns): sheets placed on pages of
+        their own no longer share the page origin.
+        """
+        row = self.flow == "row"
+        axis = 1 if row else 2
+        start = float(self.origin_xy[axis - 1])
+        gap = self.min_hgap if row else self.min_vgap
+        page, shift, end = 0, 0.0, start
+        spread = []
+        for slot, size in zip(slots, sizes):
+            if slot[0] != page:
+                page, shift = slot[0], end + gap - start
+            moved = list(slot)
+            moved[axis] += shift
+            end = max(end, moved[axis] + float(size[axis - 1]))
+            spread.append(tuple(moved))
+        return spread
+
+    @staticmethod
+    def page_count_of(slots: list[tuple[int, float, float]]) -> int:
+        return slots[-1][0] + 1 if slots else 0
+
+    def page_count(self, sizes) -> int:
+        return self.page_count_of(self.place(sizes))
+
+
+@dataclass
+class _GroupingSheet:
+    # Intermediate sheet holding one page worth of subsystem sheets.
+    sheet_name: str
+    sheet_file: Path
+    at_xy: list[float]
+    size_wh: list[float]
+    properties: dict
+    pins: list
+    schematic: "KiCadSchematic"
+    children: list
 
 
 class KiCadLibrary:
@@ -119,23 +299,27 @@ class KiCadLibrary:
         return libraries
     '''
 
+    def __init__(self, index: Optional[LibraryIndex] = None):
+        self._index = index
+
+    @property
+    def index(self) -> LibraryIndex:
+        return self._index or default_index()
+
     def _format_sexp(self, data, indent=0) -> str:
         return _format_sexp_kicad(data, indent)
 
     # @staticmethod
     def extract_symbols(self, lib_path: str, lib_prefix: str, ref: str) -> str:
         """Extrait tous les symboles d'un fichier .kicad_sym et les retourne sous forme de S-Expressions."""
-        with open(lib_path, "r", encoding="utf-8") as f:
-            lib_data = loads(f.read())
+        # Only the indexed byte span of the wanted symbol gets parsed.
+        entry = self.index.find_symbol_in_file(lib_path, ref)
+        if entry is None:
+            return ""
 
-        # symbols = {}
-        for item in lib_data:
-            if isinstance(item, list) and item and item[0] == Symbol("symbol"):
-                symbol_name = str(item[1])
-                if symbol_name == ref:
-                    item[1] = f'"{lib_prefix}:{ref}"'
-                    return self._format_sexp(item)
-        return ""
+        item = loads(entry.read())
+        item[1] = f'"{lib_prefix}:{ref}"'
+        return self._format_sexp(item)
 
     @staticmethod
     def extract_all_symbols(lib_path: str) -> Dict[str, List]:
@@ -187,12 +371,26 @@ class KiCadLibrary:
                 f.write(dumps(fp_data))
 
 
-class KiCadSchematic:
-    """Classe pour manipuler les fichiers schématiques KiCad (.kicad_sch)."""
+class KiCadSchematic(JournaledDocument):
+    """Classe pour manipuler les fichiers schématiques KiCad (.kicad_sch).
 
-    def __init__(self, file_path: Optional[str] = None):
+    Les modifications passent par self.journal : entre begin() et
+    rollback(), elles sont annulées sans copier l'arbre.
+    """
+
+    def __init__(
+        self,
+        file_path: Optional[str] = None,
+        index: Optional[LibraryIndex] = None,
+        uuids: Optional[UuidFactory] = None,
+    ):
         self.data: Union[List, Dict] = []
         self.libraries: Dict[str, List[Dict]] = {}
+        self._index = index
+        self.uuids = uuids or default_factory()
+        # Intermediate sheets created when sheets overflow the root page
+        self.grouping_sheets: Dict[Path, "KiCadSchematic"] = {}
+        self.journal = Journal()
         if file_path:
             self.import_schematic(file_path)
 
@@ -202,10 +400,10 @@ class KiCadSchematic:
             if isinstance(elem, list) and elem and elem[0] == Symbol("uuid"):
                 return str(elem[1]).strip('"')
 
-        new_uid = str(uuid.uuid4())
+        new_uid = self.uuids("root")
         # insere logo após o cabeçalho (kicad_sch ...)
         # self.data é [Symbol('kicad_sch'), (version ...), (generator ...), ...]
-        self.data.insert(1, [Symbol("uuid"), f'"{new_uid}"'])
+        self.journal.insert(self.data, 1, [Symbol("uuid"), f'"{new_uid}"'])
         return new_uid
 
     def _ensure_section(self, name: str):
@@ -214,7 +412,7 @@ class KiCadSchematic:
             if isinstance(elem, list) and elem and elem[0] == Symbol(name):
                 return elem
         section = [Symbol(name)]
-        self.data.append(section)
+        self.journal.append(self.data, section)
         return section
 
     def add_hierarchical_sheet(
@@ -228,274 +426,69 @@ class KiCadSchematic:
         net_wire_len_mm: float = 5.0,    # length of wire from pin to net label
         equal_two_sides: bool = False,   # enables equal distribution on both sides
         equal_spacing_mm: float = 2.54,  # spacing (mm) in equal_two_sides mode
+        parent_path: Optional[str] = None,   # instance path of this schematic, "/<root uuid>" by default
+        sheet_instances: Optional[list] = None,  # (sheet_instances ...) section to register the sheet in
+        label_kind: str = "label",       # "global_label" when sheets are spread over several pages
     ):
         at_x, at_y = float(object.at_xy[0]), float(
             object.at_xy[1])   # (at X Y) — sem rotação
-        w, h = float(object.size_wh[0]), float(object.size_wh[1])
-        x_left = at_x
-        x_right = at_x + w
-        y_top = at_y
-        y_bot = at_y + h
-
-        props = object.properties or {}
-        pins = object.pins or []
-
-        # ---- Helper functions for pin placement based on type ----
-        def _spread_ys(n: int) -> list:
-            """
-            Alocates n Ys equally spaced between top+margin and bottom-margin.
-            """
-            if n <= 0:
-                return []
-            usable = max(h - 2 * pin_margin_mm, 0.1)
-            if n == 1:
-                return [at_y + h / 2.0]
-            bin_h = usable / n
-            first_center = y_top + pin_margin_mm + bin_h / 2.0
-            return [first_center + i * bin_h for i in range(n)]
-
-        def _resolve_y_for_group(group: list) -> list:
-            autos = _spread_ys(sum(1 for p in group if "y" not in p))
-            auto_it = iter(autos)
-            ys = []
-            for p in group:
-                ys.append(float(p["y"]) if "y" in p else next(auto_it))
-
-            low = y_top + pin_margin_mm
-            high = y_bot - pin_margin_mm
-            if not ys:
-                return ys
-
-            ys[0] = min(max(ys[0], low), high)
-            for i in range(1, len(ys)):
-                target = max(ys[i], ys[i-1] + min_delta_mm)
-                ys[i] = min(target, high)
-
-            # if it overflows at bottom, shift up as much as possible
-            if ys[-1] > high and len(ys) > 1:
-                overflow = ys[-1] - high
-                spread = ys[-1] - ys[0]
-                min_needed = min_delta_mm * (len(ys) - 1)
-                slack = max(spread - min_needed, 0.0)
-                shift = min(overflow, slack)
-                if shift > 0:
-                    ys = [y - shift for y in ys]
-                    ys[0] = max(ys[0], low)
-                    for i in range(1, len(ys)):
-                        ys[i] = max(ys[i], ys[i-1] + min_delta_mm)
-                        ys[i] = min(ys[i], high)
-
-            return ys
-
-        # ---- Helper function for fixed spacing and centered (any type) ----
-        def _equal_spread_centered(n: int, step_mm: float) -> list:
-            """
-            Ys equally spaced by step_mm, centered vertically in the block.
-            If it doesn't fit, reduces step to fit.
-            """
-            if n <= 0:
-                return []
-
-            low = y_top + pin_margin_mm
-            high = y_bot - pin_margin_mm
-            usable_h = max(high - low, 0.1)
-
-            step = float(step_mm) if step_mm and step_mm > 0 else (
-                usable_h / max(n, 1))
-            if n == 1:
-                y = at_y + h / 2.0
-                return [min(max(y, low), high)]
-
-            total = step * (n - 1)
-
-            # If it doesn't fit, compress step
-            if total > usable_h:
-                step = usable_h / (n - 1)
-                total = step * (n - 1)
-
-            y0 = (at_y + h / 2.0) - total / 2.0
-            ys = [y0 + i * step for i in range(n)]
-
-            ys = [min(max(y, low), high) for y in ys]
-            for i in range(1, n):
-                ys[i] = max(ys[i], ys[i-1] + min_delta_mm)
-                ys[i] = min(ys[i], high)
-
-            return ys
-
-        #   1) Chose pin distribution method
-        left_pins, right_pins = [], []
-
-        if equal_two_sides:
-            # Alternates pins left/right in order of definition
-            for i, p in enumerate(pins):
-                (left_pins if i % 2 == 0 else right_pins).append(p)
-
-            ys_left = _equal_spread_centered(len(left_pins),  equal_spacing_mm)
-            ys_right = _equal_spread_centered(
-                len(right_pins), equal_spacing_mm)
-        else:
-            # alternates by type
-            for p in pins:
-                t = p.get("type", "input")
-                if t in ("input", "power_in"):
-                    left_pins.append(p)
-                elif t in ("output", "power_out"):
-                    right_pins.append(p)
-                else:
-                    (left_pins if p.get("side", "right")
-                     == "left" else right_pins).append(p)
-
-            ys_left = _resolve_y_for_group(left_pins)
-            ys_right = _resolve_y_for_group(right_pins)
-
-        #   2) Builds the block (sheet ...)
-        sheet_uuid = str(uuid.uuid4())
-        sheet = [
-            Symbol("sheet"),
-            [Symbol("at"), at_x, at_y],
-            [Symbol("size"), w, h],
-            [Symbol("fields_autoplaced")],
-            [Symbol("stroke"),
-                [Symbol("width"), 0.1524],
-                [Symbol("type"), Symbol("solid")],
-                [Symbol("color"), 0, 0, 0, 0],
-             ],
-            [Symbol("fill"), [Symbol("color"), 0, 0, 0, 0.0]],
-            [Symbol("uuid"), f'"{sheet_uuid}"'],
-            [Symbol("property"), '"Sheet name"', f'"{object.sheet_name}"',
-                [Symbol("id"), 0],
-                [Symbol("at"), at_x + 2.0, at_y - 2.0, 0],
-                [Symbol("effects"),
-                    [Symbol("font"), [Symbol("size"), 1.27, 1.27]],
-                    [Symbol("justify"), Symbol("left")],
-                 ],
-             ],
-            [Symbol("property"), '"Sheet file"', f'"{os.path.basename(object.sheet_file)}"',
-                [Symbol("id"), 1],
-                [Symbol("at"), at_x + 2.0, at_y + 2.0, 0],
-                [Symbol("effects"),
-                    [Symbol("font"), [Symbol("size"), 1.27, 1.27]],
-                    [Symbol("justify"), Symbol("left")],
-                 ],
-             ],
-        ]
 
-        # Extra properties
-        prop_id = 2
-        for k, v in props.items():
-            sheet.append(
-                [Symbol("property"), f'"{k}"', f'"{v}"',
-                 [Symbol("id"), prop_id],
-                 [Symbol("at"), at_x, at_y, 0],
-                 [Symbol("effects"),
-                    [Symbol("font"), [Symbol("size"), 1.27, 1.27]],
-                    [Symbol("hide"), Symbol("yes")],
-                  ]]
-            )
-            prop_id += 1
-
-        #   3) Pins
-        left_pin_positions = []   # [(pin_dict, (x,y))]
-        right_pin_positions = []  # [(pin_dict, (x,y))]
-
-        # Left: angle 180
-        for p, y in zip(left_pins, ys_left):
-            name = p.get("name", "IN")
-            ptype = p.get("type", "input")
-            pin_uuid = str(uuid.uuid4())
-            sheet.append(
-                [Symbol("pin"), f'"{name}"', Symbol(ptype),
-                 [Symbol("at"), x_left, y, 180.0],
-                 [Symbol("effects"),
-                    [Symbol("font"), [Symbol("size"), 1.27, 1.27]],
-                    [Symbol("justify"), Symbol("left")],
-                  ],
-                 [Symbol("uuid"), f'"{pin_uuid}"']]
-            )
-            left_pin_positions.append((p, (x_left, y)))
-
-        # Right: angle 0
-        for p, y in zip(right_pins, ys_right):
-            name = p.get("name", "OUT")
-            ptype = p.get("type", "output")
-            pin_uuid = str(uuid.uuid4())
-            sheet.append(
-                [Symbol("pin"), f'"{name}"', Symbol(ptype),
-                 [Symbol("at"), x_right, y, 0.0],
-                 [Symbol("effects"),
-                    [Symbol("font"), [Symbol("size"), 1.27, 1.27]],
-                    [Symbol("justify"), Symbol("right")],
-                  ],
-                 [Symbol("uuid"), f'"{pin_uuid}"']]
-            )
-            right_pin_positions.append((p, (x_right, y)))
+        # Pin layout and the whole block only depend on the template and the
+        # parameters: they are built once and stamped for every instance.
+        skeleton = sheet_skeleton(SheetSkeletonKey.for_object(
+            object,
+            at_y,
+            pin_margin_mm=float(pin_margin_mm),
+            min_delta_mm=float(min_delta_mm),
+            net_wire_len_mm=float(net_wire_len_mm),
+            equal_two_sides=bool(equal_two_sides),
+            equal_spacing_mm=float(equal_spacing_mm),
+            label_kind=label_kind,
+        ))
+        root_uuid = self._ensure_root_uuid()
+        if parent_path is None:
+            parent_path = f"/{root_uuid}"
+
+        # Sheet names are unique among siblings, so (parent path, name)
+        # identifies the sheet instance for deterministic UUIDs.
+        nodes, sheet_uuid = skeleton.stamp(
+            at_x, at_y, object.sheet_name, os.path.basename(object.sheet_file),
+            uuids=self.uuids, key=(parent_path, object.sheet_name))
 
         # ---- Inserção do sheet ----
         insert_idx = len(self.data) - 1
         if insert_idx < 0:
             insert_idx = 0
-        self.data.insert(insert_idx, sheet)
+        self.journal.insert(self.data, insert_idx, nodes[0])
 
         #   4) sheet_instances
-        root_uuid = self._ensure_root_uuid()
-        si = self._ensure_section("sheet_instances")
 
+        # add_hierarchical_sheets resolves the section once for all sheets,
+        # looking it up for every sheet would make placement quadratic.
+        if sheet_instances is None:
+            sheet_instances = self._ensure_sheet_instances()
+        si = sheet_instances
+
+        # Corrigido: path de folha filha deve incluir root_uuid
+        self.journal.append(si, [Symbol("path"), f"{parent_path}/{sheet_uuid}",
+                                 [Symbol("page"), str(page_for_instance)]])
+
+        #   5) NET LABELS: wires + labels for pin nets
+        self.journal.extend(self.data, nodes[1:])
+
+        return {"sheet_uuid": sheet_uuid, "root_uuid": root_uuid}
+
+    def _ensure_sheet_instances(self) -> list:
+        # (sheet_instances ...) section, always starting with the root page.
+        si = self._ensure_section("sheet_instances")
         has_root = any(
             isinstance(e, list) and e and e[0] == Symbol(
                 "path") and str(e[1]).strip('"') == "/"
             for e in si[1:]
         )
         if not has_root:
-            si.append([Symbol("path"), "/", [Symbol("page"), "1"]])
-
-        # Corrigido: path de folha filha deve incluir root_uuid
-        si.append([Symbol("path"), f"/{root_uuid}/{sheet_uuid}",
-                  [Symbol("page"), str(page_for_instance)]])
-
-        #   5) NET LABELS (optional): create wires + labels for pin nets
-        def _add_wire(x1, y1, x2, y2):
-            self.data.append(
-                [Symbol("wire"),
-                 [Symbol("pts"), [Symbol("xy"), x1, y1],
-                  [Symbol("xy"), x2, y2]],
-                 [Symbol("stroke"), [Symbol("width"), 0], [
-                     Symbol("type"), Symbol("default")]],
-                 [Symbol("uuid"), f'"{uuid.uuid4()}"']]
-            )
-
-        def _add_label(name, x, y, justify_sym):
-            self.data.append(
-                [Symbol("label"), f'"{name}"',
-                 [Symbol("at"), x, y, 0],
-                 [Symbol("effects"),
-                    [Symbol("font"), [Symbol("size"), 1.27, 1.27]],
-                    [Symbol("justify"), Symbol(justify_sym)]
-                  ],
-                 [Symbol("uuid"), f'"{uuid.uuid4()}"']]
-            )
-
-        # Left: wire goes to x_left - net_wire_len_mm, label at end with justify right
-        for p, (px, py) in left_pin_positions:
-            net = p.get("net")
-            if not net:
-                continue
-            x2 = px - float(net_wire_len_mm)
-            y2 = py
-            _add_wire(px, py, x2, y2)
-            _add_label(str(net), x2, y2, "right")
-
-        # Right: wire goes to x_right + net_wire_len_mm, label at end with justify left
-        for p, (px, py) in right_pin_positions:
-            net = p.get("net")
-            if not net:
-                continue
-            x2 = px + float(net_wire_len_mm)
-            y2 = py
-            _add_wire(px, py, x2, y2)
-            _add_label(str(net), x2, y2, "left")
-
-        return {"sheet_uuid": sheet_uuid, "root_uuid": root_uuid}
+            self.journal.append(si, [Symbol("path"), "/", [Symbol("page"), "1"]])
+        return si
 
     def add_hierarchical_sheets(
         self,
@@ -503,7 +496,7 @@ class KiCadSchematic:
         objects,                          # list of HierarchicalObjects
         # initial position (top-left) for placement
         origin_xy=(50.0, 50.0),
-        # row for horizontal breaks, column for vertical breaks (not implemented)
+        # row for horizontal breaks, column for vertical breaks
         flow="row",
         # max width before line break (only for flow=row)
         max_row_width_mm=180.0,
@@ -516,73 +509,138 @@ class KiCadSchematic:
         page_for_instance_start=2,
         pin_margin_mm=2.0,                # used on add_hierarchical_sheet
         min_delta_mm=1.0,                 # used on add_hierarchical_sheet
+        # max height before column break (only for flow=column)
+        max_column_height_mm=None,
+        page_size_mm=(297.0, 210.0),      # A4 landscape
+        page_margin_mm=10.0,
+        group_size_wh=(40.0, 15.0),       # size of the grouping sheet symbols
     ):
         """
         Adds several hierarchical sheets arranged automatically.
-        Returns metadata [{object, sheet_uuid, at_xy, size_wh, page}, ...].
+        When they do not fit on the page, they are split into grouping sheets
+        (one per page, written by export_grouping_sheets), and their nets are
+        joined with global labels.
+        Returns metadata [{object, sheet_uuid, sheet_path, at_xy, size_wh, page}, ...].
         """
+        objects = list(objects)
+        layout = SheetLayout(
+            origin_xy=origin_xy,
+            flow=flow,
+            max_row_width_mm=max_row_width_mm,
+            max_column_height_mm=max_column_height_mm,
+            page_size_mm=page_size_mm,
+            page_margin_mm=page_margin_mm,
+            h_gap_factor=h_gap_factor,
+            v_gap_factor=v_gap_factor,
+            min_hgap=min_hgap,
+            min_vgap=min_vgap,
+        )
+
+        # Everything that does not change from one sheet to the next is
+        # resolved once, so placement stays linear in the number of sheets.
+        root_uuid = self._ensure_root_uuid()
+        sheet_instances = self._ensure_sheet_instances()
+        pages = iter(range(int(page_for_instance_start), 1 << 30))
+        needs_groups = layout.page_count([obj.size_wh for obj in objects]) > 1
+
         placed = []
-        cursor_x, cursor_y = float(origin_xy[0]), float(origin_xy[1])
-        row_height = 0.0
-        row_left_edge = cursor_x
-        page_num = int(page_for_instance_start)
-
-        def _hgap(w):  # gap proportional to object width
-            # return max(h_gap_factor * float(w), float(min_hgap))
-            return 25  # constant value for better spacing
-
-        def _vgap(h):  # gap proportional to row height
-            # return max(v_gap_factor * float(h), float(min_vgap))
-            return 10  # constant value for better spacing
-        for obj in objects:
-            w = float(obj.size_wh[0])
-            h = float(obj.size_wh[1])
-
-            # line break when exceeding max row width
-            if flow == "row" and (cursor_x > row_left_edge) and (cursor_x + w > row_left_edge + float(max_row_width_mm)):
-                # next line
-                cursor_x = row_left_edge
-                cursor_y = cursor_y + row_height + _vgap(row_height)
-                row_height = 0.0
-
-            # places block
-            obj.at_xy = [cursor_x, cursor_y]
-            meta = self.add_hierarchical_sheet(
-                project_path,
-                object=obj,
-                page_for_instance=str(page_num),
-                pin_margin_mm=pin_margin_mm,
-                min_delta_mm=min_delta_mm,
-                equal_two_sides=True,
-            )
-            placed.append({
-                "object": obj,
-                "sheet_uuid": meta.get("sheet_uuid"),
-                "root_uuid": meta.get("root_uuid"),
-                "at_xy": tuple(obj.at_xy),
-                "size_wh": tuple(obj.size_wh),
-                "page": page_num
-            })
-
-            # fowards cursor
-            cursor_x += w + _hgap(w)
-            row_height = max(row_height, h)
-            page_num += 1
 
+        def _place_level(target, items, parent_path, sheet_path, name_path):
+            sizes = [item.size_wh for item in items]
+            slots = layout.place(sizes)
+            page_count = layout.page_count_of(slots)
+            if page_count > 1 and len(items) > page_count:
+                # Too many sheets for one page: one grouping sheet per page,
+                # the grouping sheets being laid out (and split) the same way.
+                chunks: dict[int, list] = {}
+                for item, (page, _, _) in zip(items, slots):
+                    chunks.setdefault(page, []).append(item)
+                items = [self._new_grouping_sheet(project_path, chunk, group_size_wh)
+                         for chunk in chunks.values()]
+                _place_level(target, items, parent_path, sheet_path, name_path)
+                return
+            if page_count > 1:
+                # One sheet per page, each too large to share one: grouping
+                # would not make fewer pages, the pages go side by side.
+                slots = layout.spread(slots, sizes)
+
+            for item, (_, x, y) in zip(items, slots):
+                item.at_xy = [x, y]
+                page_num = next(pages)
+                meta = target.add_hierarchical_sheet(
+                    project_path,
+                    object=item,
+                    page_for_instance=str(page_num),
+                    pin_margin_mm=pin_margin_mm,
+                    min_delta_mm=min_delta_mm,
+                    equal_two_sides=True,
+                    parent_path=parent_path,
+                    sheet_instances=sheet_instances,
+                    label_kind="global_label" if needs_groups else "label",
+                )
+                item_path = f"{sheet_path}/{meta['sheet_uuid']}"
+                item_name_path = f"{name_path}{item.sheet_name}/"
+
+                if isinstance(item, _GroupingSheet):
+                    _place_level(item.schematic, item.children,
+                                 f"/{root_uuid}{item_path}", item_path, item_name_path)
+                    continue
+
+                placed.append({
+                    "object": item,
+                    "sheet_uuid": meta.get("sheet_uuid"),
+                    "root_uuid": root_uuid,
+                    "sheet_path": item_path,
+                    "sheet_name_path": item_name_path,
+                    "at_xy": tuple(item.at_xy),
+                    "size_wh": tuple(item.size_wh),
+                    "page": page_num
+                })
+
+        _place_level(self, objects, f"/{root_uuid}", "", "/")
         return placed
 
+    def _new_grouping_sheet(self, project_path: Path, children: list, size_wh) -> "_GroupingSheet":
+        number = len(self.grouping_sheets) + 1
+        sheet_file = project_path / f"{project_path.name}_group_{number}.kicad_sch"
+
+        schematic = KiCadSchematic(uuids=self.uuids)
+        schematic.data = loads(base_sch_text(self.uuids("grouping sheet", number)))
+        # Edits of the grouping sheet go to this schematic's journal as well.
+        schematic.journal = self.journal
+        self.grouping_sheets[sheet_file] = schematic
+        self.journal.record(lambda: self.grouping_sheets.pop(sheet_file, None))
+
+        return _GroupingSheet(
+            sheet_name=f"GROUP_{number}",
+            sheet_file=sheet_file,
+            at_xy=[0.0, 0.0],
+            size_wh=list(size_wh),
+            properties={"Comment": f"{len(children)} subsystems"},
+            pins=[],
+            schematic=schematic,
+            children=children,
+        )
+
+    def export_grouping_sheets(self, sink: Optional[ProjectSink] = None) -> None:
+        """Writes the grouping sheets created by add_hierarchical_sheets."""
+        for sheet_file, schematic in self.grouping_sheets.items():
+            if sink is None:
+                schematic.export_schematic(sheet_file)
+            else:
+                sink.write_text(sheet_file, schematic._format_sexp(schematic.data))
+
     def _format_sexp(self, data, indent=0) -> str:
         return _format_sexp_kicad(data, indent)
 
     def import_schematic(self, file_path: str) -> None:
         """Importe un fichier schématique KiCad."""
         with open(file_path, "r", encoding="utf-8") as f:
-            self.data = loads(f.read())
+            self.data = parse_sexp(f.read())
 
     def export_schematic(self, output_path: str) -> None:
         """Exporte le schématique vers un fichier, avec un formatage lisible."""
-        with open(output_path, "w", encoding="utf-8") as f:
-            f.write(self._format_sexp(self.data))
+        _atomic_write_text(output_path, self._format_sexp(self.data))
 
     def add_component(
         self,
@@ -597,197 +655,161 @@ class KiCadSchematic:
         Transforme un symbole de librairie en composant schématique complet.
         """
         try:
-            lib_symbol = loads(symbol_data)
-        except Exception as e:
+            self.add_components(
+                [ComponentRecord(symbol_data, ref, value, footprint, at)], project_name)
+        except ValueError as e:
             print(f"Erreur parsing symbole: {e}")
-            return
 
-        # 1️⃣ Vérifier si la section (lib_symbols ...) existe
-        lib_symbols_idx = next(
-            (
-                i
-                for i, elem in enumerate(self.data)
-                if isinstance(elem, list) and elem and elem[0] == Symbol("lib_symbols")
-            ),
-            None,
-        )
-
-        if lib_symbols_idx is not None:
-            lib_section = self.data[lib_symbols_idx]
+    def _parse_library_symbol(self, symbol_data: str) -> dict[str, Any]:
+        # Everything add_components needs from a library symbol, computed once.
+        try:
+            lib_symbol = loads(symbol_data)
+        except Exception as e:
+            raise ValueError(f"could not parse library symbol: {e}") from e
 
-        # Extraire le nom du symbole lib (ex: "Device:R")
         lib_name = None
-        if (
-            isinstance(lib_symbol, list)
-            and len(lib_symbol) > 1
-            and isinstance(lib_symbol[1], str)
-        ):
+        if isinstance(lib_symbol, list) and len(lib_symbol) > 1 and isinstance(lib_symbol[1], str):
             lib_name = lib_symbol[1].strip('"')  # "Device:R"
 
-            # 2️⃣ Vérifier si ce lib_name est déjà dans la section
-            already_in_lib = False
-            print(lib_name)
-            if lib_name:
-                for entry in lib_section[1:]:
-                    if (
-                        isinstance(entry, list)
-                        and len(entry) > 1
-                        and entry[0] == Symbol("symbol")
-                        and entry[1] == lib_name
-                    ):
-                        already_in_lib = True
-                        break
-
-            # 3️⃣ Si pas présent, on l’ajoute au début de (lib_symbols ...)
-            if not already_in_lib:
-                print(
-                    f"➕ Ajout du symbole '{lib_name}' dans la section (lib_symbols)")
-                try:
-                    lib_symbol_ast = loads(symbol_data)
-                    lib_section.insert(1, lib_symbol_ast)
-                except Exception as e:
-                    print(f"Erreur lors de l'ajout du symbole lib: {e}")
-        else:
-            print("⚠️ Pas de section (lib_symbols) trouvée dans le schéma.")
-
-        # 1️⃣ Récupérer le UUID global du schéma
-        global_uuid = None
-        for elem in self.data:
-            if isinstance(elem, list) and elem and elem[0] == Symbol("uuid"):
-                global_uuid = elem[1].strip('"')
-                # print("GLOBAL UUID",global_uuid)
-                break
+        properties = []
+        pin_numbers = []
+        for node in lib_symbol:
+            if not (isinstance(node, list) and node):
+                continue
+            if node[0] == Symbol("property"):
+                name = node[1].strip('"')
+                if name in ("Reference", "Value", "Footprint", "Datasheet", "Description"):
+                    properties.append((name, node))
+            elif node[0] == Symbol("symbol"):
+                # Sub-symbols (units) hold the pins
+                for item in node:
+                    if isinstance(item, list) and item and item[0] == Symbol("pin"):
+                        for elt in item:
+                            if isinstance(elt, list) and elt[0] == Symbol("number"):
+                                num = elt[1].strip('"')
+                                if num:
+                                    pin_numbers.append(num)
+
+        return {
+            "lib_symbol": lib_symbol,
+            "lib_name": lib_name,
+            "properties": properties,
+            "pin_numbers": pin_numbers,
+        }
 
-        # Nom du symbole (ex: Device:R)
-        lib_name = None
-        if (
-            isinstance(lib_symbol, list)
-            and len(lib_symbol) > 1
-            and isinstance(lib_symbol[1], str)
-        ):
-            lib_name = lib_symbol[1].strip('"')
-
-        # Commence un nouveau composant schématique
+    def _build_component(
+        self,
+        parsed: dict[str, Any],
+        record: "ComponentRecord",
+        project_name: str,
+        root_uuid: str,
+    ) -> list:
+        x, y = float(record.at[0]), float(record.at[1])
         component = [
             Symbol("symbol"),
-            [Symbol("lib_id"), f'"{lib_name}"'],
-            [Symbol("at"), float(at[0]), float(at[1]), 0],
+            [Symbol("lib_id"), f'"{parsed["lib_name"]}"'],
+            [Symbol("at"), x, y, 0],
             [Symbol("unit"), 1],
             [Symbol("exclude_from_sim"), Symbol("no")],
             [Symbol("in_bom"), Symbol("yes")],
             [Symbol("on_board"), Symbol("yes")],
             [Symbol("dnp"), Symbol("no")],
             [Symbol("fields_autoplaced"), Symbol("yes")],
-            [Symbol("uuid"), f'"{uuid.uuid4()}"'],
+            [Symbol("uuid"), f'"{self.uuids("symbol", root_uuid, record.ref)}"'],
         ]
 
-        # --- Extraire les propriétés principales du symbole lib ---
-        for prop in lib_symbol:
-            if isinstance(prop, list) and prop and prop[0] == Symbol("property"):
-                name = prop[1].strip('"')
-
-                if name == "Reference":
-                    # Position du label ref relative au point d'insertion
-                    component.append(
-                        [
-                            Symbol("property"),
-                            '"Reference"',
-                            f'"{ref}"',
-                            [Symbol("at"), float(at[0]) + 2.54,
-                             float(at[1]) - 1.27, 0],
-                            [
-                                Symbol("effects"),
-                                [Symbol("font"), [Symbol("size"), 1.27, 1.27]],
-                                [Symbol("justify"), Symbol("left")],
-                            ],
-                        ]
-                    )
-
-                elif name == "Value":
-                    component.append(
-                        [
-                            Symbol("property"),
-                            '"Value"',
-                            f'"{value}"',
-                            [Symbol("at"), float(at[0]) + 2.54,
-                             float(at[1]) + 1.27, 0],
-                            [
-                                Symbol("effects"),
-                                [Symbol("font"), [Symbol("size"), 1.27, 1.27]],
-                                [Symbol("justify"), Symbol("left")],
-                            ],
-                        ]
-                    )
-
-                elif name == "Footprint":
-                    component.append(
-                        [
-                            Symbol("property"),
-                            '"Footprint"',
-                            f'"{footprint}"',
-                            [Symbol("at"), float(at[0]) -
-                             1.778, float(at[1]), 90],
-                            [
-                                Symbol("effects"),
-                                [Symbol("font"), [Symbol("size"), 1.27, 1.27]],
-                                [Symbol("hide"), Symbol("yes")],
-                            ],
-                        ]
-                    )
-
-                else:
-                    # Copier les autres propriétés (Datasheet, Description, etc.)
-                    if name not in (
-                        "Reference",
-                        "Value",
-                        "Footprint",
-                        "Datasheet",
-                        "Description",
-                    ):
-                        continue
-                    else:
-                        component.append(prop)
+        # --- Propriétés principales du symbole lib ---
+        for name, prop in parsed["properties"]:
+            if name == "Reference":
+                # Position du label ref relative au point d'insertion
+                component.append(
+                    [Symbol("property"), '"Reference"', f'"{record.ref}"',
+                     [Symbol("at"), x + 2.54, y - 1.27, 0],
+                     [Symbol("effects"),
+                        [Symbol("font"), [Symbol("size"), 1.27, 1.27]],
+                        [Symbol("justify"), Symbol("left")]]]
+                )
+            elif name == "Value":
+                component.append(
+                    [Symbol("property"), '"Value"', f'"{record.value}"',
+                     [Symbol("at"), x + 2.54, y + 1.27, 0],
+                     [Symbol("effects"),
+                        [Symbol("font"), [Symbol("size"), 1.27, 1.27]],
+                        [Symbol("justify"), Symbol("left")]]]
+                )
+            elif name == "Footprint":
+                component.append(
+                    [Symbol("property"), '"Footprint"', f'"{record.footprint}"',
+                     [Symbol("at"), x - 1.778, y, 90],
+                     [Symbol("effects"),
+                        [Symbol("font"), [Symbol("size"), 1.27, 1.27]],
+                        [Symbol("hide"), Symbol("yes")]]]
+                )
+            else:
+                # Datasheet, Description: copied so components never share nodes
+                component.append(_copy_sexp(prop))
 
         # --- Transformer les sous-symboles en vrais pins KiCad ---
-        for sub in lib_symbol:
-            if isinstance(sub, list) and sub and sub[0] == Symbol("symbol"):
-                for item in sub:
-                    if isinstance(item, list) and item and item[0] == Symbol("pin"):
-                        # Extraire le numéro de pin
-                        num = None
-                        for elt in item:
-                            if isinstance(elt, list) and elt[0] == Symbol("number"):
-                                num = elt[1].strip('"')
-                        if num:
-                            component.append(
-                                [
-                                    Symbol("pin"),
-                                    f'"{num}"',
-                                    [Symbol("uuid"), f'"{uuid.uuid4()}"'],
-                                ]
-                            )
+        for num in parsed["pin_numbers"]:
+            component.append(
+                [Symbol("pin"), f'"{num}"',
+                 [Symbol("uuid"), f'"{self.uuids("symbol", root_uuid, record.ref, "pin", num)}"']])
 
         # --- Ajouter les instances ---
         component.append(
-            [
-                Symbol("instances"),
-                [
-                    Symbol("project"),
-                    f'"{project_name}"',
-                    [
-                        Symbol("path"),
-                        f'"/{global_uuid}"',
-                        [Symbol("reference"), f'"{ref}"'],
-                        [Symbol("unit"), 1],
-                    ],
-                ],
-            ]
+            [Symbol("instances"),
+             [Symbol("project"), f'"{project_name}"',
+              [Symbol("path"), f'"/{root_uuid}"',
+               [Symbol("reference"), f'"{record.ref}"'],
+               [Symbol("unit"), 1]]]]
         )
+        return component
 
-        # Trouver où insérer avant la fin (on insère avant le dernier élément)
-        insert_index = len(self.data) - 2
-        # 🔹 Insérer avant la fin
-        self.data.insert(insert_index, component)
+    def add_components(
+        self,
+        records: Iterable[Union["ComponentRecord", tuple]],
+        project_name: str = "project",
+    ) -> int:
+        """
+        Adds many components at once: each distinct library symbol is parsed
+        once, and all components are spliced into the schematic in one go.
+        Records are ComponentRecord or (symbol_data, ref, value, footprint, at)
+        tuples. Returns the number of components added.
+        """
+        lib_section = self._ensure_section("lib_symbols")
+        known_lib_names = {
+            str(entry[1]).strip('"')
+            for entry in lib_section[1:]
+            if isinstance(entry, list) and len(entry) > 1 and entry[0] == Symbol("symbol")
+        }
+        root_uuid = self._ensure_root_uuid()
+
+        parsed_symbols: dict[str, dict[str, Any]] = {}
+        new_lib_symbols = []
+        components = []
+        for record in records:
+            if not isinstance(record, ComponentRecord):
+                record = ComponentRecord(*record)
+
+            parsed = parsed_symbols.get(record.symbol_data)
+            if parsed is None:
+                parsed = self._parse_library_symbol(record.symbol_data)
+                parsed_symbols[record.symbol_data] = parsed
+                lib_name = parsed["lib_name"]
+                if lib_name and lib_name not in known_lib_names:
+                    known_lib_names.add(lib_name)
+                    new_lib_symbols.append(parsed["lib_symbol"])
+
+            components.append(
+                self._build_component(parsed, record, project_name, root_uuid))
+
+        # New library symbols go at the beginning of (lib_symbols ...)
+        self.journal.splice(lib_section, 1, 1, reversed(new_lib_symbols))
+
+        # Components go before the last two elements, in a single splice
+        insert_index = max(len(self.data) - 2, 0)
+        self.journal.splice(self.data, insert_index, insert_index, components)
+        return len(components)
 
     def transform_library_symbol_to_schematic(
         self, lib_symbol: List, ref: str, value: str, at: List[float]
@@ -818,7 +840,7 @@ class KiCadSchematic:
             [Symbol("on_board"), Symbol("yes")],
             [Symbol("dnp"), Symbol("no")],
             [Symbol("fields_autoplaced"), Symbol("yes")],
-            [Symbol("uuid"), f'"{uuid.uuid4()}"'],  # UUID aléatoire
+            [Symbol("uuid"), f'"{self.uuids("symbol", ref)}"'],
             # Propriété Reference
             [
                 Symbol("property"),
@@ -868,8 +890,8 @@ class KiCadSchematic:
                 ],
             ],
             # Pins (simplifiés)
-            [Symbol("pin"), '"1"', [Symbol("uuid"), f'"{uuid.uuid4()}"']],
-            [Symbol("pin"), '"2"', [Symbol("uuid"), f'"{uuid.uuid4()}"']],
+            [Symbol("pin"), '"1"', [Symbol("uuid"), f'"{self.uuids("symbol", ref, "pin", 1)}"']],
+            [Symbol("pin"), '"2"', [Symbol("uuid"), f'"{self.uuids("symbol", ref, "pin", 2)}"']],
             # Instances (pour le projet)
             [
                 Symbol("instances"),
@@ -878,7 +900,7 @@ class KiCadSchematic:
                     '"test_python"',
                     [
                         Symbol("path"),
-                        f'"/{uuid.uuid4()}"',
+                        f'"/{self._ensure_root_uuid()}"',
                         [Symbol("reference"), f'"{ref}"'],
                         [Symbol("unit"), 1],
                     ],
@@ -898,7 +920,7 @@ class KiCadSchematic:
                         and subitem
                         and subitem[0] == Symbol(ref)
                     ):
-                        del self.data[i]
+                        self.journal.delete(self.data, i)
                         return True
         return False
 
@@ -908,7 +930,7 @@ class KiCadSchematic:
             Symbol("wire"),
             [Symbol("pts"), [Symbol("xy"), *start], [Symbol("xy"), *end]],
         ]
-        self.data.append(wire)
+        self.journal.append(self.data, wire)
 
     def get_components(self) -> List[Dict]:
         """Retourne la liste des composants du schématique."""
@@ -931,46 +953,109 @@ class KiCadSchematic:
         """Récupère un symbole depuis une bibliothèque chargée."""
         if lib_name in self.libraries and symbol_name in self.libraries[lib_name]:
             return self.libraries[lib_name][symbol_name]
+
+        # Fall back to the system-wide index instead of loading the library.
+        entry = (self._index or default_index()).find_symbol(lib_name, symbol_name)
+        if entry is not None:
+            return loads(entry.read())
         return None
 
 
-class KiCadPCB:
-    """Classe pour manipuler les fichiers PCB KiCad (.kicad_pcb)."""
+class KiCadPCB(JournaledDocument):
+    """Classe pour manipuler les fichiers PCB KiCad (.kicad_pcb).
 
-    def __init__(self, file_path: Optional[str] = None):
-        self.data: Union[List, Dict] = []
-        self.footprint_libraries: Dict[str, Dict] = {}
-        if file_path:
-            self.import_pcb(file_path)
+    Comme KiCadSchematic, les modifications passent par self.journal.
+    """
 
-    def import_pcb(self, file_path: str) -> None:
-        """Importe un fichier PCB KiCad."""
+    def __init__(
+        self,
+        file_path: Optional[str] = None,
+        index: Optional[LibraryIndex] = None,
+        lazy: bool = False,
+        uuids: Optional[UuidFactory] = None,
+    ):
+        self._data: Union[List, Dict] = []
+        self.document: Optional[LazySexpDocument] = None
+        self.footprint_libraries: Dict[str, FootprintLibrary] = {}
+        self._index = index
+        self.uuids = uuids or default_factory()
+        self.journal = Journal()
+        if file_path:
+            self.import_pcb(file_path, lazy=lazy)
+
+    @property
+    def data(self) -> Union[List, Dict]:
+        # A lazily imported board is fully parsed the first time its tree is needed.
+        if self.document is not None:
+            self._data = self.document.materialize()
+            self.document.close()
+            self.document = None
+        return self._data
+
+    @data.setter
+    def data(self, value: Union[List, Dict]) -> None:
+        if self.document is not None:
+            self.document.close()
+            self.document = None
+        self._data = value
+
+    def import_pcb(self, file_path: str, lazy: bool = False) -> None:
+        """Importe un fichier PCB KiCad.
+
+        Avec lazy=True, le fichier est seulement indexé (mmap) : les éléments
+        sont lus à la demande, et ceux qui ne sont pas modifiés sont réécrits
+        octet pour octet.
+        """
+        if lazy:
+            self.data = []
+            self.document = LazySexpDocument(file_path)
+            return
         with open(file_path, "r", encoding="utf-8") as f:
-            self.data = loads(f.read())
+            self.data = parse_sexp(f.read())
 
     def _format_sexp(self, data, indent=0) -> str:
         return _format_sexp_kicad(data, indent)
 
     def export_pcb(self, output_path: str) -> None:
         """Exporte le PCB vers un fichier, avec un formatage lisible."""
-        with open(output_path, "w", encoding="utf-8") as f:
-            f.write(self._format_sexp(self.data))
+        if self.document is not None:
+            self.document.write(output_path)
+            return
+        _atomic_write_text(output_path, self._format_sexp(self.data))
 
     def get_footprints(self) -> List[Dict]:
         """Retourne la liste des empreintes (footprints) du PCB."""
+        if self.document is not None:
+            doc = self.document
+            return [
+                {"ref": doc.property(i, "Reference"), "footprint": doc.name(i)}
+                for i in doc.indices("footprint")
+            ]
+
         footprints = []
         for item in self.data:
             if isinstance(item, list) and item and item[0] == Symbol("footprint"):
-                ref = str(item[1][0])
-                footprint = str(item[1][1])
+                ref = None
+                for child in item[2:]:
+                    if (isinstance(child, list) and len(child) > 2
+                            and child[0] == Symbol("property") and str(child[1]).strip('"') == "Reference"):
+                        ref = str(child[2]).strip('"')
+                        break
+                footprint = str(item[1]).strip('"')
                 footprints.append({"ref": ref, "footprint": footprint})
         return footprints
 
-    def load_footprint_library(self, lib_dir: str, lib_name: str) -> None:
+    def load_footprint_library(
+        self,
+        lib_dir: str,
+        lib_name: str,
+        max_entries: int | None = 256,
+        max_bytes: int | None = None,
+    ) -> None:
         """Charge une bibliothèque d'empreintes dans le PCB."""
-        self.footprint_libraries[lib_name] = KiCadLibrary.import_footprint_library(
-            lib_dir
-        )
+        # Only the folder listing happens here, footprints are parsed on access.
+        self.footprint_libraries[lib_name] = FootprintLibrary(
+            lib_dir, max_entries=max_entries, max_bytes=max_bytes)
 
     def get_footprint_from_library(
         self, lib_name: str, footprint_name: str
@@ -978,15 +1063,56 @@ class KiCadPCB:
         """Récupère une empreinte depuis une bibliothèque chargée."""
         if lib_name in self.footprint_libraries:
             return self.footprint_libraries[lib_name].get(footprint_name)
+
+        entry = (self._index or default_index()).find_footprint(lib_name, footprint_name)
+        if entry is not None:
+            return loads(entry.read())
         return None
 
+    def update_from_schematic(
+        self,
+        schematic: "KiCadSchematic",
+        sheet_file: str,
+        remove_orphans: bool = False,
+        row_width_mm: float = 200.0,
+    ) -> SyncReport:
+        """
+        Met à jour le PCB depuis le schématique (symboles de la feuille racine) :
+        empreintes ajoutées, remplacées ou mises à jour, nets des pads inclus.
+        """
+        return sync_footprints(
+            self.data,
+            schematic_netlist(schematic.data),
+            self.get_footprint_from_library,
+            sheet_file,
+            remove_orphans=remove_orphans,
+            row_width_mm=row_width_mm,
+            uuids=self.uuids,
+            journal=self.journal,
+        )
+
 
 class KiCadAPI:
     """Classe principale pour interagir avec les fichiers KiCad."""
 
-    def __init__(self):
+    def __init__(
+        self,
+        uuids: Optional[UuidFactory] = None,
+        sources: Optional[ParsedFileCache] = None,
+    ):
         self.schematic = None
         self.pcb = None
+        # DeterministicUuidFactory makes the output reproducible (see project_creation).
+        self.uuids = uuids or default_factory()
+        # Parsed template files shared between instances (see server).
+        self.sources = sources
+
+    def _read_template(self, path: Path) -> Sexp:
+        # Template trees are only read and cloned, never modified, so they
+        # can come from a cache shared with other requests.
+        if self.sources is not None:
+            return self.sources.get(path)
+        return parse_sexp(Path(path).read_text(encoding="utf-8"))
 
     def _build_unique_name(self, base_name: str, occurrence: int) -> str:
         return base_name if occurrence == 1 else f"{base_name}_{occurrence}"
@@ -995,25 +1121,29 @@ class KiCadAPI:
         self,
         node: Sexp,
         uuid_map: Optional[dict[str, str]] = None,
+        scope: tuple = (),
     ) -> tuple[Sexp, dict[str, str]]:
         # Clone the whole KiCad tree while regenerating every UUID once.
+        # `scope` identifies the copy, new UUIDs are keyed by it and the old UUID.
         if uuid_map is None:
             uuid_map = {}
+        uuid_head = Symbol("uuid")
 
-        if isinstance(node, list):
-            if node and node[0] == Symbol("uuid") and len(node) >= 2 and isinstance(node[1], str):
-                old_uuid = node[1].strip('"')
-                new_uuid = uuid_map.setdefault(old_uuid, str(uuid.uuid4()))
-                return [node[0], new_uuid, *node[2:]], uuid_map
+        def _new_uuid(node: list) -> Optional[list]:
+            if not (node and node[0] == uuid_head and len(node) >= 2 and isinstance(node[1], str)):
+                return None
+            old_uuid = node[1].strip('"')
+            new_uuid = uuid_map.get(old_uuid)
+            if new_uuid is None:
+                new_uuid = uuid_map[old_uuid] = self.uuids("clone", *scope, old_uuid)
+            return [node[0], new_uuid, *node[2:]]
 
-            cloned = []
-            for child in node:
-                cloned_child, uuid_map = self._clone_with_new_uuids(
-                    child, uuid_map)
-                cloned.append(cloned_child)
-            return cloned, uuid_map
-
-        return deepcopy(node), uuid_map
+        if isinstance(node, list):
+            replaced = _new_uuid(node)
+            if replaced is not None:
+                return replaced, uuid_map
+        # Subtrees without UUIDs keep their source span and are written verbatim.
+        return copy_sexp(node, _new_uuid), uuid_map
 
     def _replace_group_member_uuids(
         self,
@@ -1083,22 +1213,26 @@ class KiCadAPI:
         self,
         symbol_node: list[Any],
         project_name: str,
-        instance_path: str,
-        reference: str,
+        instance_paths: list[tuple[str, str]],
     ) -> None:
-        # Rewrite the instances block so the cloned sheet points to its new path.
+        # Rewrite the instances block so the cloned sheet points to its new
+        # path(s). A sheet file shared by several sheet instances carries one
+        # (path ...) entry, with its own reference, per instance.
         unit = self._get_symbol_unit(symbol_node)
         instances_block = [
             Symbol("instances"),
             [
                 Symbol("project"),
                 project_name,
-                [
-                    Symbol("path"),
-                    instance_path,
-                    [Symbol("reference"), reference],
-                    [Symbol("unit"), unit],
-                ],
+                *(
+                    [
+                        Symbol("path"),
+                        instance_path,
+                        [Symbol("reference"), reference],
+                        [Symbol("unit"), unit],
+                    ]
+                    for instance_path, reference in instance_paths
+                ),
             ],
         ]
 
@@ -1129,47 +1263,65 @@ class KiCadAPI:
             return f"{prefix}{str(next_value).zfill(width)}"
         return f"{prefix}{next_value}"
 
+    def _template_symbols(self, schematic_source: Sexp) -> list[tuple[str | None, str | None, int]]:
+        # (UUID, reference, unit) of every symbol of a template sheet.
+        return [
+            (self._get_symbol_uuid(node), self._get_symbol_reference(node), self._get_symbol_unit(node))
+            for node in schematic_source
+            if isinstance(node, list) and node and node[0] == Symbol("symbol")
+        ]
+
     def _instantiate_subsystem(
         self,
         template: HierarchicalObject,
         project_path: Path,
         occurrence: int,
         ref_counters: dict[str, int],
+        shared_with: Optional[InstantiatedSubsystem] = None,
+        state: Optional[BuildState] = None,
     ) -> InstantiatedSubsystem:
         # Build a per-instance copy of the subsystem with unique filenames,
         # fresh UUIDs, and an annotation map we can later reuse for the PCB.
-        source_sheet = Path(template.sheet_file)
+        # With `shared_with`, the new instance reuses the clone (file, UUIDs)
+        # of an earlier instance of the same template and only gets its own
+        # references, as KiCad multi-instance sheets do.
+        # Annotation only needs the symbols of the template: when `state`
+        # knows them, the sheet is only parsed if it is written. It is
+        # cloned when written (see _ensure_cloned).
         sheet_name = self._build_unique_name(template.sheet_name, occurrence)
-        sheet_filename = self._build_unique_name(source_sheet.stem, occurrence) + source_sheet.suffix
-        target_sheet = project_path / sheet_filename
+        source_sheet = Path(template.sheet_file)
+        schematic_source = None
+
+        if shared_with is None:
+            sheet_filename = self._build_unique_name(source_sheet.stem, occurrence) + source_sheet.suffix
+            target_sheet = project_path / sheet_filename
+
+            symbol_sources = None
+            if state is not None:
+                source_digest = state.input_digest(source_sheet)
+                symbol_sources = state.template_symbols(source_digest)
+            if symbol_sources is None:
+                schematic_source = self._read_template(source_sheet)
+                symbol_sources = self._template_symbols(schematic_source)
+                if state is not None:
+                    state.record_template(source_digest, symbol_sources)
+        else:
+            target_sheet = shared_with.sheet_file
+            symbol_sources = shared_with.symbol_sources
 
-        schematic_source = loads(source_sheet.read_text(encoding="utf-8"))
-        source_symbols = [
-            node for node in schematic_source
-            if isinstance(node, list) and node and node[0] == Symbol("symbol")
-        ]
         units_by_reference: dict[str, set[int]] = {}
-        for source_node in source_symbols:
-            original_ref = self._get_symbol_reference(source_node)
+        for _, original_ref, unit in symbol_sources:
             if not original_ref:
                 continue
-            units_by_reference.setdefault(original_ref, set()).add(
-                self._get_symbol_unit(source_node))
+            units_by_reference.setdefault(original_ref, set()).add(unit)
         multi_unit_refs = {
             ref for ref, units in units_by_reference.items() if len(units) > 1
         }
-        schematic_data, schematic_uuid_map = self._clone_with_new_uuids(
-            schematic_source)
-        cloned_symbols = [
-            node for node in schematic_data
-            if isinstance(node, list) and node and node[0] == Symbol("symbol")
-        ]
 
         instance_ref_map: dict[str, str] = {}
         symbol_reference_map: dict[str, str] = {}
-        for source_node, cloned_node in zip(source_symbols, cloned_symbols):
-            node = cloned_node
-            original_ref = self._get_symbol_reference(node)
+        symbol_refs: list[str | None] = [None] * len(symbol_sources)
+        for i, (source_symbol_uuid, original_ref, _) in enumerate(symbol_sources):
             if not original_ref:
                 continue
 
@@ -1182,18 +1334,16 @@ class KiCadAPI:
                 new_ref = self._allocate_reference(original_ref, ref_counters)
                 instance_ref_map.setdefault(original_ref, new_ref)
 
-            # Update the schematic symbol itself and remember the UUID -> ref link
-            # so the PCB can rename the matching footprint later.
-            ref_property = self._get_property_node(node, "Reference")
-            if ref_property is not None:
-                ref_property[2] = new_ref
+            # The schematic symbol itself is updated when cloning (only in the
+            # instance owning the clone); remember the UUID -> ref link so
+            # the PCB can rename the matching footprint later.
+            symbol_refs[i] = new_ref
 
-            source_symbol_uuid = self._get_symbol_uuid(source_node)
             if source_symbol_uuid:
                 symbol_reference_map[source_symbol_uuid] = new_ref
 
         pcb_file = Path(template.pcb_file) if template.pcb_file is not None else None
-        return InstantiatedSubsystem(
+        instance = InstantiatedSubsystem(
             dev_name=template.dev_name,
             sheet_name=sheet_name,
             sheet_file=target_sheet,
@@ -1202,46 +1352,101 @@ class KiCadAPI:
             size_wh=list(template.size_wh),
             properties=deepcopy(template.properties),
             pins=deepcopy(template.pins),
-            schematic_data=schematic_data,
             reference_map=instance_ref_map,
-            schematic_uuid_map=schematic_uuid_map,
             symbol_reference_map=symbol_reference_map,
+            symbol_sources=symbol_sources,
+            source_sheet=source_sheet,
+            symbol_refs=symbol_refs,
+            clone_owner=shared_with,
         )
+        return instance
+
+    def _clone_instance_sheet(self, instance: InstantiatedSubsystem, schematic_source: Sexp) -> None:
+        schematic_data, schematic_uuid_map = self._clone_with_new_uuids(
+            schematic_source, scope=("sch", instance.sheet_file.name))
+        cloned_symbols = [
+            node for node in schematic_data
+            if isinstance(node, list) and node and node[0] == Symbol("symbol")
+        ]
+        for node, new_ref in zip(cloned_symbols, instance.symbol_refs):
+            if new_ref is None:
+                continue
+            ref_property = self._get_property_node(node, "Reference")
+            if ref_property is not None:
+                ref_property[2] = new_ref
+
+        instance.schematic_data = schematic_data
+        instance.schematic_uuid_map = schematic_uuid_map
+
+    def _ensure_cloned(self, instance: InstantiatedSubsystem) -> InstantiatedSubsystem:
+        # Sheets are cloned here, the first time their content is needed.
+        owner = instance.clone_owner or instance
+        if not owner.schematic_data:
+            schematic_source = self._read_template(owner.source_sheet)
+            self._clone_instance_sheet(owner, schematic_source)
+        instance.schematic_data = owner.schematic_data
+        instance.schematic_uuid_map = owner.schematic_uuid_map
+        return instance
+
+    def _release_clone(self, instance: InstantiatedSubsystem) -> None:
+        # Once its sheet is written, an instance only keeps its UUID map
+        # (the PCB needs it), so memory doesn't grow with the instance count.
+        owner = instance.clone_owner or instance
+        owner.schematic_data = []
+        instance.schematic_data = []
+        instance.schematic_uuid_map = owner.schematic_uuid_map
+
+    def _schematic_uuid_map(self, instance: InstantiatedSubsystem) -> dict[str, str]:
+        # Template -> instance UUIDs of the sheet, cloning it (and releasing
+        # the clone) when it was not written in this build.
+        owner = instance.clone_owner or instance
+        if not owner.schematic_uuid_map:
+            self._ensure_cloned(owner)
+            self._release_clone(owner)
+        instance.schematic_uuid_map = owner.schematic_uuid_map
+        return instance.schematic_uuid_map
 
     def _instantiate_subsystems(
         self,
         project_path: Path,
         templates: list[HierarchicalObject],
+        shared_sheets: bool = False,
+        state: Optional[BuildState] = None,
     ) -> list[InstantiatedSubsystem]:
         # Repeated templates become independent instances with stable numbering.
         ref_counters: dict[str, int] = {}
         occurrences: dict[str, int] = {}
+        first_instances: dict[str, InstantiatedSubsystem] = {}
         instances = []
 
         for template in templates:
             key = str(Path(template.sheet_file))
             occurrences[key] = occurrences.get(key, 0) + 1
-            instances.append(
-                self._instantiate_subsystem(
-                    template=template,
-                    project_path=project_path,
-                    occurrence=occurrences[key],
-                    ref_counters=ref_counters,
-                )
+            instance = self._instantiate_subsystem(
+                template=template,
+                project_path=project_path,
+                occurrence=occurrences[key],
+                ref_counters=ref_counters,
+                shared_with=first_instances.get(key) if shared_sheets else None,
+                state=state,
             )
+            first_instances.setdefault(key, instance)
+            instances.append(instance)
 
         return instances
 
-    def _write_instantiated_schematic(
+    def _patch_instantiated_schematic(
         self,
-        instance: InstantiatedSubsystem,
+        placements: list[dict[str, Any]],
         project_name: str,
-        root_uuid: str,
-        sheet_uuid: str,
-    ) -> None:
-        # Persist the cloned child schematic after patching its instance path.
-        instance_path = f"/{root_uuid}/{sheet_uuid}"
-        schematic_data = deepcopy(instance.schematic_data)
+    ) -> Sexp:
+        # Return the cloned child schematic pointing to the instance path of
+        # every placed sheet using it (several with shared sheets). The clone
+        # is patched in place and handed over: the instance lets go of it.
+        first = self._ensure_cloned(placements[0]["object"])
+        schematic_data = first.schematic_data
+        self._release_clone(first)
+        source_uuids = {new: old for old, new in first.schematic_uuid_map.items()}
 
         for node in schematic_data:
             if not (isinstance(node, list) and node and node[0] == Symbol("symbol")):
@@ -1251,15 +1456,120 @@ class KiCadAPI:
             if not reference:
                 continue
 
+            source_uuid = source_uuids.get(self._get_symbol_uuid(node))
             self._set_symbol_instances(
                 symbol_node=node,
                 project_name=project_name,
-                instance_path=instance_path,
-                reference=reference,
+                instance_paths=[
+                    (
+                        f"/{placed['root_uuid']}{placed['sheet_path']}",
+                        placed["object"].symbol_reference_map.get(source_uuid, reference),
+                    )
+                    for placed in placements
+                ],
             )
 
-        with open(instance.sheet_file, "w", encoding="utf-8") as schematic_file:
-            schematic_file.write(_format_sexp_kicad(schematic_data))
+        return schematic_data
+
+    def _build_key(self, *parts: Any) -> str:
+        # Input digest of a generated file. The UUID drawn for a fixed key
+        # identifies the UUID mode: with random UUIDs no output is ever fresh.
+        return digest(self.uuids("build key"), *parts)
+
+    def _sheet_build_key(
+        self,
+        placements: list[dict[str, Any]],
+        project_name: str,
+        state: BuildState,
+    ) -> str:
+        first = placements[0]["object"]
+        owner = first.clone_owner or first
+        return self._build_key(
+            "sheet",
+            state.input_digest(owner.source_sheet),
+            first.sheet_file.name,
+            project_name,
+            owner.symbol_refs,
+            [
+                (f"/{placed['root_uuid']}{placed['sheet_path']}", placed["object"].symbol_reference_map)
+                for placed in placements
+            ],
+        )
+
+    def _write_instantiated_schematic(
+        self,
+        placements: list[dict[str, Any]],
+        project_name: str,
+        formatter: Optional[Executor] = None,
+        state: Optional[BuildState] = None,
+        sink: Optional[ProjectSink] = None,
+    ) -> None:
+        # Persist one child schematic file after patching its instance path(s).
+        sheet_file = placements[0]["object"].sheet_file
+        key = None
+        if state is not None:
+            key = self._sheet_build_key(placements, project_name, state)
+            if state.fresh(sheet_file, key):
+                return
+
+        schematic_data = self._patch_instantiated_schematic(placements, project_name)
+        # The embedded symbol cache only keeps what the sheet uses, the
+        # project library (see _write_symbol_library) has every definition.
+        prune_lib_symbols(schematic_data)
+
+        if formatter is not None:
+            text = formatter.submit(_format_sexp_kicad, schematic_data).result()
+        else:
+            text = _format_sexp_kicad(schematic_data)
+        if sink is not None:
+            sink.write_text(sheet_file, text)
+        else:
+            _atomic_write_text(sheet_file, text)
+        if state is not None:
+            state.record(sheet_file, key)
+
+    def _write_instantiated_schematics(
+        self,
+        placed_instances: list[dict[str, Any]],
+        project_name: str,
+        write_workers: int = 4,
+        format_processes: int = 0,
+        state: Optional[BuildState] = None,
+        sink: Optional[ProjectSink] = None,
+    ) -> None:
+        # Sheets are independent: patch, format and write them concurrently.
+        # Threads hide the I/O latency; formatting is CPU bound, so it can be
+        # offloaded to a process pool as well. The first failure cancels the
+        # remaining jobs and is re-raised as is.
+        by_sheet_file: dict[Path, list[dict[str, Any]]] = {}
+        for placed in placed_instances:
+            by_sheet_file.setdefault(placed["object"].sheet_file, []).append(placed)
+        if not by_sheet_file:
+            return
+
+        formatter = ProcessPoolExecutor(format_processes) if format_processes > 0 else None
+        writers = ThreadPoolExecutor(max(1, min(write_workers, len(by_sheet_file))))
+        try:
+            futures = [
+                writers.submit(
+                    self._write_instantiated_schematic,
+                    placements=placements,
+                    project_name=project_name,
+                    formatter=formatter,
+                    state=state,
+                    sink=sink,
+                )
+                for placements in by_sheet_file.values()
+            ]
+            for future in as_completed(futures):
+                future.result()
+        except BaseException:
+            writers.shutdown(wait=True, cancel_futures=True)
+            raise
+        finally:
+            writers.shutdown(wait=True)
+            if formatter is not None:
+                formatter.shutdown(wait=True, cancel_futures=True)
 
     def _replace_reference_in_net_name(
         self,
@@ -1311,14 +1621,17 @@ class KiCadAPI:
     def _prepare_instance_pcb(
         self,
         instance: InstantiatedSubsystem,
-        sheet_uuid: str,
+        sheet_path: str,
+        sheet_name_path: Optional[str] = None,
     ) -> Sexp:
         # Create a PCB clone that matches the already-annotated schematic copy.
         if instance.pcb_file is None:
             return []
+        schematic_uuid_map = self._schematic_uuid_map(instance)
 
-        pcb_source = loads(instance.pcb_file.read_text(encoding="utf-8"))
-        pcb_data, pcb_uuid_map = self._clone_with_new_uuids(pcb_source)
+        pcb_source = self._read_template(instance.pcb_file)
+        pcb_data, pcb_uuid_map = self._clone_with_new_uuids(
+            pcb_source, scope=("pcb", sheet_path))
         self._replace_group_member_uuids(pcb_data, pcb_uuid_map)
 
         footprint_reference_map: dict[str, str] = {}
@@ -1375,16 +1688,19 @@ class KiCadAPI:
                 if child[0] == Symbol("path") and len(child) > 1:
                     path_parts = [part for part in str(child[1]).split("/") if part]
                     symbol_uuid = path_parts[-1] if path_parts else ""
-                    child[1] = f"/{sheet_uuid}/{instance.schematic_uuid_map.get(symbol_uuid, symbol_uuid)}"
+                    child[1] = f"{sheet_path}/{schematic_uuid_map.get(symbol_uuid, symbol_uuid)}"
                 elif child[0] == Symbol("sheetname") and len(child) > 1:
-                    child[1] = f"/{instance.sheet_name}/"
+                    child[1] = sheet_name_path or f"/{instance.sheet_name}/"
                 elif child[0] == Symbol("sheetfile") and len(child) > 1:
                     child[1] = instance.sheet_file.name
 
         return pcb_data
 
-    def _next_project_net_id(self, pcb_data: list[Any]) -> int:
+    def _next_project_net_id(self, pcb_data: Union[list[Any], LazySexpDocument]) -> int:
         # Imported PCB chunks reuse net IDs, so each append needs a new range.
+        if isinstance(pcb_data, LazySexpDocument):
+            # Only the (net ...) declarations are parsed.
+            pcb_data = [pcb_data.parse(i) for i in pcb_data.indices("net")]
         max_net_id = 0
         for item in pcb_data:
             if (
@@ -1453,14 +1769,17 @@ class KiCadAPI:
         return None
 
     def group_pcb_items(self, pcb_data):
-        uuids = []
+        # uuid -> None: an ordered set, so members are dropped in O(1).
+        uuids: dict[str, None] = {}
         groups = []
 
         for item in pcb_data:
             if str(item[0]) == "group":
                 groups.append(item)
-            elif self.get_uuid(item) is not None:
-                uuids.append(self.get_uuid(item))
+            else:
+                uuid = self.get_uuid(item)
+                if uuid is not None:
+                    uuids[uuid] = None
 
         # HACK: Assume Groups have a consistent strcuture with in this order:
         # - "group" as Symbol
@@ -1469,16 +1788,15 @@ class KiCadAPI:
         # - members attribute
         for group in groups:
             for member in group[3][1:]:
-                # print(member)
-                if member in uuids:
-                    uuids.remove(member)
-            uuids.append(group[2][1])
+                uuids.pop(member, None)
+            uuids[group[2][1]] = None
+        uuids = list(uuids)
 
         if len(uuids) > 2:
             pcb_data.append([
                 Symbol('group'),
                 '',
-                [Symbol('uuid'), str(uuid.uuid4())],
+                [Symbol('uuid'), self.uuids("pcb group", *uuids)],
                 [Symbol('members'), *uuids],
             ])
 
@@ -1488,9 +1806,16 @@ class KiCadAPI:
     def is_num(self, x: Any) -> bool:
         return isinstance(x, (int, float))
 
-    def add_xy(self, node: List[Sexp], i_x: int, i_y: int, dx: float, dy: float) -> None:
-        node[i_x] = round(float(node[i_x]) + dx, 6)  # type: ignore[index]
-        node[i_y] = round(float(node[i_y]) + dy, 6)  # type: ignore[index]
+    def add_xy(self, node: List[Sexp], i_x: int, i_y: int, dx: float, dy: float,
+               journal: Optional[Journal] = None) -> None:
+        x = round(float(node[i_x]) + dx, 6)  # type: ignore[index]
+        y = round(float(node[i_y]) + dy, 6)  # type: ignore[index]
+        if journal is not None and journal.active:
+            journal.set(node, i_x, x)
+            journal.set(node, i_y, y)
+            return
+        node[i_x] = x
+        node[i_y] = y
 
     def extracts_boundaries(self, tree: Sexp) -> List:
         limits = [float('inf'), -float('inf'), float('inf'),
@@ -1544,12 +1869,16 @@ class KiCadAPI:
         # returns limits, sizes[x, y] and coordinates
         return limits, [limits[1]-limits[0], limits[3]-limits[2]]
 
-    def move_top_level_footprints(self, origin: Sexp, dx: float, dy: float) -> Sexp:
+    def move_top_level_footprints(self, origin: Sexp, dx: float, dy: float,
+                                  journal: Optional[Journal] = None, in_place: bool = False) -> Sexp:
+        # Returns a moved copy of `origin`. With a journal, or `in_place`,
+        # `origin` itself is moved (and returned); journaled moves are undone
+        # by rolling back.
 
         if not isinstance(origin, list):
             return
 
-        tree = deepcopy(origin)
+        tree = origin if in_place or journal is not None else _copy_sexp(origin)
 
         for node in tree:
 
@@ -1563,16 +1892,18 @@ class KiCadAPI:
                 if not isinstance(child, list) or not child:
                     continue
                 if self.sym(child[0]) == "at" and (len(child) >= 3 and self.is_num(child[1]) and self.is_num(child[2])):
-                    self.add_xy(child, 1, 2, dx, dy)
+                    self.add_xy(child, 1, 2, dx, dy, journal)
 
         return tree
 
-    def move_tracks_and_vias(self, tree: Sexp, dx: float, dy: float) -> None:
+    def move_tracks_and_vias(self, tree: Sexp, dx: float, dy: float,
+                             journal: Optional[Journal] = None) -> None:
         """
         Recursively walk the whole tree and move:
         - segment: start/end
         - arc: start/mid/end
         - via: at
+        Moves are recorded in `journal` when given.
         """
         if not isinstance(tree, list):
             return
@@ -1585,7 +1916,7 @@ class KiCadAPI:
                 if isinstance(child, list) and child:
                     h = self.sym(child[0])
                     if h in ("start", "end") and len(child) >= 3 and self.is_num(child[1]) and self.is_num(child[2]):
-                        self.add_xy(child, 1, 2, dx, dy)
+                        self.add_xy(child, 1, 2, dx, dy, journal)
 
         elif head == "arc":
             # Find (start x y), (mid x y), (end x y)
@@ -1593,56 +1924,86 @@ class KiCadAPI:
                 if isinstance(child, list) and child:
                     h = self.sym(child[0])
                     if h in ("start", "mid", "end") and len(child) >= 3 and self.is_num(child[1]) and self.is_num(child[2]):
-                        self.add_xy(child, 1, 2, dx, dy)
+                        self.add_xy(child, 1, 2, dx, dy, journal)
 
         elif head == "via":
             # Find (at x y [..])
             for child in tree[1:]:
                 if isinstance(child, list) and child and self.sym(child[0]) == "at":
                     if len(child) >= 3 and self.is_num(child[1]) and self.is_num(child[2]):
-                        self.add_xy(child, 1, 2, dx, dy)
+                        self.add_xy(child, 1, 2, dx, dy, journal)
                     break
 
         # Recurse
         for child in tree:
             if isinstance(child, list):
-                self.move_tracks_and_vias(child, dx, dy)
+                self.move_tracks_and_vias(child, dx, dy, journal)
 
-    def add_multiple_designs(self, project_path, design_instances: List[dict[str, Any]], space_x=9.5, space_y=5.5, max_x=285, max_y=198, cursor_x0=25, cursor_y0=25):
+    def add_multiple_designs(self, project_path, design_instances: Iterable[dict[str, Any]], space_x=9.5, space_y=5.5, max_x=285, max_y=198, cursor_x0=25, cursor_y0=25, state: Optional[BuildState] = None, sink: Optional[ProjectSink] = None):
         '''
         Takes prepared PCB instances, and, minding their limits, arranges them in the sheet.
         In a loop:
         1) Places a design and updates a cursor
         2) Moves the next design according to the cursor and stores the moved design into a variable
         3) Restarts the loop
+        With a build state, the board is generated again from the base board
+        (see _assemble_board), reusing what the previous build did.
+        The board is read from and written to `sink`, the project folder by default.
+        Each design is prepared, placed and merged in turn, then released.
         '''
-        cursor = [cursor_x0, cursor_y0]
+        if sink is None:
+            sink = DiskSink(project_path)
+        designs = [placed for placed in design_instances if placed["object"].pcb_file is not None]
 
-        line_height = 0
+        def new_placer():
+            return self._design_placer(space_x, space_y, max_x, max_y, cursor_x0, cursor_y0)
 
-        for placed in design_instances:
-            instance = placed["object"]
-            if instance.pcb_file is None:
-                continue
+        if state is not None:
+            self._assemble_board(sink, designs, new_placer, state)
+            return
 
-            # The PCB is prepared per instance first, then translated on the board.
-            tree = self._prepare_instance_pcb(instance, placed["sheet_uuid"])
-            if not tree:
-                continue
+        # The board is opened and written once, its net IDs scanned once:
+        # merging fragment by fragment (add_pcb) rewrites and rescans the
+        # whole board each time, quadratic in the number of designs.
+        project_pcb_path = f"{Path(project_path).name}.kicad_pcb"
+        place = new_placer()
+        with sink.open_document(project_pcb_path) as project_pcb:
+            net_id = self._next_project_net_id(project_pcb)
+            for placed in designs:
+                tree = self._prepare_instance_pcb(
+                    placed["object"], placed["sheet_path"], placed.get("sheet_name_path"))
+                if not tree:
+                    continue
+                dx, dy = place(self._fragment_geometry(tree), placed["object"].pcb_file)
+                placed["offset"] = [dx, dy]
+                # The prepared tree is ours: moved in place, without a copy.
+                moved_instance = self.move_top_level_footprints(tree, dx, dy, in_place=True)
+                self.move_tracks_and_vias(moved_instance, dx, dy)
+                items, net_id = self._pcb_fragment_items(moved_instance, net_id)
+                project_pcb.extend(items)
+            sink.write_chunks(project_pcb_path, project_pcb.chunks())
+
+    def _design_placer(self, space_x, space_y, max_x, max_y, cursor_x0, cursor_y0):
+        # Returns place(geometry, pcb_file) -> (dx, dy), placing designs one
+        # after the other from the limits and dimensions of each.
+        cursor = [cursor_x0, cursor_y0]
+        line_height = 0
 
-            abs_lim, dimensions = self.extracts_boundaries(tree)
+        def place(geometry: dict[str, Any], pcb_file: Path) -> tuple[float, float]:
+            nonlocal line_height
+            abs_lim, dimensions = geometry["limits"], geometry["dimensions"]
 
             center_coord = [(abs_lim[1]+abs_lim[0])/2,
                             (abs_lim[3]+abs_lim[2])/2]
 
             if dimensions[0] > max_x or dimensions[1] > max_y:
                 raise ValueError(
-                    f"Dimensions exceeded design limits in {instance.pcb_file}")
+                    f"Dimensions exceeded design limits in {pcb_file}")
 
             if dimensions[0] > max_x - cursor[0]:  # Moves the cursor down one line
                 if dimensions[1] > max_y - cursor[1]:
                     raise ValueError(
-                        f"Dimensions exceeded design limits in {instance.pcb_file}")
+                        f"Dimensions exceeded design limits in {pcb_file}")
                 cursor[1] += line_height + space_y
                 cursor[0] = cursor_x0
                 line_height = 0
@@ -1653,24 +2014,149 @@ class KiCadAPI:
 
             dx = cursor[0] - center_coord[0]
             dy = cursor[1] - center_coord[1]
-            moved_instance = self.move_top_level_footprints(
-                tree, dx, dy)
-            self.move_tracks_and_vias(moved_instance, dx, dy)
-            self.add_pcb(project_path=project_path, pcb_data=moved_instance)
 
             cursor[0] += dimensions[0] + space_x
+            return dx, dy
+
+        return place
+
+    def _fragment_geometry(self, pcb_data: Sexp) -> dict[str, Any]:
+        # What placing a fragment needs, recorded in the build state.
+        abs_lim, dimensions = self.extracts_boundaries(pcb_data)
+        return {"limits": abs_lim, "dimensions": dimensions,
+                "nets": self._count_fragment_nets(pcb_data)}
+
+    def _fragment_build_key(self, placed: dict[str, Any], state: BuildState) -> str:
+        # Everything _prepare_instance_pcb depends on.
+        instance = placed["object"]
+        owner = instance.clone_owner or instance
+        return self._build_key(
+            "pcb",
+            state.input_digest(instance.pcb_file),
+            state.input_digest(owner.source_sheet),
+            instance.sheet_file.name,
+            instance.sheet_name,
+            placed["sheet_path"],
+            placed.get("sheet_name_path"),
+            instance.reference_map,
+            instance.symbol_reference_map,
+        )
 
-    def add_pcb(
+    def _count_fragment_nets(self, pcb_data: Sexp) -> int:
+        # Net IDs a fragment takes on the board (see _remap_pcb_net_ids).
+        return len({
+            item[1] for item in pcb_data
+            if isinstance(item, list) and len(item) > 2 and item[0] == Symbol("net")
+            and isinstance(item[1], int) and item[1] != 0
+        })
+
+    def _assemble_board(
         self,
-        project_path: Path,
-        pcb_data: Sexp,
+        sink: ProjectSink,
+        designs: list[dict[str, Any]],
+        new_placer: Callable[[], Callable],
+        state: BuildState,
     ) -> None:
-        # Merge a prepared PCB fragment into the project while normalizing net IDs.
-        project_pcb_path = project_path / f"{project_path.name}.kicad_pcb"
-        project_pcb_data = loads(project_pcb_path.read_text(encoding="utf-8"))
+        # The board is the base board followed by each fragment, placed and
+        # given its net ID range. A fragment with the same inputs, offset and
+        # first net ID as in the previous build is copied from the previous
+        # board as bytes; the board isn't touched when all of them are.
+        # The board is streamed to the sink: fragments are prepared, written
+        # and dropped one at a time.
+        board_path = f"{sink.root.name}.kicad_pcb"
+        base = LazySexpDocument.from_bytes(base_pcb_text.encode("utf-8"), board_path)
+        first_net_id = self._next_project_net_id(base)
+        prepare_keys = [self._fragment_build_key(placed, state) for placed in designs]
+
+        def fragment_key(prepare_key: str, dx: float, dy: float, net_id: int) -> str:
+            return digest(prepare_key, round(dx, 6), round(dy, 6), net_id)
+
+        # Fragments all known to the build state are placed from their
+        # recorded geometry: the board may be up to date.
+        recorded = [state.previous_fragment(prepare_key) for prepare_key in prepare_keys]
+        if all(geometry is not None for geometry in recorded):
+            place = new_placer()
+            net_id = first_net_id
+            keys = []
+            for placed, prepare_key, geometry in zip(designs, prepare_keys, recorded):
+                dx, dy = place(geometry, placed["object"].pcb_file)
+                placed["offset"] = [dx, dy]
+                keys.append(fragment_key(prepare_key, dx, dy, net_id))
+                net_id += geometry["nets"]
+            if state.fresh(board_path, self._build_key("board", base_pcb_text, keys)):
+                for prepare_key, geometry in zip(prepare_keys, recorded):
+                    state.record_fragment(prepare_key, **geometry)
+                return
+
+        keys = []
+
+        def board_chunks(previous: Optional[LazySexpDocument]) -> Iterator[bytes]:
+            *prefix, suffix = base.chunks()
+            yield from prefix
+            place = new_placer()
+            net_id = first_net_id
+            item_count = len(base)
+            for placed, prepare_key in zip(designs, prepare_keys):
+                instance = placed["object"]
+                recorded = state.previous_fragment(prepare_key)
+                geometry = recorded
+                tree = None
+                if geometry is None:
+                    tree = self._prepare_instance_pcb(
+                        instance, placed["sheet_path"], placed.get("sheet_name_path"))
+                    if not tree:
+                        continue
+                    geometry = self._fragment_geometry(tree)
+
+                dx, dy = place(geometry, instance.pcb_file)
+                placed["offset"] = [dx, dy]
+                key = fragment_key(prepare_key, dx, dy, net_id)
+                keys.append(key)
+                first_item = item_count
+                if previous is not None and recorded is not None and recorded["key"] == key:
+                    start, end = recorded["items"]
+                    for i in range(start, end):
+                        yield b"\n\t" + previous.raw(i)
+                    item_count += end - start
+                else:
+                    if tree is None:
+                        tree = self._prepare_instance_pcb(
+                            instance, placed["sheet_path"], placed.get("sheet_name_path"))
+                    items = self._placed_fragment_items(tree, dx, dy, net_id)
+                    for item in items:
+                        yield b"\n\t" + _format_sexp_kicad(item, 1).encode("utf-8")
+                    item_count += len(items)
+                state.record_fragment(
+                    prepare_key,
+                    key=key,
+                    limits=geometry["limits"],
+                    dimensions=geometry["dimensions"],
+                    nets=geometry["nets"],
+                    items=[first_item, item_count],
+                )
+                net_id += geometry["nets"]
+            yield suffix
 
-        pcb_data, _ = self._remap_pcb_net_ids(
-            pcb_data, self._next_project_net_id(project_pcb_data))
+        # The previous board stays open: replacing the file keeps its bytes.
+        previous = sink.open_document(board_path) if state.unchanged(board_path) else None
+        try:
+            sink.write_chunks(board_path, board_chunks(previous))
+        finally:
+            if previous is not None:
+                previous.close()
+        state.record(board_path, self._build_key("board", base_pcb_text, keys))
+
+    def _placed_fragment_items(self, tree: Sexp, dx: float, dy: float, net_id: int) -> list[Sexp]:
+        # Board items of a prepared fragment moved by (dx, dy), its nets
+        # numbered from net_id. The prepared tree is ours: moved in place.
+        moved_instance = self.move_top_level_footprints(tree, dx, dy, in_place=True)
+        self.move_tracks_and_vias(moved_instance, dx, dy)
+        items, _ = self._pcb_fragment_items(moved_instance, net_id)
+        return items
+
+    def _pcb_fragment_items(self, pcb_data: Sexp, start_net_id: int) -> tuple[list[Sexp], int]:
+        # Board items of a prepared fragment, its nets numbered from start_net_id.
+        pcb_data, next_net_id = self._remap_pcb_net_ids(pcb_data, start_net_id)
 
         useful_symbols = ["net", "footprint", "segment", "arc", "via", "group"]
         useful_pcb_data = [
@@ -1683,34 +2169,129 @@ class KiCadAPI:
             )
         ]
         self.group_pcb_items(useful_pcb_data)
+        return useful_pcb_data, next_net_id
 
-        project_pcb_data += useful_pcb_data
-
-        with open(project_pcb_path, "w", encoding="utf-8") as pcb_file:
-            pcb_file.write(_format_sexp_kicad(project_pcb_data))
+    def add_pcb(
+        self,
+        project_path: Path,
+        pcb_data: Sexp,
+        sink: Optional[ProjectSink] = None,
+    ) -> None:
+        # Merge a prepared PCB fragment into the project while normalizing net IDs.
+        # The project board is only indexed: its items are copied as bytes.
+        if sink is None:
+            sink = DiskSink(project_path)
+        project_pcb_path = f"{Path(project_path).name}.kicad_pcb"
+        with sink.open_document(project_pcb_path) as project_pcb:
+            useful_pcb_data, _ = self._pcb_fragment_items(
+                pcb_data, self._next_project_net_id(project_pcb))
+            project_pcb.extend(useful_pcb_data)
+            sink.write_chunks(project_pcb_path, project_pcb.chunks())
 
     def project_creation(
         self,
         project_name: str,
         template_list: list[HierarchicalObject],
+        write_workers: int = 4,
+        format_processes: int = 0,
+        shared_sheets: bool = False,
+        deterministic: bool = False,
+        sink: Optional[ProjectSink] = None,
+        regenerate: bool = False,
     ) -> KiCadSchematic:
-        # Project setup
-        project_builder(project_name)
+        # deterministic: UUIDs derived from the project name and where each
+        # item comes from, so regenerating the project gives identical files.
+        # regenerate: a project generated before (it has a build state) is
+        # generated again in place, instead of FileExistsError. Files edited
+        # since they were generated are neither overwritten nor deleted:
+        # ModifiedOutputsError lists them, before anything is written.
+        # sink: where the project files go, by default the project folder
+        # (a MemorySink keeps them in memory, see generate_project_files).
+        # The deterministic factory only serves this project: the API's own
+        # factory is back in place afterwards, whatever happens. Random UUIDs
+        # are recorded as they are given, for sync (see provenance).
+        saved_uuids = self.uuids
+        if deterministic:
+            self.uuids = DeterministicUuidFactory(project_name)
+        elif not self.uuids.deterministic:
+            self.uuids = RecordedUuidFactory(self.uuids)
+        try:
+            return self._create_project(
+                project_name, template_list, write_workers, format_processes,
+                shared_sheets, sink, regenerate)
+        finally:
+            self.uuids = saved_uuids
 
-        project_path = PROJECT_FOLDER / project_name
+    def _create_project(
+        self,
+        project_name: str,
+        template_list: list[HierarchicalObject],
+        write_workers: int,
+        format_processes: int,
+        shared_sheets: bool,
+        sink: Optional[ProjectSink],
+        regenerate: bool,
+    ) -> KiCadSchematic:
+        # Each template file is parsed once, whatever its number of instances
+        # (clones are made when writing and released right after).
+        if self.sources is None:
+            self.sources = ParsedFileCache()
+
+        # When regenerating, only outputs whose inputs changed are rebuilt,
+        # which needs deterministic UUIDs (see BuildState).
+        if sink is None:
+            sink = DiskSink(PROJECT_FOLDER / project_name)
+        project_path = sink.root
+        regenerate = regenerate and BuildState.exists(sink)
+        state = BuildState(sink, enabled=self.uuids.deterministic)
+        if regenerate:
+            modified = state.modified_outputs()
+            if modified:
+                raise ModifiedOutputsError(modified)
+
+        # Project setup
+        root_uuid = self.uuids("root")
+        # (the root sheet and the board are written once, when generated:
+        # archive sinks can't rewrite them)
+        project_builder(project_name, root_uuid=root_uuid, exist_ok=regenerate, sink=sink,
+                        skip=(f"{project_name}.kicad_sch", f"{project_name}.kicad_pcb"))
 
-        # dependencies
-        copy(PROJECT_FOLDER/'src'/'lib-table_templates' /
-             'fp-lib-table', project_path / 'fp-lib-table')
-        copy(PROJECT_FOLDER/'src'/'lib-table_templates' /
-             'sym-lib-table', project_path / 'sym-lib-table')
-        self.schematic = KiCadSchematic(
-            f'{PROJECT_FOLDER}/{project_name}/{project_name}.kicad_sch')
+        # The root sheet always starts from the base one, even when regenerating.
+        self.schematic = KiCadSchematic(uuids=self.uuids)
+        self.schematic.data = parse_sexp(base_sch_text(root_uuid))
 
         # Instantiate every requested template first so schematic and PCB
-        # generation share the same annotation and UUID mapping.
+        # generation share the same annotation and UUID mapping. Only the
+        # instances' metadata (references, placement) is held for the whole
+        # project: sheets are cloned when written and released right after
+        # (see _ensure_cloned), at most one per write worker at a time.
+        # With shared_sheets, repeated templates use a single child sheet file
+        # placed several times (KiCad multi-instance sheets) instead of copies.
         instantiated_templates = self._instantiate_subsystems(
-            project_path, template_list)
+            project_path, template_list, shared_sheets=shared_sheets, state=state)
+
+        # dependencies (left untouched when regenerating an up to date project):
+        # the libraries and 3D models of the templates (see assets), the
+        # project symbol library, and the tables listing them.
+        assets = collect_assets(
+            (owner.source_sheet.parent, (owner.source_sheet, owner.pcb_file))
+            for owner in (instance.clone_owner or instance for instance in instantiated_templates)
+        )
+        materialize_assets(assets, sink)
+        for warning in assets.warnings:
+            print(f"Warning: {warning}")
+        lib_entries = {
+            'fp-lib-table': assets.footprint_libraries,
+            'sym-lib-table': list(assets.symbol_libraries),
+        }
+        symbol_library = self._write_symbol_library(sink, project_name, instantiated_templates, state)
+        if symbol_library is not None:
+            lib_entries['sym-lib-table'].append(LibTableEntry(
+                project_name, f"${{KIPRJMOD}}/{symbol_library}", "Symbols of the project's sheets"))
+        for lib_table, entries in lib_entries.items():
+            sink.write_text(lib_table, with_entries(
+                (PROJECT_FOLDER/'src'/'lib-table_templates'/lib_table).read_text(encoding="utf-8"), entries))
+            state.record(lib_table, None)
 
         placed_instances = self.schematic.add_hierarchical_sheets(
             project_path,
@@ -1722,42 +2303,161 @@ class KiCadAPI:
             page_for_instance_start=10   # evita conflito com páginas anteriores
         )
 
-        for placed in placed_instances:
-            self._write_instantiated_schematic(
-                instance=placed["object"],
-                project_name=project_name,
-                root_uuid=placed["root_uuid"],
-                sheet_uuid=placed["sheet_uuid"],
-            )
+        self._write_instantiated_schematics(
+            placed_instances,
+            project_name,
+            write_workers=write_workers,
+            format_processes=format_processes,
+            state=state,
+            sink=sink,
+        )
 
         pcb_instances = [
             placed for placed in placed_instances
             if placed["object"].pcb_file is not None
         ]
-        if pcb_instances:
-            self.add_multiple_designs(project_path, pcb_instances)
-
-        self.schematic.export_schematic(
-            f'{PROJECT_FOLDER}/{project_name}/{project_name}.kicad_sch')
+        self.add_multiple_designs(project_path, pcb_instances, state=state, sink=sink)
+
+        # Root and grouping sheets are cheap to generate: they are always
+        # rebuilt, and only written if they changed.
+        root_sheet = project_path / f"{project_name}.kicad_sch"
+        sink.write_text(root_sheet, _format_sexp_kicad(self.schematic.data))
+        self.schematic.export_grouping_sheets(sink)
+        for sheet_file in (root_sheet, *self.schematic.grouping_sheets):
+            state.record(sheet_file, None)
+
+        # Files generated last time for templates no longer in the project.
+        for file_name in state.stale_outputs():
+            sink.delete(file_name)
+        state.save()
+        self._record_provenance(sink, project_name, root_uuid, placed_instances, state)
 
         return self.schematic
 
+    def _write_symbol_library(
+        self,
+        sink: ProjectSink,
+        project_name: str,
+        instances: list[InstantiatedSubsystem],
+        state: BuildState,
+    ) -> Optional[str]:
+        # <project>.kicad_sym: each distinct symbol definition of the
+        # template sheets once (see symbol_library). Returns its name, None
+        # without symbols.
+        library_file = f"{project_name}.kicad_sym"
+        sources = list(dict.fromkeys((instance.clone_owner or instance).source_sheet for instance in instances))
+        key = self._build_key("symbols", [state.input_digest(source) for source in sources])
+        if state.fresh(library_file, key):
+            return library_file
+
+        library = ProjectSymbolLibrary()
+        for source in sources:
+            library.add_schematic(self._read_template(source))
+        if not len(library):
+            return None
+        sink.write_text(library_file, _format_sexp_kicad(library.data()))
+        state.record(library_file, key)
+        return library_file
+
+    def _instance_record(self, placed: dict[str, Any], provenance: Provenance,
+                         state: BuildState) -> dict[str, Any]:
+        # What generating this instance depended on (see provenance).
+        instance = placed["object"]
+        owner = instance.clone_owner or instance
+        pcb_file = instance.pcb_file
+        return {
+            "template": instance.dev_name,
+            "sheet_file": instance.sheet_file.name,
+            "sheet_name": instance.sheet_name,
+            "sheet_path": placed["sheet_path"],
+            "sheet_name_path": placed.get("sheet_name_path"),
+            "sheet": provenance.add_snapshot(owner.source_sheet, state.input_digest(owner.source_sheet)),
+            "pcb": None if pcb_file is None else provenance.add_snapshot(pcb_file, state.input_digest(pcb_file)),
+            "symbol_refs": instance.symbol_refs,
+            "reference_map": instance.reference_map,
+            "symbol_reference_map": instance.symbol_reference_map,
+            "offset": placed.get("offset"),
+        }
+
+    def _record_provenance(
+        self,
+        sink: ProjectSink,
+        project_name: str,
+        root_uuid: str,
+        placed_instances: list[dict[str, Any]],
+        state: BuildState,
+    ) -> None:
+        # Where every instance comes from, for `sync` (see template_sync).
+        provenance = Provenance(project_name, root_uuid, self.uuids.deterministic)
+        if isinstance(self.uuids, RecordedUuidFactory):
+            provenance.uuids = self.uuids.recorded
+        provenance.instances = [
+            self._instance_record(placed, provenance, state) for placed in placed_instances
+        ]
+        provenance.save(sink)
+
+    def generate_project_files(
+        self,
+        project_name: str,
+        template_list: list[HierarchicalObject],
+        previous: Optional[dict[str, bytes]] = None,
+        **options: Any,
+    ) -> dict[str, bytes]:
+        """Generates the project in memory: relative path -> file contents.
+
+        Nothing is written to disk. Passing the files returned for the same
+        project before (as `previous`) regenerates it incrementally, the way
+        project_creation does for a project folder. `options` are those of
+        project_creation.
+        """
+        sink = MemorySink(project_name, previous)
+        self.project_creation(project_name, template_list, sink=sink,
+                              regenerate=previous is not None, **options)
+        return sink.files
+
+    def update_pcb_from_schematic(
+        self,
+        project_name: str,
+        remove_orphans: bool = False,
+        project_path: Optional[Path] = None,
+    ) -> SyncReport:
+        # Root sheet symbols (e.g. added with add_component) -> board footprints.
+        # project_path: the project folder, by default PROJECT_FOLDER/project_name.
+        project_path = Path(project_path) if project_path is not None else PROJECT_FOLDER / project_name
+        schematic_path = project_path / f"{project_name}.kicad_sch"
+        pcb_path = project_path / f"{project_name}.kicad_pcb"
+
+        self.schematic = KiCadSchematic(str(schematic_path), uuids=self.uuids)
+        pcb = KiCadPCB(str(pcb_path), uuids=self.uuids)
+        if self.pcb is not None:
+            # Keep the footprint libraries loaded on the previous board.
+            pcb.footprint_libraries = self.pcb.footprint_libraries
+        self.pcb = pcb
+
+        # A failing sync leaves the loaded board as it was.
+        with self.pcb.transaction():
+            report = self.pcb.update_from_schematic(
+                self.schematic, schematic_path.name, remove_orphans=remove_orphans)
+        if report.added or report.updated or report.replaced or report.removed:
+            _atomic_write_text(pcb_path, _format_sexp_kicad(self.pcb.data))
+        return report
+
     def load_schematic(self, file_path: str) -> KiCadSchematic:
         """Charge un fichier schématique."""
-        self.schematic = KiCadSchematic(file_path)
+        self.schematic = KiCadSchematic(file_path, uuids=self.uuids)
         return self.schematic
 
     def load_pcb(self, file_path: str) -> KiCadPCB:
         """Charge un fichier PCB."""
-        self.pcb = KiCadPCB(file_path)
+        self.pcb = KiCadPCB(file_path, uuids=self.uuids)
         return self.pcb
 
     def create_schematic(self) -> KiCadSchematic:
         """Crée un nouveau schématique vide."""
-        self.schematic = KiCadSchematic()
+        self.schematic = KiCadSchematic(uuids=self.uuids)
         return self.schematic
 
     def create_pcb(self) -> KiCadPCB:
         """Crée un nouveau PCB vide."""
-        self.pcb = KiCadPCB()
+        self.pcb = KiCadPCB(uuids=self.uuids)
         return self.pcb
@@ -0,0 +1,224 @@
+"""
+Lazy view of a KiCad S-expression file.
+
+The file is memory-mapped and only the byte spans of its top-level items
+are located (one scan, see sexp_source). Items are parsed when accessed,
+and writing the document back copies the bytes of every item that was
+never handed out for editing.
+"""
+
+import mmap
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from sexpdata import Symbol
+
+from schematic_api.sexp_source import (
+    item_head,
+    item_name,
+    item_property,
+    top_level_spans,
+)
+from schematic_api.sinks import atomic_write
+from schematic_api.span_sexp import parse_sexp
+
+
+class LazySexpDocument:
+    """Top-level items of a .kicad_pcb (or any KiCad file), parsed on demand.
+
+    `doc[i]` returns the parsed item for editing: it is written back through
+    the formatter, which still copies its unchanged subtrees verbatim.
+    `doc.parse(i)` returns a throwaway parse for read-only use, and
+    `doc.raw(i)` the original bytes.
+    """
+
+    def __init__(self, file_path: str | Path):
+        self.path = Path(file_path)
+        self._file = open(self.path, "rb")
+        try:
+            self._buf = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except BaseException:
+            self._file.close()
+            raise
+        self._index()
+
+    @classmethod
+    def from_bytes(
+        cls, data: bytes, path: str | Path | None = None
+    ) -> "LazySexpDocument":
+        """A document over bytes already in memory (see sinks.MemorySink)."""
+        document = cls.__new__(cls)
+        document.path = Path(path) if path is not None else None
+        document._file = None
+        document._buf = data
+        document._index()
+        return document
+
+    def _index(self) -> None:
+        # Imported here: kicad_api imports this module.
+        from schematic_api.kicad_api import _format_sexp_kicad
+
+        self._format = _format_sexp_kicad
+
+        root_start = self._buf.find(b"(")
+        self.root_head = item_head(self._buf, root_start)
+        spans = top_level_spans(self._buf)
+
+        self._heads: list[str] = [head for head, _, _ in spans]
+        # Original (start, end) of each item, None for items created since.
+        self._spans: list[Optional[tuple[int, int]]] = [
+            (start, end) for _, start, end in spans
+        ]
+        # Buffer holding each span: this file's, or another document's for
+        # items copied with extend_raw.
+        self._bufs: list[Any] = [self._buf] * len(spans)
+        # Where the whitespace preceding each original item starts.
+        self._leading: list[Optional[int]] = [
+            self._whitespace_before(start) for _, start, _ in spans
+        ]
+        self._nodes: list[Any] = [None] * len(spans)
+
+        self._suffix = self._whitespace_before(self._buf.rfind(b")"))
+        self._prefix_end = self._leading[0] if spans else self._suffix
+
+    def _whitespace_before(self, pos: int) -> int:
+        while pos > 0 and self._buf[pos - 1 : pos] in (b" ", b"\t", b"\n", b"\r"):
+            pos -= 1
+        return pos
+
+    # ---- lifecycle ----
+
+    def close(self) -> None:
+        if self._file is not None and not self._buf.closed:
+            self._buf.close()
+            self._file.close()
+
+    def __enter__(self) -> "LazySexpDocument":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # ---- access ----
+
+    def __len__(self) -> int:
+        return len(self._heads)
+
+    def head(self, i: int) -> str:
+        return self._heads[i]
+
+    @property
+    def heads(self) -> list[str]:
+        return list(self._heads)
+
+    def indices(self, *heads: str) -> list[int]:
+        wanted = set(heads)
+        return [i for i, head in enumerate(self._heads) if head in wanted]
+
+    def raw(self, i: int) -> bytes:
+        if self._nodes[i] is not None or self._spans[i] is None:
+            return self._format(self._nodes[i], 1).encode("utf-8")
+        start, end = self._spans[i]
+        return self._bufs[i][start:end]
+
+    def parse(self, i: int) -> Any:
+        if self._nodes[i] is not None:
+            return self._nodes[i]
+        return parse_sexp(self.raw(i).decode("utf-8"), depth=1)
+
+    def __getitem__(self, i: int) -> Any:
+        if self._nodes[i] is None:
+            self._nodes[i] = self.parse(i)
+        return self._nodes[i]
+
+    def name(self, i: int) -> Optional[str]:
+        # (footprint "Lib:Name" ...), (net 3 "GND")... without parsing.
+        span = self._spans[i]
+        if self._nodes[i] is not None or span is None:
+            node = self._nodes[i]
+            return str(node[1]).strip('"') if len(node) > 1 else None
+        return item_name(self._bufs[i], span[0])
+
+    def property(self, i: int, name: str) -> Optional[str]:
+        span = self._spans[i]
+        if self._nodes[i] is not None or span is None:
+            for child in self._nodes[i][1:]:
+                if (
+                    isinstance(child, list)
+                    and len(child) > 2
+                    and str(child[0]) == "property"
+                    and str(child[1]).strip('"') == name
+                ):
+                    return str(child[2]).strip('"')
+            return None
+        return item_property(self._bufs[i], name, span[0], span[1])
+
+    # ---- edition ----
+
+    def __setitem__(self, i: int, node: list) -> None:
+        self._nodes[i] = node
+        self._heads[i] = str(node[0])
+
+    def __delitem__(self, i: int) -> None:
+        del (
+            self._heads[i],
+            self._spans[i],
+            self._bufs[i],
+            self._leading[i],
+            self._nodes[i],
+        )
+
+    def insert(self, i: int, node: list) -> None:
+        self._heads.insert(i, str(node[0]))
+        self._spans.insert(i, None)
+        self._bufs.insert(i, None)
+        self._leading.insert(i, None)
+        self._nodes.insert(i, node)
+
+    def append(self, node: list) -> None:
+        self.insert(len(self), node)
+
+    def extend(self, nodes) -> None:
+        for node in nodes:
+            self.append(node)
+
+    def extend_raw(self, other: "LazySexpDocument", indices) -> None:
+        """Appends items of `other` as they are, without parsing them.
+
+        Their bytes are read from `other` when writing: it must stay open
+        until then.
+        """
+        for i in indices:
+            if other._nodes[i] is not None or other._spans[i] is None:
+                self.append(other._nodes[i])
+                continue
+            self._heads.append(other._heads[i])
+            self._spans.append(other._spans[i])
+            self._bufs.append(other._bufs[i])
+            self._leading.append(None)
+            self._nodes.append(None)
+
+    def materialize(self) -> list:
+        """The whole document as a regular nested list."""
+        return [Symbol(self.root_head), *(self[i] for i in range(len(self)))]
+
+    # ---- output ----
+
+    def chunks(self) -> Iterator[bytes]:
+        # Untouched items keep their bytes and the whitespace before them.
+        yield self._buf[: self._prefix_end]
+        for i in range(len(self)):
+            span = self._spans[i]
+            if (
+                span is not None
+                and self._nodes[i] is None
+                and self._leading[i] is not None
+            ):
+                yield self._buf[self._leading[i] : span[1]]
+            else:
+                yield b"\n\t" + self.raw(i)
+        yield self._buf[self._suffix :]
+
+    def write(self, output_path: str | Path) -> None:
+        """Writes atomically, so the mapped file itself can be the target."""
+        atomic_write(output_path, self.chunks())
@@ -0,0 +1,81 @@
+"""
+Library tables (fp-lib-table, sym-lib-table) of generated projects.
+
+Projects start from the tables of src/lib-table_templates, to which the
+libraries generation brings along are added (see symbol_library, assets).
+"""
+
+from typing import Iterable, NamedTuple
+
+from sexpdata import Symbol
+
+from schematic_api.span_sexp import parse_sexp
+
+
+class LibTableEntry(NamedTuple):
+    name: str
+    uri: str
+    descr: str = ""
+    type: str = "KiCad"
+    options: str = ""
+
+
+def _quote(text: str) -> str:
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _field(lib: list, head: str) -> str:
+    head = Symbol(head)
+    for child in lib[1:]:
+        if isinstance(child, list) and len(child) > 1 and child[0] == head:
+            return str(child[1])
+    return ""
+
+
+def read_table(table_text: str) -> tuple[str, list[LibTableEntry]]:
+    """(table kind, e.g. "sym_lib_table", entries) of a table."""
+    table = parse_sexp(table_text)
+    entries = [
+        LibTableEntry(
+            _field(lib, "name"),
+            _field(lib, "uri"),
+            _field(lib, "descr"),
+            _field(lib, "type") or "KiCad",
+            _field(lib, "options"),
+        )
+        for lib in table[1:]
+        if isinstance(lib, list) and lib and lib[0] == Symbol("lib")
+    ]
+    return str(table[0]), entries
+
+
+def format_table(kind: str, entries: Iterable[LibTableEntry]) -> str:
+    """A table in the layout of the template tables."""
+    lines = [f"({kind}\n"]
+    for entry in entries:
+        lines.append(
+            f" (lib(name {_quote(entry.name)})\n"
+            f"  (type {_quote(entry.type)})\n"
+            f"  (uri {_quote(entry.uri)})\n"
+            f"  (options {_quote(entry.options)})\n"
+            f"  (descr {_quote(entry.descr)}))\n"
+        )
+    lines.append(" )\n")
+    return "".join(lines)
+
+
+def with_entries(table_text: str, entries: Iterable[LibTableEntry]) -> str:
+    """
+    The table with `entries` added. An entry replaces the table's library
+    of the same nickname, in place (KiCad refuses duplicate nicknames, and
+    the libraries generation brings along take precedence). The table is
+    returned as is when there is nothing to add.
+    """
+    entries = list(entries)
+    if not entries:
+        return table_text
+    kind, libs = read_table(table_text)
+    merged = {lib.name: lib for lib in libs}
+    for entry in entries:
+        merged[entry.name] = entry
+    return format_table(kind, merged.values())
@@ -0,0 +1,308 @@
+"""
+Persistent index of the symbols and footprints available to KiCad.
+
+Every symbol of a .kicad_sym file and every .kicad_mod of a .pretty folder
+is recorded in a SQLite database with the byte span of its definition, so
+a lookup reads a single slice of a single file instead of parsing whole
+libraries. Files are re-indexed lazily whenever their mtime or size change.
+"""
+
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+
+from schematic_api.cache import cache_dir
+from schematic_api.sexp_source import item_name, top_level_spans
+
+SYMBOL_DIR_VARIABLES = ("KICAD9_SYMBOL_DIR", "KICAD8_SYMBOL_DIR", "KICAD7_SYMBOL_DIR")
+FOOTPRINT_DIR_VARIABLES = (
+    "KICAD9_FOOTPRINT_DIR",
+    "KICAD8_FOOTPRINT_DIR",
+    "KICAD7_FOOTPRINT_DIR",
+)
+DEFAULT_SYMBOL_DIR = "/usr/share/kicad/symbols"
+DEFAULT_FOOTPRINT_DIR = "/usr/share/kicad/footprints"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS symbols (
+    library TEXT NOT NULL,
+    name TEXT NOT NULL,
+    file TEXT NOT NULL,
+    start INTEGER NOT NULL,
+    end INTEGER NOT NULL,
+    pin_count INTEGER NOT NULL,
+    extends TEXT
+);
+CREATE INDEX IF NOT EXISTS symbols_by_name ON symbols (library, name);
+CREATE INDEX IF NOT EXISTS symbols_by_file ON symbols (file, name);
+CREATE TABLE IF NOT EXISTS footprints (
+    library TEXT NOT NULL,
+    name TEXT NOT NULL,
+    file TEXT NOT NULL,
+    start INTEGER NOT NULL,
+    end INTEGER NOT NULL,
+    pad_count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS footprints_by_name ON footprints (library, name);
+CREATE INDEX IF NOT EXISTS footprints_by_file ON footprints (file);
+"""
+
+
+def _default_dirs(variables: tuple[str, ...], default: str) -> list[Path]:
+    for variable in variables:
+        if os.environ.get(variable):
+            return [Path(os.environ[variable])]
+    return [Path(default)]
+
+
+@dataclass(frozen=True)
+class LibraryEntry:
+    library: str
+    name: str
+    file: Path
+    start: int
+    end: int
+    # pin count for symbols, pad count for footprints
+    count: int
+
+    def read(self) -> str:
+        with open(self.file, "rb") as f:
+            f.seek(self.start)
+            return f.read(self.end - self.start).decode("utf-8")
+
+
+class LibraryIndex:
+    """Name -> (file, byte span) index over symbol and footprint libraries."""
+
+    def __init__(
+        self,
+        db_path: Path | None = None,
+        symbol_dirs: list[Path] | None = None,
+        footprint_dirs: list[Path] | None = None,
+    ):
+        self.db_path = (
+            Path(db_path) if db_path else cache_dir() / "library_index.sqlite3"
+        )
+        self.symbol_dirs = (
+            symbol_dirs
+            if symbol_dirs is not None
+            else _default_dirs(SYMBOL_DIR_VARIABLES, DEFAULT_SYMBOL_DIR)
+        )
+        self.footprint_dirs = (
+            footprint_dirs
+            if footprint_dirs is not None
+            else _default_dirs(FOOTPRINT_DIR_VARIABLES, DEFAULT_FOOTPRINT_DIR)
+        )
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self._db.close()
+
+    # ---- indexing ----
+
+    def _is_fresh(self, path: str, stat: os.stat_result) -> bool:
+        row = self._db.execute(
+            "SELECT mtime_ns, size FROM files WHERE path = ?", (path,)
+        ).fetchone()
+        return row is not None and row[0] == stat.st_mtime_ns and row[1] == stat.st_size
+
+    def _forget(self, path: str) -> None:
+        self._db.execute("DELETE FROM files WHERE path = ?", (path,))
+        self._db.execute("DELETE FROM symbols WHERE file = ?", (path,))
+        self._db.execute("DELETE FROM footprints WHERE file = ?", (path,))
+
+    def _index_symbol_file(self, path: str, buf: bytes) -> None:
+        library = Path(path).stem
+        rows = []
+        for head, start, end in top_level_spans(buf):
+            if head != "symbol":
+                continue
+            name = item_name(buf, start)
+            if name is None:
+                continue
+            extends_at = buf.find(b"(extends ", start, end)
+            extends = item_name(buf, extends_at) if extends_at != -1 else None
+            rows.append(
+                (
+                    library,
+                    name,
+                    path,
+                    start,
+                    end,
+                    buf.count(b"(pin ", start, end),
+                    extends,
+                )
+            )
+        self._db.executemany("INSERT INTO symbols VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def _index_footprint_file(self, path: str, buf: bytes) -> None:
+        # A .kicad_mod holds a single footprint spanning the whole file.
+        library = Path(path).parent.stem
+        start = buf.find(b"(")
+        end = buf.rfind(b")") + 1
+        if start == -1 or end == 0:
+            return
+        self._db.execute(
+            "INSERT INTO footprints VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                library,
+                Path(path).stem,
+                path,
+                start,
+                end,
+                buf.count(b"(pad ", start, end),
+            ),
+        )
+
+    def _update_file(self, path: str) -> bool:
+        # Caller holds the lock. Returns False when the file does not exist.
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self._forget(path)
+            return False
+
+        if self._is_fresh(path, stat):
+            return True
+
+        self._forget(path)
+        with open(path, "rb") as f:
+            buf = f.read()
+        if path.endswith(".kicad_sym"):
+            self._index_symbol_file(path, buf)
+        else:
+            self._index_footprint_file(path, buf)
+        self._db.execute(
+            "INSERT INTO files VALUES (?, ?, ?)", (path, stat.st_mtime_ns, stat.st_size)
+        )
+        return True
+
+    def update_file(self, path: str | Path) -> None:
+        """(Re)indexes a single .kicad_sym or .kicad_mod file if it changed."""
+        with self._lock, self._db:
+            self._update_file(os.path.abspath(path))
+
+    def refresh(self) -> None:
+        """Incrementally indexes every library under the configured folders."""
+        seen = set()
+        for directory in self.symbol_dirs:
+            if directory.is_dir():
+                seen.update(str(p.absolute()) for p in directory.glob("*.kicad_sym"))
+        for directory in self.footprint_dirs:
+            if directory.is_dir():
+                seen.update(
+                    str(p.absolute()) for p in directory.glob("*.pretty/*.kicad_mod")
+                )
+
+        with self._lock, self._db:
+            known = {row[0] for row in self._db.execute("SELECT path FROM files")}
+            for path in known - seen:
+                self._forget(path)
+            for path in seen:
+                self._update_file(path)
+
+    # ---- lookups ----
+
+    def _update_files_of(self, table: str, library: str, name: str) -> None:
+        # Caller holds the lock. Files indexed with `name` may have changed
+        # since: their spans would slice the new contents.
+        files = self._db.execute(
+            f"SELECT DISTINCT file FROM {table} WHERE library = ? AND name = ?",
+            (library, name),
+        ).fetchall()
+        for (file,) in files:
+            self._update_file(file)
+
+    def _symbol_entry(self, row) -> LibraryEntry:
+        library, name, file, start, end, pin_count, extends = row
+        if pin_count == 0 and extends:
+            # Derived symbols only draw the pins of their parent.
+            parent = self._db.execute(
+                "SELECT pin_count FROM symbols WHERE file = ? AND name = ?",
+                (file, extends),
+            ).fetchone()
+            pin_count = parent[0] if parent else 0
+        return LibraryEntry(library, name, Path(file), start, end, pin_count)
+
+    def find_symbol_in_file(
+        self, lib_path: str | Path, name: str
+    ) -> LibraryEntry | None:
+        path = os.path.abspath(lib_path)
+        with self._lock, self._db:
+            if not self._update_file(path):
+                return None
+            row = self._db.execute(
+                "SELECT * FROM symbols WHERE file = ? AND name = ?", (path, name)
+            ).fetchone()
+            return self._symbol_entry(row) if row else None
+
+    def find_symbol(self, library: str, name: str) -> LibraryEntry | None:
+        for directory in self.symbol_dirs:
+            entry = self.find_symbol_in_file(directory / f"{library}.kicad_sym", name)
+            if entry is not None:
+                return entry
+
+        # Libraries indexed from elsewhere (project or template folders).
+        with self._lock, self._db:
+            self._update_files_of("symbols", library, name)
+            row = self._db.execute(
+                "SELECT * FROM symbols WHERE library = ? AND name = ?", (library, name)
+            ).fetchone()
+            return self._symbol_entry(row) if row else None
+
+    def find_footprint(self, library: str, name: str) -> LibraryEntry | None:
+        with self._lock, self._db:
+            for directory in self.footprint_dirs:
+                path = os.path.abspath(
+                    directory / f"{library}.pretty" / f"{name}.kicad_mod"
+                )
+                if self._update_file(path):
+                    break
+            self._update_files_of("footprints", library, name)
+
+            row = self._db.execute(
+                "SELECT * FROM footprints WHERE library = ? AND name = ?",
+                (library, name),
+            ).fetchone()
+        return (
+            LibraryEntry(row[0], row[1], Path(row[2]), row[3], row[4], row[5])
+            if row
+            else None
+        )
+
+    def symbol_names(self, library: str) -> list[str]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT name FROM symbols WHERE library = ? ORDER BY name", (library,)
+            )
+            return [row[0] for row in rows]
+
+    def footprint_names(self, library: str) -> list[str]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT name FROM footprints WHERE library = ? ORDER BY name",
+                (library,),
+            )
+            return [row[0] for row in rows]
+
+
+_default_index: LibraryIndex | None = None
+_default_index_lock = threading.Lock()
+
+
+def default_index() -> LibraryIndex:
+    # Opened on first use so commands that never touch libraries stay cheap.
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            _default_index = LibraryIndex()
+        return _default_index
@@ -0,0 +1,68 @@
+"""
+Parsed KiCad files kept in memory, for long-running processes (see server).
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+from schematic_api.sexp_hash import dedupe
+from schematic_api.span_sexp import parse_sexp
+
+
+class ParsedFileCache:
+    """Path -> parsed tree, re-parsed when the file's mtime or size change.
+
+    Trees are shared between callers: they must be copied (or cloned, as
+    KiCadAPI does with templates) before being modified. Bounded to
+    `max_entries` files, least recently used first out.
+
+    With `dedupe`, large subtrees found in several files (the same
+    lib_symbols entries in many template sheets...) are kept once (see
+    sexp_hash.dedupe).
+    """
+
+    def __init__(self, max_entries: int = 256, dedupe: bool = True):
+        self.max_entries = max_entries
+        self.dedupe = dedupe
+        self._cache: OrderedDict[Path, tuple[int, int, Any]] = OrderedDict()
+        self._shared: dict = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path: str | Path) -> Any:
+        path = Path(path)
+        stat = os.stat(path)
+        with self._lock:
+            cached = self._cache.get(path)
+            if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+                self._cache.move_to_end(path)
+                self.hits += 1
+                return cached[2]
+            self.misses += 1
+
+        # Parsed outside the lock: two threads may parse the same file once
+        # each, which is cheaper than serializing every parse.
+        data = parse_sexp(path.read_text(encoding="utf-8"))
+
+        with self._lock:
+            if self.dedupe:
+                data = dedupe(data, self._shared)
+            self._cache[path] = (stat.st_mtime_ns, stat.st_size, data)
+            self._cache.move_to_end(path)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+                # Subtrees of evicted files must not stay alive through the table.
+                self._shared.clear()
+        return data
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self._shared.clear()
@@ -0,0 +1,696 @@
+"""
+Schematic -> PCB footprint synchronization ("Update PCB from schematic").
+
+The schematic is reduced to a netlist (symbol pins joined through wires,
+junctions, labels and power symbols), then every symbol is matched to the
+board footprint whose (path ...) points to it. Missing footprints are
+resolved through the footprint libraries and placed in free space, existing
+ones only get the references, values and pad nets that changed.
+"""
+
+import re
+from dataclasses import dataclass, field
+from math import cos, radians, sin
+from typing import Any, Callable, Optional
+
+from sexpdata import Symbol
+
+from schematic_api.journal import Journal
+from schematic_api.uuid_factory import UuidFactory, default_factory
+
+# Positions are compared on a 0.1 µm grid, well below KiCad's 4 decimals in mm.
+_GRID = 10_000
+
+_LABEL_HEADS = {
+    Symbol("label"): "local",
+    Symbol("global_label"): "global",
+    Symbol("hierarchical_label"): "local",
+}
+_FOOTPRINT_DROPPED_HEADS = (
+    Symbol("version"),
+    Symbol("generator"),
+    Symbol("generator_version"),
+)
+_NET_INSERT_BEFORE = (Symbol("pinfunction"), Symbol("pintype"), Symbol("uuid"))
+_PATH_INSERT_BEFORE = (
+    Symbol("attr"),
+    Symbol("fp_line"),
+    Symbol("fp_rect"),
+    Symbol("fp_circle"),
+    Symbol("fp_arc"),
+    Symbol("fp_poly"),
+    Symbol("fp_text"),
+    Symbol("pad"),
+)
+_COURTYARD_LAYERS = ("F.CrtYd", "B.CrtYd")
+
+
+def _text(x: Any) -> str:
+    return str(x).strip('"')
+
+
+def _child(node: list, head: str) -> Optional[list]:
+    head = Symbol(head)
+    for child in node[1:]:
+        if isinstance(child, list) and child and child[0] == head:
+            return child
+    return None
+
+
+def _property(node: list, name: str) -> Optional[list]:
+    for child in node[1:]:
+        if (
+            isinstance(child, list)
+            and len(child) > 2
+            and child[0] == Symbol("property")
+            and _text(child[1]) == name
+        ):
+            return child
+    return None
+
+
+def _point(x: float, y: float) -> tuple[int, int]:
+    return round(float(x) * _GRID), round(float(y) * _GRID)
+
+
+def _natural_key(text: str) -> list:
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", text)]
+
+
+@dataclass
+class SchematicSymbol:
+    uuid: str
+    reference: str
+    value: str
+    footprint: str
+    on_board: bool
+    # pin number -> net name
+    pin_nets: dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class SyncReport:
+    added: list[str] = field(default_factory=list)
+    updated: list[str] = field(default_factory=list)
+    replaced: list[str] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+    unchanged: int = 0
+    # references whose Footprint property could not be resolved
+    missing: list[str] = field(default_factory=list)
+
+
+class _UnionFind:
+    def __init__(self):
+        self.parent: dict = {}
+
+    def find(self, x):
+        parent = self.parent
+        root = parent.setdefault(x, x)
+        while root != parent[root]:
+            root = parent[root]
+        while x != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    def union(self, a, b) -> None:
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[rb] = ra
+
+
+def _library_pins(lib_section: Optional[list]) -> tuple[dict, set]:
+    # lib_id -> [(unit, number, x, y)], and the set of power symbols.
+    pins: dict[str, list] = {}
+    power: set[str] = set()
+    for lib_symbol in (lib_section or [])[1:]:
+        if not (
+            isinstance(lib_symbol, list)
+            and len(lib_symbol) > 1
+            and lib_symbol[0] == Symbol("symbol")
+        ):
+            continue
+        lib_id = _text(lib_symbol[1])
+        if _child(lib_symbol, "power") is not None:
+            power.add(lib_id)
+        symbol_pins = pins.setdefault(lib_id, [])
+        for unit_node in lib_symbol[2:]:
+            if not (
+                isinstance(unit_node, list)
+                and len(unit_node) > 1
+                and unit_node[0] == Symbol("symbol")
+            ):
+                continue
+            # Units are named "<name>_<unit>_<body style>", unit 0 being common to all.
+            parts = _text(unit_node[1]).rsplit("_", 2)
+            unit = int(parts[1]) if len(parts) == 3 and parts[1].isdigit() else 0
+            for pin in unit_node[2:]:
+                if not (isinstance(pin, list) and pin and pin[0] == Symbol("pin")):
+                    continue
+                at = _child(pin, "at")
+                number = _child(pin, "number")
+                if at is None or number is None:
+                    continue
+                symbol_pins.append((unit, _text(number[1]), float(at[1]), float(at[2])))
+    return pins, power
+
+
+def _pin_position(
+    px: float, py: float, at: list, mirror: Optional[str]
+) -> tuple[float, float]:
+    # Library coordinates have Y pointing up, the schematic Y points down.
+    x, y = px, -py
+    angle = radians(float(at[3]) if len(at) > 3 else 0.0)
+    if angle:
+        c, s = round(cos(angle), 12), round(sin(angle), 12)
+        x, y = x * c + y * s, -x * s + y * c
+    if mirror == "x":
+        y = -y
+    elif mirror == "y":
+        x = -x
+    return float(at[1]) + x, float(at[2]) + y
+
+
+def _symbol_reference(node: list) -> str:
+    instances = _child(node, "instances")
+    if instances is not None:
+        for project in instances[1:]:
+            for path in project[2:] if isinstance(project, list) else []:
+                if isinstance(path, list) and path and path[0] == Symbol("path"):
+                    reference = _child(path, "reference")
+                    if reference is not None:
+                        return _text(reference[1])
+    prop = _property(node, "Reference")
+    return _text(prop[2]) if prop is not None else ""
+
+
+def schematic_netlist(data: list) -> list[SchematicSymbol]:
+    """
+    Connectivity of a single schematic sheet: returns its symbols with the
+    net of every pin. Nets are named after their labels (local labels get
+    the "/" prefix of the root sheet) or power symbols, like KiCad does,
+    and "Net-(REF-Pad)" / "unconnected-(REF-Pad)" otherwise.
+    """
+    lib_pins, power_symbols = _library_pins(_child(data, "lib_symbols"))
+
+    uf = _UnionFind()
+    # point -> names carried there, by priority (0: power/global, 1: local)
+    point_names: dict[tuple[int, int], list[tuple[int, str]]] = {}
+    symbols: list[SchematicSymbol] = []
+    symbol_pin_points: list[list[tuple[str, tuple[int, int]]]] = []
+    segments: list[tuple[tuple[int, int], tuple[int, int]]] = []
+    junctions: list[tuple[int, int]] = []
+
+    for node in data[1:]:
+        if not (isinstance(node, list) and node):
+            continue
+        head = node[0]
+
+        if head == Symbol("symbol"):
+            lib_id = _child(node, "lib_id")
+            at = _child(node, "at")
+            if lib_id is None or at is None:
+                continue
+            lib_id = _text(lib_id[1])
+            unit = _child(node, "unit")
+            unit = int(unit[1]) if unit is not None else 1
+            mirror = _child(node, "mirror")
+            mirror = str(mirror[1]) if mirror is not None else None
+            uuid_node = _child(node, "uuid")
+            on_board = _child(node, "on_board")
+            value = _property(node, "Value")
+            footprint = _property(node, "Footprint")
+
+            pins = []
+            for pin_unit, number, px, py in lib_pins.get(lib_id, ()):
+                if pin_unit in (0, unit):
+                    pins.append((number, _point(*_pin_position(px, py, at, mirror))))
+
+            symbol = SchematicSymbol(
+                uuid=_text(uuid_node[1]) if uuid_node is not None else "",
+                reference=_symbol_reference(node),
+                value=_text(value[2]) if value is not None else "",
+                footprint=_text(footprint[2]) if footprint is not None else "",
+                on_board=on_board is None or str(on_board[1]) != "no",
+            )
+            if lib_id in power_symbols:
+                for _, point in pins:
+                    point_names.setdefault(point, []).append((0, symbol.value))
+                continue
+            symbols.append(symbol)
+            symbol_pin_points.append(pins)
+
+        elif head == Symbol("wire"):
+            pts = _child(node, "pts")
+            xy = [
+                p
+                for p in (pts or [])[1:]
+                if isinstance(p, list) and p and p[0] == Symbol("xy")
+            ]
+            if len(xy) >= 2:
+                a, b = _point(xy[0][1], xy[0][2]), _point(xy[-1][1], xy[-1][2])
+                uf.union(a, b)
+                segments.append((a, b))
+
+        elif head in _LABEL_HEADS:
+            at = _child(node, "at")
+            if at is None:
+                continue
+            name = _text(node[1])
+            if _LABEL_HEADS[head] == "global":
+                point_names.setdefault(_point(at[1], at[2]), []).append((0, name))
+            else:
+                point_names.setdefault(_point(at[1], at[2]), []).append((1, f"/{name}"))
+
+        elif head == Symbol("junction"):
+            at = _child(node, "at")
+            if at is not None:
+                junctions.append(_point(at[1], at[2]))
+
+    # Points landing inside a wire (T connections) join it. Wires are
+    # bucketed by their constant coordinate so each point checks a few only.
+    horizontal: dict[int, list] = {}
+    vertical: dict[int, list] = {}
+    for a, b in segments:
+        if a[1] == b[1]:
+            horizontal.setdefault(a[1], []).append(
+                (min(a[0], b[0]), max(a[0], b[0]), a)
+            )
+        elif a[0] == b[0]:
+            vertical.setdefault(a[0], []).append((min(a[1], b[1]), max(a[1], b[1]), a))
+
+    candidates = set(junctions)
+    candidates.update(point_names)
+    for a, b in segments:
+        candidates.add(a)
+        candidates.add(b)
+    for pins in symbol_pin_points:
+        candidates.update(point for _, point in pins)
+
+    for point in candidates:
+        x, y = point
+        for low, high, anchor in horizontal.get(y, ()):
+            if low <= x <= high:
+                uf.union(anchor, point)
+        for low, high, anchor in vertical.get(x, ()):
+            if low <= y <= high:
+                uf.union(anchor, point)
+
+    # Labels with the same name are the same net.
+    first_point_of_name: dict[str, tuple[int, int]] = {}
+    for point, names in point_names.items():
+        for _, name in names:
+            uf.union(first_point_of_name.setdefault(name, point), point)
+
+    net_names: dict[Any, tuple[int, str]] = {}
+    for point, names in point_names.items():
+        root = uf.find(point)
+        for candidate in names:
+            if root not in net_names or candidate < net_names[root]:
+                net_names[root] = candidate
+
+    members: dict[Any, list[tuple[str, str]]] = {}
+    for symbol, pins in zip(symbols, symbol_pin_points):
+        for number, point in pins:
+            members.setdefault(uf.find(point), []).append((symbol.reference, number))
+
+    auto_names: dict[Any, str] = {}
+    for root, pins in members.items():
+        if root in net_names:
+            continue
+        reference, number = min(
+            pins, key=lambda p: (_natural_key(p[0]), _natural_key(p[1]))
+        )
+        prefix = "unconnected" if len(pins) == 1 else "Net"
+        auto_names[root] = f"{prefix}-({reference}-Pad{number})"
+
+    for symbol, pins in zip(symbols, symbol_pin_points):
+        for number, point in pins:
+            root = uf.find(point)
+            symbol.pin_nets[number] = (
+                net_names[root][1] if root in net_names else auto_names[root]
+            )
+    return symbols
+
+
+def _copy_with_new_uuids(node: Any, uuids: UuidFactory, key: tuple = ()) -> Any:
+    if isinstance(node, list):
+        if node and node[0] == Symbol("uuid") and len(node) > 1:
+            return [node[0], uuids(*key, _text(node[1])), *node[2:]]
+        return [_copy_with_new_uuids(child, uuids, key) for child in node]
+    return node
+
+
+def _footprint_extents(footprint: list) -> tuple[float, float, float, float]:
+    # Courtyard box relative to the footprint origin, pads as a fallback.
+    xs: list[float] = []
+    ys: list[float] = []
+    for child in footprint[1:]:
+        if not (isinstance(child, list) and child):
+            continue
+        head = child[0]
+        if head in (Symbol("fp_line"), Symbol("fp_rect")):
+            layer = _child(child, "layer")
+            if layer is None or _text(layer[1]) not in _COURTYARD_LAYERS:
+                continue
+            for end in ("start", "end"):
+                node = _child(child, end)
+                if node is not None:
+                    xs.append(float(node[1]))
+                    ys.append(float(node[2]))
+    if not xs:
+        for child in footprint[1:]:
+            if isinstance(child, list) and child and child[0] == Symbol("pad"):
+                at, size = _child(child, "at"), _child(child, "size")
+                if at is None:
+                    continue
+                w, h = (
+                    (float(size[1]) / 2, float(size[2]) / 2)
+                    if size is not None
+                    else (0.0, 0.0)
+                )
+                xs += [float(at[1]) - w, float(at[1]) + w]
+                ys += [float(at[2]) - h, float(at[2]) + h]
+    if not xs:
+        return -1.0, 1.0, -1.0, 1.0
+    return min(xs), max(xs), min(ys), max(ys)
+
+
+class _FreeSpacePlacer:
+    """Flows new footprints in rows below everything already on the board."""
+
+    def __init__(self, pcb_data: list, row_width_mm: float, spacing_mm: float):
+        min_x = max_y = None
+        for item in pcb_data[1:]:
+            if not (isinstance(item, list) and item and item[0] == Symbol("footprint")):
+                continue
+            at = _child(item, "at")
+            if at is None:
+                continue
+            _, _, _, bottom = _footprint_extents(item)
+            x, y = float(at[1]), float(at[2]) + bottom
+            min_x = x if min_x is None else min(min_x, x)
+            max_y = y if max_y is None else max(max_y, y)
+        self.x0 = min_x if min_x is not None else 25.0
+        self.cursor_x = self.x0
+        self.cursor_y = max_y + spacing_mm if max_y is not None else 25.0
+        self.row_width_mm = row_width_mm
+        self.spacing_mm = spacing_mm
+        self.row_height = 0.0
+
+    def place(self, footprint: list) -> tuple[float, float]:
+        left, right, top, bottom = _footprint_extents(footprint)
+        w, h = right - left, bottom - top
+        if self.cursor_x > self.x0 and self.cursor_x + w > self.x0 + self.row_width_mm:
+            self.cursor_x = self.x0
+            self.cursor_y += self.row_height + self.spacing_mm
+            self.row_height = 0.0
+        x, y = self.cursor_x - left, self.cursor_y - top
+        self.cursor_x += w + self.spacing_mm
+        self.row_height = max(self.row_height, h)
+        return round(x, 4), round(y, 4)
+
+
+# Edits of nodes that are not on the board yet need no undo.
+_UNRECORDED = Journal()
+
+
+class _BoardNets:
+    """Top-level (net id "name") declarations of a board, and its journal."""
+
+    def __init__(self, pcb_data: list, journal: Journal = _UNRECORDED):
+        self.pcb_data = pcb_data
+        self.journal = journal
+        self.ids: dict[str, int] = {}
+        self.last_index = 0
+        for i, item in enumerate(pcb_data):
+            if (
+                isinstance(item, list)
+                and len(item) > 2
+                and item[0] == Symbol("net")
+                and isinstance(item[1], int)
+            ):
+                self.ids.setdefault(_text(item[2]), item[1])
+                self.last_index = i
+        self.next_id = max(self.ids.values(), default=0) + 1
+        self.new: list[list] = []
+
+    def id_of(self, name: str) -> int:
+        net_id = self.ids.get(name)
+        if net_id is None:
+            net_id = self.ids[name] = self.next_id
+            self.next_id += 1
+            self.new.append([Symbol("net"), net_id, name])
+        return net_id
+
+    def flush(self) -> None:
+        # New declarations follow the existing ones, in a single splice.
+        if self.new:
+            index = self.last_index + 1 if self.last_index else len(self.pcb_data)
+            self.journal.splice(self.pcb_data, index, index, self.new)
+            self.last_index = index + len(self.new) - 1
+            self.new = []
+
+
+def _set_pad_nets(
+    footprint: list,
+    pin_nets: dict[str, str],
+    nets: _BoardNets,
+    journal: Journal = _UNRECORDED,
+) -> bool:
+    changed = False
+    for pad in footprint[1:]:
+        if not (isinstance(pad, list) and len(pad) > 1 and pad[0] == Symbol("pad")):
+            continue
+        number = _text(pad[1])
+        if not number:
+            continue
+        net_name = pin_nets.get(number)
+        net_index = next(
+            (
+                i
+                for i, child in enumerate(pad)
+                if isinstance(child, list) and child and child[0] == Symbol("net")
+            ),
+            None,
+        )
+
+        if net_name is None:
+            if net_index is not None:
+                journal.delete(pad, net_index)
+                changed = True
+            continue
+
+        net_id = nets.id_of(net_name)
+        if net_index is not None:
+            node = pad[net_index]
+            if node[1:3] != [net_id, net_name]:
+                journal.set(pad, net_index, [Symbol("net"), net_id, net_name])
+                changed = True
+            continue
+
+        insert_at = next(
+            (
+                i
+                for i, child in enumerate(pad)
+                if isinstance(child, list) and child and child[0] in _NET_INSERT_BEFORE
+            ),
+            len(pad),
+        )
+        journal.insert(pad, insert_at, [Symbol("net"), net_id, net_name])
+        changed = True
+    return changed
+
+
+def _set_text_field(
+    footprint: list, name: str, text: str, journal: Journal = _UNRECORDED
+) -> bool:
+    prop = _property(footprint, name)
+    if prop is not None:
+        if _text(prop[2]) == text:
+            return False
+        journal.set(prop, 2, text)
+        return True
+    # Pre-KiCad 8 footprints keep reference and value as (fp_text ...)
+    kind = Symbol(name.lower())
+    for child in footprint[1:]:
+        if (
+            isinstance(child, list)
+            and len(child) > 2
+            and child[0] == Symbol("fp_text")
+            and child[1] == kind
+        ):
+            if _text(child[2]) == text:
+                return False
+            journal.set(child, 2, text)
+            return True
+    return False
+
+
+def _instantiate_footprint(
+    library_footprint: list,
+    fpid: str,
+    symbol: SchematicSymbol,
+    sheet_file: str,
+    at: list,
+    uuids: UuidFactory,
+) -> list:
+    # Footprint UUIDs are keyed by the symbol they stand for.
+    key = ("footprint", symbol.uuid, fpid)
+    footprint = [
+        child
+        for child in _copy_with_new_uuids(library_footprint, uuids, key)
+        if not (
+            isinstance(child, list) and child and child[0] in _FOOTPRINT_DROPPED_HEADS
+        )
+    ]
+    footprint[1] = fpid
+
+    layer_index = next(
+        (
+            i
+            for i, child in enumerate(footprint)
+            if isinstance(child, list) and child and child[0] == Symbol("layer")
+        ),
+        1,
+    )
+    footprint[layer_index + 1 : layer_index + 1] = [[Symbol("uuid"), uuids(*key)], at]
+
+    _set_text_field(footprint, "Reference", symbol.reference)
+    _set_text_field(footprint, "Value", symbol.value)
+
+    insert_at = next(
+        (
+            i
+            for i, child in enumerate(footprint)
+            if isinstance(child, list) and child and child[0] in _PATH_INSERT_BEFORE
+        ),
+        len(footprint),
+    )
+    footprint[insert_at:insert_at] = [
+        [Symbol("path"), f"/{symbol.uuid}"],
+        [Symbol("sheetname"), "/"],
+        [Symbol("sheetfile"), sheet_file],
+    ]
+    return footprint
+
+
+def sync_footprints(
+    pcb_data: list,
+    symbols: list[SchematicSymbol],
+    resolve_footprint: Callable[[str, str], Optional[list]],
+    sheet_file: str,
+    remove_orphans: bool = False,
+    row_width_mm: float = 200.0,
+    spacing_mm: float = 2.0,
+    uuids: Optional[UuidFactory] = None,
+    journal: Optional[Journal] = None,
+) -> SyncReport:
+    """
+    Brings the footprints of `pcb_data` in line with `symbols` (root sheet
+    symbols, linked through (path "/<symbol uuid>")). Footprints whose symbol
+    is unchanged are left untouched; `resolve_footprint(library, name)` is
+    called once per distinct footprint. Board edits go through `journal`,
+    so that a transaction opened on it can roll the sync back.
+    """
+    uuids = uuids or default_factory()
+    if journal is None:
+        journal = _UNRECORDED
+    report = SyncReport()
+    nets = _BoardNets(pcb_data, journal)
+
+    board: dict[str, int] = {}
+    for i, item in enumerate(pcb_data):
+        if isinstance(item, list) and item and item[0] == Symbol("footprint"):
+            path = _child(item, "path")
+            if path is not None:
+                board[_text(path[1])] = i
+
+    resolved: dict[str, Optional[list]] = {}
+
+    def _library_footprint(fpid: str) -> Optional[list]:
+        if fpid not in resolved:
+            library, _, name = fpid.partition(":")
+            resolved[fpid] = resolve_footprint(library, name) if name else None
+        return resolved[fpid]
+
+    placer: Optional[_FreeSpacePlacer] = None
+    new_footprints = []
+    seen_paths = set()
+
+    for symbol in symbols:
+        if not symbol.on_board or symbol.reference.startswith("#"):
+            continue
+        path = f"/{symbol.uuid}"
+        seen_paths.add(path)
+        index = board.get(path)
+
+        if index is not None and _text(pcb_data[index][1]) == symbol.footprint:
+            footprint = pcb_data[index]
+            changed = _set_text_field(footprint, "Reference", symbol.reference, journal)
+            changed |= _set_text_field(footprint, "Value", symbol.value, journal)
+            changed |= _set_pad_nets(footprint, symbol.pin_nets, nets, journal)
+            if changed:
+                report.updated.append(symbol.reference)
+            else:
+                report.unchanged += 1
+            continue
+
+        library_footprint = (
+            _library_footprint(symbol.footprint) if symbol.footprint else None
+        )
+        if library_footprint is None:
+            report.missing.append(symbol.reference)
+            continue
+
+        if index is not None:
+            # Footprint changed in the schematic: swap it in place.
+            at = list(_child(pcb_data[index], "at"))
+            footprint = _instantiate_footprint(
+                library_footprint, symbol.footprint, symbol, sheet_file, at, uuids
+            )
+            _set_pad_nets(footprint, symbol.pin_nets, nets)
+            journal.set(pcb_data, index, footprint)
+            report.replaced.append(symbol.reference)
+            continue
+
+        if placer is None:
+            placer = _FreeSpacePlacer(pcb_data, row_width_mm, spacing_mm)
+        x, y = placer.place(library_footprint)
+        footprint = _instantiate_footprint(
+            library_footprint,
+            symbol.footprint,
+            symbol,
+            sheet_file,
+            [Symbol("at"), x, y],
+            uuids,
+        )
+        _set_pad_nets(footprint, symbol.pin_nets, nets)
+        new_footprints.append(footprint)
+        report.added.append(symbol.reference)
+
+    nets.flush()
+
+    if remove_orphans:
+        # Only root sheet footprints ("/<uuid>") belong to this schematic,
+        # the others come from hierarchical sheets. Net declarations were
+        # spliced in above, so orphans are matched by identity.
+        orphans = {
+            id(pcb_data[index])
+            for path, index in board.items()
+            if path.count("/") == 1 and path not in seen_paths
+        }
+        if orphans:
+            kept = []
+            for item in pcb_data:
+                if id(item) in orphans:
+                    reference = _property(item, "Reference")
+                    report.removed.append(
+                        _text(reference[2]) if reference is not None else ""
+                    )
+                else:
+                    kept.append(item)
+            journal.replace_all(pcb_data, kept)
+
+    # New footprints go at the end of the board, in a single splice.
+    journal.extend(pcb_data, new_footprints)
+    return report
@@ -1,6 +1,8 @@
-from os import mkdir
 from uuid import uuid4
 from pathlib import Path
+from typing import Iterable
+
+from schematic_api.sinks import DiskSink, ProjectSink
 
 PROJECT_FOLDER = Path(__file__).parent.parent.parent
 
@@ -83,11 +85,11 @@ base_pcb_text = ''' (kicad_pcb
 	(embedded_fonts no)
 )'''
 
-base_sch_text = f'''(kicad_sch
+base_sch_template = '''(kicad_sch
 	(version 20250114)
 	(generator "eeschema")
 	(generator_version "9.0")
-	(uuid {uuid4()})
+	(uuid {root_uuid})
 	(paper "A4")
 	(lib_symbols)
 	(sheet_instances
@@ -98,6 +100,13 @@ base_sch_text = f'''(kicad_sch
 	(embedded_fonts no)
 )'''
 
+
+def base_sch_text(root_uuid: str | None = None) -> str:
+    # The root UUID used to be drawn once at import time, so every schematic
+    # created by a process shared it.
+    return base_sch_template.format(root_uuid=root_uuid or uuid4())
+
+
 base_pro_text = '''{
   "board": {
     "design_settings": {
@@ -133,21 +142,30 @@ base_pro_text = '''{
 '''
 
 
-def project_builder(project_name):
+def project_builder(
+    project_name,
+    root_uuid: str | None = None,
+    exist_ok: bool = False,
+    sink: ProjectSink | None = None,
+    skip: Iterable[str] = (),
+):
 
     # creates a new project folder with the necessary files for KiCad
-    mkdir(PROJECT_FOLDER / project_name)
+    # (exist_ok: the project is regenerated, only missing files are created)
+    # The project goes to `sink`, by default the folder PROJECT_FOLDER/project_name.
+    # (skip: base files the caller writes itself)
+    if sink is None:
+        sink = DiskSink(PROJECT_FOLDER / project_name)
+    sink.create(exist_ok=exist_ok)
 
-    f_proj = open(PROJECT_FOLDER / project_name /
-                  f"{project_name}.kicad_pro", "x")
-    f_proj.write(f'''{base_pro_text}''')
-
-    f_proj = open(PROJECT_FOLDER / project_name /
-                  f"{project_name}.kicad_sch", "x")
-    f_proj.write(f'''{base_sch_text}''')
-
-    f_proj = open(PROJECT_FOLDER / project_name /
-                  f"{project_name}.kicad_pcb", "x")
-    f_proj.write(f'''{base_pcb_text}''')
+    base_files = {
+        f"{project_name}.kicad_pro": base_pro_text,
+        f"{project_name}.kicad_sch": base_sch_text(root_uuid),
+        f"{project_name}.kicad_pcb": base_pcb_text,
+    }
+    for file_name, text in base_files.items():
+        if file_name in skip or (exist_ok and sink.exists(file_name)):
+            continue
+        sink.write_text(file_name, text)
 
     print("Project created successfully!")
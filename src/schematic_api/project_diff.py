@@ -0,0 +1,114 @@
+"""
+Structural diff of two generated projects (`main.py diff`).
+
+Files are paired by name, the project name prefix aside (a.kicad_sch goes
+with b.kicad_sch, the project name being the .kicad_pro file's). KiCad
+S-expression files are compared with Merkle hashes (see sexp_hash): equal
+files cost one hash each, and only the subtrees that differ are walked. Other files are compared as bytes.
+"""
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterator, Optional
+
+from schematic_api.sexp_hash import SexpChange, diff_sexp, node_label
+from schematic_api.sinks import DiskSink
+from schematic_api.span_sexp import parse_sexp
+
+SEXP_SUFFIXES = (".kicad_sch", ".kicad_pcb", ".kicad_sym", ".kicad_mod")
+SEXP_NAMES = ("fp-lib-table", "sym-lib-table")
+
+
+@dataclass
+class FileDiff:
+    name: str
+    # "only_a", "only_b", "bytes" (non S-expression file differing) or "sexp"
+    status: str
+    changes: list[SexpChange] = field(default_factory=list)
+
+
+def _generic_name(name: str, project_name: str) -> str:
+    # Project files are named after the project: pair them on the rest.
+    if name.startswith(project_name):
+        return "*" + name[len(project_name) :]
+    return name
+
+
+def _is_sexp(name: str) -> bool:
+    return name.endswith(SEXP_SUFFIXES) or Path(name).name in SEXP_NAMES
+
+
+def diff_projects(project_a: Path, project_b: Path) -> Iterator[FileDiff]:
+    """Differing files of two project folders (build state aside)."""
+    sinks = (DiskSink(project_a), DiskSink(project_b))
+    names: list[dict[str, str]] = []
+    for sink in sinks:
+        files = [name for name in sink.names() if not Path(name).name.startswith(".")]
+        project_name = next(
+            (Path(name).stem for name in files if name.endswith(".kicad_pro")),
+            sink.root.name,
+        )
+        names.append({_generic_name(name, project_name): name for name in files})
+
+    for generic in sorted(names[0].keys() | names[1].keys()):
+        name_a, name_b = names[0].get(generic), names[1].get(generic)
+        if name_b is None:
+            yield FileDiff(name_a, "only_a")
+            continue
+        if name_a is None:
+            yield FileDiff(name_b, "only_b")
+            continue
+
+        data_a, data_b = sinks[0].read_bytes(name_a), sinks[1].read_bytes(name_b)
+        if data_a == data_b:
+            continue
+        if not _is_sexp(name_a):
+            yield FileDiff(name_a, "bytes")
+            continue
+        changes = list(
+            diff_sexp(
+                parse_sexp(data_a.decode("utf-8")), parse_sexp(data_b.decode("utf-8"))
+            )
+        )
+        if changes:
+            yield FileDiff(name_a, "sexp", changes)
+
+
+def _short(node, limit: int = 80) -> str:
+    from schematic_api.kicad_api import _format_sexp_kicad
+
+    text = (
+        " ".join(_format_sexp_kicad(node).split())
+        if isinstance(node, list)
+        else repr(node)
+    )
+    return text if len(text) <= limit else text[: limit - 3] + "..."
+
+
+def format_change(change: SexpChange) -> str:
+    node = change.new if change.kind == "+" else change.old
+    path = " > ".join((*change.path, node_label(node)))
+    if change.kind == "~":
+        if (
+            isinstance(change.old, list)
+            and isinstance(change.new, list)
+            and node_label(change.old) == node_label(change.new)
+        ):
+            return f"~ {path}: {_short(change.old)} -> {_short(change.new)}"
+        return f"~ {path} -> {node_label(change.new)}"
+    return f"{change.kind} {path}"
+
+
+def format_file_diff(diff: FileDiff, max_changes: Optional[int] = 50) -> list[str]:
+    if diff.status == "only_a":
+        return [f"only in the first project: {diff.name}"]
+    if diff.status == "only_b":
+        return [f"only in the second project: {diff.name}"]
+    if diff.status == "bytes":
+        return [f"{diff.name}: differs"]
+    lines = [f"{diff.name}: {len(diff.changes)} change(s)"]
+    shown = diff.changes if max_changes is None else diff.changes[:max_changes]
+    lines.extend("  " + format_change(change) for change in shown)
+    if len(shown) < len(diff.changes):
+        lines.append(f"  ... {len(diff.changes) - len(shown)} more")
+    return lines
@@ -0,0 +1,111 @@
+"""
+Where the sheets and board fragments of a generated project come from.
+
+The project's .provenance.json records, for every instance of a template,
+which template it is, the digests of the template files it was generated
+from, and everything its generation depended on (sheet path, annotation,
+board placement...). A snapshot of each template file is kept as well,
+and the UUIDs given when they were random: together, they give back
+exactly what was generated, which is the common base `sync` needs to
+carry template changes into an edited project (see template_sync).
+
+Unlike the build state, this is not a cache: it is never thrown away.
+"""
+
+import base64
+import hashlib
+import json
+import zlib
+from pathlib import Path
+from typing import Any, Optional
+
+from schematic_api.cache import cache_dir
+from schematic_api.sinks import ProjectSink, atomic_write
+
+PROVENANCE_FILE = ".provenance.json"
+PROVENANCE_VERSION = 1
+
+
+class Provenance:
+    """Instances of a project (one dict each) and snapshots of their templates.
+
+    Instance records hold: template (name in the catalog), sheet_file,
+    sheet_name, sheet_path, sheet_name_path, sheet and pcb (digests of the
+    template files, pcb None without a board), symbol_refs, reference_map,
+    symbol_reference_map, and offset ([dx, dy] of the board fragment, None
+    without a board).
+    """
+
+    def __init__(self, project: str, root_uuid: str, deterministic: bool):
+        self.project = project
+        self.root_uuid = root_uuid
+        # Random UUIDs can't be generated again: the ones given are kept in
+        # `uuids` (key -> UUID, see RecordedUuidFactory). Projects recorded
+        # without them can't be synced.
+        self.deterministic = deterministic
+        self.uuids: Optional[dict[str, str]] = None
+        self.instances: list[dict[str, Any]] = []
+        # digest -> zlib compressed, base64 encoded template file
+        self.snapshots: dict[str, str] = {}
+
+    @classmethod
+    def load(cls, sink: ProjectSink) -> Optional["Provenance"]:
+        """The project's provenance, None if it has none (or an outdated one)."""
+        try:
+            data = json.loads(sink.read_text(PROVENANCE_FILE))
+        except (OSError, ValueError):
+            return None
+        if data.get("version") != PROVENANCE_VERSION:
+            return None
+        provenance = cls(data["project"], data["root_uuid"], data["deterministic"])
+        provenance.uuids = data.get("uuids")
+        provenance.instances = data["instances"]
+        provenance.snapshots = data["snapshots"]
+        return provenance
+
+    @staticmethod
+    def exists(sink: ProjectSink) -> bool:
+        return sink.exists(PROVENANCE_FILE)
+
+    def save(self, sink: ProjectSink) -> None:
+        # Snapshots no instance uses anymore are dropped.
+        used = {record[kind] for record in self.instances for kind in ("sheet", "pcb")}
+        data = {
+            "version": PROVENANCE_VERSION,
+            "project": self.project,
+            "root_uuid": self.root_uuid,
+            "deterministic": self.deterministic,
+            "uuids": self.uuids,
+            "instances": self.instances,
+            "snapshots": {
+                key: value for key, value in self.snapshots.items() if key in used
+            },
+        }
+        sink.write_text(PROVENANCE_FILE, json.dumps(data, indent=1, sort_keys=True))
+
+    # ---- snapshots ----
+
+    def add_snapshot(self, path: str | Path, file_digest: Optional[str] = None) -> str:
+        """Keeps a copy of the template file `path`, returns its digest."""
+        data = Path(path).read_bytes()
+        if file_digest is None:
+            file_digest = hashlib.sha256(data).hexdigest()
+        if file_digest not in self.snapshots:
+            self.snapshots[file_digest] = base64.b64encode(
+                zlib.compress(data, 9)
+            ).decode("ascii")
+        return file_digest
+
+    def snapshot_path(self, file_digest: str, suffix: str) -> Path:
+        """
+        The snapshot as a file, for the code generating from template paths.
+        Snapshots are content addressed, so projects made from the same
+        template versions share them in the cache folder.
+        """
+        path = cache_dir() / "snapshots" / f"{file_digest}{suffix}"
+        if not path.is_file():
+            path.parent.mkdir(exist_ok=True)
+            atomic_write(
+                path, zlib.decompress(base64.b64decode(self.snapshots[file_digest]))
+            )
+        return path
@@ -0,0 +1,365 @@
+"""
+Generation daemon (`main.py serve`).
+
+A CLI call starts cold: imports, template metadata, template files and the
+library index are loaded again for every command. The server keeps them
+resident and answers JSON requests, either over a Unix socket (one JSON
+object per line, both ways, several requests per connection) or over HTTP
+on localhost (POST /<op> with the request as body, GET for requests
+without arguments).
+
+Requests are {"op": ..., ...}; responses {"ok": true, "result": ...} or
+{"ok": false, "error": "..."}, both with "timings" in milliseconds. Each
+request gets its own KiCadAPI; requests on the same project are serialized.
+`new` with "in_memory": true returns the project files instead of writing
+them, as {"encoding": "utf-8" or "base64", "data": ...} each (3D models
+and other binary assets are base64), with "regenerate": true generates an
+existing project again.
+"""
+
+import base64
+import json
+import os
+import socket
+import socketserver
+import stat
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable
+
+from schematic_api.kicad_api import PROJECT_FOLDER, KiCadAPI
+from schematic_api.library_index import default_index
+from schematic_api.parsed_files import ParsedFileCache
+from schematic_api.sinks import DiskSink
+from schematic_api.templates import TemplateCatalog
+
+
+class RequestError(Exception):
+    """A request the server can't run (unknown op, bad arguments...)."""
+
+
+class ServeError(Exception):
+    """The server can't start (socket path taken...)."""
+
+
+def _file_entry(data: bytes) -> dict[str, str]:
+    # KiCad files are text; the assets brought along may not be.
+    try:
+        return {"encoding": "utf-8", "data": data.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"encoding": "base64", "data": base64.b64encode(data).decode("ascii")}
+
+
+def is_valid_project_name(name: str) -> bool:
+    # Same rule as the `new` command.
+    return bool(name) and all(c.isalnum() or c in ("-", "_") for c in name)
+
+
+class GenerationService:
+    """Request handlers sharing the resident caches. Thread-safe."""
+
+    def __init__(self, templates_folder: Path, project_folder: Path = PROJECT_FOLDER):
+        self.project_folder = Path(project_folder)
+        self.catalog = TemplateCatalog(templates_folder)
+        self.sources = ParsedFileCache()
+        self._catalog_lock = threading.Lock()
+        self._project_locks: dict[str, threading.Lock] = {}
+        self._project_locks_lock = threading.Lock()
+        self.started = time.time()
+        self.requests = 0
+
+        self.ops: dict[str, Callable[[dict, dict], Any]] = {
+            "ping": self.ping,
+            "stats": self.stats,
+            "list": self.list_templates,
+            "template": self.template,
+            "new": self.new,
+            "update_pcb": self.update_pcb,
+        }
+
+    def warm(self) -> None:
+        """Loads every template and parses its files ahead of the first request."""
+        with self._catalog_lock:
+            templates = self.catalog.all()
+            self.catalog.summaries()
+        for template in templates:
+            for path in (template.sheet_file, template.pcb_file):
+                if path is not None and Path(path).is_file():
+                    self.sources.get(path)
+        default_index()
+
+    # ---- dispatch ----
+
+    def handle(self, request: Any) -> dict:
+        start = time.perf_counter()
+        timings: dict[str, float] = {}
+        try:
+            if not isinstance(request, dict):
+                raise RequestError("a request is a JSON object")
+            op = self.ops.get(request.get("op"))
+            if op is None:
+                raise RequestError(
+                    f"unknown op {request.get('op')!r}, expected one of {sorted(self.ops)}"
+                )
+            response = {"ok": True, "result": op(request, timings)}
+        except RequestError as error:
+            response = {"ok": False, "error": str(error)}
+        except Exception as error:
+            response = {"ok": False, "error": f"{type(error).__name__}: {error}"}
+
+        with self._project_locks_lock:
+            self.requests += 1
+        timings["total_ms"] = (time.perf_counter() - start) * 1000
+        response["timings"] = {name: round(ms, 3) for name, ms in timings.items()}
+        return response
+
+    def _templates(self, names: Any) -> list:
+        if not isinstance(names, list) or not all(
+            isinstance(name, str) for name in names
+        ):
+            raise RequestError("'templates' must be a list of template names")
+        result = []
+        with self._catalog_lock:
+            for name in names:
+                if name not in self.catalog:
+                    self.catalog.refresh()
+                template = self.catalog.get(name)
+                if template is None:
+                    raise RequestError(f"could not find template {name!r}")
+                result.append(template)
+        return result
+
+    def _project_lock(self, project_name: str) -> threading.Lock:
+        with self._project_locks_lock:
+            return self._project_locks.setdefault(project_name, threading.Lock())
+
+    def _project_name(self, request: dict) -> str:
+        name = request.get("project")
+        if not isinstance(name, str) or not is_valid_project_name(name):
+            raise RequestError(
+                "'project' must only contain letters, digits, dashes or underscores"
+            )
+        return name
+
+    # ---- ops ----
+
+    def ping(self, request: dict, timings: dict) -> str:
+        return "pong"
+
+    def stats(self, request: dict, timings: dict) -> dict:
+        return {
+            "uptime_s": round(time.time() - self.started, 3),
+            "requests": self.requests,
+            "templates": len(self.catalog),
+            "parsed_files": len(self.sources),
+            "parsed_file_hits": self.sources.hits,
+            "parsed_file_misses": self.sources.misses,
+        }
+
+    def list_templates(self, request: dict, timings: dict) -> dict:
+        with self._catalog_lock:
+            self.catalog.refresh()
+            return self.catalog.summaries()
+
+    def template(self, request: dict, timings: dict) -> dict:
+        name = request.get("name")
+        with self._catalog_lock:
+            if name not in self.catalog:
+                self.catalog.refresh()
+            summary = self.catalog.summary(name) if isinstance(name, str) else None
+        if summary is None:
+            raise RequestError(f"could not find template {name!r}")
+        return summary
+
+    def new(self, request: dict, timings: dict) -> dict:
+        project_name = self._project_name(request)
+        start = time.perf_counter()
+        templates = self._templates(request.get("templates"))
+        timings["templates_ms"] = (time.perf_counter() - start) * 1000
+
+        options = {
+            "shared_sheets": bool(request.get("shared_sheets", False)),
+            "deterministic": bool(request.get("deterministic", False)),
+        }
+        if request.get("in_memory", False):
+            # Nothing written: the files come back in the response.
+            start = time.perf_counter()
+            files = KiCadAPI(sources=self.sources).generate_project_files(
+                project_name, templates, **options
+            )
+            timings["generate_ms"] = (time.perf_counter() - start) * 1000
+            return {
+                "project": project_name,
+                "files": {
+                    name: _file_entry(data) for name, data in sorted(files.items())
+                },
+            }
+
+        project_path = self.project_folder / project_name
+        self.project_folder.mkdir(parents=True, exist_ok=True)
+        start = time.perf_counter()
+        with self._project_lock(project_name):
+            timings["queued_ms"] = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            api = KiCadAPI(sources=self.sources)
+            api.project_creation(
+                project_name,
+                templates,
+                sink=DiskSink(project_path),
+                regenerate=bool(request.get("regenerate", False)),
+                **options,
+            )
+            timings["generate_ms"] = (time.perf_counter() - start) * 1000
+
+        return {
+            "project": str(project_path),
+            "files": sorted(
+                entry.name for entry in os.scandir(project_path) if entry.is_file()
+            ),
+        }
+
+    def update_pcb(self, request: dict, timings: dict) -> dict:
+        project_name = self._project_name(request)
+        start = time.perf_counter()
+        with self._project_lock(project_name):
+            timings["queued_ms"] = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            report = KiCadAPI(sources=self.sources).update_pcb_from_schematic(
+                project_name,
+                remove_orphans=bool(request.get("remove_orphans", False)),
+                project_path=self.project_folder / project_name,
+            )
+            timings["generate_ms"] = (time.perf_counter() - start) * 1000
+        return {
+            "added": report.added,
+            "updated": report.updated,
+            "replaced": report.replaced,
+            "removed": report.removed,
+            "unchanged": report.unchanged,
+            "missing": report.missing,
+        }
+
+
+# ---- transports ----
+
+
+class _UnixHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as error:
+                response = {"ok": False, "error": f"invalid JSON: {error}"}
+            else:
+                response = self.server.service.handle(request)
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, service: GenerationService):
+        self.service = service
+        super().__init__(socket_path, _UnixHandler)
+
+
+class _HttpHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _respond(self, status: int, response: dict) -> None:
+        body = json.dumps(response).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _run(self, request: Any) -> None:
+        if isinstance(request, dict):
+            request.setdefault("op", self.path.strip("/") or None)
+        response = self.server.service.handle(request)
+        self._respond(200 if response["ok"] else 400, response)
+
+    def do_GET(self) -> None:
+        self._run({})
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError as error:
+            self._respond(400, {"ok": False, "error": f"invalid JSON: {error}"})
+            return
+        self._run(request)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        # One line per request on stderr is noise for a configurator backend.
+        pass
+
+
+class _HttpServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int, service: GenerationService):
+        self.service = service
+        super().__init__(("127.0.0.1", port), _HttpHandler)
+
+
+def _claim_socket_path(socket_path: str) -> None:
+    # Only a socket left over by a server that did not shut down cleanly
+    # (nobody accepts connections on it) is removed.
+    try:
+        mode = os.lstat(socket_path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise ServeError(f"{socket_path} exists and is not a socket")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(socket_path)
+        except OSError:
+            os.unlink(socket_path)
+            return
+    raise ServeError(f"a server is already serving on {socket_path}")
+
+
+def serve(
+    service: GenerationService,
+    socket_path: str | None = None,
+    port: int | None = None,
+    ready: Callable[[str], None] = print,
+) -> None:
+    """Runs the Unix socket and/or HTTP servers until interrupted.
+
+    ServeError if the socket path is taken (by a running server or a file).
+    """
+    servers = []
+    owns_socket = False
+    try:
+        if socket_path is not None:
+            _claim_socket_path(socket_path)
+            servers.append(_UnixServer(socket_path, service))
+            owns_socket = True
+            ready(f"Listening on unix:{socket_path}")
+        if port is not None:
+            servers.append(_HttpServer(port, service))
+            ready(f"Listening on http://127.0.0.1:{servers[-1].server_address[1]}")
+
+        threads = [
+            threading.Thread(target=server.serve_forever, daemon=True)
+            for server in servers
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        for server in servers:
+            server.server_close()
+        if owns_socket and os.path.exists(socket_path):
+            os.unlink(socket_path)
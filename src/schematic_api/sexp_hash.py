@@ -0,0 +1,236 @@
+"""
+Merkle hashes of S-expression trees.
+
+A node's hash is computed from its atoms and the hashes of its child
+lists, so two subtrees are equal exactly when their hashes are (16-byte
+BLAKE2b). Parsed lists (SpanList) cache their hash; span_sexp drops it on
+any mutation below them. Comparing two hashed subtrees is then O(1), and
+a structural diff only descends where hashes differ.
+
+Plain lists (built by code) are hashed every time, and so are their
+ancestors: nothing tells them when a plain list changes.
+"""
+
+import hashlib
+from difflib import SequenceMatcher
+from typing import Any, Iterator, NamedTuple, Optional
+
+from sexpdata import Symbol
+
+from schematic_api.span_sexp import SpanList
+
+DIGEST_SIZE = 16
+
+
+def _atom_bytes(atom: Any) -> bytes:
+    # Symbols and strings with the same text are different atoms.
+    if isinstance(atom, Symbol):
+        tag, text = b"s", str(atom)
+    elif isinstance(atom, str):
+        tag, text = b"q", atom
+    elif isinstance(atom, bool):
+        tag, text = b"b", "1" if atom else "0"
+    elif isinstance(atom, int):
+        tag, text = b"i", str(atom)
+    elif isinstance(atom, float):
+        tag, text = b"f", repr(atom)
+    else:
+        tag, text = b"o", repr(atom)
+    data = text.encode("utf-8")
+    return tag + len(data).to_bytes(4, "little") + data
+
+
+def _hash_list(node: list) -> tuple[bytes, bool]:
+    # (hash, whether it may be cached: only SpanLists made of SpanLists)
+    if type(node) is SpanList and node.hash is not None:
+        return node.hash, True
+    cacheable = type(node) is SpanList
+    h = hashlib.blake2b(b"(", digest_size=DIGEST_SIZE)
+    for child in node:
+        if isinstance(child, list):
+            digest, child_cacheable = _hash_list(child)
+            cacheable = cacheable and child_cacheable
+            h.update(b"L")
+            h.update(digest)
+        else:
+            h.update(_atom_bytes(child))
+    h.update(b")")
+    digest = h.digest()
+    if cacheable:
+        node.hash = digest
+    return digest, cacheable
+
+
+def sexp_hash(node: Any) -> bytes:
+    """Merkle hash of `node` (a list or an atom)."""
+    if isinstance(node, list):
+        return _hash_list(node)[0]
+    return hashlib.blake2b(_atom_bytes(node), digest_size=DIGEST_SIZE).digest()
+
+
+def same_sexp(a: Any, b: Any) -> bool:
+    """Whether two trees are equal, in O(1) once both are hashed."""
+    return a is b or sexp_hash(a) == sexp_hash(b)
+
+
+# ---- deduplication ----
+
+
+def dedupe(tree: Any, table: dict, min_length: int = 256) -> Any:
+    """
+    Makes identical subtrees of `tree` share one instance, registered in
+    `table` (shared between trees to dedupe across files). Only parsed,
+    unmodified lists spanning at least `min_length` characters are
+    considered, and only when their source text and depth match as well,
+    so the writer's verbatim copies are unchanged. Shared lists have a
+    single parent: the tree must be treated as read-only from then on.
+    Returns `tree`, or its registered twin.
+    """
+    if not _dedupable(tree, min_length):
+        return tree
+    twin = _twin(tree, table)
+    if twin is not None:
+        return twin
+    _dedupe_children(tree, table, min_length)
+    return tree
+
+
+def _dedupable(node: Any, min_length: int) -> bool:
+    return (
+        type(node) is SpanList
+        and not node.dirty
+        and node.source is not None
+        and node.end - node.start >= min_length
+    )
+
+
+def _twin(node: SpanList, table: dict) -> Optional[SpanList]:
+    digest, cacheable = _hash_list(node)
+    if not cacheable:
+        return None
+    key = (digest, node.depth)
+    twin = table.get(key)
+    if twin is None:
+        table[key] = node
+        return None
+    if twin is not node and twin.text() == node.text():
+        return twin
+    return None
+
+
+def _dedupe_children(node: SpanList, table: dict, min_length: int) -> None:
+    for i, child in enumerate(node):
+        if not _dedupable(child, min_length):
+            continue
+        twin = _twin(child, table)
+        if twin is not None:
+            # list.__setitem__: sharing must not dirty the tree.
+            list.__setitem__(node, i, twin)
+        else:
+            _dedupe_children(child, table, min_length)
+
+
+# ---- structural diff ----
+
+
+class SexpChange(NamedTuple):
+    """One difference: kind is "+" (added), "-" (removed) or "~" (changed)."""
+
+    kind: str
+    path: tuple[str, ...]
+    old: Any
+    new: Any
+
+
+def node_label(node: Any) -> str:
+    """Short description of a node: its head and what names it."""
+    if not isinstance(node, list) or not node:
+        return repr(node)
+    head = str(node[0])
+    if len(node) > 1 and isinstance(node[1], str) and not isinstance(node[1], Symbol):
+        return f'{head} "{node[1].strip(chr(34))}"'
+    if len(node) > 2 and isinstance(node[2], str) and not isinstance(node[2], Symbol):
+        # (net 3 "SDA")
+        return f'{head} "{node[2].strip(chr(34))}"'
+    for child in node[1:]:
+        if (
+            isinstance(child, list)
+            and len(child) > 2
+            and child[0] == Symbol("property")
+            and str(child[1]).strip('"') == "Reference"
+        ):
+            return f'{head} "{str(child[2]).strip(chr(34))}"'
+    for child in node[1:]:
+        if isinstance(child, list) and len(child) > 1 and child[0] == Symbol("uuid"):
+            return f"{head} {str(child[1]).strip(chr(34))[:8]}"
+    return head
+
+
+def _match_key(node: Any) -> Any:
+    # Which items of two versions stand for the same thing: the head, and
+    # the name of items holding others (footprint "R_0603", property
+    # "Value"...). Leaves, such as (uuid ...), only match on their head.
+    if not isinstance(node, list) or not node:
+        return None
+    if not any(isinstance(child, list) for child in node):
+        return str(node[0])
+    return node_label(node)
+
+
+def _key(child: Any) -> Any:
+    return sexp_hash(child) if isinstance(child, list) else _atom_bytes(child)
+
+
+def diff_sexp(a: Any, b: Any, path: tuple[str, ...] = ()) -> Iterator[SexpChange]:
+    """
+    Differences between two trees, descending only into subtrees whose
+    hashes differ. Children are aligned on their hashes, so an inserted
+    item shows up as such instead of shifting everything after it.
+    """
+    if same_sexp(a, b):
+        return
+    if not (
+        isinstance(a, list)
+        and isinstance(b, list)
+        and a
+        and b
+        and a[0] == b[0]
+        and any(isinstance(child, list) for child in a)
+    ):
+        yield SexpChange("~", path, a, b)
+        return
+
+    path = path + (node_label(a),)
+    a_keys = [_key(child) for child in a]
+    b_keys = [_key(child) for child in b]
+    if [k for k, c in zip(a_keys, a) if not isinstance(c, list)] != [
+        k for k, c in zip(b_keys, b) if not isinstance(c, list)
+    ]:
+        # The node's own atoms changed: it is reported as a whole.
+        yield SexpChange("~", path[:-1], a, b)
+        return
+
+    matcher = SequenceMatcher(None, a_keys, b_keys, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        old, new = a[i1:i2], b[j1:j2]
+        if tag == "replace":
+            # Changed items pair up with the item standing for the same thing.
+            unmatched = list(new)
+            for item in old:
+                key = _match_key(item)
+                index = next(
+                    (i for i, n in enumerate(unmatched) if _match_key(n) == key), None
+                )
+                if index is None:
+                    yield SexpChange("-", path, item, None)
+                    continue
+                yield from diff_sexp(item, unmatched.pop(index), path)
+            for item in unmatched:
+                yield SexpChange("+", path, None, item)
+            continue
+        for item in old:
+            yield SexpChange("-", path, item, None)
+        for item in new:
+            yield SexpChange("+", path, None, item)
@@ -0,0 +1,105 @@
+"""
+Byte-level helpers locating S-expression items without parsing them.
+
+Most lookups only need one item out of a big file (a symbol out of a
+library, the footprints of a board...), and finding where an item starts
+and ends is far cheaper than building the whole tree with sexpdata.
+"""
+
+import re
+
+# Strings are matched as a whole so parentheses inside them are ignored.
+_TOKEN_RE = re.compile(rb'"(?:[^"\\]|\\.)*"|[()]')
+# Files written by KiCad 6+ (and by _format_sexp_kicad) put every item of
+# the root list on its own line, indented by exactly one tab.
+_TAB_CHILD_RE = re.compile(rb"\n\t\(")
+_HEAD_RE = re.compile(rb'\(\s*([^\s()"]+)')
+_NAME_RE = re.compile(rb'\(\s*[^\s()"]+\s+("(?:[^"\\]|\\.)*"|[^\s()"]+)')
+
+
+def unquote(raw: bytes) -> str:
+    text = raw.decode("utf-8")
+    if len(text) >= 2 and text[0] == '"' and text[-1] == '"':
+        text = text[1:-1].replace('\\"', '"').replace("\\\\", "\\")
+    return text
+
+
+def item_head(buf, start: int) -> str:
+    match = _HEAD_RE.match(buf, start)
+    return match.group(1).decode("utf-8") if match else ""
+
+
+def item_name(buf, start: int) -> str | None:
+    # Name of an item shaped like (symbol "Name" ...) or (footprint "Name" ...).
+    match = _NAME_RE.match(buf, start)
+    return unquote(match.group(1)) if match else None
+
+
+def _is_tab_formatted(buf) -> bool:
+    first_newline = buf.find(b"\n", 0, 4096)
+    return first_newline != -1 and buf[first_newline + 1 : first_newline + 3] == b"\t("
+
+
+def _tab_formatted_spans(buf) -> list[tuple[int, int]]:
+    starts = [match.start() + 2 for match in _TAB_CHILD_RE.finditer(buf)]
+    if not starts:
+        return []
+
+    # Each item ends right before the next one starts; the last one ends
+    # before the closing parenthesis of the root list.
+    root_end = buf.rfind(b")")
+    spans = []
+    for i, start in enumerate(starts):
+        stop = starts[i + 1] - 2 if i + 1 < len(starts) else root_end
+        end = buf.rfind(b")", start, stop) + 1
+        spans.append((start, end))
+    return spans
+
+
+def _tokenized_spans(buf) -> list[tuple[int, int]]:
+    spans = []
+    depth = 0
+    item_start = 0
+    for match in _TOKEN_RE.finditer(buf):
+        token = match.group()
+        if token == b"(":
+            depth += 1
+            if depth == 2:
+                item_start = match.start()
+        elif token == b")":
+            if depth == 2:
+                spans.append((item_start, match.end()))
+            depth -= 1
+            if depth == 0:
+                break
+    return spans
+
+
+def top_level_spans(buf) -> list[tuple[str, int, int]]:
+    """Returns (head, start, end) for every list directly inside the root list.
+
+    `buf` can be bytes or any buffer supporting the re module (e.g. mmap).
+    """
+    if _is_tab_formatted(buf):
+        spans = _tab_formatted_spans(buf)
+    else:
+        spans = _tokenized_spans(buf)
+    return [(item_head(buf, start), start, end) for start, end in spans]
+
+
+def item_property(buf, name: str, start: int, end: int) -> str | None:
+    """Value of (property "name" "value") inside buf[start:end], without parsing it.
+
+    Older footprints store references and values as (fp_text reference "R1").
+    """
+    quoted = re.escape(name.encode("utf-8"))
+    match = re.compile(
+        rb'\(\s*property\s+"' + quoted + rb'"\s+("(?:[^"\\]|\\.)*"|[^\s()"]+)'
+    ).search(buf, start, end)
+    if match is None:
+        match = re.compile(
+            rb"\(\s*fp_text\s+"
+            + re.escape(name.lower().encode("utf-8"))
+            + rb'\s+("(?:[^"\\]|\\.)*"|[^\s()"]+)'
+        ).search(buf, start, end)
+    return unquote(match.group(1)) if match else None
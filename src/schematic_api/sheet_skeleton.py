@@ -0,0 +1,492 @@
+"""
+Precompiled hierarchical sheet blocks.
+
+The pin distribution and the whole (sheet ...) S-expression, with its wires
+and net labels, only depend on the template and the placement parameters.
+They are built once at the origin; placing an instance is then a structural
+copy patched with its offset, UUIDs, sheet name and sheet file.
+"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any
+
+from sexpdata import Symbol
+
+from schematic_api.uuid_factory import UuidFactory, default_factory
+
+GLOBAL_LABEL_SHAPES = {
+    "input": "input",
+    "power_in": "input",
+    "output": "output",
+    "power_out": "output",
+    "bidirectional": "bidirectional",
+    "tri_state": "tri_state",
+}
+
+# Coordinates are rounded like KiCad does (it keeps 4 decimals in mm).
+_COORD_DIGITS = 4
+_COORD_HEADS = (Symbol("at"), Symbol("xy"))
+
+Path = tuple[int, ...]
+
+
+def _copy_along(node: list, plan: tuple) -> list:
+    # Copies the lists leading to patched slots; the other subtrees (effects,
+    # strokes, fonts...) stay shared between instances.
+    node = list(node)
+    for i, sub_plan in plan:
+        node[i] = _copy_along(node[i], sub_plan)
+    return node
+
+
+def _copy_plan(paths) -> tuple:
+    tree: dict = {}
+    for path in paths:
+        level = tree
+        for i in path:
+            level = level.setdefault(i, {})
+
+    def _freeze(level: dict) -> tuple:
+        return tuple((i, _freeze(sub)) for i, sub in sorted(level.items()))
+
+    return _freeze(tree)
+
+
+def _resolve(nodes: list, path: Path) -> list:
+    node = nodes
+    for i in path:
+        node = node[i]
+    return node
+
+
+@dataclass(frozen=True)
+class SheetSkeleton:
+    # nodes[0] is the (sheet ...) block, the others its wires and labels.
+    # Stamped nodes share their untouched subtrees: copy those before editing.
+    nodes: tuple
+    coord_slots: tuple[Path, ...]
+    uuid_slots: tuple[Path, ...]
+    sheet_uuid_slot: Path
+    sheet_name_slot: Path
+    sheet_file_slot: Path
+    copy_plan: tuple
+
+    def stamp(
+        self,
+        at_x: float,
+        at_y: float,
+        sheet_name: str,
+        sheet_file: str,
+        uuids: UuidFactory | None = None,
+        key: tuple = (),
+    ) -> tuple[list, str]:
+        """Returns (fresh nodes placed at (at_x, at_y), sheet uuid).
+
+        UUIDs come from `uuids`, keyed by `key` (the identity of the sheet
+        instance) and the slot number.
+        """
+        uuids = uuids or default_factory()
+        nodes = _copy_along(self.nodes, self.copy_plan)
+
+        for path in self.coord_slots:
+            node = _resolve(nodes, path)
+            node[1] = round(node[1] + at_x, _COORD_DIGITS)
+            node[2] = round(node[2] + at_y, _COORD_DIGITS)
+
+        for slot, path in enumerate(self.uuid_slots):
+            _resolve(nodes, path)[1] = f'"{uuids("sheet", *key, slot)}"'
+
+        _resolve(nodes, self.sheet_name_slot)[2] = f'"{sheet_name}"'
+        _resolve(nodes, self.sheet_file_slot)[2] = f'"{sheet_file}"'
+        return nodes, _resolve(nodes, self.sheet_uuid_slot)[1].strip('"')
+
+
+@dataclass(frozen=True)
+class SheetSkeletonKey:
+    w: float
+    h: float
+    # (name, type, net, side, y) for each pin; y is relative to the sheet top
+    pins: tuple[tuple[Any, ...], ...]
+    properties: tuple[tuple[str, Any], ...]
+    pin_margin_mm: float
+    min_delta_mm: float
+    net_wire_len_mm: float
+    equal_two_sides: bool
+    equal_spacing_mm: float
+    label_kind: str
+
+    @classmethod
+    def for_object(cls, object, at_y: float, **params) -> "SheetSkeletonKey":
+        pins = tuple(
+            (
+                p.get("name"),
+                p.get("type"),
+                p.get("net"),
+                p.get("side"),
+                float(p["y"]) - at_y if "y" in p else None,
+            )
+            for p in (object.pins or [])
+        )
+        return cls(
+            w=float(object.size_wh[0]),
+            h=float(object.size_wh[1]),
+            pins=pins,
+            properties=tuple((object.properties or {}).items()),
+            **params,
+        )
+
+
+def _pin_dicts(key: SheetSkeletonKey) -> list[dict]:
+    pins = []
+    for name, ptype, net, side, y in key.pins:
+        pin = {}
+        for field_name, value in (
+            ("name", name),
+            ("type", ptype),
+            ("net", net),
+            ("side", side),
+            ("y", y),
+        ):
+            if value is not None:
+                pin[field_name] = value
+        pins.append(pin)
+    return pins
+
+
+def _distribute_pins(key: SheetSkeletonKey, pins: list[dict]):
+    # Pin placement for a block whose top-left corner is at (0, 0).
+    h = key.h
+    pin_margin_mm = key.pin_margin_mm
+    min_delta_mm = key.min_delta_mm
+    y_top, y_bot = 0.0, h
+
+    # ---- Helper functions for pin placement based on type ----
+    def _spread_ys(n: int) -> list:
+        """
+        Alocates n Ys equally spaced between top+margin and bottom-margin.
+        """
+        if n <= 0:
+            return []
+        usable = max(h - 2 * pin_margin_mm, 0.1)
+        if n == 1:
+            return [h / 2.0]
+        bin_h = usable / n
+        first_center = y_top + pin_margin_mm + bin_h / 2.0
+        return [first_center + i * bin_h for i in range(n)]
+
+    def _resolve_y_for_group(group: list) -> list:
+        autos = _spread_ys(sum(1 for p in group if "y" not in p))
+        auto_it = iter(autos)
+        ys = []
+        for p in group:
+            ys.append(float(p["y"]) if "y" in p else next(auto_it))
+
+        low = y_top + pin_margin_mm
+        high = y_bot - pin_margin_mm
+        if not ys:
+            return ys
+
+        ys[0] = min(max(ys[0], low), high)
+        for i in range(1, len(ys)):
+            target = max(ys[i], ys[i - 1] + min_delta_mm)
+            ys[i] = min(target, high)
+
+        # if it overflows at bottom, shift up as much as possible
+        if ys[-1] > high and len(ys) > 1:
+            overflow = ys[-1] - high
+            spread = ys[-1] - ys[0]
+            min_needed = min_delta_mm * (len(ys) - 1)
+            slack = max(spread - min_needed, 0.0)
+            shift = min(overflow, slack)
+            if shift > 0:
+                ys = [y - shift for y in ys]
+                ys[0] = max(ys[0], low)
+                for i in range(1, len(ys)):
+                    ys[i] = max(ys[i], ys[i - 1] + min_delta_mm)
+                    ys[i] = min(ys[i], high)
+
+        return ys
+
+    # ---- Helper function for fixed spacing and centered (any type) ----
+    def _equal_spread_centered(n: int, step_mm: float) -> list:
+        """
+        Ys equally spaced by step_mm, centered vertically in the block.
+        If it doesn't fit, reduces step to fit.
+        """
+        if n <= 0:
+            return []
+
+        low = y_top + pin_margin_mm
+        high = y_bot - pin_margin_mm
+        usable_h = max(high - low, 0.1)
+
+        step = float(step_mm) if step_mm and step_mm > 0 else (usable_h / max(n, 1))
+        if n == 1:
+            y = h / 2.0
+            return [min(max(y, low), high)]
+
+        total = step * (n - 1)
+
+        # If it doesn't fit, compress step
+        if total > usable_h:
+            step = usable_h / (n - 1)
+            total = step * (n - 1)
+
+        y0 = (h / 2.0) - total / 2.0
+        ys = [y0 + i * step for i in range(n)]
+
+        ys = [min(max(y, low), high) for y in ys]
+        for i in range(1, n):
+            ys[i] = max(ys[i], ys[i - 1] + min_delta_mm)
+            ys[i] = min(ys[i], high)
+
+        return ys
+
+    #   1) Chose pin distribution method
+    left_pins, right_pins = [], []
+
+    if key.equal_two_sides:
+        # Alternates pins left/right in order of definition
+        for i, p in enumerate(pins):
+            (left_pins if i % 2 == 0 else right_pins).append(p)
+
+        ys_left = _equal_spread_centered(len(left_pins), key.equal_spacing_mm)
+        ys_right = _equal_spread_centered(len(right_pins), key.equal_spacing_mm)
+    else:
+        # alternates by type
+        for p in pins:
+            t = p.get("type", "input")
+            if t in ("input", "power_in"):
+                left_pins.append(p)
+            elif t in ("output", "power_out"):
+                right_pins.append(p)
+            else:
+                (left_pins if p.get("side", "right") == "left" else right_pins).append(
+                    p
+                )
+
+        ys_left = _resolve_y_for_group(left_pins)
+        ys_right = _resolve_y_for_group(right_pins)
+
+    return list(zip(left_pins, ys_left)), list(zip(right_pins, ys_right))
+
+
+def _build_nodes(key: SheetSkeletonKey) -> list:
+    w, h = key.w, key.h
+    left, right = _distribute_pins(key, _pin_dicts(key))
+
+    #   2) Builds the block (sheet ...)
+    sheet = [
+        Symbol("sheet"),
+        [Symbol("at"), 0.0, 0.0],
+        [Symbol("size"), w, h],
+        [Symbol("fields_autoplaced")],
+        [
+            Symbol("stroke"),
+            [Symbol("width"), 0.1524],
+            [Symbol("type"), Symbol("solid")],
+            [Symbol("color"), 0, 0, 0, 0],
+        ],
+        [Symbol("fill"), [Symbol("color"), 0, 0, 0, 0.0]],
+        [Symbol("uuid"), '""'],
+        [
+            Symbol("property"),
+            '"Sheet name"',
+            '""',
+            [Symbol("id"), 0],
+            [Symbol("at"), 2.0, -2.0, 0],
+            [
+                Symbol("effects"),
+                [Symbol("font"), [Symbol("size"), 1.27, 1.27]],
+                [Symbol("justify"), Symbol("left")],
+            ],
+        ],
+        [
+            Symbol("property"),
+            '"Sheet file"',
+            '""',
+            [Symbol("id"), 1],
+            [Symbol("at"), 2.0, 2.0, 0],
+            [
+                Symbol("effects"),
+                [Symbol("font"), [Symbol("size"), 1.27, 1.27]],
+                [Symbol("justify"), Symbol("left")],
+            ],
+        ],
+    ]
+
+    # Extra properties
+    prop_id = 2
+    for k, v in key.properties:
+        sheet.append(
+            [
+                Symbol("property"),
+                f'"{k}"',
+                f'"{v}"',
+                [Symbol("id"), prop_id],
+                [Symbol("at"), 0.0, 0.0, 0],
+                [
+                    Symbol("effects"),
+                    [Symbol("font"), [Symbol("size"), 1.27, 1.27]],
+                    [Symbol("hide"), Symbol("yes")],
+                ],
+            ]
+        )
+        prop_id += 1
+
+    #   3) Pins: left at angle 180, right at angle 0
+    for side, x, default_name, default_type, angle, justify in (
+        (left, 0.0, "IN", "input", 180.0, "left"),
+        (right, w, "OUT", "output", 0.0, "right"),
+    ):
+        for p, y in side:
+            sheet.append(
+                [
+                    Symbol("pin"),
+                    f'"{p.get("name", default_name)}"',
+                    Symbol(p.get("type", default_type)),
+                    [Symbol("at"), x, y, angle],
+                    [
+                        Symbol("effects"),
+                        [Symbol("font"), [Symbol("size"), 1.27, 1.27]],
+                        [Symbol("justify"), Symbol(justify)],
+                    ],
+                    [Symbol("uuid"), '""'],
+                ]
+            )
+
+    nodes = [sheet]
+
+    #   5) NET LABELS (optional): create wires + labels for pin nets
+    def _add_wire(x1, y1, x2, y2):
+        nodes.append(
+            [
+                Symbol("wire"),
+                [Symbol("pts"), [Symbol("xy"), x1, y1], [Symbol("xy"), x2, y2]],
+                [
+                    Symbol("stroke"),
+                    [Symbol("width"), 0],
+                    [Symbol("type"), Symbol("default")],
+                ],
+                [Symbol("uuid"), '""'],
+            ]
+        )
+
+    def _add_label(name, x, y, justify_sym, pin_type):
+        if key.label_kind == "global_label":
+            # Local labels do not cross sheets: once sheets are spread over
+            # grouping sheets, nets are joined through global labels.
+            nodes.append(
+                [
+                    Symbol("global_label"),
+                    f'"{name}"',
+                    [
+                        Symbol("shape"),
+                        Symbol(GLOBAL_LABEL_SHAPES.get(pin_type, "passive")),
+                    ],
+                    [Symbol("at"), x, y, 180 if justify_sym == "right" else 0],
+                    [Symbol("fields_autoplaced"), Symbol("yes")],
+                    [
+                        Symbol("effects"),
+                        [Symbol("font"), [Symbol("size"), 1.27, 1.27]],
+                        [Symbol("justify"), Symbol(justify_sym)],
+                    ],
+                    [Symbol("uuid"), '""'],
+                    [
+                        Symbol("property"),
+                        '"Intersheetrefs"',
+                        '"${INTERSHEET_REFS}"',
+                        [Symbol("at"), x, y, 0],
+                        [
+                            Symbol("effects"),
+                            [Symbol("font"), [Symbol("size"), 1.27, 1.27]],
+                            [Symbol("justify"), Symbol(justify_sym)],
+                            [Symbol("hide"), Symbol("yes")],
+                        ],
+                    ],
+                ]
+            )
+            return
+
+        nodes.append(
+            [
+                Symbol("label"),
+                f'"{name}"',
+                [Symbol("at"), x, y, 0],
+                [
+                    Symbol("effects"),
+                    [Symbol("font"), [Symbol("size"), 1.27, 1.27]],
+                    [Symbol("justify"), Symbol(justify_sym)],
+                ],
+                [Symbol("uuid"), '""'],
+            ]
+        )
+
+    # Left: wire goes to the left, label at end with justify right.
+    # Right: wire goes to the right, label at end with justify left.
+    for side, x, direction, justify, default_type in (
+        (left, 0.0, -1.0, "right", "input"),
+        (right, w, 1.0, "left", "output"),
+    ):
+        for p, y in side:
+            net = p.get("net")
+            if not net:
+                continue
+            x2 = x + direction * float(key.net_wire_len_mm)
+            _add_wire(x, y, x2, y)
+            _add_label(str(net), x2, y, justify, p.get("type", default_type))
+
+    return nodes
+
+
+def _find_slots(node: list, path: Path, coords: list, uuids: list) -> None:
+    head = node[0] if node else None
+    if head in _COORD_HEADS and len(node) >= 3:
+        coords.append(path)
+    elif head == Symbol("uuid"):
+        uuids.append(path)
+        return
+    for i, child in enumerate(node):
+        if isinstance(child, list):
+            _find_slots(child, path + (i,), coords, uuids)
+
+
+@lru_cache(maxsize=512)
+def sheet_skeleton(key: SheetSkeletonKey) -> SheetSkeleton:
+    """Builds (once per template and parameter set) the block to stamp."""
+    nodes = _build_nodes(key)
+
+    coords: list[Path] = []
+    uuids: list[Path] = []
+    for i, node in enumerate(nodes):
+        _find_slots(node, (i,), coords, uuids)
+
+    sheet = nodes[0]
+    name_index = next(
+        i
+        for i, child in enumerate(sheet)
+        if isinstance(child, list) and child[:2] == [Symbol("property"), '"Sheet name"']
+    )
+    file_index = next(
+        i
+        for i, child in enumerate(sheet)
+        if isinstance(child, list) and child[:2] == [Symbol("property"), '"Sheet file"']
+    )
+    uuid_index = next(
+        i
+        for i, child in enumerate(sheet)
+        if isinstance(child, list) and child and child[0] == Symbol("uuid")
+    )
+
+    name_slot = (0, name_index)
+    file_slot = (0, file_index)
+    return SheetSkeleton(
+        nodes=tuple(nodes),
+        coord_slots=tuple(coords),
+        uuid_slots=tuple(uuids),
+        sheet_uuid_slot=(0, uuid_index),
+        sheet_name_slot=name_slot,
+        sheet_file_slot=file_slot,
+        copy_plan=_copy_plan(coords + uuids + [name_slot, file_slot]),
+    )
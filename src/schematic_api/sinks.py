@@ -0,0 +1,463 @@
+"""
+Where generated projects go.
+
+Project generation reads and writes project files through a sink, a
+mapping of paths relative to the project folder to bytes. DiskSink is the
+project folder itself; MemorySink keeps everything in a dict, for
+services embedding the generator (and tests) that don't need the files on
+disk, or want to ship them somewhere else. ArchiveSink streams the files
+into a zip or tar archive as they are produced.
+"""
+
+import contextlib
+import hashlib
+import io
+import os
+import shutil
+import sys
+import tarfile
+import threading
+import time
+import zipfile
+from abc import ABC, abstractmethod
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO, Iterable, Iterator, Optional
+
+
+def atomic_write(
+    path: str | Path, data: bytes | Iterable[bytes], skip_unchanged: bool = True
+) -> bool:
+    """
+    Writes next to the target then renames, so readers never see a partial
+    file. (open() rather than mkstemp keeps the usual umask-based
+    permissions.) Unless `skip_unchanged` is False, a file whose content is
+    already `data` is left alone, mtime included, which is what makes
+    deterministic UUIDs pay off. `data` may be an iterable of chunks, which
+    are streamed and always written. Returns whether it wrote.
+    """
+    path = Path(path)
+    if isinstance(data, (bytes, bytearray)) and skip_unchanged:
+        with contextlib.suppress(OSError):
+            if path.stat().st_size == len(data) and path.read_bytes() == data:
+                return False
+
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            if isinstance(data, (bytes, bytearray)):
+                f.write(data)
+            else:
+                f.writelines(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp_path)
+        raise
+    return True
+
+
+def _file_chunks(path: str | Path, size: int = 1 << 20) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        while chunk := f.read(size):
+            yield chunk
+
+
+def _reflink(source: Path, target: Path) -> bool:
+    # Copy-on-write clone (Btrfs, XFS...): instant, and no block is
+    # duplicated until one of the files changes. Linux only (FICLONE).
+    if not sys.platform.startswith("linux"):
+        return False
+    import fcntl
+
+    try:
+        with open(source, "rb") as src, open(target, "wb") as dst:
+            fcntl.ioctl(dst.fileno(), 0x40049409, src.fileno())  # FICLONE
+        return True
+    except OSError:
+        with contextlib.suppress(OSError):
+            os.unlink(target)
+        return False
+
+
+class ProjectSink(ABC):
+    """Files of one project. Paths are relative to `root`, or `root` joined with one."""
+
+    root: Path
+
+    def key(self, path: str | Path) -> str:
+        path = Path(path)
+        if path.is_absolute() or self.root in path.parents:
+            path = path.relative_to(self.root)
+        return PurePosixPath(*path.parts).as_posix()
+
+    @abstractmethod
+    def create(self, exist_ok: bool = False) -> None:
+        """Creates the (empty) project, FileExistsError if it exists already."""
+
+    @abstractmethod
+    def exists(self, path: str | Path) -> bool: ...
+
+    @abstractmethod
+    def stat(self, path: str | Path) -> Optional[tuple[int, Optional[int]]]:
+        """(size, mtime_ns or None if the sink has no mtimes), None if missing."""
+
+    @abstractmethod
+    def read_bytes(self, path: str | Path) -> bytes: ...
+
+    def digest(self, path: str | Path) -> str:
+        """SHA-256 of the file, hex."""
+        return hashlib.sha256(self.read_bytes(path)).hexdigest()
+
+    @abstractmethod
+    def write_bytes(self, path: str | Path, data: bytes) -> bool:
+        """Writes `path` unless it already holds `data`. Returns whether it wrote."""
+
+    def write_chunks(self, path: str | Path, chunks: Iterable[bytes]) -> None:
+        self.write_bytes(path, b"".join(chunks))
+
+    @abstractmethod
+    def delete(self, path: str | Path) -> None:
+        """Deletes `path` if it exists."""
+
+    @abstractmethod
+    def names(self) -> list[str]: ...
+
+    def read_text(self, path: str | Path) -> str:
+        return self.read_bytes(path).decode("utf-8")
+
+    def link_file(
+        self, path: str | Path, source: str | Path, hardlink: bool = False
+    ) -> str:
+        """
+        Puts the file `source` at `path`, the cheapest way the sink allows
+        (see DiskSink), and returns how: "reflink", "hardlink", "copy" or
+        "kept" (already there). Hard links share the file with `source`,
+        edits included: only `hardlink` files (never edited) get one.
+        """
+        self.write_chunks(path, _file_chunks(source))
+        return "copy"
+
+    def write_text(self, path: str | Path, text: str) -> bool:
+        return self.write_bytes(path, text.encode("utf-8"))
+
+    def open_document(self, path: str | Path):
+        """The file as a LazySexpDocument (to be closed by the caller)."""
+        from schematic_api.lazy_document import LazySexpDocument
+
+        return LazySexpDocument.from_bytes(
+            self.read_bytes(path), self.root / self.key(path)
+        )
+
+
+class DiskSink(ProjectSink):
+    """The project folder (writes are atomic, see atomic_write)."""
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root)
+
+    def _path(self, path: str | Path) -> Path:
+        return self.root / self.key(path)
+
+    def create(self, exist_ok: bool = False) -> None:
+        if self.root.is_dir():
+            if exist_ok:
+                return
+            raise FileExistsError(f"project {self.root.name!r} already exists")
+        self.root.mkdir()
+
+    def exists(self, path: str | Path) -> bool:
+        return self._path(path).exists()
+
+    def stat(self, path: str | Path) -> Optional[tuple[int, Optional[int]]]:
+        try:
+            stat = self._path(path).stat()
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def read_bytes(self, path: str | Path) -> bytes:
+        return self._path(path).read_bytes()
+
+    def write_bytes(self, path: str | Path, data: bytes) -> bool:
+        return atomic_write(self._path(path), data)
+
+    def write_chunks(self, path: str | Path, chunks: Iterable[bytes]) -> None:
+        atomic_write(self._path(path), chunks)
+
+    def delete(self, path: str | Path) -> None:
+        self._path(path).unlink(missing_ok=True)
+
+    def names(self) -> list[str]:
+        return sorted(
+            path.relative_to(self.root).as_posix()
+            for path in self.root.rglob("*")
+            if path.is_file()
+        )
+
+    def link_file(
+        self, path: str | Path, source: str | Path, hardlink: bool = False
+    ) -> str:
+        # Tried in turn: a reflink, a hard link (when allowed), and a copy
+        # (shutil: copy_file_range/sendfile, in the kernel). Copies keep
+        # the source's mtime, which tells they are up to date next time.
+        source, target = Path(source), self._path(path)
+        source_stat = source.stat()
+        with contextlib.suppress(OSError):
+            target_stat = target.stat()
+            if os.path.samestat(source_stat, target_stat) or (
+                target_stat.st_size == source_stat.st_size
+                and target_stat.st_mtime_ns == source_stat.st_mtime_ns
+            ):
+                return "kept"
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = target.with_name(
+            f".{target.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+        )
+        try:
+            if _reflink(source, tmp_path):
+                how = "reflink"
+            else:
+                how = None
+                if hardlink:
+                    with contextlib.suppress(OSError):
+                        os.link(source, tmp_path)
+                        how = "hardlink"
+                if how is None:
+                    shutil.copyfile(source, tmp_path)
+                    how = "copy"
+            if how != "hardlink":
+                os.utime(
+                    tmp_path, ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns)
+                )
+            os.replace(tmp_path, target)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp_path)
+            raise
+        return how
+
+    def open_document(self, path: str | Path):
+        # Memory-mapped: only the items actually used are read.
+        from schematic_api.lazy_document import LazySexpDocument
+
+        return LazySexpDocument(self._path(path))
+
+
+class MemorySink(ProjectSink):
+    """Project files in `files` (relative POSIX path -> bytes); nothing touches the disk.
+
+    Passing the files of a previous generation (build state included) makes
+    the next one incremental, as with a project folder.
+    """
+
+    def __init__(
+        self, root: str | Path = "project", files: Optional[dict[str, bytes]] = None
+    ):
+        # `root` only gives the project its name (and absolute paths a base).
+        self.root = Path(root)
+        self.files: dict[str, bytes] = dict(files or {})
+        self._created = bool(self.files)
+        self._lock = threading.Lock()
+
+    def create(self, exist_ok: bool = False) -> None:
+        if self._created and not exist_ok:
+            raise FileExistsError(f"project {self.root.name!r} already exists")
+        self._created = True
+
+    def exists(self, path: str | Path) -> bool:
+        return self.key(path) in self.files
+
+    def stat(self, path: str | Path) -> Optional[tuple[int, Optional[int]]]:
+        data = self.files.get(self.key(path))
+        return None if data is None else (len(data), None)
+
+    def read_bytes(self, path: str | Path) -> bytes:
+        try:
+            return self.files[self.key(path)]
+        except KeyError:
+            raise FileNotFoundError(path) from None
+
+    def write_bytes(self, path: str | Path, data: bytes) -> bool:
+        key = self.key(path)
+        data = bytes(data)
+        with self._lock:
+            if self.files.get(key) == data:
+                return False
+            self.files[key] = data
+        return True
+
+    def delete(self, path: str | Path) -> None:
+        with self._lock:
+            self.files.pop(self.key(path), None)
+
+    def names(self) -> list[str]:
+        return sorted(self.files)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.names())
+
+
+ARCHIVE_FORMATS = ("zip", "tar", "tar.gz", "tar.xz")
+
+
+class ArchiveSink(ProjectSink):
+    """Streams the project into a zip or tar archive written to `fileobj`.
+
+    Nothing is staged: every file becomes an archive member as soon as it is
+    written, under a folder named after the project, so at most one file is
+    held in memory. Archives are append-only, hence write-once: members
+    can't be read back, rewritten or deleted (only their size and digest are
+    kept, for the build state). `fileobj` may be unseekable (stdout). close()
+    finishes the archive, but leaves `fileobj` open.
+    """
+
+    def __init__(
+        self, fileobj: BinaryIO, root: str | Path = "project", format: str = "zip"
+    ):
+        if format not in ARCHIVE_FORMATS:
+            raise ValueError(
+                f"unknown archive format {format!r}, expected one of {ARCHIVE_FORMATS}"
+            )
+        self.root = Path(root)
+        self.format = format
+        self._mtime = time.time()
+        self._members: dict[str, tuple[int, str]] = {}
+        self._lock = threading.Lock()
+        if format == "zip":
+            self._zip = zipfile.ZipFile(fileobj, "w", zipfile.ZIP_DEFLATED)
+            self._tar = None
+        else:
+            # Stream mode ("w|"): the archive is never seeked.
+            self._zip = None
+            self._tar = tarfile.open(fileobj=fileobj, mode="w|" + format[4:])
+
+    @staticmethod
+    def format_of(path: str | Path) -> str:
+        """Archive format from a file name, zip when unknown."""
+        name = str(path).lower()
+        for suffix, format in (
+            (".tar.gz", "tar.gz"),
+            (".tgz", "tar.gz"),
+            (".tar.xz", "tar.xz"),
+            (".tar", "tar"),
+        ):
+            if name.endswith(suffix):
+                return format
+        return "zip"
+
+    def _member(self, key: str) -> str:
+        return f"{self.root.name}/{key}"
+
+    def create(self, exist_ok: bool = False) -> None:
+        if self._members and not exist_ok:
+            raise FileExistsError(f"project {self.root.name!r} already exists")
+
+    def exists(self, path: str | Path) -> bool:
+        return self.key(path) in self._members
+
+    def stat(self, path: str | Path) -> Optional[tuple[int, Optional[int]]]:
+        member = self._members.get(self.key(path))
+        return None if member is None else (member[0], None)
+
+    def read_bytes(self, path: str | Path) -> bytes:
+        if self.key(path) not in self._members:
+            raise FileNotFoundError(path)
+        raise io.UnsupportedOperation(f"{path}: archive members can't be read back")
+
+    def digest(self, path: str | Path) -> str:
+        member = self._members.get(self.key(path))
+        if member is None:
+            raise FileNotFoundError(path)
+        return member[1]
+
+    def write_bytes(self, path: str | Path, data: bytes) -> bool:
+        self.write_chunks(path, (data,))
+        return True
+
+    def write_chunks(self, path: str | Path, chunks: Iterable[bytes]) -> None:
+        key = self.key(path)
+        with self._lock:
+            if key in self._members:
+                raise io.UnsupportedOperation(
+                    f"{path}: archive members are written once"
+                )
+            hasher = hashlib.sha256()
+            size = 0
+            if self._zip is not None:
+                info = zipfile.ZipInfo(
+                    self._member(key), time.localtime(self._mtime)[:6]
+                )
+                info.compress_type = zipfile.ZIP_DEFLATED
+                info.external_attr = 0o644 << 16
+                with self._zip.open(info, "w") as member:
+                    for chunk in chunks:
+                        hasher.update(chunk)
+                        size += len(chunk)
+                        member.write(chunk)
+            else:
+                # A tar header holds the size: the member is joined first.
+                data = b"".join(chunks)
+                hasher.update(data)
+                size = len(data)
+                info = tarfile.TarInfo(self._member(key))
+                info.size = size
+                info.mtime = int(self._mtime)
+                info.mode = 0o644
+                self._tar.addfile(info, io.BytesIO(data))
+            self._members[key] = (size, hasher.hexdigest())
+
+    def link_file(
+        self, path: str | Path, source: str | Path, hardlink: bool = False
+    ) -> str:
+        if self._tar is None:
+            return super().link_file(path, source, hardlink)
+        # The size is known beforehand: the file is streamed into the tar,
+        # not joined in memory first (see write_chunks).
+        key = self.key(path)
+        with self._lock:
+            if key in self._members:
+                raise io.UnsupportedOperation(
+                    f"{path}: archive members are written once"
+                )
+            hasher = hashlib.sha256()
+
+            class _Hashing(io.RawIOBase):
+                def __init__(self, f):
+                    self.f = f
+
+                def readable(self):
+                    return True
+
+                def readinto(self, buffer):
+                    n = self.f.readinto(buffer)
+                    hasher.update(memoryview(buffer)[:n])
+                    return n
+
+            with open(source, "rb") as f:
+                info = tarfile.TarInfo(self._member(key))
+                info.size = os.fstat(f.fileno()).st_size
+                info.mtime = int(self._mtime)
+                info.mode = 0o644
+                self._tar.addfile(info, _Hashing(f))
+            self._members[key] = (info.size, hasher.hexdigest())
+        return "copy"
+
+    def delete(self, path: str | Path) -> None:
+        if self.key(path) in self._members:
+            raise io.UnsupportedOperation(f"{path}: archive members can't be deleted")
+
+    def names(self) -> list[str]:
+        return sorted(self._members)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._zip is not None:
+                self._zip.close()
+            else:
+                self._tar.close()
+
+    def __enter__(self) -> "ArchiveSink":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,310 @@
+"""
+S-expression trees that remember where they came from.
+
+parse_sexp returns the same tree as sexpdata.loads, except that lists are
+SpanList instances holding their (start, end) span in the source text and
+their nesting depth there. Any mutation marks a list and its ancestors
+dirty; the writer (_format_sexp_kicad) copies clean lists verbatim from
+the source instead of formatting them, so serialization cost follows what
+changed and untouched parts diff cleanly against the original file.
+Mutations also drop the Merkle hash cached on the list and its ancestors
+(see sexp_hash).
+"""
+
+import re
+from typing import Any, Callable, Iterable, Optional
+
+from sexpdata import Symbol, loads
+
+_TOKEN_RE = re.compile(r'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|([^\s()"\\\[\]\';]+))')
+_ESCAPE_RE = re.compile(r"\\(.)", re.S)
+# Same escapes as sexpdata.String.unquote; unknown ones are kept as is.
+_ESCAPES = {"\\": "\\", '"': '"', "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+def _unescape(match: re.Match) -> str:
+    c = match.group(1)
+    return _ESCAPES.get(c, "\\" + c)
+
+
+def _atom(token: str) -> Any:
+    # Same conversions as sexpdata.Parser.atom with its default arguments.
+    if token == "nil":
+        return []
+    if token == "t":
+        return True
+    try:
+        return int(token)
+    except ValueError:
+        try:
+            return float(token)
+        except ValueError:
+            return Symbol(token)
+
+
+class SpanList(list):
+    """A list parsed from `source[start:end]`, clean until mutated."""
+
+    __slots__ = ("source", "start", "end", "depth", "dirty", "parent", "hash")
+
+    def __init__(
+        self,
+        items: Iterable = (),
+        source: Optional[str] = None,
+        start: int = 0,
+        end: int = 0,
+        depth: int = 0,
+    ):
+        list.__init__(self, items)
+        self.source = source
+        self.start = start
+        self.end = end
+        self.depth = depth
+        self.dirty = source is None
+        self.parent: Optional[SpanList] = None
+        # Merkle hash of the subtree, cached by sexp_hash.
+        self.hash: Optional[bytes] = None
+
+    def text(self) -> str:
+        return self.source[self.start : self.end]
+
+    def touch(self) -> None:
+        node = self
+        while node is not None and (not node.dirty or node.hash is not None):
+            node.dirty = True
+            node.hash = None
+            node = node.parent
+
+    def _adopt(self, items) -> None:
+        for item in items:
+            if type(item) is SpanList:
+                item.parent = self
+
+    # ---- mutators: all of them dirty the list ----
+
+    def __setitem__(self, index, value):
+        self.touch()
+        list.__setitem__(self, index, value)
+        self._adopt(value if isinstance(index, slice) else (value,))
+
+    def __delitem__(self, index):
+        self.touch()
+        list.__delitem__(self, index)
+
+    def __iadd__(self, other):
+        self.touch()
+        other = list(other)
+        list.extend(self, other)
+        self._adopt(other)
+        return self
+
+    def __imul__(self, n):
+        self.touch()
+        return list.__imul__(self, n)
+
+    def append(self, item):
+        self.touch()
+        list.append(self, item)
+        self._adopt((item,))
+
+    def extend(self, items):
+        self.touch()
+        items = list(items)
+        list.extend(self, items)
+        self._adopt(items)
+
+    def insert(self, index, item):
+        self.touch()
+        list.insert(self, index, item)
+        self._adopt((item,))
+
+    def pop(self, *args):
+        self.touch()
+        return list.pop(self, *args)
+
+    def remove(self, item):
+        self.touch()
+        list.remove(self, item)
+
+    def clear(self):
+        self.touch()
+        list.clear(self)
+
+    def sort(self, *args, **kwargs):
+        self.touch()
+        list.sort(self, *args, **kwargs)
+
+    def reverse(self):
+        self.touch()
+        list.reverse(self)
+
+    # ---- copies keep the span (and pickling must not replay mutators) ----
+
+    def __copy__(self):
+        # Children are shared and keep reporting to their first parent, so a
+        # shallow copy can't tell when they change: it is always formatted.
+        node = SpanList(self, self.source, self.start, self.end, self.depth)
+        node.dirty = True
+        return node
+
+    def __deepcopy__(self, memo):
+        return copy_sexp(self)
+
+    def __reduce__(self):
+        return _restore, (
+            list(self),
+            self.source,
+            self.start,
+            self.end,
+            self.depth,
+            self.dirty,
+        )
+
+
+def _restore(items, source, start, end, depth, dirty) -> SpanList:
+    node = SpanList(items, source, start, end, depth)
+    node.dirty = dirty
+    node._adopt(items)
+    return node
+
+
+def derive(original: list, children: Iterable) -> list:
+    """
+    A new list standing for `original` with `children` derived one to one
+    from its children (copies, or the same atoms). It stays clean, keeping
+    the original span, while every child is unchanged; plain lists give
+    plain lists.
+    """
+    children = list(children)
+    if type(original) is not SpanList:
+        return children
+
+    clean = (
+        not original.dirty
+        and len(children) == len(original)
+        and all(
+            (
+                type(child) is SpanList
+                and not child.dirty
+                and child.start == source_child.start
+            )
+            if isinstance(child, list)
+            else child is source_child
+            for child, source_child in zip(children, original)
+        )
+    )
+    node = SpanList(
+        children, original.source, original.start, original.end, original.depth
+    )
+    node.dirty = not clean
+    node._adopt(children)
+    return node
+
+
+def _copy_list(
+    node: list, replace: Optional[Callable[[list], Any]]
+) -> tuple[list, bool]:
+    changed = False
+    children = []
+    for child in node:
+        if isinstance(child, list):
+            new_child = replace(child) if replace is not None else None
+            if new_child is None:
+                child, child_changed = _copy_list(child, replace)
+                changed = changed or child_changed
+            else:
+                child = new_child
+                changed = True
+        children.append(child)
+
+    if type(node) is not SpanList:
+        return children, changed
+
+    # Built without SpanList.__init__ and derive: copies are the hot path of
+    # template instantiation, and a copy is clean exactly when its source is
+    # and nothing was replaced below it.
+    copy = SpanList.__new__(SpanList)
+    list.extend(copy, children)
+    copy.source = node.source
+    copy.start = node.start
+    copy.end = node.end
+    copy.depth = node.depth
+    copy.dirty = node.dirty or changed
+    copy.hash = None if changed else node.hash
+    copy.parent = None
+    for child in children:
+        if type(child) is SpanList:
+            child.parent = copy
+    return copy, changed
+
+
+def copy_sexp(node: Any, replace: Optional[Callable[[list], Any]] = None) -> Any:
+    """
+    Structural copy: atoms are shared, lists copied, spans kept. `replace`
+    is called on every list below `node`; when it returns something other
+    than None, that is used instead of copying the list.
+    """
+    if isinstance(node, list):
+        return _copy_list(node, replace)[0]
+    return node
+
+
+def parse_sexp(text: str, depth: int = 0) -> Any:
+    """
+    sexpdata.loads equivalent building SpanList nodes. `depth` is the nesting
+    level of the parsed text inside its file (1 for a top-level item cut out
+    of a board), so the writer knows whether its indentation can be reused.
+    Inputs using syntax KiCad never writes (comments, quotes, brackets) are
+    handed to sexpdata as is.
+    """
+    stack: list[SpanList] = []
+    root = None
+    pos = 0
+    # Atoms repeat a lot (yes, 0, 1.27...): convert each distinct one once.
+    atoms: dict[str, Any] = {}
+    append = list.append
+
+    for match in _TOKEN_RE.finditer(text):
+        if match.start() != pos:
+            # Something the tokenizer does not know about.
+            return loads(text)
+        pos = match.end()
+        kind = match.lastindex
+
+        if kind == 1:
+            node = SpanList((), text, pos - 1, 0, depth + len(stack))
+            if stack:
+                append(stack[-1], node)
+                node.parent = stack[-1]
+            elif root is None:
+                root = node
+            else:
+                return loads(text)
+            stack.append(node)
+        elif kind == 2:
+            if not stack:
+                return loads(text)
+            stack.pop().end = pos
+        elif not stack:
+            return loads(text)
+        elif kind == 3:
+            string = match.group(3)
+            append(
+                stack[-1],
+                _ESCAPE_RE.sub(_unescape, string) if "\\" in string else string,
+            )
+        else:
+            token = match.group(4)
+            value = atoms.get(token)
+            if value is None:
+                value = _atom(token)
+                if token == "nil":
+                    # a fresh (mutable) empty list every time
+                    append(stack[-1], value)
+                    continue
+                atoms[token] = value
+            append(stack[-1], value)
+
+    if text[pos:].strip() or stack or root is None:
+        return loads(text)
+    return root
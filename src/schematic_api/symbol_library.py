@@ -0,0 +1,149 @@
+"""
+Project symbol library (<project>.kicad_sym).
+
+Every sheet embeds, in (lib_symbols ...), the definitions of the symbols
+it uses: KiCad draws symbols from this cache, so it can't be dropped. The
+project library holds each distinct definition once, whatever the number
+of sheets and instances embedding it, and is registered in the project's
+sym-lib-table: symbols can be placed again, or sheets updated, from it.
+
+Definitions are told apart by content (Merkle hash, see sexp_hash): two
+templates embedding the same Device:R share one library symbol, while
+differing definitions of the same name get a suffix (GND, GND_1...), the
+way KiCad names differing cached symbols.
+"""
+
+from typing import Any, Optional
+
+from sexpdata import Symbol
+
+from schematic_api.sexp_hash import sexp_hash
+from schematic_api.span_sexp import copy_sexp
+
+# KiCad 9 symbol libraries
+LIBRARY_VERSION = 20241209
+
+_LIB_SYMBOLS = Symbol("lib_symbols")
+_SYMBOL = Symbol("symbol")
+_LIB_ID = Symbol("lib_id")
+_LIB_NAME = Symbol("lib_name")
+
+
+def _lib_symbols(schematic: list) -> Optional[list]:
+    return next(
+        (
+            node
+            for node in schematic
+            if isinstance(node, list) and node and node[0] == _LIB_SYMBOLS
+        ),
+        None,
+    )
+
+
+def used_symbol_names(schematic: list) -> set[str]:
+    """Cache names the symbols of a sheet are drawn from (lib_name, else lib_id)."""
+    names = set()
+    for node in schematic:
+        if not (isinstance(node, list) and node and node[0] == _SYMBOL):
+            continue
+        lib_id = lib_name = None
+        for child in node[1:]:
+            if isinstance(child, list) and len(child) > 1:
+                if child[0] == _LIB_NAME:
+                    lib_name = str(child[1])
+                elif child[0] == _LIB_ID:
+                    lib_id = str(child[1])
+        if lib_name or lib_id:
+            names.add(lib_name or lib_id)
+    return names
+
+
+def prune_lib_symbols(schematic: list) -> int:
+    """
+    Drops the cached definitions no symbol of the sheet uses, returns how
+    many. The sheet is left untouched (clean) when they are all used.
+    """
+    lib_symbols = _lib_symbols(schematic)
+    if lib_symbols is None:
+        return 0
+    used = used_symbol_names(schematic)
+    unused = [
+        i
+        for i, node in enumerate(lib_symbols)
+        if i > 0
+        and isinstance(node, list)
+        and len(node) > 1
+        and str(node[1]) not in used
+    ]
+    for i in reversed(unused):
+        del lib_symbols[i]
+    return len(unused)
+
+
+def _base_name(cache_name: str) -> str:
+    # "Device:R" -> "R": library symbols are named without a nickname, and
+    # so are the units of cached ones ("R_0_1").
+    return cache_name.rsplit(":", 1)[-1]
+
+
+class ProjectSymbolLibrary:
+    """Distinct symbol definitions collected from sheets, by content."""
+
+    def __init__(self):
+        # content hash -> library symbol
+        self._symbols: dict[bytes, list] = {}
+        self._names: set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self._symbols)
+
+    def add_schematic(self, schematic: list) -> None:
+        """Adds the definitions the sheet's symbols use (the sheet is not modified)."""
+        lib_symbols = _lib_symbols(schematic)
+        if lib_symbols is None:
+            return
+        used = used_symbol_names(schematic)
+        for node in lib_symbols[1:]:
+            if isinstance(node, list) and len(node) > 1 and str(node[1]) in used:
+                self.add(node)
+
+    def add(self, cached: list) -> str:
+        """Adds a cached definition, returns its name in the library."""
+        key = sexp_hash(cached)
+        symbol = self._symbols.get(key)
+        if symbol is not None:
+            return str(symbol[1])
+        base = _base_name(str(cached[1]))
+        name, n = base, 0
+        while name in self._names:
+            n += 1
+            name = f"{base}_{n}"
+        self._names.add(name)
+        self._symbols[key] = self._library_symbol(cached, base, name)
+        return name
+
+    @staticmethod
+    def _library_symbol(cached: list, base: str, name: str) -> list:
+        symbol = copy_sexp(cached)
+        symbol[1] = name
+        if name != base:
+            # Units are named after their symbol: "R_0_1" -> "R_1_0_1".
+            for child in symbol[2:]:
+                if (
+                    isinstance(child, list)
+                    and len(child) > 1
+                    and child[0] == _SYMBOL
+                    and str(child[1]).startswith(base + "_")
+                ):
+                    child[1] = name + str(child[1])[len(base) :]
+        return symbol
+
+    def data(self) -> list[Any]:
+        """The library, symbols sorted by name."""
+        return [
+            Symbol("kicad_symbol_lib"),
+            [Symbol("version"), LIBRARY_VERSION],
+            [Symbol("generator"), "kicad_symbol_editor"],
+            [Symbol("generator_version"), "9.0"],
+            *sorted(self._symbols.values(), key=lambda symbol: str(symbol[1])),
+        ]
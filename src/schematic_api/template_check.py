@@ -0,0 +1,376 @@
+"""
+Template checks (`main.py validate`, and the preflight of `main.py new`).
+
+A template is checked for what generation relies on: meta.yaml, sheet
+and board parse; meta.yaml pins match the sheet's hierarchical labels;
+footprints point (path ...) to symbols of the sheet; footprints have the
+courtyard board placement measures them with (extracts_boundaries); nets
+are declared once and used consistently. Fatal problems stop generation
+halfway, errors give a broken project (unconnected sheet pins...).
+
+Results are cached by the content of the template files, so checking
+templates that did not change only costs hashing them: `new` checks the
+templates it is given before creating anything.
+"""
+
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+from sexpdata import Symbol
+
+from schematic_api.cache import cache_dir
+from schematic_api.sinks import atomic_write
+
+# Bumped whenever checks change, so cached results are not reused.
+CHECK_VERSION = 1
+# Board area designs are placed in (add_multiple_designs' max_x and max_y).
+BOARD_SIZE = (285, 198)
+
+_NET = Symbol("net")
+_PROPERTY = Symbol("property")
+
+
+@dataclass
+class TemplateReport:
+    name: str
+    # generation would fail
+    fatal: list[str] = field(default_factory=list)
+    # the generated project would be broken
+    errors: list[str] = field(default_factory=list)
+    warnings: list[str] = field(default_factory=list)
+    # relative path -> SHA-256 of every file checked, None if it was
+    # missing (the cache key)
+    files: dict[str, Optional[str]] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return not (self.fatal or self.errors)
+
+
+def _child(node: list, head: str) -> Optional[list]:
+    head = Symbol(head)
+    return next(
+        (
+            child
+            for child in node[1:]
+            if isinstance(child, list) and child and child[0] == head
+        ),
+        None,
+    )
+
+
+def _property(node: list, name: str) -> Optional[str]:
+    for child in node[1:]:
+        if (
+            isinstance(child, list)
+            and len(child) > 2
+            and child[0] == _PROPERTY
+            and child[1] == name
+        ):
+            return str(child[2])
+    return None
+
+
+def _items(tree: list, head: str) -> list[list]:
+    head = Symbol(head)
+    return [
+        node for node in tree if isinstance(node, list) and node and node[0] == head
+    ]
+
+
+class _Reader:
+    # Reads the files of a template folder, keeping their digests.
+
+    def __init__(self, folder: Path, report: TemplateReport):
+        self.folder = folder
+        self.report = report
+
+    def read(self, path: Path) -> Optional[bytes]:
+        name = os.path.relpath(path, self.folder)
+        try:
+            data = path.read_bytes()
+        except OSError as error:
+            self.report.files[name] = None
+            self.report.fatal.append(
+                f"{name}: can't be read ({error.strerror or error})"
+            )
+            return None
+        self.report.files[name] = hashlib.sha256(data).hexdigest()
+        return data
+
+    def parse(self, path: Path, head: str) -> Optional[list]:
+        from schematic_api.span_sexp import parse_sexp
+
+        data = self.read(path)
+        if data is None:
+            return None
+        try:
+            tree = parse_sexp(data.decode("utf-8"))
+        except Exception as error:
+            self.report.fatal.append(f"{path.name}: can't be parsed ({error})")
+            return None
+        if not (isinstance(tree, list) and tree and tree[0] == Symbol(head)):
+            self.report.fatal.append(f"{path.name}: not a {head} file")
+            return None
+        return tree
+
+
+def check_template(folder: str | Path) -> TemplateReport:
+    """Checks the template in `folder` (uncached)."""
+    import yaml
+
+    folder = Path(folder)
+    report = TemplateReport(folder.name)
+    reader = _Reader(folder, report)
+
+    meta_data = reader.read(folder / "meta.yaml")
+    if meta_data is None:
+        return report
+    try:
+        meta = yaml.safe_load(meta_data)
+    except yaml.YAMLError as error:
+        report.fatal.append(f"meta.yaml: can't be parsed ({error})")
+        return report
+    if not isinstance(meta, dict):
+        report.fatal.append("meta.yaml: not a mapping")
+        return report
+    missing = [
+        key
+        for key in ("sheet_name", "sheet_file", "at_xy", "size_wh", "pins")
+        if key not in meta
+    ]
+    if missing:
+        report.fatal.append(f"meta.yaml: missing {', '.join(missing)}")
+    if "sheet_file" not in meta:
+        return report
+
+    sheet = reader.parse(folder / meta["sheet_file"], "kicad_sch")
+    if sheet is not None:
+        _check_pins(sheet, meta.get("pins") or [], report)
+
+    if meta.get("pcb_file") is not None:
+        board = reader.parse(folder / meta["pcb_file"], "kicad_pcb")
+        if board is not None:
+            _check_board(board, sheet, report)
+    return report
+
+
+def _check_pins(sheet: list, pins: list, report: TemplateReport) -> None:
+    # Pins of the sheet symbol are joined to the sheet through its labels.
+    labels = {}
+    for label in _items(sheet, "hierarchical_label"):
+        if len(label) > 1:
+            shape = _child(label, "shape")
+            labels[str(label[1])] = (
+                str(shape[1]) if shape is not None and len(shape) > 1 else None
+            )
+    names = set()
+    for pin in pins:
+        name = str(pin.get("name")) if isinstance(pin, dict) else None
+        if not name:
+            report.fatal.append(f"meta.yaml: pin without a name ({pin!r})")
+            continue
+        names.add(name)
+        if name not in labels:
+            report.errors.append(
+                f"pin {name}: no hierarchical label {name!r} in the sheet"
+            )
+        elif pin.get("type") and labels[name] and str(pin["type"]) != labels[name]:
+            report.warnings.append(
+                f"pin {name}: type {pin['type']} but the label is {labels[name]}"
+            )
+    for name in sorted(set(labels) - names):
+        report.warnings.append(f"hierarchical label {name!r} has no pin in meta.yaml")
+
+
+def _check_board(board: list, sheet: Optional[list], report: TemplateReport) -> None:
+    from schematic_api.kicad_api import KiCadAPI
+
+    # Nets: declared once, used with their declared name.
+    declared: dict[int, str] = {}
+    for net in _items(board, "net"):
+        if len(net) > 2 and isinstance(net[1], int):
+            if net[1] in declared:
+                report.errors.append(f"net {net[1]} is declared twice")
+            declared[net[1]] = str(net[2])
+    if len(set(declared.values())) < len(declared):
+        report.errors.append("several nets have the same name")
+
+    def check_nets(node: list, where: str) -> None:
+        if node and node[0] == _NET and len(node) > 1 and isinstance(node[1], int):
+            name = declared.get(node[1])
+            if declared and name is None:
+                report.errors.append(f"{where}: net {node[1]} is not declared")
+            elif name is not None and len(node) > 2 and str(node[2]) != name:
+                report.errors.append(
+                    f"{where}: net {node[1]} named {node[2]!r}, declared as {name!r}"
+                )
+            return
+        for child in node:
+            if isinstance(child, list):
+                check_nets(child, where)
+
+    symbols = {}
+    if sheet is not None:
+        for symbol in _items(sheet, "symbol"):
+            uuid = _child(symbol, "uuid")
+            if uuid is not None and len(uuid) > 1:
+                symbols[str(uuid[1]).strip('"')] = symbol
+
+    footprints = _items(board, "footprint")
+    linked = set()
+    for footprint in footprints:
+        reference = _property(footprint, "Reference") or "?"
+        where = f"footprint {reference}"
+        check_nets(footprint, where)
+
+        # (path "/<sheet>/<symbol uuid>") gives the footprint its instance path.
+        path = _child(footprint, "path")
+        if path is None or len(path) < 2:
+            report.errors.append(f"{where}: no (path ...) to its symbol")
+        elif sheet is not None:
+            symbol_uuid = str(path[1]).rstrip("/").rsplit("/", 1)[-1]
+            if symbol_uuid not in symbols:
+                report.errors.append(
+                    f"{where}: path {path[1]} matches no symbol of the sheet"
+                )
+            linked.add(symbol_uuid)
+
+        # Placement only measures F.CrtYd rectangles and lines.
+        if not any(
+            isinstance(child, list)
+            and child
+            and str(child[0]) in ("fp_rect", "fp_line")
+            and (_child(child, "layer") or [None, None])[1] == "F.CrtYd"
+            for child in footprint[1:]
+        ):
+            report.warnings.append(
+                f"{where}: no F.CrtYd rectangle or line, placement ignores its extent"
+            )
+    for item in board:
+        if (
+            isinstance(item, list)
+            and item
+            and str(item[0]) in ("segment", "arc", "via", "zone")
+        ):
+            check_nets(item, str(item[0]))
+
+    for uuid, symbol in symbols.items():
+        footprint_name = _property(symbol, "Footprint")
+        on_board = _child(symbol, "on_board")
+        if (
+            footprint_name
+            and uuid not in linked
+            and (on_board is None or str(on_board[1]) == "yes")
+        ):
+            reference = _property(symbol, "Reference") or uuid
+            report.warnings.append(f"symbol {reference}: no footprint on the board")
+
+    if footprints:
+        _, (width, height) = KiCadAPI().extracts_boundaries(board)
+        if width < 0 or height < 0:
+            report.fatal.append(
+                "no footprint has a F.CrtYd courtyard: the board can't be placed"
+            )
+        elif width > BOARD_SIZE[0] or height > BOARD_SIZE[1]:
+            report.fatal.append(
+                f"board is {width:g}x{height:g} mm, more than the {BOARD_SIZE[0]}x{BOARD_SIZE[1]} mm placed"
+            )
+
+
+# ---- cached checks ----
+
+
+class TemplateChecks:
+    """Check results by template folder, valid while its files are unchanged."""
+
+    def __init__(self, index_path: Optional[Path] = None):
+        self.index_path = index_path or cache_dir() / "template-checks.json"
+        try:
+            index = json.loads(self.index_path.read_text(encoding="utf-8"))
+            if index.get("version") != CHECK_VERSION:
+                raise ValueError("outdated check results")
+            self._entries: dict[str, Any] = index["entries"]
+        except (OSError, ValueError, KeyError):
+            self._entries = {}
+        self._dirty = False
+
+    def get(self, folder: Path) -> Optional[TemplateReport]:
+        entry = self._entries.get(str(Path(folder).resolve()))
+        if entry is None:
+            return None
+        for name, file_digest in entry["files"].items():
+            try:
+                with open(folder / name, "rb") as f:
+                    if hashlib.file_digest(f, "sha256").hexdigest() != file_digest:
+                        return None
+            except OSError:
+                if file_digest is not None:
+                    return None
+        return TemplateReport(
+            Path(folder).name,
+            entry["fatal"],
+            entry["errors"],
+            entry["warnings"],
+            entry["files"],
+        )
+
+    def put(self, folder: Path, report: TemplateReport) -> None:
+        self._entries[str(Path(folder).resolve())] = {
+            "fatal": report.fatal,
+            "errors": report.errors,
+            "warnings": report.warnings,
+            "files": report.files,
+        }
+        self._dirty = True
+
+    def save(self) -> None:
+        if self._dirty:
+            atomic_write(
+                self.index_path,
+                json.dumps(
+                    {"version": CHECK_VERSION, "entries": self._entries},
+                    separators=(",", ":"),
+                ).encode("utf-8"),
+            )
+            self._dirty = False
+
+
+def validate_templates(
+    folders: Iterable[str | Path],
+    processes: Optional[int] = None,
+    use_cache: bool = True,
+) -> list[TemplateReport]:
+    """
+    Reports for the template folders, in order. Templates whose files did
+    not change since they were last checked are not checked again; the
+    others are checked in a process pool.
+    """
+    folders = [Path(folder) for folder in folders]
+    checks = TemplateChecks() if use_cache else None
+    reports: dict[Path, TemplateReport] = {}
+    if checks is not None:
+        for folder in folders:
+            cached = checks.get(folder)
+            if cached is not None:
+                reports[folder] = cached
+
+    todo = list(dict.fromkeys(folder for folder in folders if folder not in reports))
+    if processes == 1 or len(todo) <= 1:
+        results = map(check_template, todo)
+    else:
+        with ProcessPoolExecutor(processes) as pool:
+            results = list(pool.map(check_template, todo))
+    for folder, report in zip(todo, results):
+        reports[folder] = report
+        if checks is not None:
+            checks.put(folder, report)
+
+    if checks is not None:
+        checks.save()
+    return [reports[folder] for folder in folders]
@@ -0,0 +1,635 @@
+"""
+Carrying template changes into generated projects (`main.py sync`).
+
+A project records where its sheets and board fragments come from (see
+provenance). When a template changed since, its instances are generated
+again twice, with the same UUIDs (derived again, or recorded when they
+were random), annotation and board placement: from the template as it was
+(the base, what was written then) and as it is now. The project files are
+then merged three ways, item by item, items being matched on their UUID
+(nets on their name): what only the template changed is taken from the
+new version, what only the project changed is kept. An item changed on
+both sides is a conflict: the project's version is kept, and reported.
+References and footprint positions stay the project's. Rewritten files
+that were still as generated are recorded anew in the build state, so
+that `new --regenerate` doesn't take them for edited ones.
+
+Projects are independent of each other: sync_projects runs them in a
+process pool.
+"""
+
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Optional
+
+from sexpdata import Symbol
+
+from schematic_api.build_state import BuildState, file_digest
+from schematic_api.journal import Journal
+from schematic_api.parsed_files import ParsedFileCache
+from schematic_api.provenance import Provenance
+from schematic_api.sexp_hash import node_label, same_sexp
+from schematic_api.sinks import DiskSink, ProjectSink
+from schematic_api.span_sexp import parse_sexp
+from schematic_api.templates import TemplateCatalog
+from schematic_api.uuid_factory import DeterministicUuidFactory, RecordedUuidFactory
+
+_UUID = Symbol("uuid")
+_NET = Symbol("net")
+_SHEET = Symbol("sheet")
+_PROPERTY = Symbol("property")
+# KiCad 9 writes "Sheetfile", the generator and older versions "Sheet file".
+_SHEET_FILE_PROPERTIES = ("Sheetfile", "Sheet file")
+# Children of an item that belong to the project (annotation, placement):
+# left out when comparing, and always the project's.
+_PROJECT_CHILDREN = {"symbol": ("instances",), "footprint": ("at",)}
+# Items merged child by child rather than as a whole.
+_CONTAINERS = ("lib_symbols",)
+
+# Parsed template files, kept by each worker process from one project to the next.
+_sources: Optional[ParsedFileCache] = None
+
+
+@dataclass
+class SyncResult:
+    project: str
+    # sheet files of the instances synced
+    synced: list[str] = field(default_factory=list)
+    written: list[str] = field(default_factory=list)
+    # items changed both in the template and in the project (kept as in the project)
+    conflicts: list[str] = field(default_factory=list)
+    notes: list[str] = field(default_factory=list)
+    # why the project was not synced at all
+    skipped: Optional[str] = None
+    error: Optional[str] = None
+
+
+# ---- three-way merge ----
+
+
+def _is_reference(node: Any) -> bool:
+    return (
+        isinstance(node, list)
+        and len(node) > 2
+        and node[0] == _PROPERTY
+        and str(node[1]).strip('"') == "Reference"
+    )
+
+
+def _item_key(item: list) -> tuple:
+    for child in item[1:]:
+        if isinstance(child, list) and len(child) > 1 and child[0] == _UUID:
+            return ("uuid", str(child[1]).strip('"'))
+    if item[0] == _NET and len(item) > 2:
+        return ("net", str(item[2]))
+    if len(item) > 1 and isinstance(item[1], str) and not isinstance(item[1], Symbol):
+        # (symbol "Device:R" ...) in lib_symbols
+        return (str(item[0]), item[1])
+    return (str(item[0]),)
+
+
+def _keyed(node: list) -> dict[tuple, list]:
+    # key -> item for the list children of `node`, repeated keys numbered.
+    items: dict[tuple, list] = {}
+    for child in node:
+        if isinstance(child, list) and child:
+            key = _item_key(child)
+            n = 0
+            while key + (n,) in items:
+                n += 1
+            items[key + (n,)] = child
+    return items
+
+
+def _masked(item: Optional[list]) -> Optional[list]:
+    # The item without what belongs to the project, for comparisons.
+    if item is None or str(item[0]) not in _PROJECT_CHILDREN:
+        return item
+    kept = _PROJECT_CHILDREN[str(item[0])]
+    masked = [item[0]]
+    for child in item[1:]:
+        if isinstance(child, list) and child and str(child[0]) in kept:
+            child = [child[0]]
+        elif _is_reference(child):
+            child = list(child[:2])
+        masked.append(child)
+    return masked
+
+
+def _graft(theirs: list, ours: list) -> list:
+    # The template's new version of an item, with the project's part of `ours`.
+    kept = _PROJECT_CHILDREN.get(str(theirs[0]))
+    if kept is None:
+        return theirs
+    own = {
+        str(child[0]): child
+        for child in ours[1:]
+        if isinstance(child, list) and child and str(child[0]) in kept
+    }
+    reference = next((child for child in ours[1:] if _is_reference(child)), None)
+    grafted = [theirs[0]]
+    for child in theirs[1:]:
+        if isinstance(child, list) and child and str(child[0]) in own:
+            child = own[str(child[0])]
+        elif _is_reference(child) and reference is not None:
+            child = [*child[:2], reference[2], *child[3:]]
+        grafted.append(child)
+    return grafted
+
+
+def _same(a: Optional[list], b: Optional[list]) -> bool:
+    if a is None or b is None:
+        return a is b
+    return same_sexp(a, b)
+
+
+def merge_into(
+    base: list, ours: list, theirs: list, conflicts: list[str], where: str = ""
+) -> bool:
+    """
+    Three-way merge of the items of `ours`, edited in place: the changes
+    from `base` to `theirs` are applied where `ours` still has the base
+    version. Conflicting items are kept and described in `conflicts`.
+    Returns whether `ours` changed.
+    """
+    base_items, their_items = _keyed(base), _keyed(theirs)
+    changed = False
+    # [key, item]: atoms have no key
+    result: list[list] = []
+    for key, item in _keyed_children(ours):
+        if key is None or (key not in base_items and key not in their_items):
+            result.append([key, item])
+            continue
+        base_item, their_item = base_items.get(key), their_items.get(key)
+        if _same(base_item, their_item) or _same(_masked(item), _masked(their_item)):
+            result.append([key, item])
+        elif base_item is not None and _same(_masked(item), _masked(base_item)):
+            # Only the template changed it.
+            changed = True
+            if their_item is not None:
+                result.append([key, _graft(their_item, item)])
+        elif (
+            str(item[0]) in _CONTAINERS
+            and base_item is not None
+            and their_item is not None
+        ):
+            changed = (
+                merge_into(base_item, item, their_item, conflicts, where) or changed
+            )
+            result.append([key, item])
+        else:
+            conflicts.append(f"{where}: {node_label(item)}")
+            result.append([key, item])
+
+    # Items the template added go after the item preceding them there.
+    present = {key for key, _ in result}
+    inserts: dict[Optional[tuple], list[list]] = {}
+    anchor = None
+    for key, item in their_items.items():
+        if key in present:
+            anchor = key
+            continue
+        base_item = base_items.get(key)
+        if base_item is not None:
+            if not _same(base_item, item):
+                conflicts.append(
+                    f"{where}: {node_label(item)} (deleted in the project)"
+                )
+            continue
+        if anchor is None:
+            # Nothing before it: after the last item of the same kind.
+            last = next(
+                (k for k, i in reversed(result) if k is not None and k[0] == key[0]),
+                None,
+            )
+            inserts.setdefault(last or ("end",), []).append(item)
+            continue
+        inserts.setdefault(anchor, []).append(item)
+    if inserts:
+        changed = True
+
+    if not changed:
+        return False
+    children = []
+    for key, item in result:
+        children.append(item)
+        children.extend(inserts.get(key, ()))
+    children.extend(inserts.get(("end",), ()))
+    Journal().replace_all(ours, children)
+    return True
+
+
+def _keyed_children(node: list) -> Iterator[tuple[Optional[tuple], Any]]:
+    counts: dict[tuple, int] = {}
+    for child in node:
+        if not (isinstance(child, list) and child):
+            yield None, child
+            continue
+        key = _item_key(child)
+        n = counts.get(key, 0)
+        counts[key] = n + 1
+        yield key + (n,), child
+
+
+# ---- one project ----
+
+
+def _sheet_links(sink: ProjectSink, project: str) -> set[tuple[str, str]]:
+    # (sheet file, sheet path) of every sheet of the project, following the
+    # sheet file links down from the root sheet.
+    links: set[tuple[str, str]] = set()
+    seen: set[str] = set()
+
+    def walk(file_name: str, sheet_path: str) -> None:
+        if file_name in seen or not sink.exists(file_name):
+            return
+        seen.add(file_name)
+        for node in parse_sexp(sink.read_text(file_name)):
+            if not (isinstance(node, list) and node and node[0] == _SHEET):
+                continue
+            sheet_file = next(
+                (
+                    str(child[2])
+                    for child in node[1:]
+                    if isinstance(child, list)
+                    and len(child) > 2
+                    and child[0] == _PROPERTY
+                    and str(child[1]) in _SHEET_FILE_PROPERTIES
+                ),
+                None,
+            )
+            sheet_uuid = next(
+                (
+                    str(child[1]).strip('"')
+                    for child in node[1:]
+                    if isinstance(child, list) and len(child) > 1 and child[0] == _UUID
+                ),
+                None,
+            )
+            if sheet_file is None or sheet_uuid is None:
+                continue
+            path = f"{sheet_path}/{sheet_uuid}"
+            links.add((sheet_file, path))
+            walk(sheet_file, path)
+
+    walk(f"{project}.kicad_sch", "")
+    return links
+
+
+def _reference_counters(sink: ProjectSink) -> dict[str, int]:
+    # Highest number used by each reference prefix in the project, so
+    # symbols a template gains get references no other symbol has.
+    counters: dict[str, int] = {}
+    pattern = re.compile(r'\((?:reference|property "Reference") "([^"0-9]*?)(\d+)"')
+    for name in sink.names():
+        if name.endswith(".kicad_sch"):
+            for prefix, number in pattern.findall(sink.read_text(name)):
+                counters[prefix] = max(counters.get(prefix, 0), int(number))
+    return counters
+
+
+def _synced_references(
+    api, symbol_sources: list, record: dict[str, Any], counters: dict[str, int]
+) -> tuple[list, dict, dict]:
+    # References of the symbols of the new template version: the recorded
+    # ones, and new ones for symbols the template gained.
+    reference_map = dict(record["reference_map"])
+    symbol_reference_map = dict(record["symbol_reference_map"])
+    units: dict[str, set[int]] = {}
+    for _, original_ref, unit in symbol_sources:
+        if original_ref:
+            units.setdefault(original_ref, set()).add(unit)
+
+    symbol_refs: list[str | None] = []
+    for source_uuid, original_ref, _ in symbol_sources:
+        if not original_ref:
+            symbol_refs.append(None)
+            continue
+        new_ref = symbol_reference_map.get(source_uuid) if source_uuid else None
+        if new_ref is None and len(units[original_ref]) > 1:
+            new_ref = reference_map.get(original_ref)
+        if new_ref is None:
+            new_ref = api._allocate_reference(original_ref, counters)
+            reference_map.setdefault(original_ref, new_ref)
+        if source_uuid:
+            symbol_reference_map[source_uuid] = new_ref
+        symbol_refs.append(new_ref)
+    return symbol_refs, reference_map, symbol_reference_map
+
+
+def _placements(
+    api,
+    records: list[dict[str, Any]],
+    provenance: Provenance,
+    project_path: Path,
+    template=None,
+    counters: Optional[dict[str, int]] = None,
+) -> list[dict[str, Any]]:
+    # The placed instances of one sheet file, as generated from the recorded
+    # template version (template None) or from `template` as it is now.
+    from schematic_api.kicad_api import InstantiatedSubsystem
+
+    placements = []
+    owner = None
+    for record in records:
+        if template is None:
+            source_sheet = provenance.snapshot_path(record["sheet"], ".kicad_sch")
+            pcb_file = (
+                None
+                if record["pcb"] is None
+                else provenance.snapshot_path(record["pcb"], ".kicad_pcb")
+            )
+            symbol_refs = record["symbol_refs"]
+            reference_map, symbol_reference_map = (
+                record["reference_map"],
+                record["symbol_reference_map"],
+            )
+        else:
+            source_sheet = Path(template.sheet_file)
+            pcb_file = None if template.pcb_file is None else Path(template.pcb_file)
+            symbol_sources = api._template_symbols(api._read_template(source_sheet))
+            symbol_refs, reference_map, symbol_reference_map = _synced_references(
+                api, symbol_sources, record, counters
+            )
+        instance = InstantiatedSubsystem(
+            dev_name=record["template"],
+            sheet_name=record["sheet_name"],
+            sheet_file=project_path / record["sheet_file"],
+            pcb_file=pcb_file,
+            at_xy=[0, 0],
+            size_wh=[0, 0],
+            reference_map=reference_map,
+            symbol_reference_map=symbol_reference_map,
+            source_sheet=source_sheet,
+            symbol_refs=symbol_refs,
+            clone_owner=owner,
+        )
+        owner = owner or instance
+        placements.append(
+            {
+                "object": instance,
+                "record": record,
+                "root_uuid": provenance.root_uuid,
+                "sheet_path": record["sheet_path"],
+                "sheet_name_path": record["sheet_name_path"],
+            }
+        )
+    return placements
+
+
+def _board_items(
+    api,
+    placements: list[dict[str, Any]],
+    board_nets: dict[str, int],
+    next_net_id: list[int],
+) -> list:
+    # Board items of the placed instances at their recorded offsets, their
+    # nets numbered as on the project board (new nets after its last one).
+    items = []
+    for placed in placements:
+        offset = placed["record"]["offset"]
+        if placed["object"].pcb_file is None or offset is None:
+            continue
+        tree = api._prepare_instance_pcb(
+            placed["object"], placed["sheet_path"], placed["sheet_name_path"]
+        )
+        if not tree:
+            continue
+        fragment = api._placed_fragment_items(tree, offset[0], offset[1], 1)
+        net_ids = {0: 0}
+        for item in fragment:
+            if item[0] == _NET and len(item) > 2 and isinstance(item[1], int):
+                name = str(item[2])
+                if name not in board_nets:
+                    board_nets[name] = next_net_id[0]
+                    next_net_id[0] += 1
+                net_ids[item[1]] = board_nets[name]
+        for item in fragment:
+            _renumber_nets(item, net_ids)
+        items.extend(fragment)
+    return items
+
+
+def _renumber_nets(node: list, net_ids: dict[int, int]) -> None:
+    if (
+        node
+        and node[0] == _NET
+        and len(node) > 1
+        and isinstance(node[1], int)
+        and node[1] in net_ids
+    ):
+        node[1] = net_ids[node[1]]
+    for child in node:
+        if isinstance(child, list):
+            _renumber_nets(child, net_ids)
+
+
+def sync_project(
+    project_folder: str | Path,
+    templates_folder: str | Path,
+    template_names: Iterable[str] = (),
+    dry_run: bool = False,
+) -> SyncResult:
+    """
+    Brings the instances of changed templates (of `template_names` only,
+    when given) in the project folder up to date, keeping the project's
+    own edits. With `dry_run`, nothing is written.
+    """
+    from schematic_api.kicad_api import KiCadAPI, _format_sexp_kicad
+
+    global _sources
+    sink = DiskSink(project_folder)
+    result = SyncResult(sink.root.name)
+    provenance = Provenance.load(sink)
+    if provenance is None:
+        result.skipped = "no provenance recorded (generated by an older version)"
+        return result
+    if provenance.deterministic:
+        uuids = DeterministicUuidFactory(provenance.project)
+    elif provenance.uuids is not None:
+        # UUIDs of items the template gained are recorded for the next sync.
+        uuids = RecordedUuidFactory(recorded=provenance.uuids)
+    else:
+        result.skipped = "generated with random UUIDs that were not recorded"
+        return result
+
+    # Instances of changed templates still linked from the project, by sheet file
+    catalog = TemplateCatalog(Path(templates_folder))
+    template_names = set(template_names)
+    links = _sheet_links(sink, provenance.project)
+    digests: dict[Path, str] = {}
+
+    def current_digest(path) -> Optional[str]:
+        if path is None:
+            return None
+        path = Path(path)
+        if path not in digests:
+            digests[path] = file_digest(path)
+        return digests[path]
+
+    stale: dict[str, list[dict[str, Any]]] = {}
+    templates = {}
+    for record in provenance.instances:
+        name = record["template"]
+        if template_names and name not in template_names:
+            continue
+        template = templates.get(name) or catalog.get(name)
+        if template is None:
+            result.notes.append(f"{record['sheet_file']}: template '{name}' not found")
+            continue
+        templates[name] = template
+        if record["sheet"] == current_digest(template.sheet_file) and record[
+            "pcb"
+        ] == current_digest(template.pcb_file):
+            continue
+        if (record["sheet_file"], record["sheet_path"]) not in links:
+            result.notes.append(
+                f"{record['sheet_file']}: no longer in the project, left as is"
+            )
+            continue
+        stale.setdefault(record["sheet_file"], []).append(record)
+    if not stale:
+        return result
+
+    if _sources is None:
+        _sources = ParsedFileCache()
+    api = KiCadAPI(uuids=uuids, sources=_sources)
+    counters = _reference_counters(sink)
+    outputs: dict[str, str] = {}
+    synced: list[tuple[list[dict], list[dict]]] = []
+
+    for sheet_file, records in stale.items():
+        template = templates[records[0]["template"]]
+        base = _placements(api, records, provenance, sink.root)
+        theirs = _placements(api, records, provenance, sink.root, template, counters)
+        synced.append((base, theirs))
+        result.synced.append(sheet_file)
+        if not sink.exists(sheet_file):
+            result.notes.append(f"{sheet_file}: missing, left as is")
+            continue
+        ours = parse_sexp(sink.read_text(sheet_file))
+        if merge_into(
+            api._patch_instantiated_schematic(base, provenance.project),
+            ours,
+            api._patch_instantiated_schematic(theirs, provenance.project),
+            result.conflicts,
+            sheet_file,
+        ):
+            outputs[sheet_file] = _format_sexp_kicad(ours)
+
+    board_file = f"{provenance.project}.kicad_pcb"
+    if sink.exists(board_file) and any(
+        placed["object"].pcb_file is not None
+        for pair in synced
+        for side in pair
+        for placed in side
+    ):
+        ours = parse_sexp(sink.read_text(board_file))
+        board_nets = {
+            str(item[2]): item[1]
+            for item in ours
+            if isinstance(item, list) and len(item) > 2 and item[0] == _NET
+        }
+        next_net_id = [api._next_project_net_id(ours)]
+        base_board, their_board = [ours[0]], [ours[0]]
+        for base, theirs in synced:
+            base_board.extend(_board_items(api, base, board_nets, next_net_id))
+            their_board.extend(_board_items(api, theirs, board_nets, next_net_id))
+        if merge_into(base_board, ours, their_board, result.conflicts, board_file):
+            outputs[board_file] = _format_sexp_kicad(ours)
+
+    if dry_run:
+        result.written = sorted(outputs)
+        return result
+    # Files edited in the project stay so in the build state.
+    state = BuildState(sink)
+    as_generated = [name for name in outputs if state.unchanged(name)]
+    for file_name, text in outputs.items():
+        if sink.write_text(file_name, text):
+            result.written.append(file_name)
+    if as_generated and BuildState.exists(sink):
+        state.save_rewritten(as_generated)
+
+    # What was synced is the base of the next sync.
+    for _, theirs in synced:
+        template = templates[theirs[0]["record"]["template"]]
+        for placed in theirs:
+            record, instance = placed["record"], placed["object"]
+            record["sheet"] = provenance.add_snapshot(
+                template.sheet_file, current_digest(template.sheet_file)
+            )
+            record["pcb"] = (
+                None
+                if template.pcb_file is None
+                else provenance.add_snapshot(
+                    template.pcb_file, current_digest(template.pcb_file)
+                )
+            )
+            record["symbol_refs"] = instance.symbol_refs
+            record["reference_map"] = instance.reference_map
+            record["symbol_reference_map"] = instance.symbol_reference_map
+    if isinstance(uuids, RecordedUuidFactory):
+        provenance.uuids = uuids.recorded
+    provenance.save(sink)
+    return result
+
+
+# ---- many projects ----
+
+
+def find_projects(folders: Iterable[str | Path]) -> list[Path]:
+    """Project folders among `folders` and the folders they hold."""
+    projects = []
+    for folder in folders:
+        folder = Path(folder)
+        if Provenance.exists(DiskSink(folder)) or any(folder.glob("*.kicad_pro")):
+            projects.append(folder)
+            continue
+        projects.extend(
+            sorted(
+                child
+                for child in folder.iterdir()
+                if child.is_dir() and Provenance.exists(DiskSink(child))
+            )
+        )
+    return projects
+
+
+def sync_projects(
+    project_folders: Iterable[str | Path],
+    templates_folder: str | Path,
+    template_names: Iterable[str] = (),
+    dry_run: bool = False,
+    processes: Optional[int] = None,
+) -> Iterator[SyncResult]:
+    """sync_project over many projects in a process pool, results as they complete."""
+    project_folders = list(project_folders)
+    template_names = tuple(template_names)
+    if processes == 1 or len(project_folders) <= 1:
+        for folder in project_folders:
+            yield _sync_or_error(folder, templates_folder, template_names, dry_run)
+        return
+
+    with ProcessPoolExecutor(processes) as pool:
+        futures = [
+            pool.submit(
+                _sync_or_error, folder, templates_folder, template_names, dry_run
+            )
+            for folder in project_folders
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def _sync_or_error(
+    project_folder, templates_folder, template_names, dry_run
+) -> SyncResult:
+    # One failing project must not stop the others.
+    try:
+        return sync_project(project_folder, templates_folder, template_names, dry_run)
+    except Exception as error:
+        return SyncResult(
+            Path(project_folder).name, error=f"{type(error).__name__}: {error}"
+        )
@@ -1,17 +1,176 @@
+import json
+import os
+import zlib
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Any, Iterator
 
+from schematic_api.cache import cache_dir
 from schematic_api.hierarchical_object import HierarchicalObject
 
+CATALOG_INDEX_VERSION = 2
+
+
+@dataclass
+class TemplateEntry:
+    name: str
+    path: Path
+    template: HierarchicalObject | None = None
+    template_mtime_ns: int | None = None
+    summary: dict[str, Any] | None = field(default=None, repr=False)
+
+    @property
+    def meta_path(self) -> Path:
+        return self.path / "meta.yaml"
+
+
+class TemplateCatalog:
+    """Name -> template index over a subsystems folder.
+
+    Listing only scans the folder. meta.yaml files are parsed on demand, and
+    the summary shown by `list` (pin count, PCB presence, sheet size...) is
+    kept in a small index file, re-read only for templates whose meta.yaml
+    changed since it was written.
+    """
+
+    def __init__(self, templates_folder: Path, index_path: Path | None = None):
+        self.folder = Path(templates_folder)
+        if index_path is None:
+            # zlib rather than hashlib: it keeps `list` clear of the OpenSSL import
+            folder_key = f"{zlib.crc32(str(self.folder.resolve()).encode()):08x}"
+            index_path = cache_dir() / f"templates-{folder_key}.json"
+        self.index_path = index_path
+        self._entries: dict[str, TemplateEntry] = {}
+        self.refresh()
+        self._index: dict[str, Any] | None = None
+        self._index_dirty = False
+
+    def refresh(self) -> None:
+        """Picks up templates added to or removed from the folder."""
+        entries = {}
+        for entry in os.scandir(self.folder):
+            if entry.is_dir():
+                entries[entry.name] = self._entries.get(entry.name) or TemplateEntry(entry.name, Path(entry.path))
+        self._entries = entries
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._entries
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(sorted(self._entries))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def names(self) -> list[str]:
+        return sorted(self._entries)
+
+    def get(self, name: str) -> HierarchicalObject | None:
+        entry = self._entries.get(name)
+        if entry is None:
+            return None
+        try:
+            mtime_ns = entry.meta_path.stat().st_mtime_ns
+        except OSError:
+            return None
+        # Reloaded when meta.yaml changes: the server keeps catalogs for long.
+        if entry.template is None or entry.template_mtime_ns != mtime_ns:
+            entry.template = HierarchicalObject.load_from_yaml(entry.meta_path)
+            entry.template_mtime_ns = mtime_ns
+        return entry.template
+
+    def all(self) -> list[HierarchicalObject]:
+        result = []
+        for name in self:
+            template = self.get(name)
+            if template is None:
+                print(f"Warning: could not load template '{name}'")
+                continue
+            result.append(template)
+        return result
+
+    # ---- summaries ----
+
+    def _load_index(self) -> dict[str, Any]:
+        if self._index is None:
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    index = json.load(f)
+                if index.get("version") != CATALOG_INDEX_VERSION:
+                    raise ValueError("outdated catalog index")
+                self._index = index["entries"]
+            except (OSError, ValueError, KeyError):
+                self._index = {}
+        return self._index
+
+    def save_index(self) -> None:
+        if not self._index_dirty:
+            return
+        tmp_path = self.index_path.with_name(self.index_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": CATALOG_INDEX_VERSION, "entries": self._index},
+                      f, separators=(",", ":"))
+        os.replace(tmp_path, self.index_path)
+        self._index_dirty = False
+
+    def _summarize(self, entry: TemplateEntry, stat: os.stat_result) -> dict[str, Any]:
+        try:
+            template = self.get(entry.name)
+            if template is None:
+                raise ValueError("meta.yaml can't be read")
+        except Exception as error:
+            # A malformed meta.yaml (YAML error, missing key...) is listed
+            # as such: one broken template must not break `list`.
+            return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "invalid": str(error) or repr(error)}
+        pcb_file = template.pcb_file
+        return {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "sheet_name": template.sheet_name,
+            "comment": (template.properties or {}).get("Comment", ""),
+            "pin_count": len(template.pins or []),
+            "pcb_file": None if pcb_file is None else str(pcb_file),
+            "size_wh": list(template.size_wh),
+        }
+
+    def summary(self, name: str) -> dict[str, Any] | None:
+        entry = self._entries.get(name)
+        if entry is None:
+            return None
+        try:
+            stat = entry.meta_path.stat()
+        except OSError:
+            return None
+        cached = entry.summary
+        if cached is None or cached["mtime_ns"] != stat.st_mtime_ns:
+            index = self._load_index()
+            cached = index.get(name)
+            if cached is None or cached["mtime_ns"] != stat.st_mtime_ns or cached["size"] != stat.st_size:
+                cached = self._summarize(entry, stat)
+                index[name] = cached
+                self._index_dirty = True
+            entry.summary = cached
+
+        if "invalid" in cached:
+            return cached
+        # The board can be added or removed without touching meta.yaml:
+        # its presence is checked every time (one stat).
+        pcb_file = cached["pcb_file"]
+        return {**cached, "has_pcb": pcb_file is not None and os.path.isfile(pcb_file)}
+
+    def summaries(self) -> dict[str, dict[str, Any] | None]:
+        result = {name: self.summary(name) for name in self}
+        # Forget templates that were removed from the folder.
+        index = self._load_index()
+        for name in [name for name in index if name not in self._entries]:
+            del index[name]
+            self._index_dirty = True
+        self.save_index()
+        return result
+
+
 def load_templates(templates_folder: Path) -> list[HierarchicalObject]:
-    result = []
-    for path in templates_folder.iterdir():
-        template = HierarchicalObject.load_from_yaml(path / "meta.yaml")
-        if template is None:
-            print(f"Warning: could not load template '{template}'")
-            continue
-
-        result.append(template)
-    return result
+    return TemplateCatalog(templates_folder).all()
 
 
 def find_template(name: str, templates: list[HierarchicalObject]) -> HierarchicalObject | None:
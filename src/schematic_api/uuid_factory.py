@@ -0,0 +1,95 @@
+"""
+UUID sources for generated KiCad files.
+
+Every place creating a UUID calls a factory with a key describing what the
+UUID is for (scope, instance path, original UUID...). The default factory
+ignores the key and returns random (version 4) UUIDs, drawn from the OS in
+batches. The deterministic one derives a version 5 UUID from the project
+name and the key, so identical inputs give byte-identical files. The
+recorded one remembers the UUID given for each key, so that random UUIDs
+can be given again (see template_sync).
+"""
+
+import os
+import threading
+import uuid
+from typing import Any
+
+# Namespace of every deterministic UUID. Arbitrary, but fixed forever:
+# changing it would change every generated file.
+NAMESPACE = uuid.UUID("a3c4b7e2-5f0d-5b8e-9d61-2f8e4c1a7b90")
+
+
+class UuidFactory:
+    """Random UUIDs. Keys are accepted for interface compatibility only."""
+
+    deterministic = False
+
+    def __init__(self, batch_size: int = 512):
+        self.batch_size = batch_size
+        self._hex = ""
+        self._pos = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, *key: Any) -> str:
+        with self._lock:
+            if self._pos >= len(self._hex):
+                # One urandom call and one hex conversion per batch, instead
+                # of building a uuid.UUID object for every single UUID.
+                self._hex = os.urandom(16 * self.batch_size).hex()
+                self._pos = 0
+            h = self._hex[self._pos : self._pos + 32]
+            self._pos += 32
+
+        # Version 4, RFC 4122 variant.
+        variant = "89ab"[int(h[16], 16) & 0x3]
+        return f"{h[0:8]}-{h[8:12]}-4{h[13:16]}-{variant}{h[17:20]}-{h[20:32]}"
+
+
+class DeterministicUuidFactory(UuidFactory):
+    """uuid5(NAMESPACE, project + key): the same key always gives the same UUID.
+
+    Callers must pass keys unique within the project, e.g. the instance path
+    of a sheet together with the UUID of the template item being cloned.
+    """
+
+    deterministic = True
+
+    def __init__(self, project: str, namespace: uuid.UUID = NAMESPACE):
+        super().__init__()
+        self.project = project
+        self.namespace = namespace
+
+    def __call__(self, *key: Any) -> str:
+        name = "\x1f".join([self.project, *(str(part) for part in key)])
+        return str(uuid.uuid5(self.namespace, name))
+
+
+class RecordedUuidFactory(UuidFactory):
+    """The UUID given for each key is remembered in `recorded`, and given again.
+
+    Keys seen for the first time get one from `factory` (random by default).
+    Passing the `recorded` dict of a previous run replays its UUIDs.
+    """
+
+    def __init__(
+        self, factory: UuidFactory | None = None, recorded: dict[str, str] | None = None
+    ):
+        super().__init__()
+        self.factory = factory or default_factory()
+        self.recorded: dict[str, str] = dict(recorded or {})
+
+    def __call__(self, *key: Any) -> str:
+        name = "\x1f".join(str(part) for part in key)
+        with self._lock:
+            value = self.recorded.get(name)
+            if value is None:
+                value = self.recorded[name] = self.factory(*key)
+        return value
+
+
+_default_factory = UuidFactory()
+
+
+def default_factory() -> UuidFactory:
+    return _default_factory
@@ -0,0 +1,30 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# The package is run from src/ (see README), not installed.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+SUBSYSTEMS = Path(__file__).resolve().parent.parent / "subsystems"
+
+
+@pytest.fixture(scope="session")
+def catalog():
+    from schematic_api.templates import TemplateCatalog
+
+    return TemplateCatalog(SUBSYSTEMS)
+
+
+@pytest.fixture
+def generate(catalog):
+    """generate(names, **options): the files of a project generated in memory."""
+    from schematic_api.kicad_api import KiCadAPI
+
+    def generate(names, project_name="demo", **options):
+        options.setdefault("deterministic", True)
+        return KiCadAPI().generate_project_files(
+            project_name, [catalog.get(name) for name in names], **options
+        )
+
+    return generate
@@ -0,0 +1,97 @@
+import pytest
+from sexpdata import Symbol, loads
+
+from schematic_api.kicad_api import ComponentRecord, KiCadSchematic
+from schematic_api.project_builder import base_sch_text
+
+
+def _library_symbol(name, pins):
+    pin_text = " ".join(
+        f'(pin passive line (at 0 {i} 0) (length 1.27) (name "~") (number "{i + 1}"))'
+        for i in range(pins)
+    )
+    return (
+        f'(symbol "Device:{name}" (property "Reference" "{name[0]}" (at 0 0 0))'
+        f' (property "Value" "{name}" (at 0 0 0)) (property "Footprint" "" (at 0 0 0)) (symbol "{name}_1_1" {pin_text}))'
+    )
+
+
+R = _library_symbol("R", 2)
+Q = _library_symbol("Q_NPN", 3)
+
+
+def _schematic():
+    schematic = KiCadSchematic()
+    schematic.data = loads(base_sch_text("00000000-0000-0000-0000-000000000001"))
+    return schematic
+
+
+def _children(node, head):
+    return [
+        child
+        for child in node
+        if isinstance(child, list) and child and child[0] == Symbol(head)
+    ]
+
+
+def _property(symbol, name):
+    return next(
+        str(p[2]) for p in _children(symbol, "property") if str(p[1]).strip('"') == name
+    )
+
+
+def test_adds_every_record_and_each_library_symbol_once(monkeypatch):
+    schematic = _schematic()
+    parsed = []
+    parse = schematic._parse_library_symbol
+    monkeypatch.setattr(
+        schematic,
+        "_parse_library_symbol",
+        lambda data: parsed.append(data) or parse(data),
+    )
+
+    records = [
+        ComponentRecord(R, f"R{i}", "10k", "Resistor_SMD:R_0603", [10.0 * i, 20.0])
+        for i in range(1, 51)
+    ]
+    records.append((Q, "Q1", "BC547", "", [0.0, 40.0]))
+    assert schematic.add_components(records) == 51
+
+    assert parsed == [R, Q]
+    (lib_symbols,) = _children(schematic.data, "lib_symbols")
+    assert sorted(str(s[1]).strip('"') for s in _children(lib_symbols, "symbol")) == [
+        "Device:Q_NPN",
+        "Device:R",
+    ]
+
+    symbols = _children(schematic.data, "symbol")
+    assert [_property(s, "Reference").strip('"') for s in symbols] == [
+        f"R{i}" for i in range(1, 51)
+    ] + ["Q1"]
+    assert _property(symbols[0], "Footprint").strip('"') == "Resistor_SMD:R_0603"
+    assert len(_children(symbols[-1], "pin")) == 3
+    assert len({str(_children(s, "uuid")[0][1]) for s in symbols}) == 51
+    # Components go before the closing sections of the sheet.
+    assert schematic.data[-2][0] == Symbol("sheet_instances")
+
+
+def test_library_symbols_already_in_the_sheet_are_not_added_again():
+    schematic = _schematic()
+    schematic.add_components([(R, "R1", "10k", "", [0.0, 0.0])])
+    schematic.add_component(R, "R2", "1k", "", [10.0, 0.0])
+    (lib_symbols,) = _children(schematic.data, "lib_symbols")
+    assert len(_children(lib_symbols, "symbol")) == 1
+    assert len(_children(schematic.data, "symbol")) == 2
+
+
+def test_unparsable_symbol_adds_nothing():
+    schematic = _schematic()
+    before = repr(schematic.data)
+    with pytest.raises(ValueError):
+        schematic.add_components(
+            [
+                (R, "R1", "10k", "", [0.0, 0.0]),
+                ('(symbol "Device:X"', "X1", "", "", [0.0, 0.0]),
+            ]
+        )
+    assert repr(schematic.data) == before
@@ -0,0 +1,100 @@
+import hashlib
+import io
+import tarfile
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from schematic_api.sinks import ArchiveSink
+
+SUBSYSTEMS = Path(__file__).resolve().parent.parent / "subsystems"
+
+
+class _Stdout(io.RawIOBase):
+    # What `new --archive -` writes to: a pipe, that can't seek or tell.
+    def __init__(self):
+        self.data = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return False
+
+    def write(self, b) -> int:
+        self.data += b
+        return len(b)
+
+    def tell(self) -> int:
+        raise io.UnsupportedOperation("unseekable")
+
+    def seek(self, *args) -> int:
+        raise io.UnsupportedOperation("unseekable")
+
+
+def _members(format, data):
+    if format == "zip":
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            return {name: archive.read(name) for name in archive.namelist()}
+    with tarfile.open(fileobj=io.BytesIO(data), mode="r:*") as archive:
+        return {
+            member.name: archive.extractfile(member).read()
+            for member in archive
+            if member.isfile()
+        }
+
+
+@pytest.mark.parametrize("format", ["zip", "tar", "tar.gz", "tar.xz"])
+def test_streams_to_an_unseekable_output(tmp_path, format):
+    model = tmp_path / "part.step"
+    model.write_bytes(bytes(range(256)) * 64)
+    stdout = _Stdout()
+
+    with ArchiveSink(stdout, "demo", format) as sink:
+        sink.create()
+        assert sink.write_text("demo.kicad_sch", "(kicad_sch)")
+        sink.write_chunks("sub/demo.kicad_pcb", [b"(kicad_pcb", b")"])
+        sink.link_file("3d_models/part.step", model, hardlink=True)
+        assert sink.stat("demo.kicad_sch") == (len("(kicad_sch)"), None)
+        assert (
+            sink.digest("3d_models/part.step")
+            == hashlib.sha256(model.read_bytes()).hexdigest()
+        )
+        # Write-once: members can't be rewritten.
+        with pytest.raises(io.UnsupportedOperation):
+            sink.write_text("demo.kicad_sch", "(kicad_sch 2)")
+
+    assert not stdout.closed
+    assert _members(format, bytes(stdout.data)) == {
+        "demo/demo.kicad_sch": b"(kicad_sch)",
+        "demo/sub/demo.kicad_pcb": b"(kicad_pcb)",
+        "demo/3d_models/part.step": model.read_bytes(),
+    }
+
+
+def test_project_generated_into_an_unseekable_output():
+    from schematic_api.kicad_api import KiCadAPI
+    from schematic_api.templates import TemplateCatalog
+
+    catalog = TemplateCatalog(SUBSYSTEMS)
+    stdout = _Stdout()
+    with ArchiveSink(stdout, "demo", "zip") as sink:
+        KiCadAPI().project_creation(
+            "demo",
+            [catalog.get("acc_mag"), catalog.get("buzzer")],
+            deterministic=True,
+            sink=sink,
+        )
+
+    members = _members("zip", bytes(stdout.data))
+    for name in (
+        "demo.kicad_pro",
+        "demo.kicad_sch",
+        "demo.kicad_pcb",
+        "acc_mag.kicad_sch",
+        "buzzer.kicad_sch",
+        ".build_state.json",
+    ):
+        assert f"demo/{name}" in members
+    assert members["demo/demo.kicad_sch"].startswith(b"(kicad_sch")
@@ -0,0 +1,118 @@
+import pytest
+
+from schematic_api.assets import collect_assets, materialize_assets
+from schematic_api.lib_tables import read_table
+from schematic_api.sinks import DiskSink, MemorySink
+
+
+def _template(folder, part="PART", footprint="FP1", model_data=b"solid"):
+    # A template using one of its two symbol and footprint libraries.
+    folder.mkdir(parents=True)
+    sheet = folder / "t.kicad_sch"
+    sheet.write_text(
+        f'(kicad_sch (symbol (lib_id "Local:{part}") (property "Footprint" "LocalFp:{footprint}")))'
+    )
+    board = folder / "t.kicad_pcb"
+    board.write_text(
+        f'(kicad_pcb (footprint "LocalFp:{footprint}" (model "${{KIPRJMOD}}/3d/board.step")))'
+    )
+    (folder / "libs").mkdir()
+    (folder / "libs" / "local.kicad_sym").write_text(
+        f'(kicad_symbol_lib (symbol "{part}" (symbol "{part}_0_1")))'
+    )
+    (folder / "spare.kicad_sym").write_text('(kicad_symbol_lib (symbol "OTHER"))')
+    (folder / "fp.pretty").mkdir()
+    (folder / "fp.pretty" / f"{footprint}.kicad_mod").write_text(
+        f'(footprint "{footprint}" (model "3d/inner.wrl") (model "${{KICAD9_3DMODEL_DIR}}/x.step"))'
+    )
+    (folder / "spare.pretty").mkdir()
+    (folder / "spare.pretty" / "FP9.kicad_mod").write_text('(footprint "FP9")')
+    (folder / "3d").mkdir()
+    (folder / "3d" / "board.step").write_bytes(model_data)
+    (folder / "3d" / "inner.wrl").write_bytes(b"mesh")
+    return folder, (sheet, board)
+
+
+def test_only_used_libraries_and_models_are_collected(tmp_path):
+    plan = collect_assets([_template(tmp_path / "t")])
+    assert set(plan.files) == {
+        "libs/local.kicad_sym",
+        "fp.pretty/FP1.kicad_mod",
+        "3d/board.step",
+        "3d/inner.wrl",
+    }
+    assert plan.models == {"3d/board.step", "3d/inner.wrl"}
+    assert [(e.name, e.uri) for e in plan.symbol_libraries] == [
+        ("Local", "${KIPRJMOD}/libs/local.kicad_sym")
+    ]
+    assert [(e.name, e.uri) for e in plan.footprint_libraries] == [
+        ("LocalFp", "${KIPRJMOD}/fp.pretty")
+    ]
+    assert plan.warnings == []
+
+
+def test_templates_without_library_items_bring_nothing(tmp_path):
+    folder, design_files = _template(tmp_path / "t", part="NONE", footprint="FP1")
+    (folder / "libs" / "local.kicad_sym").write_text(
+        '(kicad_symbol_lib (symbol "PART"))'
+    )
+    plan = collect_assets([(folder, design_files)])
+    assert plan.symbol_libraries == []
+    assert "libs/local.kicad_sym" not in plan.files
+
+
+def test_missing_and_conflicting_files_are_reported(tmp_path):
+    first = _template(tmp_path / "a")
+    second = _template(tmp_path / "b", model_data=b"other")
+    (tmp_path / "b" / "3d" / "inner.wrl").unlink()
+    plan = collect_assets([first, second, first])
+
+    assert plan.files["3d/board.step"] == tmp_path / "a" / "3d" / "board.step"
+    assert len(plan.symbol_libraries) == len(plan.footprint_libraries) == 1
+    assert sorted(plan.warnings) == [
+        "b: 3D model 3d/inner.wrl not found",
+        "b: 3d/board.step differs from the one of another template, which is used",
+    ]
+
+
+def test_materialized_files_are_linked_once(tmp_path):
+    plan = collect_assets([_template(tmp_path / "t")])
+    sink = DiskSink(tmp_path / "project")
+    sink.create()
+
+    counts = materialize_assets(plan, sink)
+    assert sum(counts.values()) == 4
+    assert set(counts) <= {"reflink", "hardlink", "copy"}
+    assert (tmp_path / "project" / "3d" / "board.step").read_bytes() == b"solid"
+    assert materialize_assets(plan, sink) == {"kept": 4}
+
+    memory = MemorySink("project")
+    assert materialize_assets(plan, memory) == {"copy": 4}
+    assert memory.files["libs/local.kicad_sym"].startswith(b"(kicad_symbol_lib")
+
+
+def test_models_are_hard_linked_where_nothing_better_exists(tmp_path, monkeypatch):
+    monkeypatch.setattr("schematic_api.sinks._reflink", lambda source, target: False)
+    plan = collect_assets([_template(tmp_path / "t")])
+    sink = DiskSink(tmp_path / "project")
+    sink.create()
+    assert materialize_assets(plan, sink) == {"hardlink": 2, "copy": 2}
+    model = tmp_path / "project" / "3d" / "board.step"
+    assert model.samefile(tmp_path / "t" / "3d" / "board.step")
+    assert not (tmp_path / "project" / "libs" / "local.kicad_sym").samefile(
+        tmp_path / "t" / "libs" / "local.kicad_sym"
+    )
+
+
+@pytest.mark.parametrize("table", ["sym-lib-table", "fp-lib-table"])
+def test_generated_project_lists_the_template_libraries(generate, table):
+    files = generate(["mikrobus"])
+    _, entries = read_table(files[table].decode("utf-8"))
+    uris = {entry.name: entry.uri for entry in entries}
+    expected = {
+        "sym-lib-table": ("Mikrobus", "${KIPRJMOD}/MIKROE-4247.kicad_sym"),
+        "fp-lib-table": ("Mikrobus", "${KIPRJMOD}/mikrobus.pretty"),
+    }[table]
+    assert uris[expected[0]] == expected[1]
+    assert "MIKROE-4247.kicad_sym" in files
+    assert "mikrobus.pretty/MIKROE4247.kicad_mod" in files
@@ -0,0 +1,76 @@
+from schematic_api.build_state import BuildState
+from schematic_api.sinks import DiskSink, MemorySink
+
+
+def _build(sink, outputs, enabled=True):
+    # One build writing {name: (key, text)}, recorded and saved.
+    state = BuildState(sink, enabled=enabled)
+    for name, (key, text) in outputs.items():
+        if not state.fresh(name, key):
+            sink.write_text(name, text)
+            state.record(name, key)
+    state.save()
+    return state
+
+
+def test_fresh_when_the_key_and_the_file_are_unchanged():
+    sink = MemorySink("p")
+    _build(sink, {"a.kicad_sch": ("k1", "a"), "b.kicad_sch": ("k2", "b")})
+
+    state = BuildState(sink)
+    assert state.fresh("a.kicad_sch", "k1")
+    assert not state.fresh("b.kicad_sch", "other key")
+    assert not state.fresh("new.kicad_sch", "k1")
+    # A fresh output is recorded again as it is.
+    assert "a.kicad_sch" in state.outputs
+
+
+def test_not_fresh_once_edited_or_deleted(tmp_path):
+    sink = DiskSink(tmp_path)
+    _build(sink, {"a.kicad_sch": ("k", "a"), "b.kicad_sch": ("k", "b")})
+    (tmp_path / "a.kicad_sch").write_text("edited")
+    (tmp_path / "b.kicad_sch").unlink()
+
+    state = BuildState(sink)
+    assert not state.fresh("a.kicad_sch", "k")
+    assert not state.fresh("b.kicad_sch", "k")
+    # Missing files are only generated again; edited ones must be kept.
+    assert state.modified_outputs() == ["a.kicad_sch"]
+
+
+def test_nothing_is_fresh_without_reproducible_outputs():
+    sink = MemorySink("p")
+    _build(sink, {"a.kicad_sch": ("k", "a")}, enabled=False)
+    state = BuildState(sink, enabled=False)
+    assert not state.fresh("a.kicad_sch", "k")
+    assert BuildState(sink).fresh("a.kicad_sch", "k")
+
+
+def test_stale_outputs_are_those_not_produced_again():
+    sink = MemorySink("p")
+    _build(
+        sink,
+        {
+            "a.kicad_sch": ("k", "a"),
+            "b.kicad_sch": ("k", "b"),
+            "c.kicad_sch": ("k", "c"),
+        },
+    )
+
+    state = BuildState(sink)
+    assert state.fresh("a.kicad_sch", "k")
+    sink.write_text("c.kicad_sch", "c2")
+    state.record("c.kicad_sch", "k2")
+    assert state.stale_outputs() == ["b.kicad_sch"]
+
+
+def test_state_of_another_version_is_ignored():
+    sink = MemorySink("p")
+    _build(sink, {"a.kicad_sch": ("k", "a")})
+    sink.write_text(
+        ".build_state.json",
+        sink.read_text(".build_state.json").replace('"version": ', '"version": -'),
+    )
+    state = BuildState(sink)
+    assert not state.fresh("a.kicad_sch", "k")
+    assert state.stale_outputs() == []
@@ -0,0 +1,59 @@
+import pytest
+
+from schematic_api.footprint_library import FootprintLibrary
+
+
+def _library(tmp_path, count=4):
+    folder = tmp_path / "Test.pretty"
+    folder.mkdir()
+    for i in range(count):
+        (folder / f"FP{i}.kicad_mod").write_text(
+            f'(footprint "FP{i}" (pad "1" smd rect))\n'
+        )
+    (folder / "notes.txt").write_text("not a footprint")
+    return folder
+
+
+def test_lists_footprints_without_parsing_them(tmp_path):
+    library = FootprintLibrary(_library(tmp_path))
+    assert sorted(library) == ["FP0", "FP1", "FP2", "FP3"]
+    assert len(library) == 4
+    assert "FP1" in library and "notes" not in library
+    assert library.cached_names == []
+    with pytest.raises(KeyError):
+        library["missing"]
+
+
+def test_parsed_on_first_access_and_shared(tmp_path):
+    library = FootprintLibrary(_library(tmp_path))
+    footprint = library["FP2"]
+    assert str(footprint[0]) == "footprint" and footprint[1] == "FP2"
+    assert library["FP2"] is footprint
+    assert library.cached_names == ["FP2"]
+
+
+def test_least_recently_used_is_evicted_past_max_entries(tmp_path):
+    library = FootprintLibrary(_library(tmp_path), max_entries=2)
+    library["FP0"]
+    library["FP1"]
+    library["FP0"]  # FP1 is now the least recently used
+    library["FP2"]
+    assert library.cached_names == ["FP0", "FP2"]
+
+
+def test_max_bytes_bounds_the_cached_sources(tmp_path):
+    folder = _library(tmp_path)
+    size = (folder / "FP0.kicad_mod").stat().st_size
+    library = FootprintLibrary(folder, max_entries=None, max_bytes=2 * size)
+    for name in ("FP0", "FP1", "FP2", "FP3"):
+        library[name]
+    assert library.cached_names == ["FP2", "FP3"]
+
+    # A footprint larger than the budget is still kept, alone.
+    library = FootprintLibrary(folder, max_entries=None, max_bytes=1)
+    library["FP0"]
+    library["FP1"]
+    assert library.cached_names == ["FP1"]
+
+    library.clear_cache()
+    assert library.cached_names == []
@@ -0,0 +1,56 @@
+from schematic_api.kicad_api import KiCadAPI
+
+
+def _spied_api(monkeypatch):
+    # The instances of the project, and how many of them hold a cloned
+    # sheet each time one is cloned.
+    api = KiCadAPI()
+    instances, live = [], []
+
+    instantiate = api._instantiate_subsystems
+
+    def spy_instantiate(*args, **kwargs):
+        result = instantiate(*args, **kwargs)
+        instances.extend(result)
+        return result
+
+    ensure_cloned = api._ensure_cloned
+
+    def spy_ensure_cloned(instance):
+        result = ensure_cloned(instance)
+        live.append(sum(1 for other in instances if other.schematic_data))
+        return result
+
+    monkeypatch.setattr(api, "_instantiate_subsystems", spy_instantiate)
+    monkeypatch.setattr(api, "_ensure_cloned", spy_ensure_cloned)
+    return api, instances, live
+
+
+def test_sheets_are_cloned_one_at_a_time_and_released(catalog, monkeypatch):
+    api, instances, live = _spied_api(monkeypatch)
+    api.generate_project_files(
+        "demo", [catalog.get("acc_mag")] * 6, deterministic=True, write_workers=1
+    )
+
+    assert len(instances) == 6
+    assert live and max(live) == 1
+    for instance in instances:
+        assert instance.schematic_data == []
+        # What the board needs from the sheet survives the clone.
+        assert instance.schematic_uuid_map
+
+
+def test_shared_sheets_are_cloned_once(catalog, monkeypatch):
+    api, instances, live = _spied_api(monkeypatch)
+    api.generate_project_files(
+        "demo",
+        [catalog.get("acc_mag")] * 4,
+        deterministic=True,
+        shared_sheets=True,
+        write_workers=1,
+    )
+
+    assert live == [1]
+    assert all(instance.schematic_data == [] for instance in instances)
+    maps = {id(instance.schematic_uuid_map) for instance in instances}
+    assert len(maps) == 1
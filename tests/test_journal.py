@@ -0,0 +1,81 @@
+import pytest
+from sexpdata import Symbol
+
+from schematic_api.journal import Journal
+from schematic_api.kicad_api import _format_sexp_kicad
+from schematic_api.span_sexp import parse_sexp
+
+SOURCE = (
+    "(kicad_sch (version 20250114) (wire (pts (xy 1 2) (xy 3 4))) (junction (at 5 6)))"
+)
+
+
+def test_edits_outside_a_transaction_are_applied_and_not_recorded():
+    journal = Journal()
+    node = [1, 2, 3]
+    journal.set(node, 0, 10)
+    journal.append(node, 4)
+    assert node == [10, 2, 3, 4]
+    assert len(journal) == 0
+
+
+def test_rollback_restores_the_tree_and_its_clean_flags():
+    tree = parse_sexp(SOURCE)
+    before = _format_sexp_kicad(tree)
+    wire, junction = tree[2], tree[3]
+    journal = Journal()
+
+    journal.begin()
+    journal.set(wire[1][1], 1, 100)
+    journal.delete(tree, 3)
+    journal.append(tree, [Symbol("no_connect")])
+    journal.replace_all(junction, [Symbol("junction")])
+    assert tree.dirty and wire.dirty
+    journal.rollback()
+
+    assert tree[3] is junction
+    assert wire[1][1][1] == 1
+    assert not tree.dirty and not wire.dirty and not wire[1][1].dirty
+    assert _format_sexp_kicad(tree) == before
+    assert not journal.active
+
+
+def test_nested_transactions():
+    journal = Journal()
+    node = [0, 0, 0]
+    journal.begin()
+    journal.set(node, 0, 1)
+    journal.begin()
+    journal.set(node, 1, 2)
+    journal.rollback()  # only the inner edit
+    assert node == [1, 0, 0]
+    journal.begin()
+    journal.set(node, 2, 3)
+    journal.commit()  # handed over to the outer transaction
+    journal.rollback()
+    assert node == [0, 0, 0]
+
+
+def test_transaction_rolls_back_when_the_block_raises():
+    journal = Journal()
+    node = ["a", "b"]
+    undone = []
+    with pytest.raises(KeyError):
+        with journal.transaction():
+            journal.insert(node, 0, "c")
+            journal.record(lambda: undone.append(True))
+            raise KeyError("x")
+    assert node == ["a", "b"]
+    assert undone == [True]
+
+    with journal.transaction():
+        journal.delete(node, -1)
+    assert node == ["a"]
+    assert len(journal) == 0
+
+
+def test_commit_and_rollback_need_a_transaction():
+    with pytest.raises(RuntimeError):
+        Journal().commit()
+    with pytest.raises(RuntimeError):
+        Journal().rollback()
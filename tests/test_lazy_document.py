@@ -0,0 +1,83 @@
+from sexpdata import Symbol
+
+from schematic_api.lazy_document import LazySexpDocument
+
+BOARD = b"""(kicad_pcb (version 20241229) (generator "pcbnew")
+  (net 0 "")
+  (net 1 "GND")
+  (footprint "Resistor_SMD:R_0603"   (layer "F.Cu")
+      (property "Reference" "R1" (at 0 0 0))
+      (pad "1" smd rect (at 0 0) (size 1 1) (layers "F.Cu") (net 1 "GND")))
+  (footprint "Capacitor_SMD:C_0603" (layer "F.Cu") (property "Reference" "C1" (at 0 0 0)))
+  (segment (start 0 0) (end 1 1) (width 0.2) (layer "F.Cu") (net 1))
+)
+"""
+
+
+def _document(tmp_path, data=BOARD, name="board.kicad_pcb"):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return LazySexpDocument(path)
+
+
+def _written(document):
+    return b"".join(document.chunks())
+
+
+def test_untouched_document_is_written_back_byte_for_byte(tmp_path):
+    with _document(tmp_path) as document:
+        assert _written(document) == BOARD
+    assert _written(LazySexpDocument.from_bytes(BOARD)) == BOARD
+
+
+def test_items_are_located_without_being_parsed(tmp_path):
+    with _document(tmp_path) as document:
+        assert document.root_head == "kicad_pcb"
+        assert document.heads == [
+            "version",
+            "generator",
+            "net",
+            "net",
+            "footprint",
+            "footprint",
+            "segment",
+        ]
+        assert document.indices("footprint") == [4, 5]
+        assert document.name(4) == "Resistor_SMD:R_0603"
+        assert document.property(5, "Reference") == "C1"
+        assert document.parse(4)[0] == Symbol("footprint")
+        assert document._nodes == [None] * len(document)
+
+
+def test_only_edited_items_are_formatted_again(tmp_path):
+    with _document(tmp_path) as document:
+        footprint = document[5]
+        footprint[2][1] = '"B.Cu"'
+        del document[6]
+        document.append([Symbol("gr_text"), '"new"'])
+        written = _written(document).decode()
+
+    untouched = BOARD.decode().split('(footprint "Capacitor_SMD')[0].rstrip()
+    assert written.startswith(untouched)
+    assert '(layer "B.Cu")' in written and "(segment" not in written
+    assert written.rstrip().endswith('(gr_text "new")\n)')
+
+
+def test_raw_items_of_another_document(tmp_path):
+    other = _document(tmp_path, name="other.kicad_pcb")
+    target = LazySexpDocument.from_bytes(b"(kicad_pcb (version 20241229)\n)\n")
+    target.extend_raw(other, other.indices("footprint"))
+    written = _written(target)
+    other.close()
+    assert written.count(b"(footprint") == 2
+    assert b'(footprint "Resistor_SMD:R_0603"   (layer "F.Cu")' in written
+
+
+def test_written_over_its_own_mapped_file(tmp_path):
+    document = _document(tmp_path)
+    document[4][1] = '"Resistor_SMD:R_0805"'
+    document.write(document.path)
+    document.close()
+    with LazySexpDocument(tmp_path / "board.kicad_pcb") as again:
+        assert again.name(4) == "Resistor_SMD:R_0805"
+        assert again.name(5) == "Capacitor_SMD:C_0603"
@@ -0,0 +1,98 @@
+import os
+
+import pytest
+
+from schematic_api.library_index import LibraryIndex
+
+LIBRARY = """(kicad_symbol_lib (version 20241209)
+  (symbol "R" (pin passive line (at 0 3.81 270) (length 1.27)) (pin passive line (at 0 -3.81 90) (length 1.27)))
+  (symbol "R_Small" (extends "R"))
+  (symbol "C" (pin passive line (at 0 3.81 270) (length 1.27)))
+)
+"""
+
+
+def _write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+    return path
+
+
+def _touch_later(path):
+    # Freshness is mtime + size: edits are seen even within one mtime tick.
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+@pytest.fixture
+def index(tmp_path):
+    _write(tmp_path / "symbols" / "Device.kicad_sym", LIBRARY)
+    _write(
+        tmp_path / "footprints" / "Resistor_SMD.pretty" / "R_0603.kicad_mod",
+        '(footprint "R_0603" (pad "1" smd rect) (pad "2" smd rect))\n',
+    )
+    index = LibraryIndex(
+        tmp_path / "index.sqlite3", [tmp_path / "symbols"], [tmp_path / "footprints"]
+    )
+    yield index
+    index.close()
+
+
+def test_finds_symbols_and_footprints_by_span(index):
+    entry = index.find_symbol("Device", "R")
+    assert entry.count == 2
+    assert entry.read().startswith('(symbol "R" (pin')
+    assert entry.read().endswith("(length 1.27)))")
+    # Derived symbols count their parent's pins.
+    assert index.find_symbol("Device", "R_Small").count == 2
+    assert index.find_symbol("Device", "Nope") is None
+    assert index.find_symbol("Other", "R") is None
+
+    footprint = index.find_footprint("Resistor_SMD", "R_0603")
+    assert footprint.count == 2
+    assert footprint.read().startswith('(footprint "R_0603"')
+
+
+def test_edited_library_is_indexed_again(index, tmp_path):
+    library = tmp_path / "symbols" / "Device.kicad_sym"
+    index.find_symbol("Device", "R")
+    library.write_text(LIBRARY.replace('(symbol "C"', '(symbol "C_New"'))
+    _touch_later(library)
+    assert index.find_symbol("Device", "C") is None
+    assert index.find_symbol("Device", "C_New").read().startswith('(symbol "C_New"')
+
+
+def test_libraries_indexed_from_elsewhere_are_checked_for_changes(index, tmp_path):
+    # A template-local library, found by nickname after being indexed.
+    library = _write(tmp_path / "template" / "Mikrobus.kicad_sym", LIBRARY)
+    index.update_file(library)
+    assert index.find_symbol("Mikrobus", "C").read().startswith('(symbol "C"')
+
+    # Edited: the spans recorded before no longer hold "C".
+    library.write_text(
+        LIBRARY.replace('(symbol "R" ', '(symbol "Resistor_With_A_Longer_Name" ')
+    )
+    _touch_later(library)
+    assert index.find_symbol("Mikrobus", "C").read().startswith('(symbol "C"')
+
+    library.unlink()
+    assert index.find_symbol("Mikrobus", "C") is None
+
+
+def test_refresh_forgets_removed_libraries(index, tmp_path):
+    index.refresh()
+    assert index.symbol_names("Device") == ["C", "R", "R_Small"]
+    assert index.footprint_names("Resistor_SMD") == ["R_0603"]
+
+    (tmp_path / "symbols" / "Device.kicad_sym").unlink()
+    index.refresh()
+    assert index.symbol_names("Device") == []
+
+
+def test_index_persists_between_instances(index, tmp_path):
+    index.refresh()
+    reopened = LibraryIndex(index.db_path, [], [])
+    try:
+        assert reopened.symbol_names("Device") == ["C", "R", "R_Small"]
+    finally:
+        reopened.close()
@@ -0,0 +1,131 @@
+from dataclasses import replace
+
+from sexpdata import Symbol, loads
+
+from schematic_api.journal import Journal
+from schematic_api.pcb_sync import schematic_netlist, sync_footprints
+from schematic_api.project_builder import base_pcb_text
+
+LIB_SYMBOLS = """(lib_symbols (symbol "Device:R" (property "Reference" "R" (at 0 0 0)) (symbol "R_1_1"
+  (pin passive line (at 0 3.81 270) (length 1.27) (name "~") (number "1"))
+  (pin passive line (at 0 -3.81 90) (length 1.27) (name "~") (number "2")))))"""
+
+
+def _symbol(reference, x, y, uuid, footprint="Resistor_SMD:R_0603"):
+    return (
+        f'(symbol (lib_id "Device:R") (at {x} {y} 0) (unit 1) (on_board yes) (uuid "{uuid}")'
+        f' (property "Reference" "{reference}" (at 0 0 0)) (property "Value" "10k" (at 0 0 0))'
+        f' (property "Footprint" "{footprint}" (at 0 0 0)) (pin "1" (uuid "{uuid}-1")) (pin "2" (uuid "{uuid}-2")))'
+    )
+
+
+# R1 pin 2 and R2 pin 1 are joined by a wire carrying the label SIG.
+SHEET = f"""(kicad_sch (version 20250114) {LIB_SYMBOLS}
+  {_symbol("R1", 100, 100, "u1")} {_symbol("R2", 100, 120, "u2")}
+  (wire (pts (xy 100 103.81) (xy 100 116.19)) (uuid "w1"))
+  (label "SIG" (at 100 103.81 0) (uuid "l1")))"""
+
+
+def _library_footprint(name):
+    return loads(
+        f'(footprint "{name}" (layer "F.Cu") (property "Reference" "REF**" (at 0 0 0))'
+        f' (property "Value" "{name}" (at 0 1 0))'
+        ' (fp_line (start -1 -0.5) (end 1 0.5) (layer "F.CrtYd"))'
+        ' (pad "1" smd rect (at -0.8 0) (size 0.8 0.9) (layers "F.Cu"))'
+        ' (pad "2" smd rect (at 0.8 0) (size 0.8 0.9) (layers "F.Cu")))'
+    )
+
+
+class _Resolver:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, library, name):
+        self.calls.append(f"{library}:{name}")
+        return _library_footprint(name)
+
+
+def _footprints(board):
+    return [
+        item
+        for item in board
+        if isinstance(item, list) and item and item[0] == Symbol("footprint")
+    ]
+
+
+def _pad_nets(footprint):
+    nets = {}
+    for pad in footprint:
+        if isinstance(pad, list) and pad and pad[0] == Symbol("pad"):
+            net = next(
+                (c for c in pad if isinstance(c, list) and c and c[0] == Symbol("net")),
+                None,
+            )
+            nets[str(pad[1]).strip('"')] = (
+                None if net is None else str(net[2]).strip('"')
+            )
+    return nets
+
+
+def test_netlist_joins_pins_through_wires_and_labels():
+    symbols = {symbol.reference: symbol for symbol in schematic_netlist(loads(SHEET))}
+    assert symbols["R1"].pin_nets == {"1": "unconnected-(R1-Pad1)", "2": "/SIG"}
+    assert symbols["R2"].pin_nets == {"1": "/SIG", "2": "unconnected-(R2-Pad2)"}
+    assert symbols["R1"].footprint == "Resistor_SMD:R_0603"
+
+
+def test_sync_adds_then_only_updates_what_changed():
+    symbols = schematic_netlist(loads(SHEET))
+    board = loads(base_pcb_text)
+    resolve = _Resolver()
+
+    report = sync_footprints(board, symbols, resolve, "demo.kicad_sch")
+    assert report.added == ["R1", "R2"] and not report.missing
+    assert resolve.calls == ["Resistor_SMD:R_0603"]
+    footprints = _footprints(board)
+    assert [_pad_nets(footprint)["2"] for footprint in footprints] == [
+        "/SIG",
+        "unconnected-(R2-Pad2)",
+    ]
+
+    report = sync_footprints(board, symbols, resolve, "demo.kicad_sch")
+    assert report.unchanged == 2 and not (report.added or report.updated)
+
+    symbols[1] = replace(symbols[1], value="22k")
+    report = sync_footprints(board, symbols, resolve, "demo.kicad_sch")
+    assert report.updated == ["R2"] and report.unchanged == 1
+
+    symbols[0] = replace(symbols[0], footprint="Resistor_SMD:R_0805")
+    report = sync_footprints(board, symbols, resolve, "demo.kicad_sch")
+    assert report.replaced == ["R1"]
+    assert str(_footprints(board)[0][1]).strip('"') == "Resistor_SMD:R_0805"
+
+    report = sync_footprints(
+        board, symbols[1:], resolve, "demo.kicad_sch", remove_orphans=True
+    )
+    assert report.removed == ["R1"] and len(_footprints(board)) == 1
+
+
+def test_unresolved_footprints_are_reported():
+    symbols = schematic_netlist(loads(SHEET))
+    report = sync_footprints(
+        loads(base_pcb_text), symbols, lambda library, name: None, "demo.kicad_sch"
+    )
+    assert report.missing == ["R1", "R2"] and not report.added
+
+
+def test_sync_rolls_back_with_the_journal():
+    board = loads(base_pcb_text)
+    before = repr(board)
+    journal = Journal()
+    journal.begin()
+    sync_footprints(
+        board,
+        schematic_netlist(loads(SHEET)),
+        _Resolver(),
+        "demo.kicad_sch",
+        journal=journal,
+    )
+    assert repr(board) != before
+    journal.rollback()
+    assert repr(board) == before
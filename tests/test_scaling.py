@@ -0,0 +1,35 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+
+import scaling  # noqa: E402
+
+
+def test_growth_exponent_is_the_log_log_slope():
+    sizes = [10, 100, 1000]
+    assert scaling.growth_exponent(sizes, [3 * n for n in sizes]) == pytest.approx(1)
+    assert scaling.growth_exponent(sizes, [n * n for n in sizes]) == pytest.approx(2)
+    assert scaling.growth_exponent(sizes, [0, 0, 5]) is None
+
+
+def test_fits_need_three_sizes():
+    results = {size: {"time": {}, "peak": {}} for size in (1, 10, 100)}
+    with pytest.raises(ValueError, match="at least 3 sizes"):
+        scaling.exponents(results, fit_from=10)
+
+
+@pytest.mark.benchmark
+def test_no_stage_grows_super_linearly():
+    results = scaling.run([30, 100, 300], runs=1, template_count=10)
+    fits = scaling.exponents(results, fit_from=30)
+    assert fits["time"]["total"] is not None
+    super_linear = {
+        f"{measure} {stage}": round(exponent, 2)
+        for measure, stages in fits.items()
+        for stage, exponent in stages.items()
+        if exponent is not None and exponent > 1.2
+    }
+    assert super_linear == {}
@@ -0,0 +1,106 @@
+import json
+import socket
+import threading
+
+import pytest
+
+from conftest import SUBSYSTEMS
+from schematic_api.server import GenerationService, ServeError, serve
+
+
+@pytest.fixture
+def service(tmp_path):
+    return GenerationService(SUBSYSTEMS, project_folder=tmp_path / "projects")
+
+
+def test_answers_ping_and_reports_errors(service):
+    response = service.handle({"op": "ping"})
+    assert response["ok"] and response["result"] == "pong"
+    assert "total_ms" in response["timings"]
+
+    assert not service.handle({"op": "nope"})["ok"]
+    assert not service.handle([1, 2])["ok"]
+    assert (
+        "template"
+        in service.handle({"op": "new", "project": "p", "templates": ["missing"]})[
+            "error"
+        ]
+    )
+    assert not service.handle({"op": "new", "project": "../p", "templates": []})["ok"]
+    assert service.handle({"op": "stats"})["result"]["requests"] == 5
+
+
+def test_lists_and_describes_templates(service):
+    listed = service.handle({"op": "list"})["result"]
+    assert "buzzer" in listed
+    summary = service.handle({"op": "template", "name": "buzzer"})["result"]
+    assert summary == listed["buzzer"]
+    assert not service.handle({"op": "template", "name": "missing"})["ok"]
+
+
+def test_in_memory_project_writes_nothing(service, tmp_path):
+    response = service.handle(
+        {"op": "new", "project": "demo", "templates": ["buzzer"], "in_memory": True}
+    )
+    files = response["result"]["files"]
+    assert files["demo.kicad_sch"]["encoding"] == "utf-8"
+    assert files["demo.kicad_sch"]["data"].startswith("(kicad_sch")
+    assert not (tmp_path / "projects").exists()
+
+
+def test_projects_go_to_the_service_folder(service, tmp_path):
+    request = {
+        "op": "new",
+        "project": "demo",
+        "templates": ["buzzer"],
+        "deterministic": True,
+    }
+    response = service.handle(request)
+    assert response["ok"], response
+    project = tmp_path / "projects" / "demo"
+    assert response["result"]["project"] == str(project)
+    assert "demo.kicad_sch" in response["result"]["files"]
+    assert (project / "demo.kicad_pcb").is_file()
+
+    assert not service.handle(request)["ok"]
+    assert service.handle({**request, "regenerate": True})["ok"]
+
+    report = service.handle({"op": "update_pcb", "project": "demo"})
+    assert report["ok"], report
+    assert report["result"]["added"] == []
+    assert not service.handle({"op": "update_pcb", "project": "other"})["ok"]
+
+
+def test_serves_json_lines_on_a_unix_socket(service, tmp_path):
+    socket_path = str(tmp_path / "s.sock")
+    ready = threading.Event()
+    threading.Thread(
+        target=serve,
+        args=(service, socket_path),
+        kwargs={"ready": lambda message: ready.set()},
+        daemon=True,
+    ).start()
+    assert ready.wait(5)
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        stream = client.makefile("rwb")
+        for request in (b'{"op": "ping"}\n', b"not json\n", b'{"op": "stats"}\n'):
+            stream.write(request)
+            stream.flush()
+        responses = [json.loads(stream.readline()) for _ in range(3)]
+    assert responses[0]["result"] == "pong"
+    assert not responses[1]["ok"] and "invalid JSON" in responses[1]["error"]
+    assert responses[2]["ok"]
+
+    # A second server can't take the socket of a running one.
+    with pytest.raises(ServeError, match="already serving"):
+        serve(service, socket_path, ready=lambda message: None)
+
+
+def test_refuses_a_socket_path_that_is_a_file(service, tmp_path):
+    path = tmp_path / "file"
+    path.write_text("")
+    with pytest.raises(ServeError, match="not a socket"):
+        serve(service, str(path), ready=lambda message: None)
+    assert path.exists()
@@ -0,0 +1,110 @@
+from sexpdata import Symbol, loads
+
+from schematic_api.kicad_api import KiCadAPI, _format_sexp_kicad
+from schematic_api.project_diff import diff_projects, format_file_diff
+from schematic_api.sexp_hash import dedupe, diff_sexp, same_sexp, sexp_hash
+from schematic_api.sinks import DiskSink
+from schematic_api.span_sexp import parse_sexp
+
+BOARD = """(kicad_pcb (version 20241229)
+  (footprint "R_0603" (layer "F.Cu") (property "Reference" "R1") (at 1 2))
+  (footprint "R_0603" (layer "F.Cu") (property "Reference" "R2") (at 3 4))
+  (segment (start 0 0) (end 1 1) (net 1))
+)"""
+
+
+def test_equal_trees_have_equal_hashes():
+    parsed = parse_sexp(BOARD)
+    assert sexp_hash(parsed) == sexp_hash(loads(BOARD))
+    assert same_sexp(parsed, loads(BOARD))
+    # Atoms keep their type: a symbol is not the string of the same text.
+    assert sexp_hash([Symbol("a")]) != sexp_hash(['"a"'])
+    assert sexp_hash([1]) != sexp_hash([1.0]) != sexp_hash([True])
+    assert not same_sexp(parsed[2], parsed[3])
+
+
+def test_mutations_drop_cached_hashes_up_to_the_root():
+    tree = parse_sexp(BOARD)
+    before = sexp_hash(tree)
+    footprint = tree[2]
+    assert footprint.hash is not None
+
+    footprint[-1][1] = 5
+    assert footprint.hash is None and tree.hash is None
+    assert sexp_hash(tree) != before
+    assert tree[3].hash is not None
+
+    footprint[-1][1] = 1
+    assert sexp_hash(tree) == before
+
+
+def test_dedupe_shares_identical_subtrees_without_changing_the_output():
+    text = (
+        "(root\n  (a (b 1 2 3) (c x))\n  (a (b 1 2 3) (c x))\n  (a (b 1 2 4) (c x))\n)"
+    )
+    tree = parse_sexp(text)
+    table = {}
+    assert dedupe(tree, table, min_length=1) is tree
+    assert tree[1] is tree[2]
+    assert tree[3] is not tree[1] and tree[3][2] is tree[1][2]
+    assert not tree.dirty
+    assert _format_sexp_kicad(tree) == text
+
+    # Across trees: the second one is the first's twin.
+    other = parse_sexp(text)
+    assert dedupe(other, table, min_length=1) is tree
+
+
+def test_dedupe_leaves_small_and_modified_lists_alone():
+    tree = parse_sexp("(root (a 1) (a 1))")
+    dedupe(tree, {}, min_length=100)
+    assert tree[1] is not tree[2]
+
+    tree = parse_sexp("(root (a 1) (a 1))")
+    tree[1].append(2)
+    tree[1].pop()
+    dedupe(tree, {}, min_length=1)
+    assert tree[1] is not tree[2]
+
+
+def test_diff_reports_the_changed_items_only():
+    old = parse_sexp(BOARD)
+    new = parse_sexp(
+        BOARD.replace("(at 3 4)", "(at 3 5)").replace(
+            "(segment", '(footprint "C_0603" (property "Reference" "C1"))\n  (segment'
+        )
+    )
+    changes = list(diff_sexp(old, new))
+    assert [(c.kind, c.path) for c in changes] == [
+        ("~", ("kicad_pcb", 'footprint "R_0603"')),
+        ("+", ("kicad_pcb",)),
+    ]
+    assert changes[0].old == [Symbol("at"), 3, 4]
+    assert changes[1].new[1] == "C_0603"
+    assert list(diff_sexp(old, parse_sexp(BOARD))) == []
+
+
+def test_diff_projects_pairs_files_across_project_names(catalog, tmp_path):
+    def create(folder, name, templates):
+        path = tmp_path / folder / name
+        path.parent.mkdir(exist_ok=True)
+        KiCadAPI().project_creation(
+            name,
+            [catalog.get(t) for t in templates],
+            deterministic=True,
+            sink=DiskSink(path),
+        )
+        return path
+
+    a = create("1", "demo", ["buzzer"])
+    assert list(diff_projects(a, create("2", "demo", ["buzzer"]))) == []
+
+    diffs = {
+        d.name: d for d in diff_projects(a, create("3", "b", ["buzzer", "acc_mag"]))
+    }
+    assert diffs["acc_mag.kicad_sch"].status == "only_b"
+    # Paired despite their names: the root sheets differ by one sheet.
+    assert "b.kicad_sch" not in diffs
+    lines = format_file_diff(diffs["demo.kicad_sch"])
+    assert lines[0].startswith("demo.kicad_sch: ")
+    assert any(line.startswith("  + ") for line in lines[1:])
@@ -0,0 +1,74 @@
+from sexpdata import Symbol
+
+from schematic_api.span_sexp import parse_sexp
+
+TEMPLATES = ["acc_mag", "buzzer", "acc_mag"]
+
+
+def _children(node, head):
+    return [
+        child
+        for child in node
+        if isinstance(child, list) and child and child[0] == Symbol(head)
+    ]
+
+
+def _sheet_files(root):
+    return [
+        str(prop[2])
+        for sheet in _children(root, "sheet")
+        for prop in _children(sheet, "property")
+        if str(prop[1]) in ("Sheetfile", "Sheet file")
+    ]
+
+
+def _instance_references(schematic):
+    # symbol -> [(instance path, reference)]
+    result = []
+    for symbol in _children(schematic, "symbol"):
+        (instances,) = _children(symbol, "instances")
+        result.append(
+            [
+                (str(path[1]), str(_children(path, "reference")[0][1]))
+                for project in _children(instances, "project")
+                for path in _children(project, "path")
+            ]
+        )
+    return result
+
+
+def test_repeated_templates_share_one_sheet_file(generate):
+    files = generate(TEMPLATES, shared_sheets=True)
+    assert "acc_mag_2.kicad_sch" not in files
+    root = parse_sexp(files["demo.kicad_sch"].decode())
+    assert _sheet_files(root) == [
+        "acc_mag.kicad_sch",
+        "buzzer.kicad_sch",
+        "acc_mag.kicad_sch",
+    ]
+
+    # Each symbol of the shared sheet is annotated once per sheet instance.
+    references = _instance_references(parse_sexp(files["acc_mag.kicad_sch"].decode()))
+    assert references
+    for instances in references:
+        assert len(instances) == 2
+        assert len({path for path, _ in instances}) == 2
+        assert len({reference for _, reference in instances}) == 2
+    all_references = [
+        reference for instances in references for _, reference in instances
+    ]
+    assert len(all_references) == len(set(all_references))
+
+
+def test_copies_without_shared_sheets(generate):
+    files = generate(TEMPLATES)
+    root = parse_sexp(files["demo.kicad_sch"].decode())
+    assert _sheet_files(root) == [
+        "acc_mag.kicad_sch",
+        "buzzer.kicad_sch",
+        "acc_mag_2.kicad_sch",
+    ]
+    for instances in _instance_references(
+        parse_sexp(files["acc_mag_2.kicad_sch"].decode())
+    ):
+        assert len(instances) == 1
@@ -0,0 +1,67 @@
+from itertools import combinations
+from pathlib import Path
+
+import pytest
+
+from schematic_api.hierarchical_object import HierarchicalObject
+from schematic_api.kicad_api import KiCadSchematic, SheetLayout
+
+
+def _objects(count, size_wh):
+    return [
+        HierarchicalObject(
+            f"dev{i}",
+            f"S{i}",
+            Path(f"s{i}.kicad_sch"),
+            None,
+            [0.0, 0.0],
+            list(size_wh),
+            {},
+            [],
+        )
+        for i in range(count)
+    ]
+
+
+def _overlapping(placed):
+    # Pairs of sheets drawn on the same parent sheet whose frames intersect.
+    by_parent = {}
+    for item in placed:
+        by_parent.setdefault(item["sheet_path"].rsplit("/", 1)[0], []).append(item)
+    pairs = []
+    for items in by_parent.values():
+        for a, b in combinations(items, 2):
+            (ax, ay), (aw, ah) = a["at_xy"], a["size_wh"]
+            (bx, by), (bw, bh) = b["at_xy"], b["size_wh"]
+            if ax < bx + bw and bx < ax + aw and ay < by + bh and by < ay + ah:
+                pairs.append((a["object"].sheet_name, b["object"].sheet_name))
+    return pairs
+
+
+@pytest.mark.parametrize(
+    "count, size_wh, flow",
+    [
+        (5, (30.0, 20.0), "row"),
+        (60, (30.0, 20.0), "row"),  # grouping sheets
+        (3, (120.0, 250.0), "row"),  # one sheet per page
+        (3, (350.0, 80.0), "column"),
+    ],
+)
+def test_sheets_do_not_overlap(tmp_path, count, size_wh, flow):
+    placed = KiCadSchematic().add_hierarchical_sheets(
+        tmp_path, _objects(count, size_wh), flow=flow
+    )
+    assert len(placed) == count
+    assert _overlapping(placed) == []
+
+
+def test_spread_moves_pages_past_each_other():
+    layout = SheetLayout()
+    sizes = [(120.0, 250.0)] * 3
+    slots = layout.place(sizes)
+    assert [page for page, _, _ in slots] == [0, 1, 2]
+    assert layout.spread(slots, sizes) == [
+        (0, 50.0, 50.0),
+        (1, 174.0, 50.0),
+        (2, 298.0, 50.0),
+    ]
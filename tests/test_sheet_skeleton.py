@@ -0,0 +1,102 @@
+from pathlib import Path
+
+from sexpdata import Symbol
+
+from schematic_api.hierarchical_object import HierarchicalObject
+from schematic_api.sheet_skeleton import SheetSkeletonKey, sheet_skeleton
+from schematic_api.uuid_factory import DeterministicUuidFactory
+
+PINS = [
+    {"name": "SDA", "type": "bidirectional", "net": "SDA"},
+    {"name": "SCL", "type": "input", "net": "SCL"},
+    {"name": "INT", "type": "output", "net": "INT"},
+]
+PARAMS = dict(
+    pin_margin_mm=2.0,
+    min_delta_mm=1.0,
+    net_wire_len_mm=5.0,
+    equal_two_sides=True,
+    equal_spacing_mm=2.54,
+    label_kind="label",
+)
+
+
+def _key(size_wh=(30.0, 20.0)):
+    template = HierarchicalObject(
+        "sensor",
+        "SENSOR",
+        Path("sensor.kicad_sch"),
+        None,
+        [0, 0],
+        list(size_wh),
+        {"Comment": "x"},
+        PINS,
+    )
+    return SheetSkeletonKey.for_object(template, 0.0, **PARAMS)
+
+
+def _coords(node, found=None):
+    found = [] if found is None else found
+    if isinstance(node, list):
+        if node and node[0] in (Symbol("at"), Symbol("xy")):
+            found.append((node[1], node[2]))
+        for child in node:
+            _coords(child, found)
+    return found
+
+
+def test_skeletons_are_built_once_per_key():
+    assert sheet_skeleton(_key()) is sheet_skeleton(_key())
+    assert sheet_skeleton(_key()) is not sheet_skeleton(_key((40.0, 20.0)))
+
+
+def test_stamps_are_offset_copies():
+    skeleton = sheet_skeleton(_key())
+    pristine = repr(list(skeleton.nodes))
+    uuids = DeterministicUuidFactory("p")
+
+    origin, _ = skeleton.stamp(
+        0.0, 0.0, "S1", "s1.kicad_sch", uuids=uuids, key=("/", "S1")
+    )
+    moved, _ = skeleton.stamp(
+        12.5, 40.0, "S2", "s2.kicad_sch", uuids=uuids, key=("/", "S2")
+    )
+    assert repr(list(skeleton.nodes)) == pristine
+    assert (
+        len(origin) == len(moved) == 1 + 2 * len(PINS)
+    )  # sheet, then a wire and a label per pin
+    assert [
+        (round(x + 12.5, 4), round(y + 40.0, 4)) for x, y in _coords(origin)
+    ] == _coords(moved)
+
+
+def test_stamps_get_their_name_file_and_uuids():
+    skeleton = sheet_skeleton(_key())
+    uuids = DeterministicUuidFactory("p")
+    nodes, sheet_uuid = skeleton.stamp(
+        0.0, 0.0, "S1", "s1.kicad_sch", uuids=uuids, key=("/", "S1")
+    )
+    sheet = repr(nodes[0])
+    assert '"S1"' in sheet and '"s1.kicad_sch"' in sheet and sheet_uuid in sheet
+
+    again, same_uuid = skeleton.stamp(
+        5.0, 5.0, "S1", "s1.kicad_sch", uuids=uuids, key=("/", "S1")
+    )
+    other, other_uuid = skeleton.stamp(
+        0.0, 0.0, "S2", "s2.kicad_sch", uuids=uuids, key=("/", "S2")
+    )
+    assert same_uuid == sheet_uuid and other_uuid != sheet_uuid
+    # Stamps don't share their patched lists: editing one leaves the others.
+    other_coords = _coords(other)
+    for node in nodes[0]:
+        if isinstance(node, list) and node and node[0] == Symbol("at"):
+            node[1] = 999.0
+    assert _coords(other) == other_coords
+    assert (
+        _coords(
+            skeleton.stamp(
+                0.0, 0.0, "S3", "s3.kicad_sch", uuids=uuids, key=("/", "S3")
+            )[0]
+        )
+        == other_coords
+    )
@@ -0,0 +1,27 @@
+import pytest
+
+from schematic_api.kicad_api import KiCadAPI
+
+TEMPLATES = ["acc_mag", "adc_ads1115", "buzzer", "can_buffer", "acc_mag", "buzzer"]
+
+
+def test_concurrent_writing_gives_the_same_files(generate):
+    sequential = generate(TEMPLATES, write_workers=1)
+    assert generate(TEMPLATES, write_workers=8) == sequential
+    assert generate(TEMPLATES, write_workers=3, format_processes=2) == sequential
+    assert {"acc_mag.kicad_sch", "acc_mag_2.kicad_sch", "buzzer_2.kicad_sch"} <= set(
+        sequential
+    )
+
+
+def test_first_failure_is_raised(generate, monkeypatch):
+    write = KiCadAPI._write_instantiated_schematic
+
+    def failing(self, placements, **kwargs):
+        if placements[0]["object"].sheet_file.name == "can_buffer.kicad_sch":
+            raise OSError("disk full")
+        return write(self, placements=placements, **kwargs)
+
+    monkeypatch.setattr(KiCadAPI, "_write_instantiated_schematic", failing)
+    with pytest.raises(OSError, match="disk full"):
+        generate(TEMPLATES, write_workers=4)
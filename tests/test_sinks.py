@@ -0,0 +1,84 @@
+import pytest
+
+from schematic_api.build_state import ModifiedOutputsError
+from schematic_api.kicad_api import KiCadAPI
+from schematic_api.sinks import DiskSink, MemorySink, ProjectSink
+
+STATE_FILES = (".build_state.json", ".provenance.json")
+
+
+def test_project_sink_is_abstract():
+    with pytest.raises(TypeError):
+        ProjectSink()
+
+
+def test_memory_sink_maps_relative_paths_to_bytes():
+    sink = MemorySink("demo")
+    sink.create()
+    with pytest.raises(FileExistsError):
+        sink.create()
+    sink.create(exist_ok=True)
+
+    assert sink.write_text(sink.root / "sub" / "a.txt", "A")
+    assert not sink.write_bytes("sub/a.txt", b"A")
+    assert sink.files == {"sub/a.txt": b"A"}
+    assert sink.read_text("sub/a.txt") == "A"
+    assert sink.stat("sub/a.txt") == (1, None)
+    assert sink.stat("b") is None
+    with pytest.raises(FileNotFoundError):
+        sink.read_bytes("b")
+
+    sink.delete("sub/a.txt")
+    sink.delete("sub/a.txt")
+    assert list(sink) == []
+    with pytest.raises(FileExistsError):
+        MemorySink("demo", {"x": b""}).create()
+
+
+def test_disk_sink_skips_unchanged_files(tmp_path):
+    sink = DiskSink(tmp_path / "demo")
+    sink.create()
+    with pytest.raises(FileExistsError, match="demo"):
+        sink.create()
+    assert sink.write_text("a.txt", "A")
+    mtime = sink.stat("a.txt")[1]
+    assert not sink.write_text("a.txt", "A")
+    assert sink.stat("a.txt")[1] == mtime
+    assert sink.names() == ["a.txt"]
+
+
+def test_in_memory_project_matches_the_project_folder(
+    catalog, generate, tmp_path, monkeypatch
+):
+    monkeypatch.chdir(tmp_path)
+    files = generate(["buzzer", "acc_mag"])
+    assert list(tmp_path.iterdir()) == []
+
+    KiCadAPI().project_creation(
+        "demo",
+        [catalog.get("buzzer"), catalog.get("acc_mag")],
+        deterministic=True,
+        sink=DiskSink(tmp_path / "demo"),
+    )
+    on_disk = DiskSink(tmp_path / "demo")
+    assert set(on_disk.names()) == set(files)
+    for name in on_disk.names():
+        if name not in STATE_FILES:
+            assert on_disk.read_bytes(name) == files[name], name
+
+
+def test_previous_files_make_generation_incremental(generate):
+    first = generate(["buzzer", "acc_mag"])
+    assert generate(["buzzer", "acc_mag"], previous=first) == first
+
+    # A template dropped from the project takes its sheet with it.
+    second = generate(["buzzer"], previous=first)
+    assert "buzzer.kicad_sch" in second
+    assert not any(name.startswith("acc_mag") for name in second)
+
+
+def test_edited_outputs_are_not_overwritten(generate):
+    first = generate(["buzzer"])
+    edited = {**first, "buzzer.kicad_sch": first["buzzer.kicad_sch"] + b"\n"}
+    with pytest.raises(ModifiedOutputsError, match="buzzer.kicad_sch"):
+        generate(["buzzer"], previous=edited)
@@ -0,0 +1,82 @@
+import copy
+import pickle
+
+from sexpdata import Symbol, loads
+
+from schematic_api.kicad_api import _format_sexp_kicad
+from schematic_api.span_sexp import SpanList, copy_sexp, derive, parse_sexp
+
+SOURCE = """(kicad_sch (version 20231120)
+  (lib_symbols)
+  (symbol   (lib_id "Device:R") (at 10 20 0)
+      (property "Reference" "R1"  (at 0 0 0)))
+  (wire (pts (xy 0 0) (xy 1.5 0)))
+)"""
+
+
+def _symbol(tree):
+    return next(n for n in tree if isinstance(n, list) and n[0] == Symbol("symbol"))
+
+
+def test_parse_gives_the_same_tree_as_sexpdata():
+    tree = parse_sexp(SOURCE)
+    assert tree == loads(SOURCE)
+    assert type(tree) is SpanList and not tree.dirty
+    assert tree.text() == SOURCE
+
+
+def test_clean_tree_is_written_back_verbatim():
+    assert _format_sexp_kicad(parse_sexp(SOURCE)) == SOURCE
+
+
+def test_mutation_reformats_only_the_changed_path():
+    tree = parse_sexp(SOURCE)
+    symbol = _symbol(tree)
+    reference = symbol[3]
+    reference[2] = "R2"
+
+    assert reference.dirty and symbol.dirty and tree.dirty
+    wire = tree[-1]
+    assert not wire.dirty
+
+    text = _format_sexp_kicad(tree)
+    assert '"R2"' in text and '"R1"' not in text
+    # The untouched sibling keeps its odd spacing, the edited symbol doesn't.
+    assert wire.text() in text
+    assert '(symbol   (lib_id "Device:R")' not in text
+    assert loads(text) == tree
+
+
+def test_copies_keep_the_span_and_stay_independent():
+    tree = parse_sexp(SOURCE)
+    clone = copy_sexp(tree)
+    assert clone == tree and not clone.dirty
+    assert _format_sexp_kicad(clone) == SOURCE
+
+    _symbol(clone)[3][2] = "R9"
+    assert clone.dirty and not tree.dirty
+    assert _format_sexp_kicad(tree) == SOURCE
+
+    assert not copy.deepcopy(tree).dirty
+    assert copy.copy(tree).dirty
+
+
+def test_derive_stays_clean_only_for_identical_children():
+    tree = parse_sexp(SOURCE)
+    same = derive(tree, (copy_sexp(c) if isinstance(c, list) else c for c in tree))
+    assert not same.dirty
+    assert _format_sexp_kicad(same) == SOURCE
+
+    shorter = derive(tree, list(tree)[:-1])
+    assert shorter.dirty
+    assert derive([1, [2]], [1, [2]]) == [1, [2]]
+    assert type(derive([1], [1])) is list
+
+
+def test_pickled_tree_keeps_its_state():
+    tree = parse_sexp(SOURCE)
+    _symbol(tree)[3][2] = "R2"
+    restored = pickle.loads(pickle.dumps(tree))
+    assert restored == tree
+    assert restored.dirty and not restored[-1].dirty
+    assert _format_sexp_kicad(restored) == _format_sexp_kicad(tree)
@@ -0,0 +1,30 @@
+import subprocess
+import sys
+from pathlib import Path
+
+MAIN = Path(__file__).resolve().parent.parent / "src" / "main.py"
+
+
+def _imported_modules(tmp_path, *args):
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", str(MAIN), *args],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={"KICAD_TEMPLATES_CACHE": str(tmp_path), "PATH": ""},
+    )
+    return {
+        line.rsplit("|", 1)[-1].strip()
+        for line in proc.stderr.splitlines()
+        if line.startswith("import time:")
+    }
+
+
+def test_help_and_warm_list_skip_generation_imports(tmp_path):
+    heavy = {"schematic_api.kicad_api", "sexpdata", "yaml"}
+    assert not heavy & _imported_modules(tmp_path, "--help")
+
+    # The first list fills the catalog index (and needs PyYAML); the next
+    # ones read it.
+    _imported_modules(tmp_path, "list")
+    assert not heavy & _imported_modules(tmp_path, "list")
@@ -0,0 +1,96 @@
+from sexpdata import Symbol, loads
+
+from schematic_api.kicad_api import _format_sexp_kicad
+from schematic_api.span_sexp import parse_sexp
+from schematic_api.symbol_library import (
+    ProjectSymbolLibrary,
+    prune_lib_symbols,
+    used_symbol_names,
+)
+
+
+def _definition(name, body="(rectangle (start 0 0) (end 1 1))"):
+    unit = name.rsplit(":", 1)[-1]
+    return f'(symbol "{name}" (property "Reference" "X") (symbol "{unit}_0_1" {body}))'
+
+
+def _sheet(definitions, *symbols):
+    placed = " ".join(
+        f'(symbol (lib_id "{lib_id}") (at 0 0 0))'
+        if lib_name is None
+        else f'(symbol (lib_name "{lib_name}") (lib_id "{lib_id}") (at 0 0 0))'
+        for lib_id, lib_name in symbols
+    )
+    return parse_sexp(
+        f"(kicad_sch (version 20250114) (lib_symbols {' '.join(definitions)}) {placed})"
+    )
+
+
+def _names(node):
+    return [
+        str(child[1])
+        for child in node[1:]
+        if isinstance(child, list) and child[0] == Symbol("symbol")
+    ]
+
+
+def test_used_names_prefer_lib_name():
+    sheet = _sheet([], ("Device:R", None), ("power:GND", "GND_1"))
+    assert used_symbol_names(sheet) == {"Device:R", "GND_1"}
+
+
+def test_prune_drops_unused_definitions_only():
+    sheet = _sheet(
+        [_definition("Device:R"), _definition("Device:C"), _definition("GND_1")],
+        ("Device:R", None),
+        ("power:GND", "GND_1"),
+    )
+    assert prune_lib_symbols(sheet) == 1
+    assert _names(sheet[2]) == ["Device:R", "GND_1"]
+
+    assert prune_lib_symbols(sheet) == 0
+    clean = _sheet([_definition("Device:R")], ("Device:R", None))
+    assert prune_lib_symbols(clean) == 0 and not clean.dirty
+
+
+def test_library_keeps_each_distinct_definition_once():
+    library = ProjectSymbolLibrary()
+    library.add_schematic(_sheet([_definition("Device:R")], ("Device:R", None)))
+    library.add_schematic(
+        _sheet(
+            [_definition("Device:R"), _definition("Device:C")],
+            ("Device:R", None),
+        )
+    )
+    assert len(library) == 1
+
+    # Same name, other drawing: a suffixed symbol, units renamed with it.
+    other = parse_sexp(_definition("Other:R", "(circle (center 0 0) (radius 1))"))
+    assert library.add(other) == "R_1"
+    assert library.add(parse_sexp(_definition("Device:R"))) == "R"
+
+    data = library.data()
+    assert data[0] == Symbol("kicad_symbol_lib")
+    assert _names(data) == ["R", "R_1"]
+    assert _names(data[-1]) == ["R_1_0_1"]
+    assert loads(_format_sexp_kicad(data)) == data
+
+
+def test_generated_project_has_its_symbol_library(generate):
+    files = generate(["buzzer", "acc_mag"])
+    library = loads(files["demo.kicad_sym"].decode("utf-8"))
+    names = _names(library)
+    assert names and len(names) == len(set(names))
+    table = {
+        str(entry[1][1]): str(entry[3][1])
+        for entry in loads(files["sym-lib-table"].decode("utf-8"))[1:]
+        if isinstance(entry, list) and entry[0] == Symbol("lib")
+    }
+    assert table["demo"] == "${KIPRJMOD}/demo.kicad_sym"
+
+    for sheet_file in ("buzzer.kicad_sch", "acc_mag.kicad_sch"):
+        sheet = loads(files[sheet_file].decode("utf-8"))
+        lib_symbols = next(
+            n for n in sheet if isinstance(n, list) and n[0] == Symbol("lib_symbols")
+        )
+        assert set(_names(lib_symbols)) == used_symbol_names(sheet)
@@ -0,0 +1,92 @@
+import shutil
+
+import pytest
+from click.testing import CliRunner
+
+import main
+from conftest import SUBSYSTEMS
+from schematic_api import template_check
+from schematic_api.template_check import check_template, validate_templates
+
+
+@pytest.fixture(autouse=True)
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("KICAD_TEMPLATES_CACHE", str(tmp_path / "cache"))
+
+
+@pytest.fixture
+def templates(tmp_path):
+    folder = tmp_path / "templates"
+    for name in ("acc_mag", "buzzer"):
+        shutil.copytree(SUBSYSTEMS / name, folder / name)
+    return folder
+
+
+def test_shipped_templates_can_be_generated():
+    folders = sorted(
+        path for path in SUBSYSTEMS.iterdir() if (path / "meta.yaml").is_file()
+    )
+    reports = validate_templates(folders, processes=1, use_cache=False)
+    assert [report.name for report in reports] == [folder.name for folder in folders]
+    assert all(report.fatal == [] for report in reports)
+    buzzer = next(report for report in reports if report.name == "buzzer")
+    assert not buzzer.ok
+    assert any("BUZZER_PIN" in error for error in buzzer.errors)
+
+
+def test_unreadable_files_are_fatal(templates):
+    (templates / "acc_mag" / "acc_mag.kicad_sch").write_text("(kicad_sch (oops")
+    report = check_template(templates / "acc_mag")
+    assert report.fatal == [
+        "acc_mag.kicad_sch: can't be parsed (" + report.fatal[0].split("(", 1)[1]
+    ]
+
+    (templates / "acc_mag" / "meta.yaml").unlink()
+    report = check_template(templates / "acc_mag")
+    assert len(report.fatal) == 1 and report.fatal[0].startswith(
+        "meta.yaml: can't be read"
+    )
+    assert report.files == {"meta.yaml": None}
+
+
+def test_footprints_must_point_to_sheet_symbols(templates):
+    board = templates / "acc_mag" / "acc_mag.kicad_pcb"
+    text = board.read_text(encoding="utf-8")
+    # The last part of the path is the symbol's UUID.
+    end = text.index('"', text.index("(path ") + len('(path "'))
+    board.write_text(text[:end] + "0" + text[end:], encoding="utf-8")
+    errors = check_template(templates / "acc_mag").errors
+    assert any("matches no symbol of the sheet" in error for error in errors)
+
+
+def test_unchanged_templates_are_not_checked_again(templates, monkeypatch):
+    folders = [templates / "acc_mag", templates / "buzzer"]
+    first = validate_templates(folders, processes=1)
+
+    checked = []
+    check = template_check.check_template
+    monkeypatch.setattr(
+        template_check,
+        "check_template",
+        lambda folder: checked.append(folder.name) or check(folder),
+    )
+    assert validate_templates(folders, processes=1) == first
+    assert checked == []
+
+    (templates / "buzzer" / "meta.yaml").write_text(
+        (templates / "buzzer" / "meta.yaml").read_text() + "\n# edited\n"
+    )
+    validate_templates(folders, processes=1)
+    assert checked == ["buzzer"]
+
+
+def test_new_creates_nothing_from_broken_templates(templates, tmp_path, monkeypatch):
+    (templates / "acc_mag" / "acc_mag.kicad_sch").write_text("(kicad_sch (oops")
+    monkeypatch.setattr(main, "SUBSYSTEM_FOLDER", templates)
+    monkeypatch.chdir(tmp_path)
+
+    result = CliRunner().invoke(main.cli, ["new", "broken", "buzzer", "acc_mag"])
+    assert result.exit_code == 1
+    assert "acc_mag: acc_mag.kicad_sch: can't be parsed" in result.output
+    assert "Nothing was created" in result.output
+    assert not (main.PROJECT_FOLDER / "broken").exists()
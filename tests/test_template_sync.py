@@ -0,0 +1,220 @@
+import re
+import shutil
+
+import pytest
+
+from conftest import SUBSYSTEMS
+from schematic_api.build_state import ModifiedOutputsError
+from schematic_api.kicad_api import KiCadAPI
+from schematic_api.provenance import Provenance
+from schematic_api.sinks import DiskSink
+from schematic_api.span_sexp import parse_sexp
+from schematic_api.template_sync import merge_into, sync_project
+from schematic_api.templates import TemplateCatalog
+
+
+def _symbol(uuid, value="10k", reference="R1", x=10):
+    return (
+        f'(symbol (lib_id "Device:R") (at {x} 20 0) (uuid "{uuid}")'
+        f' (property "Reference" "{reference}" (at 0 0 0)) (property "Value" "{value}" (at 0 0 0))'
+        f' (instances (project "p" (path "/root" (reference "{reference}") (unit 1)))))'
+    )
+
+
+def _sheet(*items):
+    return parse_sexp("(kicad_sch (version 20250114) " + " ".join(items) + ")")
+
+
+def _merge(base, ours, theirs):
+    ours = _sheet(*ours)
+    conflicts = []
+    changed = merge_into(_sheet(*base), ours, _sheet(*theirs), conflicts, "s.kicad_sch")
+    return changed, ours, conflicts
+
+
+def _values(sheet):
+    # uuid -> (value, reference) of each symbol
+    values = {}
+    for item in sheet[2:]:
+        properties = {
+            str(child[1]): str(child[2])
+            for child in item
+            if isinstance(child, list) and str(child[0]) == "property"
+        }
+        uuid = next(
+            str(child[1])
+            for child in item
+            if isinstance(child, list) and str(child[0]) == "uuid"
+        )
+        values[uuid] = (properties["Value"], properties["Reference"])
+    return values
+
+
+def test_unchanged_template_leaves_the_project_alone():
+    changed, ours, conflicts = _merge(
+        [_symbol("a")], [_symbol("a", value="22k")], [_symbol("a")]
+    )
+    assert not changed and conflicts == []
+    assert _values(ours) == {"a": ("22k", "R1")}
+
+
+def test_template_only_change_is_taken():
+    changed, ours, conflicts = _merge(
+        [_symbol("a")], [_symbol("a")], [_symbol("a", value="4k7")]
+    )
+    assert changed and conflicts == []
+    assert _values(ours) == {"a": ("4k7", "R1")}
+
+
+def test_annotation_and_position_stay_the_project_s():
+    # The project annotated the symbol (R7) and moved it: neither is a
+    # change of its own, and both survive the template's.
+    changed, ours, conflicts = _merge(
+        [_symbol("a")],
+        [_symbol("a", reference="R7")],
+        [_symbol("a", value="4k7", x=50)],
+    )
+    assert changed and conflicts == []
+    assert _values(ours) == {"a": ("4k7", "R7")}
+
+
+def test_change_on_both_sides_is_a_conflict_keeping_the_project_s():
+    changed, ours, conflicts = _merge(
+        [_symbol("a")], [_symbol("a", value="1k")], [_symbol("a", value="4k7")]
+    )
+    assert not changed
+    assert _values(ours) == {"a": ("1k", "R1")}
+    assert len(conflicts) == 1 and conflicts[0].startswith("s.kicad_sch: ")
+
+
+def test_same_change_on_both_sides_is_no_conflict():
+    changed, ours, conflicts = _merge(
+        [_symbol("a")], [_symbol("a", value="1k")], [_symbol("a", value="1k")]
+    )
+    assert not changed and conflicts == []
+
+
+def test_template_deletions():
+    # Deleted in the template: gone, unless the project changed it.
+    changed, ours, conflicts = _merge(
+        [_symbol("a"), _symbol("b")], [_symbol("a"), _symbol("b", value="1k")], []
+    )
+    assert changed
+    assert _values(ours) == {"b": ("1k", "R1")}
+    assert len(conflicts) == 1
+
+
+def test_template_change_of_an_item_deleted_in_the_project_is_a_conflict():
+    changed, ours, conflicts = _merge(
+        [_symbol("a"), _symbol("b")],
+        [_symbol("a")],
+        [_symbol("a"), _symbol("b", value="1k")],
+    )
+    assert not changed
+    assert _values(ours) == {"a": ("10k", "R1")}
+    assert conflicts == [conflicts[0]] and conflicts[0].endswith(
+        "(deleted in the project)"
+    )
+
+
+def test_template_additions_go_after_their_predecessor():
+    changed, ours, conflicts = _merge(
+        [_symbol("a"), _symbol("c")],
+        [_symbol("a"), _symbol("c"), _symbol("p")],
+        [_symbol("a"), _symbol("b"), _symbol("c")],
+    )
+    assert changed and conflicts == []
+    assert list(_values(ours)) == ["a", "b", "c", "p"]
+
+
+# ---- whole projects ----
+
+UUID_RE = re.compile(r'\(uuid "?([0-9a-f-]{36})"?\)')
+# The transistor placed on the buzzer sheet (its library symbol is deeper).
+PLACED_VALUE = '\n\t\t(property "Value" "MMBT2222A"'
+NEW_VALUE = PLACED_VALUE.replace("MMBT2222A", "BC817")
+
+
+@pytest.fixture
+def project(tmp_path):
+    """A buzzer project with random UUIDs, and its editable template folder."""
+    templates = tmp_path / "templates"
+    shutil.copytree(SUBSYSTEMS / "buzzer", templates / "buzzer")
+    path = tmp_path / "demo"
+
+    def create(regenerate=False):
+        KiCadAPI().project_creation(
+            "demo",
+            [TemplateCatalog(templates).get("buzzer")],
+            sink=DiskSink(path),
+            regenerate=regenerate,
+        )
+
+    create()
+    return path, templates, create
+
+
+def _edit(path, old, new):
+    text = path.read_text(encoding="utf-8")
+    assert text.count(old) == 1
+    path.write_text(text.replace(old, new), encoding="utf-8")
+
+
+def test_random_uuid_projects_are_synced_with_their_recorded_uuids(project):
+    path, templates, create = project
+    sheet = path / "buzzer.kicad_sch"
+    before = set(UUID_RE.findall(sheet.read_text(encoding="utf-8")))
+    provenance = Provenance.load(DiskSink(path))
+    assert not provenance.deterministic and provenance.uuids
+
+    _edit(
+        templates / "buzzer" / "buzzer.kicad_sch",
+        PLACED_VALUE,
+        NEW_VALUE,
+    )
+    result = sync_project(path, templates)
+    assert result.skipped is None and result.error is None
+    assert result.synced == ["buzzer.kicad_sch"] and result.conflicts == []
+
+    text = sheet.read_text(encoding="utf-8")
+    assert '"BC817"' in text
+    assert set(UUID_RE.findall(text)) == before
+    assert sync_project(path, templates).synced == []
+
+
+def test_synced_files_stay_regenerable(project):
+    path, templates, create = project
+    _edit(
+        templates / "buzzer" / "buzzer.kicad_sch",
+        PLACED_VALUE,
+        NEW_VALUE,
+    )
+    assert "buzzer.kicad_sch" in sync_project(path, templates).written
+
+    create(regenerate=True)
+    assert '"BC817"' in (path / "buzzer.kicad_sch").read_text(encoding="utf-8")
+
+
+def test_edited_files_stay_protected_after_a_sync(project):
+    path, templates, create = project
+    _edit(path / "buzzer.kicad_sch", '"Buzz pwr"', '"Buzzer power"')
+    _edit(
+        templates / "buzzer" / "buzzer.kicad_sch",
+        PLACED_VALUE,
+        NEW_VALUE,
+    )
+    assert "buzzer.kicad_sch" in sync_project(path, templates).written
+
+    text = (path / "buzzer.kicad_sch").read_text(encoding="utf-8")
+    assert '"BC817"' in text and '"Buzzer power"' in text
+    with pytest.raises(ModifiedOutputsError, match="buzzer.kicad_sch"):
+        create(regenerate=True)
+
+
+def test_projects_without_recorded_uuids_are_skipped(project):
+    path, templates, create = project
+    sink = DiskSink(path)
+    provenance = Provenance.load(sink)
+    provenance.uuids = None
+    provenance.save(sink)
+    assert "not recorded" in sync_project(path, templates).skipped
@@ -0,0 +1,103 @@
+import os
+
+from schematic_api.templates import TemplateCatalog
+
+META = """sheet_name: {sheet}
+sheet_file: {name}.kicad_sch
+pcb_file: {name}.kicad_pcb
+at_xy: [0, 0]
+size_wh: [30, 20]
+properties:
+  Comment: {comment}
+pins:
+  - name: IN
+    type: input
+    net: IN
+  - name: OUT
+    type: output
+    net: OUT
+"""
+
+
+def _template(folder, name, comment="Test", pcb=True):
+    path = folder / name
+    path.mkdir(parents=True)
+    (path / "meta.yaml").write_text(
+        META.format(sheet=name.upper(), name=name, comment=comment)
+    )
+    (path / f"{name}.kicad_sch").write_text("(kicad_sch)")
+    if pcb:
+        (path / f"{name}.kicad_pcb").write_text("(kicad_pcb)")
+    return path
+
+
+def _touch_later(path):
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_lookup_by_name(tmp_path):
+    folder = tmp_path / "subsystems"
+    _template(folder, "led")
+    _template(folder, "buzzer")
+    catalog = TemplateCatalog(folder, tmp_path / "index.json")
+
+    assert catalog.names() == ["buzzer", "led"]
+    assert "led" in catalog and "fan" not in catalog
+    led = catalog.get("led")
+    assert led.sheet_name == "LED" and len(led.pins) == 2
+    assert catalog.get("led") is led
+    assert catalog.get("fan") is None
+
+    _template(folder, "fan")
+    catalog.refresh()
+    assert catalog.names() == ["buzzer", "fan", "led"]
+
+
+def test_summaries_are_kept_in_the_index(tmp_path, monkeypatch):
+    folder = tmp_path / "subsystems"
+    _template(folder, "led", comment="Status LED")
+    index = tmp_path / "index.json"
+    summary = TemplateCatalog(folder, index).summaries()["led"]
+    assert (
+        summary["pin_count"] == 2
+        and summary["comment"] == "Status LED"
+        and summary["has_pcb"]
+    )
+
+    # A new catalog answers from the index, without loading meta.yaml.
+    catalog = TemplateCatalog(folder, index)
+    monkeypatch.setattr(catalog, "get", lambda name: 1 / 0)
+    assert catalog.summaries()["led"]["comment"] == "Status LED"
+
+
+def test_summary_follows_meta_yaml_and_the_board(tmp_path):
+    folder = tmp_path / "subsystems"
+    led = _template(folder, "led")
+    catalog = TemplateCatalog(folder, tmp_path / "index.json")
+    assert catalog.summary("led")["has_pcb"]
+
+    (led / "led.kicad_pcb").unlink()
+    assert not catalog.summary("led")["has_pcb"]
+    assert not TemplateCatalog(folder, tmp_path / "index.json").summaries()["led"][
+        "has_pcb"
+    ]
+
+    (led / "meta.yaml").write_text(
+        META.format(sheet="LED", name="led", comment="Changed")
+    )
+    _touch_later(led / "meta.yaml")
+    assert catalog.summary("led")["comment"] == "Changed"
+
+
+def test_broken_templates_are_summarized_as_such(tmp_path):
+    folder = tmp_path / "subsystems"
+    _template(folder, "led")
+    (folder / "empty").mkdir()
+    broken = _template(folder, "broken")
+    (broken / "meta.yaml").write_text("sheet_name: X\n")
+
+    summaries = TemplateCatalog(folder, tmp_path / "index.json").summaries()
+    assert summaries["empty"] is None
+    assert "invalid" in summaries["broken"]
+    assert summaries["led"]["pin_count"] == 2
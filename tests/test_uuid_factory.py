@@ -0,0 +1,61 @@
+import re
+import uuid
+
+import pytest
+
+from schematic_api.kicad_api import KiCadAPI
+from schematic_api.uuid_factory import DeterministicUuidFactory, UuidFactory
+
+UUID_RE = re.compile(rb'\(uuid "?([0-9a-f-]{36})"?\)')
+
+
+def _uuids(files):
+    return {match for data in files.values() for match in UUID_RE.findall(data)}
+
+
+def test_random_uuids_are_version_4_and_distinct():
+    factory = UuidFactory(batch_size=4)
+    values = [factory("same key") for _ in range(10)]
+    assert len(set(values)) == 10
+    for value in values:
+        parsed = uuid.UUID(value)
+        assert parsed.version == 4 and str(parsed) == value
+
+
+def test_deterministic_uuids_depend_on_project_and_key():
+    factory = DeterministicUuidFactory("demo")
+    assert factory("a", 1) == DeterministicUuidFactory("demo")("a", 1)
+    assert factory("a", 1) != factory("a", 2)
+    assert factory("a", 1) != DeterministicUuidFactory("other")("a", 1)
+    assert uuid.UUID(factory("a")).version == 5
+
+
+def test_deterministic_generation_is_reproducible(generate):
+    assert generate(["buzzer", "acc_mag"]) == generate(["buzzer", "acc_mag"])
+
+
+def test_deterministic_run_leaves_the_api_factory_alone(catalog):
+    api = KiCadAPI()
+    own = api.uuids
+    templates = [catalog.get("buzzer")]
+
+    first = api.generate_project_files("demo", templates, deterministic=True)
+    assert api.uuids is own
+
+    second = api.generate_project_files("demo", templates)
+    third = api.generate_project_files("demo", templates)
+    assert not _uuids(first) & _uuids(second)
+    assert not _uuids(second) & _uuids(third)
+
+
+def test_factory_is_restored_when_generation_fails(catalog):
+    api = KiCadAPI()
+    own = api.uuids
+    with pytest.raises(FileExistsError):
+        api.generate_project_files(
+            "demo",
+            [catalog.get("buzzer")],
+            previous={"demo.kicad_pro": b"{}"},
+            deterministic=True,
+        )
+    assert api.uuids is own